@@ -0,0 +1,54 @@
+"""add patient search indexes
+
+Revision ID: 20250116000021
+Revises: 20250115000020
+Create Date: 2026-01-16 00:00:00.000000
+
+Adds pg_trgm trigram indexes so that the registration desk search
+(ILIKE '%term%' over name, phone, MRN and NIK) no longer needs a
+sequential scan, and a composite index that backs keyset pagination on (created_at, id).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000021'
+down_revision = '20250115000020'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Trigram indexes serve both leading-wildcard ILIKE and similarity()
+    op.create_index(
+        'ix_patients_full_name_trgm', 'patients', ['full_name'],
+        postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_patients_phone_trgm', 'patients', ['phone'],
+        postgresql_using='gin', postgresql_ops={'phone': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_patients_medical_record_number_trgm', 'patients', ['medical_record_number'],
+        postgresql_using='gin', postgresql_ops={'medical_record_number': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_patients_nik_trgm', 'patients', ['nik'],
+        postgresql_using='gin', postgresql_ops={'nik': 'gin_trgm_ops'}
+    )
+
+    # Keyset pagination: WHERE is_active = ? AND (created_at, id) < (?, ?)
+    op.create_index(
+        'ix_patients_active_created_id', 'patients',
+        ['is_active', sa.text('created_at DESC'), sa.text('id DESC')]
+    )
+
+
+def downgrade():
+    op.drop_index('ix_patients_active_created_id', table_name='patients')
+    op.drop_index('ix_patients_nik_trgm', table_name='patients')
+    op.drop_index('ix_patients_medical_record_number_trgm', table_name='patients')
+    op.drop_index('ix_patients_phone_trgm', table_name='patients')
+    op.drop_index('ix_patients_full_name_trgm', table_name='patients')
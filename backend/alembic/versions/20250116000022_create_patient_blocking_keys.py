@@ -0,0 +1,168 @@
+"""create patient blocking keys
+
+Revision ID: 20250116000022
+Revises: 20250116000021
+Create Date: 2026-01-16 00:00:00.000000
+
+Side table of precomputed blocking keys (phonetic name keys, phone suffix,
+date-of-birth bucket) used by PatientDeduplicationService for indexed
+candidate lookup. Existing patients are backfilled here (the phonetic rules only exist in
+Python), so duplicate detection covers them as soon as the upgrade finishes.
+The key functions below are a frozen copy of those in
+app.services.patient_deduplication as of this revision, so the migration
+does not depend on application code that may change later.
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000022'
+down_revision = '20250116000021'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+PHONE_SUFFIX_LENGTH = 8
+MIN_PHONE_DIGITS = 9
+
+NAME_TITLES = {
+    "tn", "ny", "nn", "an", "by", "sdr", "sdri", "bpk", "ibu", "h", "hj",
+    "dr", "drg", "ir", "prof",
+}
+
+MUHAMMAD_VARIANTS = {
+    "m", "mhd", "moh", "moch", "mochd", "mohd", "muh", "much", "mukh",
+    "mohammad", "mohamad", "mochammad", "mochamad", "muhammad", "muhamad",
+    "muhammed", "mohammed", "muchammad", "muchamad",
+}
+
+PHONETIC_RULES = (
+    ("oe", "u"), ("dj", "j"), ("tj", "c"), ("sj", "sy"), ("nj", "ny"),
+    ("j", "y"), ("ch", "h"), ("kh", "h"), ("ph", "f"), ("th", "t"),
+    ("dh", "d"), ("q", "k"), ("x", "ks"), ("v", "f"), ("w", "u"), ("y", "i"),
+)
+
+
+def normalize_name(full_name):
+    name = (full_name or "").split(",")[0].lower()
+    tokens = re.sub(r"[^a-z\s]", " ", name).split()
+    normalized = []
+    for token in tokens:
+        if token in NAME_TITLES:
+            continue
+        if token in MUHAMMAD_VARIANTS:
+            token = "muhammad"
+        normalized.append(token)
+    return " ".join(normalized)
+
+
+def phonetic_key(token):
+    if not token:
+        return ""
+    word = token
+    for source, target in PHONETIC_RULES:
+        word = word.replace(source, target)
+    key = word[0]
+    for char in word[1:]:
+        if char in "aeiouh":
+            continue
+        if char != key[-1]:
+            key += char
+    return key
+
+
+def phone_suffix(phone):
+    if not phone:
+        return None
+    digits = "".join(c for c in phone if c.isdigit())
+    if digits.startswith("62"):
+        digits = "0" + digits[2:]
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return digits[-PHONE_SUFFIX_LENGTH:]
+
+
+def build_blocking_keys(full_name, phone, date_of_birth):
+    normalized = normalize_name(full_name)
+    tokens = normalized.split()
+    return {
+        "normalized_name": normalized,
+        "phonetic_first": phonetic_key(tokens[0]) if tokens else None,
+        "phonetic_last": phonetic_key(tokens[-1]) if tokens else None,
+        "phone_suffix": phone_suffix(phone),
+        "dob_bucket": date_of_birth.year * 100 + date_of_birth.month if date_of_birth else None,
+    }
+
+
+def upgrade():
+    op.create_table(
+        'patient_blocking_keys',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False, comment='Reference to patient'),
+        sa.Column('normalized_name', sa.String(length=255), nullable=False, comment='Lowercased, punctuation-free full name used for scoring'),
+        sa.Column('phonetic_first', sa.String(length=50), nullable=True, comment='Phonetic key of the first name token'),
+        sa.Column('phonetic_last', sa.String(length=50), nullable=True, comment='Phonetic key of the last name token'),
+        sa.Column('phone_suffix', sa.String(length=10), nullable=True, comment='Last digits of the normalized phone number'),
+        sa.Column('dob_bucket', sa.Integer(), nullable=True, comment='Date-of-birth bucket (YYYYMM)'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False, comment='Record last update timestamp'),
+        sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('patient_id', name='uq_patient_blocking_keys_patient_id')
+    )
+    op.create_index('ix_patient_blocking_keys_id', 'patient_blocking_keys', ['id'])
+    op.create_index('ix_patient_blocking_keys_patient_id', 'patient_blocking_keys', ['patient_id'], unique=True)
+    op.create_index('ix_patient_blocking_keys_phone_suffix', 'patient_blocking_keys', ['phone_suffix'])
+    op.create_index('ix_patient_blocking_keys_dob_first', 'patient_blocking_keys', ['dob_bucket', 'phonetic_first'])
+    op.create_index('ix_patient_blocking_keys_dob_last', 'patient_blocking_keys', ['dob_bucket', 'phonetic_last'])
+
+    backfill_blocking_keys()
+
+
+def backfill_blocking_keys():
+    """Compute blocking keys for existing patients, in id-ordered batches"""
+    bind = op.get_bind()
+    blocking_keys = sa.table(
+        'patient_blocking_keys',
+        sa.column('patient_id', sa.Integer),
+        sa.column('normalized_name', sa.String),
+        sa.column('phonetic_first', sa.String),
+        sa.column('phonetic_last', sa.String),
+        sa.column('phone_suffix', sa.String),
+        sa.column('dob_bucket', sa.Integer),
+    )
+    patients = sa.table(
+        'patients',
+        sa.column('id', sa.Integer),
+        sa.column('full_name', sa.String),
+        sa.column('phone', sa.String),
+        sa.column('date_of_birth', sa.Date),
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(patients.c.id, patients.c.full_name, patients.c.phone, patients.c.date_of_birth)
+            .where(patients.c.id > last_id)
+            .order_by(patients.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(blocking_keys.insert(), [
+            dict(patient_id=row.id, **build_blocking_keys(row.full_name or '', row.phone, row.date_of_birth))
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def downgrade():
+    op.drop_index('ix_patient_blocking_keys_dob_last', table_name='patient_blocking_keys')
+    op.drop_index('ix_patient_blocking_keys_dob_first', table_name='patient_blocking_keys')
+    op.drop_index('ix_patient_blocking_keys_phone_suffix', table_name='patient_blocking_keys')
+    op.drop_index('ix_patient_blocking_keys_patient_id', table_name='patient_blocking_keys')
+    op.drop_index('ix_patient_blocking_keys_id', table_name='patient_blocking_keys')
+    op.drop_table('patient_blocking_keys')
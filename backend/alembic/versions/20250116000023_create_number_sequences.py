@@ -0,0 +1,36 @@
+"""create number sequences
+
+Revision ID: 20250116000023
+Revises: 20250116000022
+Create Date: 2026-01-16 00:00:00.000000
+
+Counter table for SequenceAllocator. Rows are created lazily per sequence
+and scope, seeded once from the highest number already in use.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000023'
+down_revision = '20250116000022'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'number_sequences',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False, comment='Sequence name (e.g. patient_mrn, invoice)'),
+        sa.Column('scope', sa.String(length=100), nullable=False, comment='Reset scope: period and optional department'),
+        sa.Column('last_value', sa.BigInteger(), nullable=False, server_default='0', comment='Last value handed out (end of last reserved block)'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False, comment='Record last update timestamp'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name', 'scope', name='uq_number_sequences_name_scope')
+    )
+    op.create_index('ix_number_sequences_id', 'number_sequences', ['id'])
+
+
+def downgrade():
+    op.drop_index('ix_number_sequences_id', table_name='number_sequences')
+    op.drop_table('number_sequences')
@@ -0,0 +1,35 @@
+"""add appointment overlap constraint
+
+Revision ID: 20250116000024
+Revises: 20250116000023
+Create Date: 2026-01-16 00:00:00.000000
+
+Exclusion constraint that rejects two active (scheduled, confirmed or
+checked-in) appointments of the same doctor with overlapping time ranges,
+so concurrent bookings cannot double-book a doctor. Needs btree_gist for
+the integer equality operator in a GiST index.
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20250116000024'
+down_revision = '20250116000023'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    op.execute(
+        "ALTER TABLE appointments ADD CONSTRAINT ex_appointments_doctor_overlap "
+        "EXCLUDE USING gist ("
+        "doctor_id WITH =, "
+        "tsrange(appointment_date + appointment_time, "
+        "appointment_date + appointment_time + duration_minutes * interval '1 minute') WITH &&"
+        ") WHERE (doctor_id IS NOT NULL AND status IN ('SCHEDULED', 'CONFIRMED', 'CHECKED_IN'))"
+    )
+
+
+def downgrade():
+    op.execute('ALTER TABLE appointments DROP CONSTRAINT IF EXISTS ex_appointments_doctor_overlap')
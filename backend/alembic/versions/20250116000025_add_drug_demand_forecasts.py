@@ -0,0 +1,48 @@
+"""add drug demand forecasts
+
+Revision ID: 20250116000025
+Revises: 20250116000024
+Create Date: 2026-01-16 00:00:00.000000
+
+Stores the results of the nightly bulk demand forecast, one row per drug,
+history end date and horizon, so reports and purchase suggestions can read
+them instead of re-forecasting.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20250116000025'
+down_revision = '20250116000024'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'drug_demand_forecasts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('drug_id', sa.Integer(), nullable=False),
+        sa.Column('forecast_date', sa.Date(), nullable=False),
+        sa.Column('forecast_horizon', sa.Integer(), nullable=False),
+        sa.Column('algorithm', sa.String(length=50), nullable=False),
+        sa.Column('total_forecast_quantity', sa.Float(), nullable=False),
+        sa.Column('mape', sa.Float(), nullable=True),
+        sa.Column('forecast', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('confidence_intervals', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+        sa.ForeignKeyConstraint(['drug_id'], ['drugs.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('drug_id', 'forecast_date', 'forecast_horizon', name='uq_drug_demand_forecasts_run'),
+    )
+    op.create_index(op.f('ix_drug_demand_forecasts_id'), 'drug_demand_forecasts', ['id'], unique=False)
+    op.create_index(op.f('ix_drug_demand_forecasts_drug_id'), 'drug_demand_forecasts', ['drug_id'], unique=False)
+    op.create_index(op.f('ix_drug_demand_forecasts_forecast_date'), 'drug_demand_forecasts', ['forecast_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_drug_demand_forecasts_forecast_date'), table_name='drug_demand_forecasts')
+    op.drop_index(op.f('ix_drug_demand_forecasts_drug_id'), table_name='drug_demand_forecasts')
+    op.drop_index(op.f('ix_drug_demand_forecasts_id'), table_name='drug_demand_forecasts')
+    op.drop_table('drug_demand_forecasts')
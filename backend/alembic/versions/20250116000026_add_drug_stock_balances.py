@@ -0,0 +1,66 @@
+"""add drug stock balances
+
+Revision ID: 20250116000026
+Revises: 20250116000025
+Create Date: 2026-01-16 00:00:00.000000
+
+Maintains the usable on-hand stock per drug (drugs.stock_on_hand) and per
+drug and bin location (drug_stock_balances), so stock checks are a point
+lookup instead of a SUM over drug_batches. Both are backfilled from the
+current batches.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000026'
+down_revision = '20250116000025'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'drugs',
+        sa.Column('stock_on_hand', sa.Integer(), server_default='0', nullable=False),
+    )
+    op.create_table(
+        'drug_stock_balances',
+        sa.Column('drug_id', sa.Integer(), nullable=False),
+        sa.Column('location', sa.String(length=50), nullable=False),
+        sa.Column('on_hand', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+        sa.ForeignKeyConstraint(['drug_id'], ['drugs.id']),
+        sa.PrimaryKeyConstraint('drug_id', 'location'),
+    )
+
+    op.execute("""
+        INSERT INTO drug_stock_balances (drug_id, location, on_hand)
+        SELECT drug_id, COALESCE(bin_location, ''), SUM(quantity)
+        FROM drug_batches
+        WHERE is_quarantined = false AND expiry_date >= CURRENT_DATE
+        GROUP BY drug_id, COALESCE(bin_location, '')
+    """)
+    op.execute("""
+        UPDATE drugs SET stock_on_hand = totals.on_hand
+        FROM (
+            SELECT drug_id, SUM(on_hand) AS on_hand
+            FROM drug_stock_balances
+            GROUP BY drug_id
+        ) AS totals
+        WHERE totals.drug_id = drugs.id
+    """)
+
+    op.create_index(
+        'ix_drugs_stock_shortfall',
+        'drugs',
+        [sa.text('(stock_on_hand - min_stock_level)')],
+        unique=False,
+        postgresql_where=sa.text('is_active = true'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_drugs_stock_shortfall', table_name='drugs')
+    op.drop_table('drug_stock_balances')
+    op.drop_column('drugs', 'stock_on_hand')
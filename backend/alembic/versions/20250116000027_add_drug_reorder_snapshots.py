@@ -0,0 +1,48 @@
+"""add drug reorder snapshots
+
+Revision ID: 20250116000027
+Revises: 20250116000026
+Create Date: 2026-01-16 00:00:00.000000
+
+Stores the latest reorder point, safety stock, EOQ and ABC/VEN class of
+every drug, written by the formulary-wide reorder classification pass and
+read by reorder alerts.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000027'
+down_revision = '20250116000026'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'drug_reorder_snapshots',
+        sa.Column('drug_id', sa.Integer(), nullable=False),
+        sa.Column('average_daily_usage', sa.Float(), nullable=False),
+        sa.Column('demand_std_dev', sa.Float(), nullable=False),
+        sa.Column('annual_demand', sa.Float(), nullable=False),
+        sa.Column('annual_value', sa.Float(), nullable=False),
+        sa.Column('service_level', sa.Float(), nullable=False),
+        sa.Column('lead_time_days', sa.Integer(), nullable=False),
+        sa.Column('safety_stock', sa.Float(), nullable=False),
+        sa.Column('reorder_point', sa.Float(), nullable=False),
+        sa.Column('economic_order_quantity', sa.Float(), nullable=False),
+        sa.Column('abc_class', sa.String(length=1), nullable=False),
+        sa.Column('ven_class', sa.String(length=1), nullable=False),
+        sa.Column('cumulative_value_share', sa.Float(), nullable=False),
+        sa.Column('calculated_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+        sa.ForeignKeyConstraint(['drug_id'], ['drugs.id']),
+        sa.PrimaryKeyConstraint('drug_id'),
+    )
+    op.create_index(op.f('ix_drug_reorder_snapshots_abc_class'), 'drug_reorder_snapshots', ['abc_class'], unique=False)
+    op.create_index(op.f('ix_drug_reorder_snapshots_ven_class'), 'drug_reorder_snapshots', ['ven_class'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_drug_reorder_snapshots_ven_class'), table_name='drug_reorder_snapshots')
+    op.drop_index(op.f('ix_drug_reorder_snapshots_abc_class'), table_name='drug_reorder_snapshots')
+    op.drop_table('drug_reorder_snapshots')
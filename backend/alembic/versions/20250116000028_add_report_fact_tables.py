@@ -0,0 +1,136 @@
+"""add report fact tables
+
+Revision ID: 20250116000028
+Revises: 20250116000027
+Create Date: 2026-01-16 00:00:00.000000
+
+Daily fact tables for encounters, invoices, payments and BPJS claims,
+read by the revenue, aging, claim statistics and census reports. Indexes
+on the source updated_at columns let the incremental refresh find
+changed rows; the facts are backfilled from the full history here.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000028'
+down_revision = '20250116000027'
+branch_labels = None
+depends_on = None
+
+
+SOURCE_UPDATED_AT_INDEXES = (
+    ('ix_encounters_updated_at', 'encounters'),
+    ('ix_invoices_updated_at', 'invoices'),
+    ('ix_payments_updated_at', 'payments'),
+    ('ix_bpjs_claims_updated_at', 'bpjs_claims'),
+)
+
+
+def upgrade():
+    op.create_table(
+        'fact_daily_encounters',
+        sa.Column('fact_date', sa.Date(), nullable=False),
+        sa.Column('department', sa.String(length=100), server_default='', nullable=False),
+        sa.Column('encounter_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('encounter_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('fact_date', 'department', 'encounter_type', 'status'),
+    )
+    op.create_table(
+        'fact_daily_invoices',
+        sa.Column('fact_date', sa.Date(), nullable=False),
+        sa.Column('department', sa.String(length=100), server_default='', nullable=False),
+        sa.Column('payer_type', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('invoice_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('paid_amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('balance_due', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('fact_date', 'department', 'payer_type', 'status'),
+    )
+    op.create_table(
+        'fact_daily_payments',
+        sa.Column('fact_date', sa.Date(), nullable=False),
+        sa.Column('department', sa.String(length=100), server_default='', nullable=False),
+        sa.Column('payer_type', sa.String(length=20), nullable=False),
+        sa.Column('payment_method', sa.String(length=20), nullable=False),
+        sa.Column('payment_count', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('fact_date', 'department', 'payer_type', 'payment_method'),
+    )
+    op.create_table(
+        'fact_daily_claims',
+        sa.Column('fact_date', sa.Date(), nullable=False),
+        sa.Column('department', sa.String(length=100), server_default='', nullable=False),
+        sa.Column('claim_type', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('claim_count', sa.Integer(), nullable=False),
+        sa.Column('claimed_amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('approved_amount', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint('fact_date', 'department', 'claim_type', 'status'),
+    )
+    op.create_table(
+        'report_fact_watermarks',
+        sa.Column('fact_name', sa.String(length=50), nullable=False),
+        sa.Column('refreshed_through', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+        sa.PrimaryKeyConstraint('fact_name'),
+    )
+
+    for index_name, table_name in SOURCE_UPDATED_AT_INDEXES:
+        op.create_index(index_name, table_name, ['updated_at'], unique=False)
+
+    # Backfill from the full history
+    op.execute("""
+        INSERT INTO fact_daily_encounters
+            (fact_date, department, encounter_type, status, encounter_count)
+        SELECT encounter_date, COALESCE(department, ''), encounter_type, status, COUNT(*)
+        FROM encounters
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO fact_daily_invoices
+            (fact_date, department, payer_type, status,
+             invoice_count, total_amount, paid_amount, balance_due)
+        SELECT i.invoice_date, COALESCE(e.department, ''), i.payer_type, i.status,
+               COUNT(*), COALESCE(SUM(i.total_amount), 0),
+               COALESCE(SUM(i.paid_amount), 0), COALESCE(SUM(i.balance_due), 0)
+        FROM invoices i
+        LEFT JOIN encounters e ON e.id = i.encounter_id
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO fact_daily_payments
+            (fact_date, department, payer_type, payment_method, payment_count, amount)
+        SELECT DATE(p.payment_date), COALESCE(e.department, ''), i.payer_type, p.payment_method,
+               COUNT(*), COALESCE(SUM(p.amount), 0)
+        FROM payments p
+        JOIN invoices i ON i.id = p.invoice_id
+        LEFT JOIN encounters e ON e.id = i.encounter_id
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO fact_daily_claims
+            (fact_date, department, claim_type, status,
+             claim_count, claimed_amount, approved_amount)
+        SELECT DATE(c.created_at), COALESCE(e.department, ''), c.claim_type, c.status,
+               COUNT(*), COALESCE(SUM(c.package_amount), 0), COALESCE(SUM(c.approved_amount), 0)
+        FROM bpjs_claims c
+        LEFT JOIN encounters e ON e.id = c.encounter_id
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO report_fact_watermarks (fact_name, refreshed_through)
+        VALUES ('encounters', NOW()), ('invoices', NOW()), ('payments', NOW()), ('claims', NOW())
+    """)
+
+
+def downgrade():
+    for index_name, table_name in SOURCE_UPDATED_AT_INDEXES:
+        op.drop_index(index_name, table_name=table_name)
+    op.drop_table('report_fact_watermarks')
+    op.drop_table('fact_daily_claims')
+    op.drop_table('fact_daily_payments')
+    op.drop_table('fact_daily_invoices')
+    op.drop_table('fact_daily_encounters')
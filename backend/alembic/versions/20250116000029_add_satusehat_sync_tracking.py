@@ -0,0 +1,76 @@
+"""add satusehat sync tracking
+
+Revision ID: 20250116000029
+Revises: 20250116000028
+Create Date: 2026-01-16 00:00:00.000000
+
+Dirty-row tracking and a resumable checkpoint for the bulk SATUSEHAT
+sync. satusehat_synced_at holds the updated_at of the version last pushed;
+the partial indexes cover the rows changed since. Rows that already have
+a SATUSEHAT ID are marked as synced at their current version, so the
+first incremental run only pushes rows that were never synced.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000029'
+down_revision = '20250116000028'
+branch_labels = None
+depends_on = None
+
+
+DIRTY_PREDICATE = 'satusehat_synced_at IS NULL OR updated_at > satusehat_synced_at'
+
+
+def upgrade():
+    op.add_column('patients', sa.Column(
+        'satusehat_synced_at', sa.DateTime(timezone=True), nullable=True,
+        comment='updated_at of the version last pushed to SATUSEHAT',
+    ))
+    op.add_column('encounters', sa.Column(
+        'satusehat_synced_at', sa.DateTime(timezone=True), nullable=True,
+        comment='updated_at of the version last pushed to SATUSEHAT',
+    ))
+
+    op.execute("""
+        UPDATE patients SET satusehat_synced_at = updated_at
+        WHERE satusehat_patient_id IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE encounters SET satusehat_synced_at = updated_at
+        WHERE satusehat_encounter_id IS NOT NULL
+    """)
+
+    op.create_index(
+        'ix_patients_satusehat_dirty', 'patients', ['id'],
+        postgresql_where=sa.text(DIRTY_PREDICATE),
+    )
+    op.create_index(
+        'ix_encounters_satusehat_dirty', 'encounters', ['id'],
+        postgresql_where=sa.text(DIRTY_PREDICATE),
+    )
+
+    op.create_table(
+        'satusehat_sync_checkpoints',
+        sa.Column('resource_type', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('full_sync', sa.Boolean(), nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.Column('processed_count', sa.Integer(), nullable=False),
+        sa.Column('success_count', sa.Integer(), nullable=False),
+        sa.Column('failure_count', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('NOW()'), nullable=False),
+        sa.PrimaryKeyConstraint('resource_type'),
+    )
+
+
+def downgrade():
+    op.drop_table('satusehat_sync_checkpoints')
+    op.drop_index('ix_encounters_satusehat_dirty', table_name='encounters')
+    op.drop_index('ix_patients_satusehat_dirty', table_name='patients')
+    op.drop_column('encounters', 'satusehat_synced_at')
+    op.drop_column('patients', 'satusehat_synced_at')
@@ -0,0 +1,60 @@
+"""add backup restore progress
+
+Revision ID: 20250116000030
+Revises: 20250116000029
+Create Date: 2026-01-16 00:00:00.000000
+
+Progress columns for running restores, and 64-bit byte counts so
+database-sized backups and restores fit. The backup tables are created
+with metadata.create_all on fresh installs, so installs that do not have
+them yet are skipped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20250116000030'
+down_revision = '20250116000029'
+branch_labels = None
+depends_on = None
+
+
+BYTE_COLUMNS = (
+    ('backup_jobs', 'backup_size_bytes', True),
+    ('backup_restorations', 'bytes_restored', True),
+    ('backup_metrics', 'backup_size_bytes', False),
+)
+
+
+def _existing_tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    tables = _existing_tables()
+
+    for table, column, nullable in BYTE_COLUMNS:
+        if table in tables:
+            op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer(),
+                            existing_nullable=nullable)
+
+    if 'backup_restorations' in tables:
+        op.add_column('backup_restorations', sa.Column(
+            'progress_percent', sa.Float(), nullable=True, comment='Restore progress (0-100)',
+        ))
+        op.add_column('backup_restorations', sa.Column(
+            'progress_message', sa.String(length=255), nullable=True, comment='Current restore phase',
+        ))
+
+
+def downgrade():
+    tables = _existing_tables()
+
+    if 'backup_restorations' in tables:
+        op.drop_column('backup_restorations', 'progress_message')
+        op.drop_column('backup_restorations', 'progress_percent')
+
+    for table, column, nullable in BYTE_COLUMNS:
+        if table in tables:
+            op.alter_column(table, column, type_=sa.Integer(), existing_type=sa.BigInteger(),
+                            existing_nullable=nullable)
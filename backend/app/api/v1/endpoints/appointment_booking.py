@@ -10,7 +10,7 @@ import logging
 from typing import Optional
 from datetime import date, time
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -180,6 +180,40 @@ async def get_available_slots(
         )
 
 
+@router.get("/availability")
+async def get_availability_calendar(
+    department_id: int,
+    doctor_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    days: int = Query(14, ge=1, le=60, description="Number of days"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get available appointment slots for a date range
+
+    Without doctor_id, returns availability for the department and for
+    every doctor scheduled in the range.
+
+    Requires appointment:read permission.
+    """
+    try:
+        service = get_appointment_booking_service(db)
+
+        return await service.get_availability_calendar(
+            department_id=department_id,
+            doctor_id=doctor_id,
+            start_date=start_date,
+            days=days,
+        )
+
+    except Exception as e:
+        logger.error("Error getting availability calendar: {}".format(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get availability"
+        )
+
+
 @router.get("/patient/{patient_id}")
 async def get_patient_appointments(
     patient_id: int,
@@ -413,6 +413,51 @@ async def execute_restore_job(
         )
 
 
+@router.get("/restore/{restore_id}")
+async def get_restore_job(
+    restore_id: int,
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get restore job status and progress (admin only)"""
+    try:
+        result = await db.execute(
+            select(BackupRestore).where(BackupRestore.id == restore_id)
+        )
+        restore_job = result.scalar_one_or_none()
+
+        if not restore_job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Restore job not found"
+            )
+
+        return {
+            "id": restore_job.id,
+            "restore_id": restore_job.restore_id,
+            "status": restore_job.status,
+            "progress_percent": restore_job.progress_percent,
+            "progress_message": restore_job.progress_message,
+            "started_at": restore_job.started_at,
+            "completed_at": restore_job.completed_at,
+            "files_restored": restore_job.files_restored,
+            "bytes_restored": restore_job.bytes_restored,
+            "tables_restored": restore_job.tables_restored,
+            "checksum_verified": restore_job.checksum_verified,
+            "validation_passed": restore_job.validation_passed,
+            "error_message": restore_job.error_message,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting restore job: {}".format(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get restore job"
+        )
+
+
 # =============================================================================
 # Verification Endpoints
 # =============================================================================
@@ -13,6 +13,7 @@ from app.db.session import get_db
 from app.core.deps import get_current_user, require_permission, get_request_info
 from app.models.user import User
 from app.crud.audit_log import create_audit_log
+from app.crud import billing as crud_billing
 
 router = APIRouter()
 
@@ -665,6 +666,8 @@ async def get_revenue_report(
     date_from: date = Query(..., description="Start date"),
     date_to: date = Query(..., description="End date"),
     group_by: Optional[str] = Query("day", description="Group by: day, week, month"),
+    department: Optional[str] = Query(None, description="Filter by encounter department"),
+    payer_type: Optional[str] = Query(None, description="Filter by payer type"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_permission("billing", "read"))
 ):
@@ -675,27 +678,31 @@ async def get_revenue_report(
         date_from: Start date
         date_to: End date
         group_by: Grouping period (day, week, month)
+        department: Optional encounter department filter
+        payer_type: Optional payer type filter
         db: Database session
         current_user: Authenticated user with billing:read permission
 
     Returns:
         Revenue report with breakdown by period
     """
-    # TODO: Implement revenue report generation
-    return {
-        "date_from": date_from,
-        "date_to": date_to,
-        "group_by": group_by,
-        "total_revenue": Decimal("0.00"),
-        "total_payments": 0,
-        "average_payment": Decimal("0.00"),
-        "breakdown": []
-    }
+    try:
+        return await crud_billing.get_revenue_report(
+            db,
+            start_date=date_from,
+            end_date=date_to,
+            department=department,
+            payer_type=payer_type,
+            group_by=group_by,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/reports/aging", response_model=dict, status_code=status.HTTP_200_OK)
 async def get_aging_report(
     as_of_date: Optional[date] = Query(None, description="As of date (default: today)"),
+    patient_id: Optional[int] = Query(None, description="Filter by patient; lists the invoices"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_permission("billing", "read"))
 ):
@@ -704,25 +711,14 @@ async def get_aging_report(
 
     Args:
         as_of_date: Report date (default: today)
+        patient_id: Optional patient filter
         db: Database session
         current_user: Authenticated user with billing:read permission
 
     Returns:
         Aging report with buckets (0-30, 31-60, 61-90, 90+ days)
     """
-    # TODO: Implement aging report generation
-    report_date = as_of_date or date.today()
-
-    return {
-        "as_of_date": report_date,
-        "total_outstanding": Decimal("0.00"),
-        "aging_buckets": {
-            "current": {"amount": Decimal("0.00"), "count": 0, "days": "0-30"},
-            "overdue_31_60": {"amount": Decimal("0.00"), "count": 0, "days": "31-60"},
-            "overdue_61_90": {"amount": Decimal("0.00"), "count": 0, "days": "61-90"},
-            "overdue_90_plus": {"amount": Decimal("0.00"), "count": 0, "days": "90+"}
-        }
-    }
+    return await crud_billing.get_aging_report(db, as_of_date=as_of_date, patient_id=patient_id)
 
 
 @router.get("/reports/payer-summary", response_model=dict, status_code=status.HTTP_200_OK)
@@ -744,30 +740,23 @@ async def get_payer_summary_report(
     Returns:
         Payer summary with breakdown by payment type
     """
-    # TODO: Implement payer summary report generation
+    payers = await crud_billing.get_payer_summary(db, start_date=date_from, end_date=date_to)
+    total_amount = sum((payer["total_billed"] for payer in payers), Decimal("0.00"))
+
     return {
         "date_from": date_from,
         "date_to": date_to,
-        "total_amount": Decimal("0.00"),
+        "total_amount": total_amount,
         "payers": [
             {
-                "payer_type": "cash",
-                "amount": Decimal("0.00"),
-                "count": 0,
-                "percentage": 0.0
-            },
-            {
-                "payer_type": "bpjs",
-                "amount": Decimal("0.00"),
-                "count": 0,
-                "percentage": 0.0
-            },
-            {
-                "payer_type": "insurance",
-                "amount": Decimal("0.00"),
-                "count": 0,
-                "percentage": 0.0
+                "payer_type": payer["payer_type"],
+                "amount": payer["total_billed"],
+                "collected": payer["total_collected"],
+                "outstanding": payer["outstanding"],
+                "count": payer["invoice_count"],
+                "percentage": round(float(payer["total_billed"] / total_amount * 100), 2) if total_amount else 0.0
             }
+            for payer in payers
         ]
     }
 
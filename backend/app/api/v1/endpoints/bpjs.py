@@ -34,16 +34,16 @@ from app.services.bpjs_vclaim import (
 router = APIRouter()
 
 
-async def get_bpjs_client() -> BPJSVClaimClient:
-    """Dependency to get BPJS VClaim client instance."""
-    return BPJSVClaimClient()
+async def get_bpjs_client():
+    """Dependency to get BPJS VClaim client instance on the shared connection pool."""
+    async with BPJSVClaimClient() as client:
+        yield client
 
 
-async def get_bpjs_client_with_retry() -> BPJSVClaimClientWithRetry:
+async def get_bpjs_client_with_retry():
     """Dependency to get BPJS VClaim client instance with retry logic."""
-    client = BPJSVClaimClientWithRetry()
-    await client.get_client()  # Initialize HTTP client
-    return client
+    async with BPJSVClaimClientWithRetry() as client:
+        yield client
 
 
 @router.post("/eligibility", response_model=BPJSEligibilityResponse)
@@ -19,6 +19,7 @@ from app.db.session import get_db
 from app.core.deps import get_current_user, require_permission, get_request_info
 from app.models.user import User
 from app.crud.audit_log import create_audit_log
+from app.crud import bpjs_claims as crud_bpjs_claims
 
 router = APIRouter()
 
@@ -897,7 +898,6 @@ async def respond_to_query(
 async def get_claim_statistics(
     date_from: date = Query(..., description="Start date"),
     date_to: date = Query(..., description="End date"),
-    group_by: Optional[str] = Query("day", description="Group by: day, week, month"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_permission("bpjs_claims", "read"))
 ):
@@ -907,34 +907,13 @@ async def get_claim_statistics(
     Args:
         date_from: Start date
         date_to: End date
-        group_by: Grouping period (day, week, month)
         db: Database session
         current_user: Authenticated user with bpjs_claims:read permission
 
     Returns:
         Claim statistics with breakdown
     """
-    # TODO: Implement claim statistics generation
-    return {
-        "date_from": date_from,
-        "date_to": date_to,
-        "group_by": group_by,
-        "total_claims": 0,
-        "total_claimed_amount": Decimal("0.00"),
-        "total_approved_amount": Decimal("0.00"),
-        "total_rejected_amount": Decimal("0.00"),
-        "approval_rate": 0.0,
-        "average_processing_days": 0,
-        "status_breakdown": {
-            "draft": 0,
-            "validated": 0,
-            "submitted": 0,
-            "approved": 0,
-            "rejected": 0,
-            "paid": 0
-        },
-        "breakdown": []
-    }
+    return await crud_bpjs_claims.get_claim_statistics(db, start_date=date_from, end_date=date_to)
 
 
 @router.get("/bpjs-claims/upcoming-deadlines", response_model=List[dict], status_code=status.HTTP_200_OK)
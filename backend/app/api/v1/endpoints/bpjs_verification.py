@@ -6,14 +6,15 @@ history tracking, and manual override capabilities.
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.db.session import get_db
 from app.core.deps import get_current_user, require_permission
 from app.models.user import User
 from app.schemas.bpjs import BPJSEligibilityRequest, BPJSEligibilityResponse
+from app.core.upstream_resilience import is_transient_code
 from app.services.bpjs_vclaim import BPJSVClaimClient, BPJSVClaimError
-from app.services.bpjs_cache import BPJSCacheManager
+from app.services.bpjs_cache import BPJSCacheManager, is_not_eligible_message
 from app.crud.bpjs_eligibility import (
     create_eligibility_check,
     get_eligibility_checks_by_patient,
@@ -68,41 +69,47 @@ async def verify_bpjs_eligibility(
         )
 
     # Initialize services
-    bpjs_client = BPJSVClaimClient()
     cache_manager = BPJSCacheManager(redis)
 
     # Determine search key
     search_key = request.card_number or request.nik
     search_type = "card" if request.card_number else "nik"
 
-    # Check cache first
-    cached_result = None
-    is_cached = False
-    if use_cache and search_key:
-        cached_result = await cache_manager.get_cached_eligibility(search_key)
-        if cached_result:
-            is_cached = True
-
-    # If no cached result, call BPJS API
-    api_result = None
-    if not is_cached:
-        try:
+    if not search_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either card_number or nik must be provided"
+        )
+
+    async def fetch_eligibility():
+        async with BPJSVClaimClient() as bpjs_client:
             if request.card_number:
-                api_result = await bpjs_client.check_eligibility_by_card(
+                return await bpjs_client.check_eligibility_by_card(
                     card_number=request.card_number,
                     sep_date=request.sep_date
                 )
-            elif request.nik:
-                api_result = await bpjs_client.check_eligibility_by_nik(
-                    nik=request.nik,
-                    sep_date=request.sep_date
-                )
+            return await bpjs_client.check_eligibility_by_nik(
+                nik=request.nik,
+                sep_date=request.sep_date
+            )
+
+    # Cached result, or a BPJS API call shared with concurrent checks of the same key
+    result = None
+    is_cached = False
+    is_stale = False
+    try:
+        result, is_cached = await cache_manager.get_or_fetch_eligibility(
+            search_key, fetch_eligibility, use_cache=use_cache
+        )
 
-            # Cache the result
-            if api_result and search_key:
-                await cache_manager.set_cached_eligibility(search_key, api_result.dict())
+    except BPJSVClaimError as e:
+        # When BPJS is down or the circuit is open, serve the last known
+        # result instead of failing the registration desk
+        stale_result = None
+        if is_transient_code(e.code):
+            stale_result = await cache_manager.get_stale_eligibility(search_key)
 
-        except BPJSVClaimError as e:
+        if stale_result is None:
             # Create failed check record
             await create_eligibility_check(
                 db=db,
@@ -117,7 +124,7 @@ async def verify_bpjs_eligibility(
             )
 
             # Check if this is a "not eligible" error vs actual API error
-            if " tidak aktif" in e.message.lower() or " tidak ditemukan" in e.message.lower():
+            if is_not_eligible_message(e.message):
                 return {
                     "is_eligible": False,
                     "message": e.message,
@@ -132,8 +139,8 @@ async def verify_bpjs_eligibility(
                 detail=f"BPJS API error: {e.message}"
             )
 
-    # Use cached or API result
-    result = cached_result if is_cached else (api_result.dict() if api_result else None)
+        result = stale_result
+        is_cached = is_stale = True
 
     if not result:
         raise HTTPException(
@@ -162,6 +169,7 @@ async def verify_bpjs_eligibility(
         "search_key": search_key,
         "search_type": search_type,
         "is_cached": is_cached,
+        "is_stale": is_stale,
         "verified_at": datetime.now(timezone.utc).isoformat(),
     }
 
@@ -10,7 +10,7 @@ This module provides API endpoints for:
 - Dispensing history and statistics
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.deps import get_current_user, get_current_active_user, get_db
@@ -28,6 +28,7 @@ from app.schemas.dispensing import (
     DispensingStatus, DispensePriority,
 )
 from app.crud import dispensing as crud
+from app.crud.inventory import InsufficientStockError
 
 
 router = APIRouter()
@@ -264,10 +265,16 @@ async def complete_dispensing(
     completion.prescription_id = prescription_id
     completion.dispenser_id = current_user.id
 
-    completion_response = await crud.complete_dispensing(
-        db=db,
-        completion=completion,
-    )
+    try:
+        completion_response = await crud.complete_dispensing(
+            db=db,
+            completion=completion,
+        )
+    except InsufficientStockError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        )
 
     return completion_response
 
@@ -99,10 +99,10 @@ async def list_drugs(
         page_size=page_size,
     )
 
-    # Get current stock for each drug
+    # Current stock is maintained on the drug row
     drug_responses = []
     for drug in drugs:
-        current_stock = await crud_inventory.get_current_stock(db, drug.id)
+        current_stock = drug.stock_on_hand
         drug_responses.append(DrugResponse(
             id=drug.id,
             drug_code=drug.drug_code,
@@ -509,7 +509,7 @@ async def get_stock_levels(
 
     stock_levels = []
     for drug in drugs:
-        current_stock = await crud_inventory.get_current_stock(db, drug.id)
+        current_stock = drug.stock_on_hand
         is_below_min = current_stock < drug.min_stock_level
 
         # Skip if only alerts and not below min
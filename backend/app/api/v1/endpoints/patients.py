@@ -212,6 +212,9 @@ async def search_patients(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, ge=1, le=100, description="Maximum number of records to return"),
     is_active: bool = Query(True, description="Filter by active status"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous page's next_cursor"),
+    ranked: bool = Query(False, description="Order by relevance: exact MRN/NIK, prefix, then fuzzy name"),
+    estimate_total: bool = Query(False, description="Return an estimated total instead of an exact count"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_permission("patient", "read"))
 ):
@@ -223,29 +226,46 @@ async def search_patients(
         skip: Number of records to skip (for pagination)
         limit: Maximum number of records to return
         is_active: Filter by active status
+        cursor: Keyset pagination cursor (replaces skip)
+        ranked: Use ranked search mode
+        estimate_total: Use the planner estimate for the total
         db: Database session
         current_user: Authenticated user with patient:read permission
 
     Returns:
         Paginated list of patients
     """
-    patients, total = await patient_crud.search_patients(
-        db=db,
-        search_term=search,
-        skip=skip,
-        limit=limit,
-        is_active=is_active
-    )
+    try:
+        patients, total = await patient_crud.search_patients(
+            db=db,
+            search_term=search,
+            skip=skip,
+            limit=limit,
+            is_active=is_active,
+            cursor=cursor,
+            ranked=ranked,
+            estimate_total=estimate_total
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
     page = (skip // limit) + 1 if limit > 0 else 1
     total_pages = (total + limit - 1) // limit if limit > 0 else 1
 
+    next_cursor = None
+    if not ranked and len(patients) == limit:
+        next_cursor = patient_crud.encode_patient_cursor(patients[-1])
+
     return PatientListResponse(
         items=patients,
         total=total,
         page=page,
         page_size=limit,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor
     )
 
 
@@ -6,11 +6,13 @@ including ticket creation, calling, serving, and digital display support.
 Python 3.5+ compatible
 """
 
+import json
 import logging
 from typing import Optional, List
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -21,6 +23,7 @@ from app.services.queue_management import (
     QueueNotFoundError,
     QueueOperationError,
 )
+from app.services.queue_display import queue_display_store
 from app.schemas.queue import QueueDepartment, QueueStatus, QueuePriority
 from app.core.deps import get_current_user, get_current_admin_user
 
@@ -384,6 +387,8 @@ async def get_department_queue_status(
 
 @router.get("/display/{department}")
 async def get_digital_display_data(
+    request: Request,
+    response: Response,
     department: QueueDepartment,
     poli_id: Optional[int] = Query(None, description="Filter by polyclinic"),
     current_user: User = Depends(get_current_user),
@@ -391,18 +396,28 @@ async def get_digital_display_data(
 ):
     """Get data for digital queue display
 
-    Includes current serving, waiting, and recently served.
+    Includes current serving, waiting, and recently served. Served from a
+    precomputed snapshot; send the returned ETag as If-None-Match to get
+    304 Not Modified while the display is unchanged.
 
     Requires queue:read permission.
     """
     try:
-        service = get_queue_management_service(db)
-
-        display_data = await service.get_digital_display_data(
+        display_data = await queue_display_store.get(
             department=department,
             poli_id=poli_id,
+            db=db,
         )
 
+        etag = display_data["etag"]
+        if request.headers.get("if-none-match") == etag:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag, "Cache-Control": "no-cache"},
+            )
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
         return display_data
 
     except Exception as e:
@@ -413,6 +428,48 @@ async def get_digital_display_data(
         )
 
 
+@router.get("/display/{department}/stream")
+async def stream_digital_display_data(
+    request: Request,
+    department: QueueDepartment,
+    poli_id: Optional[int] = Query(None, description="Filter by polyclinic"),
+    current_user: User = Depends(get_current_user),
+):
+    """Stream digital queue display updates (Server-Sent Events)
+
+    Sends the current display snapshot, then a "display" event each time a
+    ticket change alters it, with keep-alive comments in between.
+
+    Requires queue:read permission.
+    """
+    last_event_id = request.headers.get("last-event-id")
+
+    async def event_stream():
+        async for snapshot in queue_display_store.watch(
+            department=department,
+            poli_id=poli_id,
+            etag=last_event_id,
+        ):
+            if await request.is_disconnected():
+                break
+
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+
+            yield "event: display\nid: {}\nretry: {}\ndata: {}\n\n".format(
+                snapshot["etag"],
+                snapshot.get("refresh_interval_seconds", 10) * 1000,
+                json.dumps(snapshot, default=str),
+            )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/tickets/{ticket_id}/status")
 async def get_patient_queue_status(
     ticket_id: int,
@@ -11,9 +11,10 @@ Python 3.5+ compatible
 
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 
@@ -87,7 +88,9 @@ class ReportListResponse(BaseModel):
 class ReportExecutionRequest(BaseModel):
     """Request to execute a report"""
     parameters: Optional[dict] = Field(None, description="Report parameters")
-    output_format: str = Field("json", description="Output format")
+    output_format: str = Field("json", description="Output format (json, csv, xlsx)")
+    background: bool = Field(False, description="Run in the background and poll the execution")
+    use_cache: bool = Field(True, description="Serve a cached result if one is fresh")
 
 
 class ReportExecutionResponse(BaseModel):
@@ -96,10 +99,14 @@ class ReportExecutionResponse(BaseModel):
     report_id: int
     report_name: str
     status: str
+    output_format: Optional[str] = None
     duration_seconds: Optional[int] = None
     row_count: Optional[int] = None
-    data: Optional[dict] = None
+    file_size_bytes: Optional[int] = None
+    data: Optional[Any] = None
     executed_at: Optional[str] = None
+    cached: bool = False
+    error_message: Optional[str] = None
 
 
 class MetricsResponse(BaseModel):
@@ -256,7 +263,9 @@ async def execute_report(
             report_id=report_id,
             parameters=request.parameters,
             output_format=request.output_format,
-            triggered_by=current_user.id
+            triggered_by=current_user.id,
+            background=request.background,
+            use_cache=request.use_cache
         )
 
         return ReportExecutionResponse(**result)
@@ -279,6 +288,56 @@ async def execute_report(
         )
 
 
+@router.get("/reports/executions/{execution_id}", response_model=ReportExecutionResponse)
+async def get_report_execution(
+    execution_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the status of a report execution"""
+    try:
+        service = get_reporting_service(db)
+        result = await service.get_execution(execution_id)
+        return ReportExecutionResponse(**result)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+
+@router.get("/reports/executions/{execution_id}/download")
+async def download_report_execution(
+    execution_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Download the output file of a completed report execution"""
+    try:
+        service = get_reporting_service(db)
+        result = await service.get_execution(execution_id)
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    if result["status"] != "completed" or not result["file_path"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Report execution {} has no output file (status: {})".format(
+                execution_id, result["status"]
+            )
+        )
+
+    return FileResponse(
+        result["file_path"],
+        filename="{}_{}.{}".format(result["report_name"], execution_id, result["output_format"])
+    )
+
+
 # =============================================================================
 # Pre-defined Report Endpoints
 # =============================================================================
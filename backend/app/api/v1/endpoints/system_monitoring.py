@@ -17,8 +17,9 @@ from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, func, desc
 
+from app.core.config import settings
 from app.db.session import get_db
 from app.models.user import User
 from app.models.system_monitoring import (
@@ -52,8 +53,8 @@ class HealthStatusResponse(BaseModel):
 
 
 class MetricResponse(BaseModel):
-    """Response model for a single metric"""
-    id: int
+    """Response model for a single metric (id is None for in-memory samples)"""
+    id: Optional[int] = None
     metric_name: str
     metric_value: float
     metric_unit: Optional[str]
@@ -137,6 +138,7 @@ async def get_system_metrics(
     metric_name: Optional[str] = Query(None, description="Filter by metric name"),
     start_time: Optional[datetime] = Query(None, description="Start of time range"),
     end_time: Optional[datetime] = Query(None, description="End of time range"),
+    interval: str = Query("minute", pattern="^(minute|hour)$", description="Rollup interval of persisted metrics"),
     limit: int = Query(100, ge=1, le=1000, description="Max records to return"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
@@ -149,6 +151,7 @@ async def get_system_metrics(
             metric_name=metric_name,
             start_time=start_time,
             end_time=end_time,
+            interval=interval,
             limit=limit,
         )
 
@@ -175,69 +178,9 @@ async def get_metrics_summary(
 ):
     """Get metrics summary for the specified time period"""
     try:
-        start_time = datetime.utcnow() - timedelta(hours=hours)
-
-        # Get CPU metrics
-        cpu_query = select(
-            func.avg(SystemMetric.metric_value).label("avg"),
-            func.max(SystemMetric.metric_value).label("max"),
-            func.min(SystemMetric.metric_value).label("min"),
-        ).where(
-            and_(
-                SystemMetric.metric_name == "cpu.usage",
-                SystemMetric.timestamp >= start_time,
-            )
-        )
-
-        cpu_result = await db.execute(cpu_query)
-        cpu_row = cpu_result.first()
-
-        # Get memory metrics
-        mem_query = select(
-            func.avg(SystemMetric.metric_value).label("avg"),
-            func.max(SystemMetric.metric_value).label("max"),
-            func.min(SystemMetric.metric_value).label("min"),
-        ).where(
-            and_(
-                SystemMetric.metric_name == "memory.usage",
-                SystemMetric.timestamp >= start_time,
-            )
-        )
-
-        mem_result = await db.execute(mem_query)
-        mem_row = mem_result.first()
-
-        # Get disk metrics
-        disk_query = select(
-            func.avg(SystemMetric.metric_value).label("avg"),
-            func.max(SystemMetric.metric_value).label("max"),
-        ).where(
-            and_(
-                SystemMetric.metric_name == "disk.usage",
-                SystemMetric.timestamp >= start_time,
-            )
-        )
-
-        disk_result = await db.execute(disk_query)
-        disk_row = disk_result.first()
+        service = get_query_service(db)
 
-        return {
-            "period_hours": hours,
-            "cpu": {
-                "avg": round(cpu_row.avg or 0, 2),
-                "max": round(cpu_row.max or 0, 2),
-                "min": round(cpu_row.min or 0, 2),
-            } if cpu_row else None,
-            "memory": {
-                "avg": round(mem_row.avg or 0, 2),
-                "max": round(mem_row.max or 0, 2),
-                "min": round(mem_row.min or 0, 2),
-            } if mem_row else None,
-            "disk": {
-                "avg": round(disk_row.avg or 0, 2),
-                "max": round(disk_row.max or 0, 2),
-            } if disk_row else None,
-        }
+        return await service.get_metrics_summary(hours=hours)
 
     except Exception as e:
         logger.error("Error getting metrics summary: {}".format(e))
@@ -419,7 +362,8 @@ async def get_monitoring_info(
             "disk.health",
             "memory.health",
         ],
-        "collection_interval": "1 minute",
+        "collection_interval": "{:g} seconds".format(settings.MONITORING_SAMPLE_INTERVAL_SECONDS),
+        "rollup_intervals": ["minute", "hour"],
         "retention_period": "30 days",
     }
 
@@ -0,0 +1,340 @@
+"""
+Buffered audit log writer.
+
+Collects audit log entries from AuditLoggingMiddleware in a bounded
+in-process buffer and writes them with a single background flusher using
+multi-row INSERTs, instead of one task, session and INSERT per request.
+
+When the buffer passes its high-water mark, or a flush fails or exceeds
+its timeout, rows are spilled to a local JSON-lines journal and replayed
+once the database keeps up again. The journal only holds DB-ready rows,
+so request bodies are already encrypted when they reach disk. Worker
+processes share the journal: appends and takeovers hold an flock, and a
+replay file is kept until its rows are committed.
+"""
+import asyncio
+import contextlib
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.encryption import encrypt_field
+from app.core.metrics import (
+    audit_buffer_depth,
+    audit_buffer_entries_total,
+    audit_flush_batch_size,
+    audit_flush_duration_seconds,
+)
+from app.db.session import get_db_context
+from app.models.audit_log import AuditLog
+
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the buffer after which new entries go straight to the journal
+HIGH_WATER_MARK = 0.8
+
+
+class AuditLogWriter:
+    """
+    Bounded audit log buffer with a single background flusher.
+
+    Usage:
+        audit_log_writer.start()        # in the application lifespan
+        audit_log_writer.enqueue({...}) # from request handling
+        await audit_log_writer.stop()   # on shutdown, flushes everything
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.AUDIT_BUFFER_MAX_SIZE,
+        flush_interval_ms: int = settings.AUDIT_FLUSH_INTERVAL_MS,
+        batch_size: int = settings.AUDIT_FLUSH_BATCH_SIZE,
+        flush_timeout: float = settings.AUDIT_FLUSH_TIMEOUT_SECONDS,
+        journal_path: str = settings.AUDIT_JOURNAL_PATH,
+    ):
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.flush_timeout = flush_timeout
+        self.journal_path = journal_path
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._journal_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Whether the background flusher is running."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._stopping = False
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info("Audit log writer started")
+
+    async def stop(self) -> None:
+        """
+        Stop the flusher and flush every buffered entry.
+
+        Entries that cannot be written are spilled to the journal, so
+        nothing buffered is lost on shutdown.
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+        logger.info("Audit log writer stopped")
+
+    def enqueue(self, entry: Dict[str, Any]) -> None:
+        """
+        Add an audit log entry to the buffer without blocking.
+
+        Args:
+            entry: Keyword arguments for an AuditLog row; "request_body"
+                (a dict) is encrypted by the flusher
+        """
+        entry.setdefault("timestamp", datetime.now(timezone.utc))
+
+        if not self.running:
+            # Writer not started (e.g. scripts); keep the entry on disk
+            self._spill_in_background([entry])
+            return
+
+        if self._queue.qsize() >= self.max_size * HIGH_WATER_MARK:
+            self._spill_in_background([entry])
+            return
+
+        try:
+            self._queue.put_nowait(entry)
+            audit_buffer_entries_total.labels(status="queued").inc()
+            audit_buffer_depth.set(self._queue.qsize())
+        except asyncio.QueueFull:
+            self._spill_in_background([entry])
+
+    async def _run(self) -> None:
+        """Flusher loop: flush every flush_interval or batch_size entries."""
+        await self._replay_journal()
+
+        while True:
+            batch = await self._collect_batch()
+            if batch:
+                flushed = await self._flush(batch)
+                if flushed and os.path.exists(self.journal_path):
+                    await self._replay_journal()
+            elif self._stopping:
+                break
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        """Wait up to flush_interval for entries and return at most batch_size."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        audit_buffer_depth.set(self._queue.qsize())
+        return batch
+
+    async def _flush(self, entries: List[Dict[str, Any]]) -> bool:
+        """
+        Write a batch with one multi-row INSERT.
+
+        Args:
+            entries: Buffered entries
+
+        Returns:
+            True if written to the database, False if spilled to the journal
+        """
+        rows = [self._to_row(entry) for entry in entries]
+        return await self._insert_rows(rows, status="flushed")
+
+    async def _insert_rows(self, rows: List[Dict[str, Any]], status: str) -> bool:
+        """Insert DB-ready rows, spilling them to the journal on failure."""
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._execute_insert(rows), timeout=self.flush_timeout)
+        except Exception as e:
+            logger.warning(f"Audit flush of {len(rows)} entries failed, spilling to journal: {e}")
+            audit_buffer_entries_total.labels(status="failed").inc(len(rows))
+            await self._spill(rows)
+            return False
+
+        audit_flush_duration_seconds.observe(time.monotonic() - start)
+        audit_flush_batch_size.observe(len(rows))
+        audit_buffer_entries_total.labels(status=status).inc(len(rows))
+        return True
+
+    async def _execute_insert(self, rows: List[Dict[str, Any]]) -> None:
+        """Execute the multi-row INSERT on one pooled session."""
+        async with get_db_context() as db:
+            await db.execute(insert(AuditLog.__table__).values(rows))
+
+    @staticmethod
+    def _to_row(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a buffered entry to an audit_logs row, encrypting the body."""
+        row = dict(entry)
+        request_body = row.pop("request_body", None)
+        status_code = row.pop("status_code", None)
+
+        additional_data = {"status_code": status_code}
+        if request_body:
+            additional_data["request_body_encrypted"] = encrypt_field(json.dumps(request_body))
+        row["additional_data"] = additional_data
+        return row
+
+    def _spill_in_background(self, entries: List[Dict[str, Any]]) -> None:
+        """Spill entries to the journal from the request path without blocking it."""
+        rows = [self._to_row(entry) for entry in entries]
+        try:
+            loop = asyncio.get_event_loop()
+            loop.run_in_executor(None, self._append_journal, rows)
+        except RuntimeError:
+            self._append_journal(rows)
+
+    async def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        """Append rows to the journal on a worker thread."""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._append_journal, rows)
+
+    @contextlib.contextmanager
+    def _locked_journal(self):
+        """Hold the journal lock of this process and of all worker processes."""
+        with self._journal_lock:
+            with open(f"{self.journal_path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _append_journal(self, rows: List[Dict[str, Any]]) -> None:
+        """Append DB-ready rows to the JSON-lines journal."""
+        try:
+            directory = os.path.dirname(self.journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._locked_journal():
+                with open(self.journal_path, "a", encoding="utf-8") as journal:
+                    for row in rows:
+                        journal.write(json.dumps(row, default=_json_default) + "\n")
+            audit_buffer_entries_total.labels(status="spilled").inc(len(rows))
+        except Exception as e:
+            logger.error(f"Audit journal write failed, {len(rows)} entries lost: {e}")
+
+    def _claim_journals(self) -> List[Tuple[str, IO[str]]]:
+        """
+        Claim journaled rows for replay by this process.
+
+        The journal is renamed to a replay file of its own, so workers
+        keep spilling to a fresh journal meanwhile. Replay files left by
+        a crashed process are claimed as well. Each claimed file stays
+        flock-ed until its replay finished, so no two processes replay
+        the same file.
+
+        Returns:
+            (path, open file) of every claimed replay file
+        """
+        if not os.path.exists(self.journal_path) and not glob.glob(f"{self.journal_path}.replay-*"):
+            return []
+
+        with self._locked_journal():
+            if os.path.exists(self.journal_path):
+                replay_path = f"{self.journal_path}.replay-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+                os.replace(self.journal_path, replay_path)
+
+        claimed = []
+        for path in sorted(glob.glob(f"{self.journal_path}.replay-*")):
+            try:
+                journal = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                journal.close()  # Being replayed by another process
+                continue
+            if not os.path.exists(path):
+                journal.close()  # Replayed and removed while we waited
+                continue
+            claimed.append((path, journal))
+        return claimed
+
+    @staticmethod
+    def _read_journal(journal: IO[str]) -> List[Dict[str, Any]]:
+        """Parse the rows of a claimed replay file."""
+        rows = []
+        for line in journal:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("timestamp"):
+                row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+            rows.append(row)
+        return rows
+
+    async def _replay_journal(self) -> None:
+        """
+        Insert journaled rows in batches.
+
+        Failed batches go back to the journal. A replay file is only
+        removed once every batch is either committed or journaled again,
+        so a crash mid-replay replays the file again (at least once)
+        instead of losing its rows.
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            claimed = await loop.run_in_executor(None, self._claim_journals)
+        except Exception as e:
+            logger.error(f"Audit journal replay failed: {e}")
+            return
+
+        for path, journal in claimed:
+            try:
+                rows = await loop.run_in_executor(None, self._read_journal, journal)
+                if rows:
+                    logger.info(f"Replaying {len(rows)} journaled audit log entries")
+                for i in range(0, len(rows), self.batch_size):
+                    await self._insert_rows(rows[i:i + self.batch_size], status="replayed")
+                os.remove(path)
+            except Exception as e:
+                logger.error(f"Audit journal replay of {path} failed: {e}")
+            finally:
+                journal.close()
+
+
+def _json_default(value: Any) -> str:
+    """Serialize datetimes in journal rows."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unserializable audit value: {type(value)}")
+
+
+# Process-wide writer, started and stopped from the application lifespan
+audit_log_writer = AuditLogWriter()
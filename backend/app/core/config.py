@@ -53,12 +53,81 @@ class Settings(BaseSettings):
     SATUSEHAT_AUTH_URL: str = "https://api-satusehat.kemkes.go.id/oauth2/v1"
     SATUSEHAT_API_URL: str = "https://api-satusehat.kemkes.go.id/fhir-r4/v1"
 
+    # Upstream HTTP Connection Pools (shared per upstream, see app.core.http_clients)
+    UPSTREAM_HTTP2: bool = Field(default=True, env="UPSTREAM_HTTP2")
+    UPSTREAM_KEEPALIVE_EXPIRY_SECONDS: float = Field(default=60.0, env="UPSTREAM_KEEPALIVE_EXPIRY_SECONDS")
+    UPSTREAM_DRAIN_TIMEOUT_SECONDS: float = Field(default=10.0, env="UPSTREAM_DRAIN_TIMEOUT_SECONDS")
+    BPJS_VCLAIM_MAX_CONNECTIONS: int = Field(default=50, env="BPJS_VCLAIM_MAX_CONNECTIONS")
+    BPJS_VCLAIM_MAX_KEEPALIVE: int = Field(default=20, env="BPJS_VCLAIM_MAX_KEEPALIVE")
+    BPJS_ANTREAN_MAX_CONNECTIONS: int = Field(default=20, env="BPJS_ANTREAN_MAX_CONNECTIONS")
+    BPJS_ANTREAN_MAX_KEEPALIVE: int = Field(default=10, env="BPJS_ANTREAN_MAX_KEEPALIVE")
+    BPJS_APLICARE_MAX_CONNECTIONS: int = Field(default=10, env="BPJS_APLICARE_MAX_CONNECTIONS")
+    BPJS_APLICARE_MAX_KEEPALIVE: int = Field(default=5, env="BPJS_APLICARE_MAX_KEEPALIVE")
+    SATUSEHAT_MAX_CONNECTIONS: int = Field(default=50, env="SATUSEHAT_MAX_CONNECTIONS")
+    SATUSEHAT_MAX_KEEPALIVE: int = Field(default=20, env="SATUSEHAT_MAX_KEEPALIVE")
+
+    # Upstream Resilience (BPJS circuit breakers, see app.core.upstream_resilience)
+    UPSTREAM_CIRCUIT_FAILURE_RATE: float = Field(default=0.5, env="UPSTREAM_CIRCUIT_FAILURE_RATE")
+    UPSTREAM_CIRCUIT_MIN_CALLS: int = Field(default=10, env="UPSTREAM_CIRCUIT_MIN_CALLS")
+    UPSTREAM_CIRCUIT_WINDOW: int = Field(default=20, env="UPSTREAM_CIRCUIT_WINDOW")
+    UPSTREAM_CIRCUIT_OPEN_SECONDS: float = Field(default=15.0, env="UPSTREAM_CIRCUIT_OPEN_SECONDS")
+    UPSTREAM_CIRCUIT_MAX_OPEN_SECONDS: float = Field(default=120.0, env="UPSTREAM_CIRCUIT_MAX_OPEN_SECONDS")
+    UPSTREAM_MIN_CONCURRENCY: int = Field(default=2, env="UPSTREAM_MIN_CONCURRENCY")
+    UPSTREAM_MAX_QUEUE: int = Field(default=50, env="UPSTREAM_MAX_QUEUE")
+    UPSTREAM_QUEUE_TIMEOUT_SECONDS: float = Field(default=2.0, env="UPSTREAM_QUEUE_TIMEOUT_SECONDS")
+    UPSTREAM_TIMEOUT_INITIAL_SECONDS: float = Field(default=10.0, env="UPSTREAM_TIMEOUT_INITIAL_SECONDS")
+    UPSTREAM_TIMEOUT_MIN_SECONDS: float = Field(default=3.0, env="UPSTREAM_TIMEOUT_MIN_SECONDS")
+    UPSTREAM_TIMEOUT_MAX_SECONDS: float = Field(default=30.0, env="UPSTREAM_TIMEOUT_MAX_SECONDS")
+    UPSTREAM_HEDGE_ENABLED: bool = Field(default=True, env="UPSTREAM_HEDGE_ENABLED")
+
+    # SATUSEHAT Bulk Sync
+    SATUSEHAT_ORGANIZATION_ID: Optional[str] = Field(default="", env="SATUSEHAT_ORGANIZATION_ID")
+    SATUSEHAT_SYNC_CONCURRENCY: int = Field(default=4, env="SATUSEHAT_SYNC_CONCURRENCY")
+    SATUSEHAT_SYNC_REQUESTS_PER_SECOND: float = Field(default=10.0, env="SATUSEHAT_SYNC_REQUESTS_PER_SECOND")
+
+    # API Rate Limiting (requests per minute)
+    RATE_LIMIT_ENABLED: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    RATE_LIMIT_DEFAULT_PER_MINUTE: int = Field(default=1200, env="RATE_LIMIT_DEFAULT_PER_MINUTE")
+    RATE_LIMIT_LOGIN_PER_MINUTE: int = Field(default=20, env="RATE_LIMIT_LOGIN_PER_MINUTE")
+    RATE_LIMIT_SEARCH_PER_MINUTE: int = Field(default=120, env="RATE_LIMIT_SEARCH_PER_MINUTE")
+    RATE_LIMIT_BPJS_PER_MINUTE: int = Field(default=120, env="RATE_LIMIT_BPJS_PER_MINUTE")
+    RATE_LIMIT_BPJS_TOTAL_PER_MINUTE: int = Field(default=1500, env="RATE_LIMIT_BPJS_TOTAL_PER_MINUTE")
+    # Only enable when the API is reachable solely through the reverse proxy
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = Field(default=False, env="RATE_LIMIT_TRUST_FORWARDED_FOR")
+    # SHA-256 hex digests of issued X-API-Key keys; other keys are limited per user or IP
+    RATE_LIMIT_API_KEY_HASHES: list[str] = Field(default=[], env="RATE_LIMIT_API_KEY_HASHES")
+
+    # Backups
+    BACKUP_PG_DUMP_JOBS: int = Field(default=4, env="BACKUP_PG_DUMP_JOBS")
+    BACKUP_PG_RESTORE_JOBS: int = Field(default=8, env="BACKUP_PG_RESTORE_JOBS")
+    BACKUP_MAX_BYTES_PER_SECOND: int = Field(default=64 * 1024 * 1024, env="BACKUP_MAX_BYTES_PER_SECOND")  # 0 = no cap
+    BACKUP_RESTORE_MAX_BYTES_PER_SECOND: int = Field(default=0, env="BACKUP_RESTORE_MAX_BYTES_PER_SECOND")  # 0 = no cap
+    BACKUP_UPLOAD_PART_SIZE: int = Field(default=32 * 1024 * 1024, env="BACKUP_UPLOAD_PART_SIZE")
+    BACKUP_STAGING_DIR: Optional[str] = Field(default="", env="BACKUP_STAGING_DIR")
+
+    # System Monitoring
+    MONITORING_SAMPLER_ENABLED: bool = Field(default=True, env="MONITORING_SAMPLER_ENABLED")
+    MONITORING_SAMPLE_INTERVAL_SECONDS: float = Field(default=5.0, env="MONITORING_SAMPLE_INTERVAL_SECONDS")
+    MONITORING_BUFFER_SAMPLES: int = Field(default=720, env="MONITORING_BUFFER_SAMPLES")  # 1 hour at 5 s
+    MONITORING_FLUSH_INTERVAL_SECONDS: float = Field(default=60.0, env="MONITORING_FLUSH_INTERVAL_SECONDS")
+
     # Logging
     LOG_LEVEL: str = "INFO"
 
     # Audit Log Encryption
     AUDIT_LOG_ENCRYPTION_KEY: Optional[str] = Field(default="", env="AUDIT_LOG_ENCRYPTION_KEY")
 
+    # Audit Log Buffer
+    AUDIT_BUFFER_MAX_SIZE: int = Field(default=10000, env="AUDIT_BUFFER_MAX_SIZE")
+    AUDIT_FLUSH_INTERVAL_MS: int = Field(default=500, env="AUDIT_FLUSH_INTERVAL_MS")
+    AUDIT_FLUSH_BATCH_SIZE: int = Field(default=500, env="AUDIT_FLUSH_BATCH_SIZE")
+    AUDIT_FLUSH_TIMEOUT_SECONDS: float = Field(default=5.0, env="AUDIT_FLUSH_TIMEOUT_SECONDS")
+    AUDIT_JOURNAL_PATH: str = Field(default="logs/audit_journal.jsonl", env="AUDIT_JOURNAL_PATH")
+
+    # Report Exports
+    REPORT_OUTPUT_DIR: str = Field(default="reports/output", env="REPORT_OUTPUT_DIR")
+    REPORT_OUTPUT_RETENTION_DAYS: int = Field(default=7, env="REPORT_OUTPUT_RETENTION_DAYS")
+
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: set[str] = {
@@ -3,16 +3,32 @@ Encryption utilities for securing sensitive data at rest.
 
 Uses Fernet (symmetric encryption) from cryptography library.
 All data is encrypted using AES-128 in CBC mode with PKCS7 padding.
+
+Values are stored as bare Fernet tokens. Values written by earlier
+versions carry an extra base64 layer and are still read transparently.
 """
 import base64
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Iterable, List, Optional
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+from app.core.config import settings
+
+
+# Every Fernet token starts with version byte 0x80 followed by the high
+# bytes of its timestamp, which base64-encode to this prefix. Legacy values
+# were base64-encoded again and start with "Z0FBQUFB" instead.
+FERNET_TOKEN_PREFIX = "gAAAAA"
+
+# Minimum batch size before encrypt_many/decrypt_many use worker threads
+BULK_PARALLEL_THRESHOLD = 1000
+
 
 class EncryptionError(Exception):
     """Custom exception for encryption/decryption errors."""
@@ -29,18 +45,44 @@ def generate_key() -> str:
     return Fernet.generate_key().decode('utf-8')
 
 
-def _get_fernet() -> Fernet:
+@lru_cache(maxsize=4)
+def _build_key_ring(key_setting: str) -> MultiFernet:
     """
-    Get Fernet instance using the encryption key from environment.
+    Build the key ring for a key setting value.
+
+    Cached per setting value, so the keys are parsed once per process
+    and a changed setting builds a new ring.
+
+    Args:
+        key_setting: Comma-separated Fernet keys, newest (primary) first
 
     Returns:
-        Fernet: Configured Fernet instance
+        MultiFernet: Key ring that encrypts with the primary key and
+        decrypts with any key
 
     Raises:
-        EncryptionError: If AUDIT_LOG_ENCRYPTION_KEY is not set
+        EncryptionError: If a key is not a valid Fernet key
+    """
+    keys = [key.strip() for key in key_setting.split(",") if key.strip()]
+    try:
+        return MultiFernet([Fernet(key.encode('utf-8')) for key in keys])
+    except Exception as e:
+        raise EncryptionError(f"Invalid encryption key format: {str(e)}")
+
+
+def _get_fernet() -> MultiFernet:
     """
-    from app.core.config import settings
+    Get the cached key ring for AUDIT_LOG_ENCRYPTION_KEY.
+
+    The setting may hold several comma-separated keys for rotation: the
+    first encrypts new values, the others are only used to decrypt.
+
+    Returns:
+        MultiFernet: Configured key ring
 
+    Raises:
+        EncryptionError: If AUDIT_LOG_ENCRYPTION_KEY is not set or invalid
+    """
     encryption_key = getattr(settings, 'AUDIT_LOG_ENCRYPTION_KEY', None)
 
     if not encryption_key:
@@ -49,10 +91,50 @@ def _get_fernet() -> Fernet:
             "Please generate a key using: python -m app.scripts.generate_audit_key"
         )
 
+    return _build_key_ring(encryption_key)
+
+
+def _is_compact_token(ciphertext: str) -> bool:
+    """Check whether a stored value is a bare Fernet token (compact format)."""
+    return ciphertext.startswith(FERNET_TOKEN_PREFIX)
+
+
+def _encrypt(fernet: MultiFernet, plaintext: Optional[str]) -> Optional[str]:
+    """Encrypt one value with an already resolved key ring."""
+    if plaintext is None:
+        return None
+
     try:
-        return Fernet(encryption_key.encode('utf-8'))
+        # Fernet tokens are already URL-safe base64, store them as-is
+        return fernet.encrypt(plaintext.encode('utf-8')).decode('ascii')
     except Exception as e:
-        raise EncryptionError(f"Invalid encryption key format: {str(e)}")
+        raise EncryptionError(f"Encryption failed: {str(e)}")
+
+
+def _decrypt(fernet: MultiFernet, ciphertext: Optional[str]) -> Optional[str]:
+    """Decrypt one value with an already resolved key ring."""
+    if ciphertext is None:
+        return None
+
+    if not ciphertext:
+        # Return empty string for consistency
+        return ""
+
+    try:
+        if _is_compact_token(ciphertext):
+            token = ciphertext.encode('ascii')
+        else:
+            # Legacy format: Fernet token base64-encoded a second time
+            token = base64.urlsafe_b64decode(ciphertext.encode('utf-8'))
+        return fernet.decrypt(token).decode('utf-8')
+    except Exception as e:
+        # Attempt to return as-is if it's not encrypted (backward compatibility)
+        try:
+            # Check if it's already a valid UTF-8 string (not encrypted)
+            ciphertext.encode('utf-8').decode('utf-8')
+            return ciphertext
+        except Exception:
+            raise EncryptionError(f"Decryption failed: {str(e)}")
 
 
 def encrypt_field(plaintext: Optional[str]) -> Optional[str]:
@@ -63,7 +145,7 @@ def encrypt_field(plaintext: Optional[str]) -> Optional[str]:
         plaintext: String to encrypt (can be None)
 
     Returns:
-        str: Base64-encoded encrypted string, or None if input is None
+        str: Fernet token (URL-safe base64), or None if input is None
 
     Raises:
         EncryptionError: If encryption fails
@@ -71,24 +153,17 @@ def encrypt_field(plaintext: Optional[str]) -> Optional[str]:
     if plaintext is None:
         return None
 
-    if not plaintext:
-        # Encrypt empty string to maintain consistency
-        plaintext = ""
-
-    try:
-        fernet = _get_fernet()
-        encrypted_bytes = fernet.encrypt(plaintext.encode('utf-8'))
-        return base64.urlsafe_b64encode(encrypted_bytes).decode('utf-8')
-    except Exception as e:
-        raise EncryptionError(f"Encryption failed: {str(e)}")
+    return _encrypt(_get_fernet(), plaintext)
 
 
 def decrypt_field(ciphertext: Optional[str]) -> Optional[str]:
     """
     Decrypt a ciphertext field.
 
+    Reads both the compact format and the legacy double-base64 format.
+
     Args:
-        ciphertext: Base64-encoded encrypted string (can be None)
+        ciphertext: Encrypted string (can be None)
 
     Returns:
         str: Decrypted plaintext, or None if input is None
@@ -100,22 +175,74 @@ def decrypt_field(ciphertext: Optional[str]) -> Optional[str]:
         return None
 
     if not ciphertext:
-        # Return empty string for consistency
         return ""
 
     try:
         fernet = _get_fernet()
-        encrypted_bytes = base64.urlsafe_b64decode(ciphertext.encode('utf-8'))
-        decrypted_bytes = fernet.decrypt(encrypted_bytes)
-        return decrypted_bytes.decode('utf-8')
-    except Exception as e:
-        # Attempt to return as-is if it's not encrypted (backward compatibility)
-        try:
-            # Check if it's already a valid UTF-8 string (not encrypted)
-            ciphertext.encode('utf-8').decode('utf-8')
-            return ciphertext
-        except Exception:
-            raise EncryptionError(f"Decryption failed: {str(e)}")
+    except EncryptionError:
+        # Without a key nothing can be decrypted; keep the old behaviour of
+        # returning the stored value as-is
+        return ciphertext
+
+    return _decrypt(fernet, ciphertext)
+
+
+def _map_values(func, values: List[Optional[str]], max_workers: int) -> List[Optional[str]]:
+    """Apply func to values, in chunks on a thread pool for large inputs."""
+    if max_workers <= 1 or len(values) < BULK_PARALLEL_THRESHOLD:
+        return [func(value) for value in values]
+
+    chunk_size = max(1, -(-len(values) // max_workers))
+    chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda chunk: [func(value) for value in chunk], chunks)
+        return [value for chunk in results for value in chunk]
+
+
+def encrypt_many(
+    values: Iterable[Optional[str]],
+    max_workers: int = 1,
+) -> List[Optional[str]]:
+    """
+    Encrypt many fields with one key ring lookup.
+
+    Args:
+        values: Plaintext strings (None entries stay None)
+        max_workers: Threads to use for inputs of BULK_PARALLEL_THRESHOLD
+            values or more; 1 encrypts inline
+
+    Returns:
+        List of encrypted strings in input order
+
+    Raises:
+        EncryptionError: If the key is missing or encryption fails
+    """
+    fernet = _get_fernet()
+    return _map_values(partial(_encrypt, fernet), list(values), max_workers)
+
+
+def decrypt_many(
+    values: Iterable[Optional[str]],
+    max_workers: int = 1,
+) -> List[Optional[str]]:
+    """
+    Decrypt many fields with one key ring lookup.
+
+    Args:
+        values: Encrypted strings in either storage format (None entries
+            stay None)
+        max_workers: Threads to use for inputs of BULK_PARALLEL_THRESHOLD
+            values or more; 1 decrypts inline
+
+    Returns:
+        List of plaintext strings in input order
+
+    Raises:
+        EncryptionError: If the key is missing or decryption fails
+    """
+    fernet = _get_fernet()
+    return _map_values(partial(_decrypt, fernet), list(values), max_workers)
 
 
 def is_encrypted(value: Optional[str]) -> bool:
@@ -131,8 +258,11 @@ def is_encrypted(value: Optional[str]) -> bool:
     if not value:
         return False
 
+    if _is_compact_token(value):
+        return len(value) > 32
+
     try:
-        # Try to decode as base64
+        # Legacy format: base64 of a Fernet token
         decoded = base64.urlsafe_b64decode(value.encode('utf-8'))
         # Check if it looks like Fernet output (typically > 32 bytes)
         return len(decoded) > 32
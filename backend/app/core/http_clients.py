@@ -0,0 +1,256 @@
+"""
+Shared HTTP connection pools for external APIs.
+
+BPJS VClaim, Antrean, Aplicare and SATUSEHAT clients borrow one
+long-lived httpx.AsyncClient per upstream from this registry instead of
+opening (and throwing away) a connection pool per request, so requests
+reuse warm TLS connections. The pools are created and drained from the
+application lifespan; outside it (scripts, tests) clients fall back to a
+private pool with the same settings.
+
+Every request is counted by whether it opened a new connection or reused
+one, which is what the pools are meant to save.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import (
+    upstream_http_request_duration_seconds,
+    upstream_http_requests_in_flight,
+    upstream_http_requests_total,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# httpcore trace event fired once a request opens a new connection
+NEW_CONNECTION_EVENT = "connection.connect_tcp.complete"
+
+
+class UpstreamPool:
+    """Connection pool settings of one external API."""
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+
+UPSTREAM_POOLS = {
+    "bpjs_vclaim": UpstreamPool(
+        settings.BPJS_VCLAIM_MAX_CONNECTIONS, settings.BPJS_VCLAIM_MAX_KEEPALIVE
+    ),
+    "bpjs_antrean": UpstreamPool(
+        settings.BPJS_ANTREAN_MAX_CONNECTIONS, settings.BPJS_ANTREAN_MAX_KEEPALIVE
+    ),
+    "bpjs_aplicare": UpstreamPool(
+        settings.BPJS_APLICARE_MAX_CONNECTIONS, settings.BPJS_APLICARE_MAX_KEEPALIVE
+    ),
+    "satusehat": UpstreamPool(
+        settings.SATUSEHAT_MAX_CONNECTIONS, settings.SATUSEHAT_MAX_KEEPALIVE
+    ),
+}  # type: Dict[str, UpstreamPool]
+
+
+def http2_available() -> bool:
+    """Whether the h2 package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that reports when it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    HTTP transport recording connection reuse and in-flight requests.
+
+    A request counts as in flight until its response body is closed, so
+    draining waits for responses that are still being read.
+    """
+
+    def __init__(self, upstream: str, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+        self.in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        opened = []
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == NEW_CONNECTION_EVENT:
+                opened.append(event_name)
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions = dict(request.extensions, trace=trace)
+
+        self._request_started()
+        started = time.monotonic()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            upstream_http_requests_total.labels(upstream=self.upstream, connection="error").inc()
+            self._request_finished()
+            raise
+
+        upstream_http_request_duration_seconds.labels(upstream=self.upstream).observe(
+            time.monotonic() - started
+        )
+        upstream_http_requests_total.labels(
+            upstream=self.upstream, connection="new" if opened else "reused"
+        ).inc()
+
+        finished = []
+
+        def on_close():
+            if not finished:
+                finished.append(True)
+                self._request_finished()
+
+        response.stream = _TrackedStream(response.stream, on_close)
+        return response
+
+    def _request_started(self):
+        self.in_flight += 1
+        upstream_http_requests_in_flight.labels(upstream=self.upstream).inc()
+
+    def _request_finished(self):
+        self.in_flight -= 1
+        upstream_http_requests_in_flight.labels(upstream=self.upstream).dec()
+
+
+def build_upstream_client(upstream: str, pool: Optional[UpstreamPool] = None) -> httpx.AsyncClient:
+    """
+    Create an HTTP client for an external API.
+
+    Args:
+        upstream: Key in UPSTREAM_POOLS
+        pool: Pool settings (default: UPSTREAM_POOLS[upstream])
+
+    Returns:
+        httpx.AsyncClient with an InstrumentedTransport
+    """
+    pool = pool or UPSTREAM_POOLS[upstream]
+    transport = InstrumentedTransport(
+        upstream,
+        http2=settings.UPSTREAM_HTTP2 and http2_available(),
+        limits=httpx.Limits(
+            max_connections=pool.max_connections,
+            max_keepalive_connections=pool.max_keepalive_connections,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(pool.timeout, connect=pool.connect_timeout),
+    )
+
+
+def _in_flight(clients: Dict[str, httpx.AsyncClient]) -> int:
+    return sum(client._transport.in_flight for client in clients.values())
+
+
+class HTTPClientRegistry:
+    """
+    Application-scoped HTTP clients, one per external API.
+
+    Usage:
+        http_client_registry.start()                      # in the application lifespan
+        client, owned = http_client_registry.acquire("satusehat")
+        await http_client_registry.stop()                 # on shutdown, drains requests
+    """
+
+    def __init__(
+        self,
+        pools: Optional[Dict[str, UpstreamPool]] = None,
+        drain_timeout: float = settings.UPSTREAM_DRAIN_TIMEOUT_SECONDS,
+    ):
+        self.pools = pools if pools is not None else UPSTREAM_POOLS
+        self.drain_timeout = drain_timeout
+        self._clients = {}  # type: Dict[str, httpx.AsyncClient]
+
+    @property
+    def started(self) -> bool:
+        return bool(self._clients)
+
+    def start(self):
+        """Create the shared client of every upstream."""
+        if self._clients:
+            return
+        if settings.UPSTREAM_HTTP2 and not http2_available():
+            logger.warning("UPSTREAM_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+        for upstream, pool in self.pools.items():
+            self._clients[upstream] = build_upstream_client(upstream, pool)
+        logger.info(f"Shared HTTP clients started for: {', '.join(self._clients)}")
+
+    def acquire(self, upstream: str) -> Tuple[httpx.AsyncClient, bool]:
+        """
+        Get the HTTP client for an external API.
+
+        Args:
+            upstream: Key in the registry's pools
+
+        Returns:
+            Tuple of (client, owned). Owned clients are private to the
+            caller, which must close them; shared clients must not be closed.
+        """
+        client = self._clients.get(upstream)
+        if client is not None:
+            return client, False
+        return build_upstream_client(upstream, self.pools.get(upstream)), True
+
+    def in_flight(self) -> int:
+        """Requests on the shared clients whose response is not closed yet."""
+        return _in_flight(self._clients)
+
+    async def stop(self):
+        """Stop lending clients, wait for in-flight requests, then close the pools."""
+        clients, self._clients = self._clients, {}
+        if not clients:
+            return
+
+        deadline = time.monotonic() + self.drain_timeout
+        while _in_flight(clients) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if _in_flight(clients):
+            logger.warning("Closing shared HTTP clients with requests still in flight")
+
+        for client in clients.values():
+            await client.aclose()
+        logger.info("Shared HTTP clients closed")
+
+
+# Process-wide registry, started and stopped from the application lifespan
+http_client_registry = HTTPClientRegistry()
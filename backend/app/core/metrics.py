@@ -107,6 +107,87 @@ bpjs_api_duration_seconds = Histogram(
 )
 
 
+# Upstream HTTP client metrics (BPJS, SATUSEHAT)
+upstream_http_requests_total = Counter(
+    'simrs_upstream_http_requests_total',
+    'Requests to external APIs by connection used',
+    ['upstream', 'connection']  # connection: new, reused, error
+)
+
+upstream_http_request_duration_seconds = Histogram(
+    'simrs_upstream_http_request_duration_seconds',
+    'Time until external API response headers arrive',
+    ['upstream'],
+    buckets=(.01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+upstream_http_requests_in_flight = Gauge(
+    'simrs_upstream_http_requests_in_flight',
+    'External API requests whose response is not closed yet',
+    ['upstream']
+)
+
+upstream_circuit_state = Gauge(
+    'simrs_upstream_circuit_state',
+    'Circuit breaker state per external API endpoint (0 closed, 1 half-open, 2 open)',
+    ['upstream', 'endpoint']
+)
+
+upstream_requests_rejected_total = Counter(
+    'simrs_upstream_requests_rejected_total',
+    'External API requests failed fast without being sent',
+    ['upstream', 'reason']  # reason: circuit_open, overloaded
+)
+
+upstream_concurrency_limit = Gauge(
+    'simrs_upstream_concurrency_limit',
+    'Current adaptive limit of concurrent requests per external API',
+    ['upstream']
+)
+
+upstream_hedged_requests_total = Counter(
+    'simrs_upstream_hedged_requests_total',
+    'Hedged (duplicate) external API requests by which attempt answered first',
+    ['upstream', 'winner']  # winner: primary, hedge
+)
+
+
+# BPJS eligibility cache metrics
+bpjs_eligibility_cache_requests_total = Counter(
+    'simrs_bpjs_eligibility_cache_requests_total',
+    'BPJS eligibility cache lookups by tier that answered',
+    ['result']  # result: l1_hit, l2_hit, miss
+)
+
+
+# API rate limiting metrics
+rate_limit_decisions_total = Counter(
+    'simrs_rate_limit_decisions_total',
+    'API rate limit checks by rule and outcome',
+    ['rule', 'result']  # result: allowed, limited, error
+)
+
+rate_limit_redis_calls_total = Counter(
+    'simrs_rate_limit_redis_calls_total',
+    'Token bucket scripts run on Redis to refill local token leases',
+    ['rule']
+)
+
+
+# SATUSEHAT OAuth token metrics
+satusehat_token_requests_total = Counter(
+    'simrs_satusehat_token_requests_total',
+    'SATUSEHAT access tokens handed out, by where they came from',
+    ['source']  # source: memory, redis, refresh
+)
+
+satusehat_token_refreshes_total = Counter(
+    'simrs_satusehat_token_refreshes_total',
+    'SATUSEHAT access token requests to the OAuth server',
+    ['status']  # status: success, failure
+)
+
+
 # Audit metrics
 audit_log_entries_total = Counter(
     'simrs_audit_log_entries_total',
@@ -114,6 +195,57 @@ audit_log_entries_total = Counter(
     ['action', 'resource']
 )
 
+audit_buffer_depth = Gauge(
+    'simrs_audit_buffer_depth',
+    'Audit log entries waiting in the in-process buffer'
+)
+
+audit_buffer_entries_total = Counter(
+    'simrs_audit_buffer_entries_total',
+    'Audit log buffer entries by outcome',
+    ['status']  # status: queued, flushed, spilled, replayed, failed
+)
+
+audit_flush_duration_seconds = Histogram(
+    'simrs_audit_flush_duration_seconds',
+    'Audit log batch flush latency',
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+)
+
+audit_flush_batch_size = Histogram(
+    'simrs_audit_flush_batch_size',
+    'Audit log entries per batch flush',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+
+# Notification queue metrics
+notification_queue_depth = Gauge(
+    'simrs_notification_queue_depth',
+    'Notifications waiting in the Redis queues',
+    ['queue']  # queue: urgent, high, normal, low, processing, delayed
+)
+
+notification_queue_lag_seconds = Histogram(
+    'simrs_notification_queue_lag_seconds',
+    'Time from enqueue until a worker picks a notification up',
+    ['priority'],
+    buckets=(.01, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+notification_queue_processed_total = Counter(
+    'simrs_notification_queue_processed_total',
+    'Notifications processed by the queue workers',
+    ['channel', 'status']  # status: sent, delivered, failed, retry, error
+)
+
+notification_delivery_duration_seconds = Histogram(
+    'simrs_notification_delivery_duration_seconds',
+    'Channel provider send latency',
+    ['channel'],
+    buckets=(.05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
 
 # Backup metrics
 backup_operations_total = Counter(
@@ -154,6 +286,28 @@ memory_usage_bytes = Gauge(
     ['type']  # type: used, free, total, cached, buffers
 )
 
+system_cpu_usage_percent = Gauge(
+    'simrs_system_cpu_usage_percent',
+    'Host CPU usage since the previous sample'
+)
+
+system_network_bytes = Gauge(
+    'simrs_system_network_bytes',
+    'Bytes through the host network interfaces since boot',
+    ['direction']  # direction: sent, recv
+)
+
+system_process_count = Gauge(
+    'simrs_system_process_count',
+    'Processes running on the host'
+)
+
+system_metric_rollups_total = Counter(
+    'simrs_system_metric_rollups_total',
+    'System metric rollup rows by outcome',
+    ['status']  # status: written, failed, dropped
+)
+
 
 # Error metrics
 errors_total = Counter(
@@ -0,0 +1,287 @@
+"""
+Token bucket rate limiting for the API, shared across workers through Redis.
+
+Each rule is a token bucket of `limit` tokens refilled over `period`
+seconds, kept per identity (route, IP, user or API key). The bucket lives
+in Redis and is updated by one Lua script, so reading, refilling and
+taking tokens is atomic across all workers; the script uses the Redis
+clock, so worker clocks do not matter.
+
+To keep the Redis cost of a check well under one round-trip, a worker
+takes a small batch of tokens at a time and hands them out locally for up
+to LEASE_SECONDS. The batch grows while a client keeps using its lease up
+and shrinks when tokens are left over, and never exceeds a small share of
+the limit, so strict limits (e.g. login) still go to Redis every time.
+Tokens are only ever taken from the shared bucket, so leases can make a
+limit slightly stricter, never looser. A client that is limited is
+answered locally until its retry-after has passed.
+
+When Redis cannot be reached checks fail open for REDIS_RETRY_SECONDS,
+so an outage of the limiter never takes the API down with it.
+"""
+import asyncio
+import collections
+import logging
+import math
+import re
+import time
+from typing import Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import rate_limit_decisions_total, rate_limit_redis_calls_total
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rate_limit:bucket:"
+
+# Local token leases: how long they last, how many are kept, and the
+# largest share of a limit one worker may take at once
+LEASE_SECONDS = 1.0
+MAX_LEASES = 10000
+PREALLOCATION_FRACTION = 0.05
+MAX_PREALLOCATION = 50
+
+# Checks skip Redis (and allow) this long after it failed
+REDIS_RETRY_SECONDS = 5.0
+
+# KEYS[1]: bucket; ARGV: capacity, refill rate (tokens per ms), tokens wanted.
+# Grants up to the wanted tokens (0 when empty) and returns
+# {granted, tokens left, ms until one token is available, ms until full}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local granted = math.min(wanted, math.floor(tokens))
+tokens = tokens - granted
+local retry_after = 0
+if granted == 0 then
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+local full_after = math.ceil((capacity - tokens) / rate)
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], full_after + 1000)
+return {granted, math.floor(tokens), retry_after, full_after}
+"""
+
+
+class RateLimitRule:
+    """A token bucket of `limit` requests per `period` seconds.
+
+    by: what the bucket is kept per - "ip", "user", "api_key", "client"
+    (issued API key, else user, else IP) or "route" (one bucket for everyone).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        period: float,
+        by: str = "client",
+        path: Optional[str] = None,
+        methods: Optional[Iterable[str]] = None,
+    ):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.by = by
+        self.pattern = re.compile(path) if path else None
+        self.methods = frozenset(m.upper() for m in methods) if methods else None
+        self.max_batch = max(1, min(MAX_PREALLOCATION, int(limit * PREALLOCATION_FRACTION)))
+
+    @property
+    def policy(self) -> str:
+        return f"{self.limit};w={int(self.period)}"
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self.pattern is None or self.pattern.match(path) is not None
+
+
+class RateLimitDecision:
+    """Outcome of one check; remaining and reset_after are None when unknown."""
+
+    __slots__ = ("rule", "allowed", "remaining", "reset_after", "retry_after")
+
+    def __init__(
+        self,
+        rule: RateLimitRule,
+        allowed: bool,
+        remaining: Optional[int] = None,
+        reset_after: Optional[float] = None,
+        retry_after: float = 0.0,
+    ):
+        self.rule = rule
+        self.allowed = allowed
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    def headers(self) -> List[tuple]:
+        """RateLimit-* headers (IETF draft), plus Retry-After when limited."""
+        if self.remaining is None:
+            return []
+        headers = [
+            ("RateLimit-Limit", str(self.rule.limit)),
+            ("RateLimit-Remaining", str(max(0, self.remaining))),
+            ("RateLimit-Reset", str(int(math.ceil(self.reset_after or 0)))),
+            ("RateLimit-Policy", self.rule.policy),
+        ]
+        if not self.allowed:
+            headers.append(("Retry-After", str(max(1, int(math.ceil(self.retry_after))))))
+        return headers
+
+
+class _Lease:
+    """Tokens this worker took from one bucket, handed out locally."""
+
+    __slots__ = ("tokens", "expires_at", "batch", "remaining", "reset_after", "blocked_until")
+
+    def __init__(self):
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.batch = 1
+        self.remaining = 0
+        self.reset_after = 0.0
+        self.blocked_until = 0.0
+
+    def take(self, rule: RateLimitRule, now: float) -> Optional[RateLimitDecision]:
+        if self.blocked_until > now:
+            return RateLimitDecision(
+                rule, False, 0, self.reset_after, retry_after=self.blocked_until - now
+            )
+        if self.tokens > 0 and self.expires_at > now:
+            self.tokens -= 1
+            return RateLimitDecision(rule, True, self.remaining + self.tokens, self.reset_after)
+        return None
+
+    def next_batch(self, rule: RateLimitRule, now: float) -> int:
+        if self.expires_at > now and self.tokens == 0:
+            self.batch = min(rule.max_batch, self.batch * 2)   # used up early
+        elif self.tokens > 0:
+            self.batch = max(1, self.batch // 2)                # tokens left over
+        return min(self.batch, rule.max_batch)
+
+
+class RateLimiter:
+    """Checks requests against token buckets in Redis, through local leases."""
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._script = None
+        self._leases = collections.OrderedDict()
+        self._refills = {}
+        self._redis_down_until = 0.0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            from app.db.redis import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+
+    async def check(self, rule: RateLimitRule, identity: str) -> RateLimitDecision:
+        """Take one token from the rule's bucket for an identity."""
+        key = f"{rule.name}:{identity}"
+
+        while True:
+            lease = self._lease(key)
+            decision = lease.take(rule, time.monotonic())
+            if decision is not None:
+                rate_limit_decisions_total.labels(
+                    rule=rule.name, result="allowed" if decision.allowed else "limited"
+                ).inc()
+                return decision
+
+            refill = self._refills.get(key)
+            if refill is not None:
+                # Another request of this worker is already refilling the lease
+                await asyncio.shield(refill)
+                continue
+
+            if self._redis_down_until > time.monotonic():
+                rate_limit_decisions_total.labels(rule=rule.name, result="error").inc()
+                return RateLimitDecision(rule, True)
+
+            refill = asyncio.get_running_loop().create_future()
+            self._refills[key] = refill
+            try:
+                await self._refill(rule, key, lease)
+            except Exception as e:
+                self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+                logger.warning(f"Rate limiting skipped for {REDIS_RETRY_SECONDS}s, Redis failed: {e}")
+                rate_limit_decisions_total.labels(rule=rule.name, result="error").inc()
+                return RateLimitDecision(rule, True)
+            finally:
+                del self._refills[key]
+                refill.set_result(None)
+
+    async def _refill(self, rule: RateLimitRule, key: str, lease: _Lease):
+        if self._script is None:
+            self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+        now = time.monotonic()
+        batch = lease.next_batch(rule, now)
+        rate_limit_redis_calls_total.labels(rule=rule.name).inc()
+        granted, remaining, retry_after_ms, full_after_ms = [
+            int(value) for value in await self._script(
+                keys=[KEY_PREFIX + key],
+                args=[rule.limit, rule.limit / (rule.period * 1000.0), batch],
+            )
+        ]
+
+        now = time.monotonic()
+        lease.tokens = granted
+        lease.remaining = remaining
+        lease.reset_after = full_after_ms / 1000.0
+        if granted:
+            lease.expires_at = now + LEASE_SECONDS
+            lease.blocked_until = 0.0
+        else:
+            lease.expires_at = now
+            lease.blocked_until = now + retry_after_ms / 1000.0
+
+    def _lease(self, key: str) -> _Lease:
+        lease = self._leases.get(key)
+        if lease is None:
+            lease = self._leases[key] = _Lease()
+            while len(self._leases) > MAX_LEASES:
+                self._leases.popitem(last=False)
+        else:
+            self._leases.move_to_end(key)
+        return lease
+
+
+def default_rate_limit_rules() -> List[RateLimitRule]:
+    """Rules applied by the API rate limiting middleware, most specific first."""
+    bpjs_paths = r"^/api/v1/bpjs(-[a-z]+)?/"
+    return [
+        RateLimitRule("login", settings.RATE_LIMIT_LOGIN_PER_MINUTE, 60, by="ip",
+                      path=r"^/api/v1/(auth|portal/auth)/login", methods=["POST"]),
+        RateLimitRule("patient_search", settings.RATE_LIMIT_SEARCH_PER_MINUTE, 60,
+                      path=r"^/api/v1/(patients/?$|patients/(lookup|history/search)"
+                           r"|patient-registration/search|satusehat/patients/search)",
+                      methods=["GET"]),
+        RateLimitRule("bpjs", settings.RATE_LIMIT_BPJS_PER_MINUTE, 60, path=bpjs_paths),
+        # All clients together, to stay inside the hospital's BPJS quota
+        RateLimitRule("bpjs_total", settings.RATE_LIMIT_BPJS_TOTAL_PER_MINUTE, 60, by="route", path=bpjs_paths),
+        RateLimitRule("default", settings.RATE_LIMIT_DEFAULT_PER_MINUTE, 60, path=r"^/api/"),
+    ]
+
+
+# Process-wide limiter, shared by the middleware of all routes
+rate_limiter = RateLimiter()
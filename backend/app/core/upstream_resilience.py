@@ -0,0 +1,494 @@
+"""
+Resilience layer for calls to the BPJS APIs.
+
+When BPJS is degraded (typically at the start of each month) requests
+used to wait out a 30 second timeout, be retried, and tie up workers
+until the whole API stalled. Every BPJS client now sends its requests
+through the UpstreamGuard of its upstream, which:
+
+- keeps a circuit breaker per endpoint; once too many recent calls fail
+  it rejects calls immediately, then lets single probes through to find
+  out whether the endpoint recovered
+- caps concurrent requests with a limit that adapts to the upstream
+  (additive increase on success, multiplicative decrease on timeouts and
+  5xx/429) and sheds callers once too many are queued
+- derives each endpoint's timeout from its observed latency instead of
+  a fixed 30 seconds
+- hedges idempotent requests: a duplicate is sent when the first one is
+  slower than usual, and the first answer wins
+
+Rejected calls raise UpstreamUnavailableError, which the clients turn
+into their own error with code UPSTREAM_UNAVAILABLE_CODE, so callers can
+fall back (e.g. to stale cached eligibility) instead of waiting.
+"""
+import asyncio
+import collections
+import logging
+import re
+import time
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.http_clients import UPSTREAM_POOLS
+from app.core.metrics import (
+    upstream_circuit_state,
+    upstream_concurrency_limit,
+    upstream_hedged_requests_total,
+    upstream_requests_rejected_total,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Error codes of client errors raised for calls rejected without being
+# sent, and for requests that failed before the upstream answered
+UPSTREAM_UNAVAILABLE_CODE = "UNAVAILABLE"
+CONNECT_ERROR_CODE = "CONNECT_ERROR"
+TIMEOUT_CODE = "TIMEOUT"
+REQUEST_ERROR_CODE = "REQUEST_ERROR"
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Samples needed before latency drives timeouts and hedging
+MIN_LATENCY_SAMPLES = 5
+
+# Hedges are never sent sooner than this
+HEDGE_MIN_DELAY_SECONDS = 0.25
+
+# The concurrency limit shrinks at most once per interval
+LIMIT_DECREASE_INTERVAL_SECONDS = 1.0
+LIMIT_DECREASE_FACTOR = 0.7
+
+_ID_SEGMENT = re.compile(r"\d")
+
+
+def endpoint_key(endpoint: str) -> str:
+    """
+    Endpoint template used to group calls, e.g. "Peserta/nokartu/*/tglSEP/*".
+
+    Path segments containing digits (card numbers, dates, SEP numbers)
+    are replaced by "*".
+    """
+    path = endpoint.split("?", 1)[0].strip("/")
+    return "/".join("*" if _ID_SEGMENT.search(segment) else segment for segment in path.split("/"))
+
+
+def is_transient_code(code: Optional[str]) -> bool:
+    """
+    Whether a client error code means an outage rather than an answer.
+
+    True for rejected calls (circuit open, overloaded), connection errors,
+    timeouts and HTTP 5xx/429.
+    """
+    code = code or ""
+    if code in (UPSTREAM_UNAVAILABLE_CODE, CONNECT_ERROR_CODE, TIMEOUT_CODE, REQUEST_ERROR_CODE):
+        return True
+    return code.isdigit() and (code.startswith("5") or code == "429")
+
+
+class UpstreamUnavailableError(Exception):
+    """A call was rejected without being sent to the upstream."""
+
+    def __init__(self, upstream: str, endpoint: str, reason: str, retry_after: Optional[float] = None):
+        self.upstream = upstream
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{upstream} {endpoint} unavailable: {reason}")
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over the last `window` calls.
+
+    Opens when at least `min_calls` calls were seen and the failure rate
+    reaches `failure_rate`. After `open_seconds` one probe is let through
+    (half-open); its success closes the circuit, its failure reopens it
+    for twice as long, up to `max_open_seconds`.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = settings.UPSTREAM_CIRCUIT_FAILURE_RATE,
+        min_calls: int = settings.UPSTREAM_CIRCUIT_MIN_CALLS,
+        window: int = settings.UPSTREAM_CIRCUIT_WINDOW,
+        open_seconds: float = settings.UPSTREAM_CIRCUIT_OPEN_SECONDS,
+        max_open_seconds: float = settings.UPSTREAM_CIRCUIT_MAX_OPEN_SECONDS,
+        on_state_change: Optional[Callable[[str], None]] = None,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = CLOSED
+        self._outcomes = collections.deque(maxlen=window)  # type: Deque[bool]
+        self._opened_for = open_seconds
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._on_state_change = on_state_change
+
+    def retry_after(self) -> float:
+        return max(0.0, self._open_until - time.monotonic())
+
+    def allow(self) -> Optional[bool]:
+        """
+        Whether a call may be sent.
+
+        Returns:
+            None if the call is rejected, True if it is the half-open
+            probe (finish it with record() or release_probe()), else False
+        """
+        if self.state == OPEN:
+            if time.monotonic() < self._open_until:
+                return None
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                return None
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, success: bool, probe: bool = False):
+        if probe:
+            self._probe_in_flight = False
+            if success:
+                self._outcomes.clear()
+                self._opened_for = self.open_seconds
+                self._set_state(CLOSED)
+            else:
+                self._open(min(self._opened_for * 2, self.max_open_seconds))
+            return
+
+        if self.state != CLOSED:
+            # Late result of a call sent before the circuit opened
+            return
+        self._outcomes.append(success)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+            self._open(self.open_seconds)
+
+    def release_probe(self):
+        """Forget a probe that ended without a result (e.g. cancelled)."""
+        self._probe_in_flight = False
+
+    def _open(self, seconds: float):
+        self._opened_for = seconds
+        self._open_until = time.monotonic() + seconds
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            if self._on_state_change is not None:
+                self._on_state_change(state)
+
+
+class LatencyEstimator:
+    """
+    Smoothed latency and deviation of one endpoint (as TCP estimates RTT),
+    used for its timeout and hedge delay.
+    """
+
+    def __init__(
+        self,
+        initial_timeout: float = settings.UPSTREAM_TIMEOUT_INITIAL_SECONDS,
+        min_timeout: float = settings.UPSTREAM_TIMEOUT_MIN_SECONDS,
+        max_timeout: float = settings.UPSTREAM_TIMEOUT_MAX_SECONDS,
+    ):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.samples = 0
+        self.mean = 0.0
+        self.deviation = 0.0
+
+    def observe(self, seconds: float):
+        if not self.samples:
+            self.mean = seconds
+            self.deviation = seconds / 2
+        else:
+            self.deviation = 0.75 * self.deviation + 0.25 * abs(seconds - self.mean)
+            self.mean = 0.875 * self.mean + 0.125 * seconds
+        self.samples += 1
+
+    def timeout(self) -> float:
+        if self.samples < MIN_LATENCY_SAMPLES:
+            return self.initial_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.mean + 4 * self.deviation))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay after which a request is slower than usual; None until known."""
+        if self.samples < MIN_LATENCY_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, self.mean + 2 * self.deviation)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the upstream (AIMD), with a bounded
+    wait queue; callers beyond the queue, or waiting too long, are shed.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = settings.UPSTREAM_MIN_CONCURRENCY,
+        max_queue: int = settings.UPSTREAM_MAX_QUEUE,
+        queue_timeout: float = settings.UPSTREAM_QUEUE_TIMEOUT_SECONDS,
+        on_limit_change: Optional[Callable[[float], None]] = None,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limit = float(max_limit)
+        self.in_use = 0
+        self._waiters = collections.deque()  # type: Deque[asyncio.Future]
+        self._last_decrease = 0.0
+        self._on_limit_change = on_limit_change
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now."""
+        if self.in_use < int(self.limit) and not self._waiters:
+            self.in_use += 1
+            return True
+        return False
+
+    async def acquire(self) -> bool:
+        """
+        Wait for a slot.
+
+        Returns:
+            False if the caller was shed (queue full or waited too long)
+        """
+        if self.try_acquire():
+            return True
+        if len(self._waiters) >= self.max_queue:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        if waiter.done():
+            return True
+        self._abandon(waiter)
+        return False
+
+    def release(self):
+        self.in_use -= 1
+        self._wake()
+
+    def on_success(self):
+        if self.limit < self.max_limit:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._limit_changed()
+            self._wake()
+
+    def on_overload(self):
+        now = time.monotonic()
+        if now - self._last_decrease < LIMIT_DECREASE_INTERVAL_SECONDS:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * LIMIT_DECREASE_FACTOR)
+        self._limit_changed()
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # Granted a slot in the same tick it gave up
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self):
+        while self._waiters and self.in_use < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_use += 1
+                waiter.set_result(None)
+
+    def _limit_changed(self):
+        if self._on_limit_change is not None:
+            self._on_limit_change(self.limit)
+
+
+class UpstreamGuard:
+    """
+    Circuit breakers, adaptive timeouts and concurrency limit of one upstream.
+
+    Usage:
+        async def send(timeout):
+            return await client.get(url, headers=headers, timeout=timeout)
+
+        response = await upstream_guards["bpjs_vclaim"].call(endpoint, send, hedge=True)
+    """
+
+    def __init__(self, upstream: str, max_concurrency: int, hedge: bool = settings.UPSTREAM_HEDGE_ENABLED):
+        self.upstream = upstream
+        self.hedge_enabled = hedge
+        self.limiter = AdaptiveLimiter(
+            max_concurrency,
+            on_limit_change=upstream_concurrency_limit.labels(upstream=upstream).set,
+        )
+        upstream_concurrency_limit.labels(upstream=upstream).set(max_concurrency)
+        self._breakers = {}  # type: Dict[str, CircuitBreaker]
+        self._latency = {}  # type: Dict[str, LatencyEstimator]
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            gauge = upstream_circuit_state.labels(upstream=self.upstream, endpoint=key)
+
+            def on_state_change(state: str):
+                gauge.set(_STATE_VALUES[state])
+                log = logger.warning if state == OPEN else logger.info
+                log(f"{self.upstream} circuit for {key} is now {state}")
+
+            breaker = self._breakers[key] = CircuitBreaker(on_state_change=on_state_change)
+            gauge.set(0)
+        return breaker
+
+    def latency(self, key: str) -> LatencyEstimator:
+        estimator = self._latency.get(key)
+        if estimator is None:
+            estimator = self._latency[key] = LatencyEstimator()
+        return estimator
+
+    def status(self) -> Dict[str, object]:
+        """Circuit states and limiter state, for health endpoints."""
+        return {
+            "concurrency_limit": round(self.limiter.limit, 1),
+            "in_use": self.limiter.in_use,
+            "queued": self.limiter.queued,
+            "circuits": {key: breaker.state for key, breaker in self._breakers.items()},
+        }
+
+    async def call(
+        self,
+        endpoint: str,
+        send: Callable[[httpx.Timeout], Awaitable[httpx.Response]],
+        hedge: bool = False,
+    ) -> httpx.Response:
+        """
+        Send a request through the guard.
+
+        Args:
+            endpoint: Endpoint path, grouped by endpoint_key()
+            send: Coroutine function sending the request with the given
+                timeout; called twice when the request is hedged
+            hedge: Whether the request is idempotent and may be hedged
+
+        Returns:
+            The upstream response (5xx responses are returned, and counted
+            as failures)
+
+        Raises:
+            UpstreamUnavailableError: If the circuit is open or the caller
+                was shed
+            httpx.HTTPError: If the request failed
+        """
+        key = endpoint_key(endpoint)
+        breaker = self.breaker(key)
+        probe = breaker.allow()
+        if probe is None:
+            upstream_requests_rejected_total.labels(upstream=self.upstream, reason="circuit_open").inc()
+            raise UpstreamUnavailableError(self.upstream, key, "circuit_open", breaker.retry_after())
+
+        try:
+            if not await self.limiter.acquire():
+                upstream_requests_rejected_total.labels(upstream=self.upstream, reason="overloaded").inc()
+                raise UpstreamUnavailableError(self.upstream, key, "overloaded")
+        except BaseException:
+            if probe:
+                breaker.release_probe()
+            raise
+
+        try:
+            if hedge and self.hedge_enabled and not probe:
+                return await self._hedged(key, send)
+            return await self._attempt(key, send, probe)
+        finally:
+            if probe and breaker.state == HALF_OPEN:
+                breaker.release_probe()
+            self.limiter.release()
+
+    async def _attempt(self, key: str, send, probe: bool = False) -> httpx.Response:
+        estimator = self.latency(key)
+        timeout = estimator.timeout()
+        started = time.monotonic()
+        try:
+            response = await send(httpx.Timeout(timeout, connect=min(timeout, 10.0)))
+        except httpx.TransportError:
+            estimator.observe(time.monotonic() - started)
+            self._record(key, False, probe)
+            raise
+
+        estimator.observe(time.monotonic() - started)
+        if response.status_code >= 500 or response.status_code == 429:
+            self._record(key, False, probe, breaker_failure=response.status_code != 429)
+        else:
+            self._record(key, True, probe)
+        return response
+
+    async def _hedged(self, key: str, send) -> httpx.Response:
+        primary = asyncio.ensure_future(self._attempt(key, send))
+        delay = self.latency(key).hedge_delay()
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or self.breaker(key).state != CLOSED or not self.limiter.try_acquire():
+            return await primary
+
+        hedge = asyncio.ensure_future(self._attempt(key, send))
+        names = {primary: "primary", hedge: "hedge"}
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        upstream_hedged_requests_total.labels(
+                            upstream=self.upstream, winner=names[task]
+                        ).inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            self.limiter.release()
+
+    def _record(self, key: str, success: bool, probe: bool, breaker_failure: bool = True):
+        if success or breaker_failure:
+            self.breaker(key).record(success, probe)
+        elif probe:
+            self.breaker(key).release_probe()
+        if success:
+            self.limiter.on_success()
+        else:
+            self.limiter.on_overload()
+
+
+# Process-wide guards of the BPJS upstreams; the concurrency limit starts
+# at, and never exceeds, the upstream's connection pool size
+upstream_guards = {
+    upstream: UpstreamGuard(upstream, UPSTREAM_POOLS[upstream].max_connections)
+    for upstream in ("bpjs_vclaim", "bpjs_antrean", "bpjs_aplicare")
+}  # type: Dict[str, UpstreamGuard]
@@ -1,7 +1,10 @@
 """
 Scheduled jobs for audit log retention and archival.
 
-Runs periodic cleanup and archival tasks for compliance with UU 27/2022.
+Runs periodic cleanup and archival tasks for compliance with UU 27/2022,
+plus registry maintenance jobs such as the patient duplicate scan, the
+nightly demand forecast, the reorder classification and the stock balance
+roll-off and reconciliation.
 """
 import asyncio
 from datetime import datetime, timedelta
@@ -209,10 +212,401 @@ class AuditLogStatisticsJob:
         return stats
 
 
+class PatientDuplicateScanJob:
+    """
+    Scheduled job that scans the whole patient registry for duplicates.
+
+    Backfills missing blocking keys, then scores candidate pairs within
+    each block on a process pool.
+
+    Schedule: Run weekly on Sunday at 1 AM
+    """
+
+    def __init__(self):
+        self.threshold = 0.9
+        self.max_workers = None
+
+    async def run(self) -> dict:
+        """
+        Run the duplicate scan job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.patient_deduplication import get_deduplication_service
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "indexed_count": 0,
+            "duplicate_pairs": [],
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                service = get_deduplication_service(db)
+                results["indexed_count"] = await service.rebuild_blocking_keys()
+                results["duplicate_pairs"] = await service.scan_registry_for_duplicates(
+                    threshold=self.threshold,
+                    max_workers=self.max_workers,
+                )
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class DemandForecastJob:
+    """
+    Scheduled job that forecasts demand for every active drug.
+
+    Loads consumption for the whole formulary with one grouped query,
+    forecasts it vectorized on a process pool and upserts the results
+    into drug_demand_forecasts.
+
+    Schedule: Run daily at 3 AM
+    """
+
+    def __init__(self):
+        self.forecast_horizons = (30, 60, 90)
+        self.historical_days = 365
+        self.max_workers = None
+
+    async def run(self) -> dict:
+        """
+        Run the demand forecast job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.demand_forecasting import create_demand_forecasting_service
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "horizons": {},
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                service = create_demand_forecasting_service(db)
+                for horizon in self.forecast_horizons:
+                    results["horizons"][horizon] = await service.forecast_all_drugs(
+                        forecast_horizon=horizon,
+                        historical_days=self.historical_days,
+                        max_workers=self.max_workers,
+                    )
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class ReorderClassificationJob:
+    """
+    Scheduled job that classifies the formulary and stores reorder points.
+
+    Ranks every active drug by annual consumption value (ABC), derives VEN
+    classes and computes reorder points and safety stock in one vectorized
+    pass into drug_reorder_snapshots, which reorder alerts read.
+
+    Schedule: Run daily at 4 AM
+    """
+
+    def __init__(self):
+        self.service_level = 0.95
+
+    async def run(self) -> dict:
+        """
+        Run the reorder classification job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.reorder_point_optimization import create_reorder_point_service
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                service = create_reorder_point_service(db)
+                results.update(await service.refresh_reorder_snapshot(
+                    service_level=self.service_level,
+                ))
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class StockExpiryRollOffJob:
+    """
+    Scheduled job that removes expired batches from the stock balances.
+
+    Batches stop counting toward stock the day after their expiry date;
+    this recomputes the balances of the drugs whose batches just expired.
+
+    Schedule: Run daily at 00:05
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the expiry roll-off job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.crud.inventory import roll_off_expired_stock
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                results.update(await roll_off_expired_stock(db))
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class StockBalanceReconciliationJob:
+    """
+    Scheduled job that reconciles stock balances against the batch sums.
+
+    Corrects drug totals and location balances that drifted from the
+    usable batch quantities, e.g. after batches were edited directly.
+
+    Schedule: Run daily at 2 AM
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the stock balance reconciliation job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.crud.inventory import reconcile_stock_balances
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                results.update(await reconcile_stock_balances(db))
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class ReportFactRefreshJob:
+    """
+    Scheduled job that folds recent changes into the report fact tables.
+
+    Recomputes the days of encounters, invoices, payments and BPJS claims
+    changed since the previous run.
+
+    Schedule: Run every 10 minutes
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the report fact refresh job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.report_facts import create_report_fact_service
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                service = create_report_fact_service(db)
+                results.update(await service.refresh_changed())
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class ReportFactRebuildJob:
+    """
+    Scheduled job that rebuilds the recent days of the report fact tables.
+
+    Corrects facts the incremental refresh cannot see change, e.g. after
+    deleted invoices or encounters moved to another day.
+
+    Schedule: Run daily at 1 AM
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the report fact rebuild job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.report_facts import create_report_fact_service
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                service = create_report_fact_service(db)
+                results.update(await service.rebuild())
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class ReportOutputCleanupJob:
+    """
+    Scheduled job that deletes report output files past their retention.
+
+    Schedule: Run daily at 3 AM
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the report output cleanup job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.reporting import get_reporting_service
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        try:
+            async with get_db_context() as db:
+                service = get_reporting_service(db)
+                results.update(await service.purge_expired_outputs(settings.REPORT_OUTPUT_RETENTION_DAYS))
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class SATUSEHATSyncJob:
+    """
+    Scheduled job that pushes changed patients and encounters to SATUSEHAT.
+
+    Patients go first so encounters of new patients can reference them.
+    An interrupted run resumes from its checkpoint on the next schedule.
+
+    Schedule: Run every 15 minutes
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the SATUSEHAT sync job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.satusehat import SATUSEHATClient
+        from app.services.satusehat_bulk_sync import create_satusehat_bulk_sync, SYNC_RESOURCES
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        if not settings.SATUSEHAT_CLIENT_ID or not settings.SATUSEHAT_CLIENT_SECRET:
+            results["skipped"] = "SATUSEHAT credentials are not configured"
+            return results
+
+        try:
+            async with SATUSEHATClient() as client:
+                bulk_sync = create_satusehat_bulk_sync(client)
+                for resource_type in SYNC_RESOURCES:
+                    results[resource_type] = await bulk_sync.run(resource_type)
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
+class BPJSEligibilityPrewarmJob:
+    """
+    Scheduled job that refreshes cached BPJS eligibility for tomorrow.
+
+    Looks up every BPJS patient with an appointment tomorrow, so the
+    registration desks answer from the cache when they open.
+
+    Schedule: Run daily at 10 PM
+    """
+
+    async def run(self) -> dict:
+        """
+        Run the BPJS eligibility prewarm job.
+
+        Returns:
+            Dictionary with job results
+        """
+        from app.services.bpjs_eligibility_prewarm import create_bpjs_eligibility_prewarmer
+
+        results = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "errors": [],
+        }
+
+        if not settings.BPJS_CONSUMER_ID or not settings.BPJS_CONSUMER_SECRET:
+            results["skipped"] = "BPJS credentials are not configured"
+            return results
+
+        try:
+            results.update(await create_bpjs_eligibility_prewarmer().prewarm())
+
+        except Exception as e:
+            results["errors"].append(str(e))
+
+        return results
+
+
 # Job registry
 SCHEDULED_JOBS = {
     "audit_retention": AuditLogRetentionJob,
     "audit_statistics": AuditLogStatisticsJob,
+    "patient_duplicate_scan": PatientDuplicateScanJob,
+    "demand_forecast": DemandForecastJob,
+    "reorder_classification": ReorderClassificationJob,
+    "stock_expiry_roll_off": StockExpiryRollOffJob,
+    "stock_balance_reconciliation": StockBalanceReconciliationJob,
+    "report_fact_refresh": ReportFactRefreshJob,
+    "report_fact_rebuild": ReportFactRebuildJob,
+    "report_output_cleanup": ReportOutputCleanupJob,
+    "satusehat_sync": SATUSEHATSyncJob,
+    "bpjs_eligibility_prewarm": BPJSEligibilityPrewarmJob,
 }
 
 
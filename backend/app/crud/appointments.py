@@ -25,8 +25,13 @@ from sqlalchemy import (
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-# Import models (these would be defined in models/appointment.py)
-# For now, we'll use placeholders that match typical appointment system models
+from app.models.appointments import (
+    Appointment,
+    AppointmentReminder,
+    AppointmentSlot,
+    AppointmentStatus,
+)
+from app.models.patient import Patient
 
 
 # =============================================================================
@@ -473,6 +478,40 @@ async def get_today_appointments(
     return list(result.scalars().all())
 
 
+async def get_appointment_bpjs_cards(
+    db: AsyncSession,
+    appointment_date: date
+) -> List[Tuple[int, str]]:
+    """
+    Get the BPJS card numbers of patients with an appointment on a date.
+
+    Used to prewarm the BPJS eligibility cache before the desks open.
+    Only scheduled and confirmed appointments of active patients count.
+
+    Args:
+        db: Database session
+        appointment_date: Appointment date
+
+    Returns:
+        List of (patient ID, BPJS card number), one per patient
+    """
+    query = (
+        select(Patient.id, Patient.bpjs_card_number)
+        .join(Appointment, Appointment.patient_id == Patient.id)
+        .where(
+            Appointment.appointment_date == appointment_date,
+            Appointment.status.in_([AppointmentStatus.SCHEDULED, AppointmentStatus.CONFIRMED]),
+            Patient.is_active.is_(True),
+            Patient.bpjs_card_number.isnot(None),
+        )
+        .distinct()
+        .order_by(Patient.id)
+    )
+
+    result = await db.execute(query)
+    return [(row.id, row.bpjs_card_number) for row in result.all()]
+
+
 # =============================================================================
 # SLOT MANAGEMENT
 # =============================================================================
@@ -517,7 +556,7 @@ async def get_available_slots(
     query = select(AppointmentSlot).where(
         and_(
             AppointmentSlot.doctor_id == doctor_id,
-            AppointmentSlot.slot_date == slot_date,
+            AppointmentSlot.date == slot_date,
             AppointmentSlot.is_available == True
         )
     )
@@ -559,12 +598,12 @@ async def create_slot(
     """
     slot = AppointmentSlot(
         doctor_id=doctor_id,
-        slot_date=slot_date,
+        date=slot_date,
         start_time=start_time,
         end_time=end_time,
         department=department,
-        max_bookings=max_bookings,
-        current_bookings=0,
+        max_patients=max_bookings,
+        booked_count=0,
         slot_type=slot_type,
         is_available=True
     )
@@ -670,8 +709,8 @@ async def get_doctor_availability(
     query = select(AppointmentSlot).where(
         and_(
             AppointmentSlot.doctor_id == doctor_id,
-            AppointmentSlot.slot_date >= start_date,
-            AppointmentSlot.slot_date <= end_date,
+            AppointmentSlot.date >= start_date,
+            AppointmentSlot.date <= end_date,
             AppointmentSlot.is_available == True
         )
     )
@@ -679,7 +718,7 @@ async def get_doctor_availability(
     if department:
         query = query.where(AppointmentSlot.department == department)
 
-    query = query.order_by(AppointmentSlot.slot_date, AppointmentSlot.start_time)
+    query = query.order_by(AppointmentSlot.date, AppointmentSlot.start_time)
 
     result = await db.execute(query)
     slots = result.scalars().all()
@@ -687,9 +726,9 @@ async def get_doctor_availability(
     # Group by date
     availability = {}
     for slot in slots:
-        if slot.slot_date not in availability:
-            availability[slot.slot_date] = []
-        availability[slot.slot_date].append(slot)
+        if slot.date not in availability:
+            availability[slot.date] = []
+        availability[slot.date].append(slot)
 
     return availability
 
@@ -713,7 +752,7 @@ async def get_department_availability(
     query = select(AppointmentSlot).where(
         and_(
             AppointmentSlot.department == department,
-            AppointmentSlot.slot_date == appointment_date,
+            AppointmentSlot.date == appointment_date,
             AppointmentSlot.is_available == True
         )
     ).order_by(AppointmentSlot.doctor_id, AppointmentSlot.start_time)
@@ -749,7 +788,7 @@ async def check_slot_availability(
     if not slot or not slot.is_available:
         return False
 
-    return slot.current_bookings < slot.max_bookings
+    return slot.booked_count < slot.max_patients
 
 
 async def book_slot(
@@ -770,13 +809,13 @@ async def book_slot(
     if not slot:
         return None
 
-    if slot.current_bookings >= slot.max_bookings:
+    if slot.booked_count >= slot.max_patients:
         return None
 
     await db.execute(
         update(AppointmentSlot)
         .where(AppointmentSlot.id == slot_id)
-        .values(current_bookings=AppointmentSlot.current_bookings + 1)
+        .values(booked_count=AppointmentSlot.booked_count + 1)
     )
     await db.commit()
     await db.refresh(slot)
@@ -802,11 +841,11 @@ async def release_slot(
     if not slot:
         return None
 
-    if slot.current_bookings > 0:
+    if slot.booked_count > 0:
         await db.execute(
             update(AppointmentSlot)
             .where(AppointmentSlot.id == slot_id)
-            .values(current_bookings=AppointmentSlot.current_bookings - 1)
+            .values(booked_count=AppointmentSlot.booked_count - 1)
         )
         await db.commit()
         await db.refresh(slot)
@@ -1203,7 +1242,7 @@ async def book_appointment_with_slot(
     if not slot or not slot.is_available:
         return None
 
-    if slot.current_bookings >= slot.max_bookings:
+    if slot.booked_count >= slot.max_patients:
         return None
 
     # Check for conflicting appointments
@@ -1211,7 +1250,7 @@ async def book_appointment_with_slot(
         db=db,
         patient_id=patient_id,
         doctor_id=doctor_id,
-        appointment_date=slot.slot_date,
+        appointment_date=slot.date,
         appointment_time=slot.start_time
     )
 
@@ -1223,7 +1262,7 @@ async def book_appointment_with_slot(
         db=db,
         patient_id=patient_id,
         doctor_id=doctor_id,
-        appointment_date=slot.slot_date,
+        appointment_date=slot.date,
         appointment_time=slot.start_time,
         department=department,
         appointment_type=appointment_type,
@@ -1377,7 +1416,7 @@ async def validate_booking_time(
     slot_query = select(AppointmentSlot).where(
         and_(
             AppointmentSlot.doctor_id == doctor_id,
-            AppointmentSlot.slot_date == appointment_date,
+            AppointmentSlot.date == appointment_date,
             AppointmentSlot.start_time <= appointment_time,
             AppointmentSlot.end_time > appointment_time,
             AppointmentSlot.department == department,
@@ -1423,8 +1462,8 @@ async def create_reminder(
     reminder = AppointmentReminder(
         appointment_id=appointment_id,
         reminder_type=reminder_type,
-        reminder_time=reminder_time,
-        message=message,
+        scheduled_at=reminder_time,
+        message_content=message,
         method=method,
         status="pending"
     )
@@ -1524,9 +1563,9 @@ async def get_pending_reminders(
     query = select(AppointmentReminder).where(
         and_(
             AppointmentReminder.status == "pending",
-            AppointmentReminder.reminder_time <= current_time
+            AppointmentReminder.scheduled_at <= current_time
         )
-    ).order_by(AppointmentReminder.reminder_time)
+    ).order_by(AppointmentReminder.scheduled_at)
 
     result = await db.execute(query)
     return list(result.scalars().all())
@@ -1575,23 +1614,3 @@ async def get_reminder(
     query = select(AppointmentReminder).where(AppointmentReminder.id == reminder_id)
     result = await db.execute(query)
     return result.scalar_one_or_none()
-
-
-# =============================================================================
-# MODEL DEFINITIONS (These would be in models/appointment.py)
-# =============================================================================
-
-# Placeholder classes - in production, these would be imported from models
-class Appointment:
-    """Appointment model placeholder"""
-    pass
-
-
-class AppointmentSlot:
-    """Appointment slot model placeholder"""
-    pass
-
-
-class AppointmentReminder:
-    """Appointment reminder model placeholder"""
-    pass
@@ -17,12 +17,16 @@ Supports Indonesian healthcare billing requirements including:
 """
 from typing import List, Optional, Tuple, Dict, Any
 from datetime import datetime, date, timedelta
-from sqlalchemy import select, and_, or_, func as sql_func, update, case
+from sqlalchemy import select, and_, or_, func as sql_func, update, case, literal_column
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from decimal import Decimal
 import json
 
+from app.models.billing import Invoice
+from app.models.reporting import FactDailyInvoice
+from app.services.sequence_allocation import allocate_number
+
 # Models would be imported when they exist
 # from app.models.billing import (
 #     Invoice, InvoiceItem, BillingRule, InvoiceApproval,
@@ -475,23 +479,10 @@ async def generate_invoice_number(db: AsyncSession) -> str:
     Returns:
         Unique invoice number
     """
-    # year = datetime.now().year
-    # pattern = f"INV-{year}-%"
-
-    # stmt = select(sql_func.max(Invoice.invoice_number)).filter(
-    #     Invoice.invoice_number.like(pattern)
-    # )
-    # result = await db.execute(stmt)
-    # last_number = result.scalar()
+    today = date.today()
+    new_sequence = await allocate_number("invoice", on_date=today)
 
-    # if last_number:
-    #     last_sequence = int(last_number.split('-')[-1])
-    #     new_sequence = last_sequence + 1
-    # else:
-    #     new_sequence = 1
-
-    # return f"INV-{year}-{new_sequence:05d}"
-    return f"INV-{datetime.now().year}-00001"
+    return f"INV-{today.year}-{new_sequence:05d}"
 
 
 async def calculate_invoice_totals(
@@ -1483,83 +1474,115 @@ async def get_payment_status(
 # Reporting
 # =============================================================================
 
+# Invoice statuses left out of revenue figures
+NON_REVENUE_INVOICE_STATUSES = ('cancelled',)
+
+# Invoice statuses with an outstanding balance
+OPEN_INVOICE_STATUSES = ('approved', 'partial_paid')
+
+# Aging buckets as (key, oldest day of the bucket); the last is open-ended
+AGING_BUCKETS = (
+    ('0_30', 30),
+    ('31_60', 60),
+    ('61_90', 90),
+    ('91_plus', None),
+)
+
+REVENUE_PERIODS = ('day', 'week', 'month')
+
+
+def aging_bucket(days_outstanding: int) -> str:
+    """Aging bucket key of an invoice outstanding for the given days."""
+    for key, oldest in AGING_BUCKETS:
+        if oldest is None or days_outstanding <= oldest:
+            return key
+    return AGING_BUCKETS[-1][0]
+
+
 async def get_revenue_report(
     db: AsyncSession,
     start_date: date,
     end_date: date,
-    department_id: Optional[int] = None,
+    department: Optional[str] = None,
     payer_type: Optional[str] = None,
+    group_by: str = 'day',
 ) -> Dict[str, Any]:
     """
     Generate revenue report for a date range.
 
+    Reads the daily invoice facts, so the cost depends on the number of
+    days and payer/status combinations rather than on invoice volume.
+
     Args:
         db: Database session
         start_date: Report start date
         end_date: Report end date
-        department_id: Optional department filter
+        department: Optional encounter department filter
         payer_type: Optional payer type filter
+        group_by: Breakdown period (day, week, month)
 
     Returns:
         Revenue report data
     """
-    # stmt = select(
-    #     sql_func.date(Invoice.invoice_date).label('date'),
-    #     sql_func.sum(Invoice.total_amount).label('total_billed'),
-    #     sql_func.sum(Invoice.amount_paid).label('total_collected'),
-    #     sql_func.count(Invoice.id).label('invoice_count'),
-    # ).where(
-    #     and_(
-    #         Invoice.invoice_date >= start_date,
-    #         Invoice.invoice_date <= end_date,
-    #     )
-    # )
-
-    # if department_id:
-    #     stmt = stmt.where(Invoice.department_id == department_id)
-    # if payer_type:
-    #     stmt = stmt.where(Invoice.payer_type == payer_type)
+    if group_by not in REVENUE_PERIODS:
+        raise ValueError(f"Invalid group_by {group_by!r}, expected one of {REVENUE_PERIODS}")
+
+    if group_by == 'day':
+        period = FactDailyInvoice.fact_date
+    else:
+        period = sql_func.date(
+            sql_func.date_trunc(literal_column(f"'{group_by}'"), FactDailyInvoice.fact_date)
+        )
+
+    stmt = select(
+        period.label('period'),
+        sql_func.sum(FactDailyInvoice.total_amount).label('total_billed'),
+        sql_func.sum(FactDailyInvoice.paid_amount).label('total_collected'),
+        sql_func.sum(FactDailyInvoice.invoice_count).label('invoice_count'),
+    ).where(
+        and_(
+            FactDailyInvoice.fact_date >= start_date,
+            FactDailyInvoice.fact_date <= end_date,
+            FactDailyInvoice.status.notin_(NON_REVENUE_INVOICE_STATUSES),
+        )
+    )
 
-    # stmt = stmt.group_by(sql_func.date(Invoice.invoice_date))
-    # stmt = stmt.order_by(sql_func.date(Invoice.invoice_date))
+    if department is not None:
+        stmt = stmt.where(FactDailyInvoice.department == department)
+    if payer_type:
+        stmt = stmt.where(FactDailyInvoice.payer_type == payer_type)
 
-    # result = await db.execute(stmt)
-    # daily_data = result.all()
+    stmt = stmt.group_by(period).order_by(period)
 
-    # # Calculate totals
-    # total_billed = sum(row.total_billed or Decimal('0') for row in daily_data)
-    # total_collected = sum(row.total_collected or Decimal('0') for row in daily_data)
-    # total_invoices = sum(row.invoice_count for row in daily_data)
-    # collection_rate = (total_collected / total_billed * 100) if total_billed > 0 else Decimal('0')
+    result = await db.execute(stmt)
+    rows = result.all()
 
-    # return {
-    #     'start_date': start_date,
-    #     'end_date': end_date,
-    #     'total_billed': total_billed,
-    #     'total_collected': total_collected,
-    #     'total_invoices': total_invoices,
-    #     'collection_rate': collection_rate,
-    #     'outstanding': total_billed - total_collected,
-    #     'daily_breakdown': [
-    #         {
-    #             'date': str(row.date),
-    #             'billed': row.total_billed,
-    #             'collected': row.total_collected,
-    #             'count': row.invoice_count,
-    #         }
-    #         for row in daily_data
-    #     ],
-    # }
+    total_billed = sum((row.total_billed or Decimal('0') for row in rows), Decimal('0.00'))
+    total_collected = sum((row.total_collected or Decimal('0') for row in rows), Decimal('0.00'))
+    total_invoices = sum(int(row.invoice_count or 0) for row in rows)
+    collection_rate = (
+        (total_collected / total_billed * 100).quantize(Decimal('0.01'))
+        if total_billed > 0 else Decimal('0.00')
+    )
 
     return {
         'start_date': start_date,
         'end_date': end_date,
-        'total_billed': Decimal('0.00'),
-        'total_collected': Decimal('0.00'),
-        'total_invoices': 0,
-        'collection_rate': Decimal('0.00'),
-        'outstanding': Decimal('0.00'),
-        'daily_breakdown': [],
+        'group_by': group_by,
+        'total_billed': total_billed,
+        'total_collected': total_collected,
+        'total_invoices': total_invoices,
+        'collection_rate': collection_rate,
+        'outstanding': total_billed - total_collected,
+        'daily_breakdown': [
+            {
+                'date': str(row.period),
+                'billed': row.total_billed or Decimal('0.00'),
+                'collected': row.total_collected or Decimal('0.00'),
+                'count': int(row.invoice_count or 0),
+            }
+            for row in rows
+        ],
     }
 
 
@@ -1571,6 +1594,11 @@ async def get_aging_report(
     """
     Generate accounts receivable aging report.
 
+    Invoices are aged from their invoice date. Without a patient filter the
+    buckets come from the daily invoice facts (current balances, aged as
+    of the report date); with one, the patient's open invoices are read
+    directly and listed in details.
+
     Args:
         db: Database session
         as_of_date: Report date (default: today)
@@ -1579,76 +1607,68 @@ async def get_aging_report(
     Returns:
         Aging report data
     """
-    # report_date = as_of_date or date.today()
-
-    # # Define aging buckets
-    # buckets = {
-    #     '0_30': 0,
-    #     '31_60': 0,
-    #     '61_90': 0,
-    #     '91_plus': 0,
-    # }
-
-    # stmt = select(Invoice).where(
-    #     and_(
-    #         Invoice.status.in_(['approved', 'partial_payment']),
-    #         Invoice.balance_due > 0
-    #     )
-    # )
-
-    # if patient_id:
-    #     stmt = stmt.where(Invoice.patient_id == patient_id)
-
-    # result = await db.execute(stmt)
-    # invoices = result.scalars().all()
-
-    # aging_details = []
-    # total_outstanding = Decimal('0.00')
-
-    # for invoice in invoices:
-    #     days_overdue = (report_date - invoice.due_date).days
-
-    #     if days_overdue <= 30:
-    #         bucket = '0_30'
-    #     elif days_overdue <= 60:
-    #         bucket = '31_60'
-    #     elif days_overdue <= 90:
-    #         bucket = '61_90'
-    #     else:
-    #         bucket = '91_plus'
-
-    #     buckets[bucket] += invoice.balance_due
-    #     total_outstanding += invoice.balance_due
-
-    #     aging_details.append({
-    #         'invoice_id': invoice.id,
-    #         'invoice_number': invoice.invoice_number,
-    #         'patient_id': invoice.patient_id,
-    #         'due_date': invoice.due_date,
-    #         'days_overdue': days_overdue,
-    #         'balance_due': invoice.balance_due,
-    #         'bucket': bucket,
-    #     })
-
-    # return {
-    #     'as_of_date': report_date,
-    #     'total_outstanding': total_outstanding,
-    #     'aging_buckets': buckets,
-    #     'invoice_count': len(invoices),
-    #     'details': aging_details,
-    # }
+    report_date = as_of_date or date.today()
+    buckets = dict((key, Decimal('0.00')) for key, _ in AGING_BUCKETS)
+    details = []
+
+    if patient_id:
+        stmt = select(
+            Invoice.id,
+            Invoice.invoice_number,
+            Invoice.invoice_date,
+            Invoice.due_date,
+            Invoice.balance_due,
+        ).where(
+            and_(
+                Invoice.patient_id == patient_id,
+                Invoice.status.in_(OPEN_INVOICE_STATUSES),
+                Invoice.balance_due > 0,
+                Invoice.invoice_date <= report_date,
+            )
+        ).order_by(Invoice.invoice_date)
+
+        result = await db.execute(stmt)
+        for row in result.all():
+            days_outstanding = (report_date - row.invoice_date).days
+            bucket = aging_bucket(days_outstanding)
+            buckets[bucket] += row.balance_due
+            details.append({
+                'invoice_id': row.id,
+                'invoice_number': row.invoice_number,
+                'patient_id': patient_id,
+                'invoice_date': row.invoice_date,
+                'due_date': row.due_date,
+                'days_outstanding': days_outstanding,
+                'balance_due': row.balance_due,
+                'bucket': bucket,
+            })
+        invoice_count = len(details)
+    else:
+        stmt = select(
+            FactDailyInvoice.fact_date,
+            sql_func.sum(FactDailyInvoice.balance_due).label('balance_due'),
+            sql_func.sum(FactDailyInvoice.invoice_count).label('invoice_count'),
+        ).where(
+            and_(
+                FactDailyInvoice.status.in_(OPEN_INVOICE_STATUSES),
+                FactDailyInvoice.balance_due > 0,
+                FactDailyInvoice.fact_date <= report_date,
+            )
+        ).group_by(FactDailyInvoice.fact_date)
+
+        result = await db.execute(stmt)
+        invoice_count = 0
+        for row in result.all():
+            bucket = aging_bucket((report_date - row.fact_date).days)
+            buckets[bucket] += row.balance_due or Decimal('0')
+            invoice_count += int(row.invoice_count or 0)
 
     return {
-        'as_of_date': as_of_date or date.today(),
-        'total_outstanding': Decimal('0.00'),
-        'aging_buckets': {
-            '0_30': Decimal('0.00'),
-            '31_60': Decimal('0.00'),
-            '61_90': Decimal('0.00'),
-            '91_plus': Decimal('0.00'),
-        },
-        'invoice_count': 0,
-        'details': [],
+        'as_of_date': report_date,
+        'total_outstanding': sum(buckets.values(), Decimal('0.00')),
+        'aging_buckets': buckets,
+        'invoice_count': invoice_count,
+        'details': details,
     }
 
 
@@ -1668,33 +1688,32 @@ async def get_payer_summary(
     Returns:
         List of payer summaries
     """
-    # stmt = select(
-    #     Invoice.payer_type,
-    #     sql_func.count(Invoice.id).label('invoice_count'),
-    #     sql_func.sum(Invoice.total_amount).label('total_billed'),
-    #     sql_func.sum(Invoice.amount_paid).label('total_collected'),
-    # ).where(
-    #     and_(
-    #         Invoice.invoice_date >= start_date,
-    #         Invoice.invoice_date <= end_date,
-    #     )
-    # ).group_by(Invoice.payer_type)
-
-    # result = await db.execute(stmt)
-    # rows = result.all()
-
-    # return [
-    #     {
-    #         'payer_type': row.payer_type,
-    #         'invoice_count': row.invoice_count,
-    #         'total_billed': row.total_billed or Decimal('0'),
-    #         'total_collected': row.total_collected or Decimal('0'),
-    #         'outstanding': (row.total_billed or Decimal('0')) - (row.total_collected or Decimal('0')),
-    #     }
-    #     for row in rows
-    # ]
-
-    return []
+    stmt = select(
+        FactDailyInvoice.payer_type,
+        sql_func.sum(FactDailyInvoice.invoice_count).label('invoice_count'),
+        sql_func.sum(FactDailyInvoice.total_amount).label('total_billed'),
+        sql_func.sum(FactDailyInvoice.paid_amount).label('total_collected'),
+    ).where(
+        and_(
+            FactDailyInvoice.fact_date >= start_date,
+            FactDailyInvoice.fact_date <= end_date,
+            FactDailyInvoice.status.notin_(NON_REVENUE_INVOICE_STATUSES),
+        )
+    ).group_by(FactDailyInvoice.payer_type).order_by(FactDailyInvoice.payer_type)
+
+    result = await db.execute(stmt)
+    rows = result.all()
+
+    return [
+        {
+            'payer_type': row.payer_type,
+            'invoice_count': int(row.invoice_count or 0),
+            'total_billed': row.total_billed or Decimal('0'),
+            'total_collected': row.total_collected or Decimal('0'),
+            'outstanding': (row.total_billed or Decimal('0')) - (row.total_collected or Decimal('0')),
+        }
+        for row in rows
+    ]
 
 
 # =============================================================================
@@ -22,6 +22,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from decimal import Decimal
 
+from app.models.reporting import FactDailyClaim
+from app.services.sequence_allocation import allocate_number
+
 # Import models when they are created
 # from app.models.bpjs_claims import (
 #     BPJSClaim, BPJSClaimItem, BPJSClaimDocument,
@@ -492,23 +495,10 @@ async def generate_claim_number(db: AsyncSession) -> str:
     Returns:
         Unique claim number
     """
-    # year = datetime.now().year
-    # pattern = f"CLAIM-{year}-%"
-
-    # stmt = select(sql_func.max(BPJSClaim.claim_number)).filter(
-    #     BPJSClaim.claim_number.like(pattern)
-    # )
-    # result = await db.execute(stmt)
-    # last_number = result.scalar()
-
-    # if last_number:
-    #     last_sequence = int(last_number.split('-')[-1])
-    #     new_sequence = last_sequence + 1
-    # else:
-    #     new_sequence = 1
+    today = date.today()
+    new_sequence = await allocate_number("bpjs_claim", on_date=today)
 
-    # return f"CLAIM-{year}-{new_sequence:05d}"
-    return f"CLAIM-{datetime.now().year}-00001"
+    return f"CLAIM-{today.year}-{new_sequence:05d}"
 
 
 async def generate_eclaim_data(
@@ -1692,6 +1682,20 @@ async def update_query_status(
 # Reporting
 # =============================================================================
 
+# Claim statuses reported together as pending in claim statistics
+PENDING_CLAIM_STATUSES = ('ready', 'processing', 'revision_requested')
+
+
+def _claim_facts_in_period(stmt, start_date: date, end_date: date):
+    """Restrict a daily claim fact query to a creation date range."""
+    return stmt.where(
+        and_(
+            FactDailyClaim.fact_date >= start_date,
+            FactDailyClaim.fact_date <= end_date,
+        )
+    )
+
+
 async def get_claim_statistics(
     db: AsyncSession,
     start_date: date,
@@ -1701,6 +1705,9 @@ async def get_claim_statistics(
     """
     Get comprehensive claim statistics for a date range.
 
+    Reads the daily claim facts. Claims carry no facility, so facility_id
+    is accepted for API compatibility but does not filter.
+
     Args:
         db: Database session
         start_date: Start date
@@ -1710,51 +1717,60 @@ async def get_claim_statistics(
     Returns:
         Statistics dictionary
     """
-    # stmt = select(BPJSClaim).where(
-    #     and_(
-    #         BPJSClaim.created_at >= start_date,
-    #         BPJSClaim.created_at <= end_date,
-    #     )
-    # )
-
-    # if facility_id:
-    #     stmt = stmt.where(BPJSClaim.facility_id == facility_id)
-
-    # result = await db.execute(stmt)
-    # claims = result.scalars().all()
-
-    # Calculate statistics
-    # total_claims = len(claims)
-    # submitted = len([c for c in claims if c.status == 'submitted'])
-    # verified = len([c for c in claims if c.status == 'verified'])
-    # approved = len([c for c in claims if c.status == 'approved'])
-    # paid = len([c for c in claims if c.status == 'paid'])
-    # rejected = len([c for c in claims if c.status == 'rejected'])
-
-    # total_amount = sum(c.total_amount or Decimal('0') for c in claims)
-    # approved_amount = sum(c.total_amount or Decimal('0') for c in claims if c.status == 'paid')
-    # pending_amount = sum(c.total_amount or Decimal('0') for c in claims if c.status in ['submitted', 'verified'])
+    stmt = _claim_facts_in_period(
+        select(
+            FactDailyClaim.status,
+            sql_func.sum(FactDailyClaim.claim_count).label('claim_count'),
+            sql_func.sum(FactDailyClaim.claimed_amount).label('claimed_amount'),
+            sql_func.sum(FactDailyClaim.approved_amount).label('approved_amount'),
+        ),
+        start_date,
+        end_date,
+    ).where(
+        FactDailyClaim.status != 'cancelled'
+    ).group_by(FactDailyClaim.status)
+
+    result = await db.execute(stmt)
+    rows = dict((row.status, row) for row in result.all())
+
+    def count(*statuses):
+        return sum(int(rows[s].claim_count or 0) for s in statuses if s in rows)
+
+    def amount(field, *statuses):
+        return sum(
+            (getattr(rows[s], field) or Decimal('0') for s in statuses if s in rows),
+            Decimal('0.00'),
+        )
+
+    total_claims = count(*rows)
+    approved = count('approved', 'paid')
+    rejected = count('rejected')
+
+    def rate(part):
+        if not total_claims:
+            return Decimal('0.00')
+        return (Decimal(part) / total_claims * 100).quantize(Decimal('0.01'))
 
     return {
         'period': {'start': start_date, 'end': end_date},
-        'total_claims': 0,
+        'total_claims': total_claims,
         'by_status': {
-            'draft': 0,
-            'pending': 0,
-            'submitted': 0,
-            'verified': 0,
-            'approved': 0,
-            'paid': 0,
-            'rejected': 0,
+            'draft': count('draft'),
+            'pending': count(*PENDING_CLAIM_STATUSES),
+            'submitted': count('submitted'),
+            'verified': count('verified'),
+            'approved': count('approved'),
+            'paid': count('paid'),
+            'rejected': rejected,
         },
         'amounts': {
-            'total_claimed': Decimal('0.00'),
-            'total_approved': Decimal('0.00'),
-            'total_paid': Decimal('0.00'),
-            'pending_payment': Decimal('0.00'),
+            'total_claimed': amount('claimed_amount', *rows),
+            'total_approved': amount('approved_amount', 'approved', 'paid'),
+            'total_paid': amount('approved_amount', 'paid'),
+            'pending_payment': amount('approved_amount', 'approved'),
         },
-        'approval_rate': Decimal('0.00'),
-        'rejection_rate': Decimal('0.00'),
+        'approval_rate': rate(approved),
+        'rejection_rate': rate(rejected),
     }
 
 
@@ -1774,32 +1790,28 @@ async def get_claim_summary_by_status(
     Returns:
         List of status summaries
     """
-    # stmt = select(
-    #     BPJSClaim.status,
-    #     sql_func.count(BPJSClaim.id).label('claim_count'),
-    #     sql_func.sum(BPJSClaim.total_amount).label('total_amount'),
-    #     sql_func.sum(BPJSClaim.cbg_rate).label('total_cbg_rate'),
-    # ).where(
-    #     and_(
-    #         BPJSClaim.created_at >= start_date,
-    #         BPJSClaim.created_at <= end_date,
-    #     )
-    # ).group_by(BPJSClaim.status)
-
-    # result = await db.execute(stmt)
-    # rows = result.all()
-
-    # return [
-    #     {
-    #         'status': row.status,
-    #         'claim_count': row.claim_count,
-    #         'total_amount': row.total_amount or Decimal('0'),
-    #         'total_cbg_rate': row.total_cbg_rate or Decimal('0'),
-    #     }
-    #     for row in rows
-    # ]
-
-    return []
+    stmt = _claim_facts_in_period(
+        select(
+            FactDailyClaim.status,
+            sql_func.sum(FactDailyClaim.claim_count).label('claim_count'),
+            sql_func.sum(FactDailyClaim.claimed_amount).label('total_amount'),
+            sql_func.sum(FactDailyClaim.approved_amount).label('total_approved'),
+        ),
+        start_date,
+        end_date,
+    ).group_by(FactDailyClaim.status).order_by(FactDailyClaim.status)
+
+    result = await db.execute(stmt)
+
+    return [
+        {
+            'status': row.status,
+            'claim_count': int(row.claim_count or 0),
+            'total_amount': row.total_amount or Decimal('0'),
+            'total_approved': row.total_approved or Decimal('0'),
+        }
+        for row in result.all()
+    ]
 
 
 async def get_claim_summary_by_package(
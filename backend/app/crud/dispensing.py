@@ -23,6 +23,7 @@ from app.models.dispensing import (
 )
 from app.models.prescription import Prescription, PrescriptionItem, BasicPrescriptionTransmission
 from app.models.inventory import Drug
+from app.crud.inventory import dispense_stock
 from app.models.user import User
 from app.schemas.dispensing import (
     DispensingStatus, DispensePriority, VerificationStatus,
@@ -710,12 +711,24 @@ async def complete_dispensing(
 
     # Mark items as dispensed
     items_dispensed = 0
+    requested = {}
     for item in prescription.items:
         if not completion.partial_dispense or item.id not in (completion.partial_dispense_items or []):
+            if item.dispense_status != "dispensed":
+                requested[item.drug_id] = requested.get(item.drug_id, 0) + (item.quantity or 0)
             item.dispense_status = "dispensed"
             item.quantity_dispensed = item.quantity
             items_dispensed += 1
 
+    # Deduct stock FEFO for all newly dispensed items together
+    await dispense_stock(
+        db,
+        requested,
+        user_id=completion.dispenser_id,
+        reference_number=prescription.prescription_number,
+        reference_type="prescription",
+    )
+
     await db.commit()
     await db.refresh(queue_item)
 
@@ -13,6 +13,7 @@ from app.models.problem_list import ProblemList
 from app.models.patient import Patient
 from app.models.user import User
 from app.models.encounter import Encounter
+from app.services.icd10_index import icd10_index
 
 
 async def search_icd10_codes(
@@ -26,6 +27,9 @@ async def search_icd10_codes(
     """
     Search ICD-10 codes by code or description.
 
+    Served from the in-memory ICD-10 index once it is loaded; the database
+    is only queried before that.
+
     Args:
         db: Database session
         query: Search query
@@ -37,6 +41,15 @@ async def search_icd10_codes(
     Returns:
         Tuple of (list of codes, total count)
     """
+    if icd10_index.ready:
+        return icd10_index.search(
+            query,
+            limit=limit,
+            chapter_filter=chapter_filter,
+            severity_filter=severity_filter,
+            common_only=common_only,
+        )
+
     # Build search query with full-text search
     search_query = f"%{query}%"
 
@@ -210,6 +223,8 @@ async def create_problem(
     db.add(problem)
     await db.commit()
     await db.refresh(problem)
+
+    icd10_index.record_usage(icd10_code_id)
     return problem
 
 
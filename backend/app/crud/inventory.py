@@ -6,14 +6,17 @@ stock transactions, and purchase orders.
 from datetime import datetime, date, timezone, timedelta
 from typing import List, Optional, Dict, Any, Tuple
 from decimal import Decimal
-from sqlalchemy import select, and_, desc, func, case, cast, Integer
+from sqlalchemy import select, update, and_, desc, func, cast, Integer, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.inventory import (
     Drug, DrugBatch, Supplier, StockTransaction, StockTransactionItem,
     PurchaseOrder, PurchaseOrderItem, GoodsReceipt, GoodsReceiptItem, NearExpiryAlert,
+    DrugStockBalance,
 )
+from app.services.sequence_allocation import allocate_number
 from app.schemas.inventory import (
     DrugCreate, DrugUpdate, DrugResponse,
     DrugBatchCreate, DrugBatchResponse,
@@ -144,17 +147,230 @@ async def get_current_stock(
     db: AsyncSession,
     drug_id: int,
 ) -> int:
-    """Get current stock level for a drug."""
-    stmt = select(func.sum(DrugBatch.quantity)).where(
+    """Get current stock level for a drug from its maintained balance."""
+    stmt = select(Drug.stock_on_hand).where(Drug.id == drug_id)
+    result = await db.execute(stmt)
+    stock = result.scalar()
+    return stock or 0
+
+
+# =============================================================================
+# Stock Balances
+# =============================================================================
+
+# Days of expiries re-checked by the nightly roll-off, so a missed run is caught up
+EXPIRY_ROLL_OFF_LOOKBACK_DAYS = 7
+
+
+def batch_counts_toward_stock(batch: DrugBatch, today: Optional[date] = None) -> bool:
+    """Whether a batch is part of the usable stock (not quarantined or expired)."""
+    today = today or date.today()
+    return not batch.is_quarantined and batch.expiry_date >= today
+
+
+def _usable_batch_conditions(today: date) -> list:
+    """SQL form of batch_counts_toward_stock."""
+    return [
+        DrugBatch.is_quarantined == False,
+        DrugBatch.expiry_date >= today,
+    ]
+
+
+async def apply_stock_delta(
+    db: AsyncSession,
+    drug_id: int,
+    location: Optional[str],
+    delta: int,
+) -> int:
+    """
+    Adjust the maintained stock balances of a drug.
+
+    Runs in the caller's transaction, so the balance commits or rolls back
+    together with the batch change. The drug row stays locked until then,
+    which serializes concurrent movements of the same drug.
+
+    Returns the drug's stock after the change.
+    """
+    result = await db.execute(
+        update(Drug)
+        .where(Drug.id == drug_id)
+        .values(stock_on_hand=Drug.stock_on_hand + delta)
+        .returning(Drug.stock_on_hand)
+    )
+    stock = result.scalar() or 0
+
+    if delta:
+        now = datetime.now(timezone.utc)
+        stmt = pg_insert(DrugStockBalance).values(
+            drug_id=drug_id,
+            location=location or "",
+            on_hand=delta,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DrugStockBalance.drug_id, DrugStockBalance.location],
+            set_={
+                "on_hand": DrugStockBalance.on_hand + stmt.excluded.on_hand,
+                "updated_at": now,
+            },
+        )
+        await db.execute(stmt)
+
+    return stock
+
+
+async def get_stock_balances(
+    db: AsyncSession,
+    drug_id: int,
+) -> Dict[str, int]:
+    """Get the on-hand balance of a drug per bin location ("" when unassigned)."""
+    stmt = select(DrugStockBalance.location, DrugStockBalance.on_hand).where(
+        and_(
+            DrugStockBalance.drug_id == drug_id,
+            DrugStockBalance.on_hand != 0,
+        )
+    ).order_by(DrugStockBalance.location)
+    result = await db.execute(stmt)
+    return {row.location: row.on_hand for row in result.all()}
+
+
+async def reconcile_stock_balances(
+    db: AsyncSession,
+    drug_ids: Optional[List[int]] = None,
+) -> Dict[str, int]:
+    """
+    Correct stock balances that differ from the batch sums.
+
+    Each comparison is a single statement, so it reads batches and balances
+    from one snapshot; corrections are applied as deltas and stay right if
+    other movements commit meanwhile.
+
+    Args:
+        db: Database session
+        drug_ids: Limit to these drugs (all drugs if omitted)
+
+    Returns:
+        Number of drug totals and location balances corrected
+    """
+    today = date.today()
+    batch_conditions = _usable_batch_conditions(today)
+    if drug_ids is not None:
+        if not drug_ids:
+            return {'drugs_corrected': 0, 'locations_corrected': 0}
+        batch_conditions.append(DrugBatch.drug_id.in_(drug_ids))
+
+    # Drug totals
+    batch_totals = select(
+        DrugBatch.drug_id,
+        func.sum(DrugBatch.quantity).label('on_hand'),
+    ).where(and_(*batch_conditions)).group_by(DrugBatch.drug_id).subquery()
+
+    expected = func.coalesce(batch_totals.c.on_hand, 0)
+    drug_stmt = select(
+        Drug.id,
+        (expected - Drug.stock_on_hand).label('delta'),
+    ).outerjoin(
+        batch_totals, batch_totals.c.drug_id == Drug.id
+    ).where(expected != Drug.stock_on_hand)
+    if drug_ids is not None:
+        drug_stmt = drug_stmt.where(Drug.id.in_(drug_ids))
+    drug_deltas = (await db.execute(drug_stmt.order_by(Drug.id))).all()
+
+    for row in drug_deltas:
+        await db.execute(
+            update(Drug)
+            .where(Drug.id == row.id)
+            .values(stock_on_hand=Drug.stock_on_hand + row.delta)
+        )
+
+    # Location balances
+    location = func.coalesce(DrugBatch.bin_location, literal_column("''"))
+    batch_locations = select(
+        DrugBatch.drug_id,
+        location.label('location'),
+        func.sum(DrugBatch.quantity).label('on_hand'),
+    ).where(and_(*batch_conditions)).group_by(DrugBatch.drug_id, location).subquery()
+
+    balances = select(DrugStockBalance)
+    if drug_ids is not None:
+        balances = balances.where(DrugStockBalance.drug_id.in_(drug_ids))
+    balances = balances.subquery()
+
+    expected = func.coalesce(batch_locations.c.on_hand, 0)
+    actual = func.coalesce(balances.c.on_hand, 0)
+    location_stmt = select(
+        func.coalesce(batch_locations.c.drug_id, balances.c.drug_id).label('drug_id'),
+        func.coalesce(batch_locations.c.location, balances.c.location).label('location'),
+        (expected - actual).label('delta'),
+    ).select_from(
+        batch_locations.outerjoin(
+            balances,
+            and_(
+                balances.c.drug_id == batch_locations.c.drug_id,
+                balances.c.location == batch_locations.c.location,
+            ),
+            full=True,
+        )
+    ).where(expected != actual).order_by('drug_id', 'location')
+    location_deltas = (await db.execute(location_stmt)).all()
+
+    if location_deltas:
+        now = datetime.now(timezone.utc)
+        stmt = pg_insert(DrugStockBalance)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DrugStockBalance.drug_id, DrugStockBalance.location],
+            set_={
+                "on_hand": DrugStockBalance.on_hand + stmt.excluded.on_hand,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        await db.execute(stmt, [
+            {
+                "drug_id": row.drug_id,
+                "location": row.location,
+                "on_hand": row.delta,
+                "updated_at": now,
+            }
+            for row in location_deltas
+        ])
+
+    await db.commit()
+
+    return {
+        'drugs_corrected': len(drug_deltas),
+        'locations_corrected': len(location_deltas),
+    }
+
+
+async def roll_off_expired_stock(
+    db: AsyncSession,
+    lookback_days: int = EXPIRY_ROLL_OFF_LOOKBACK_DAYS,
+) -> Dict[str, int]:
+    """
+    Remove batches that expired recently from the stock balances.
+
+    Batches stop counting the day after their expiry date; this recomputes
+    the balances of the drugs with batches that expired in the last
+    lookback_days. Running it again is harmless.
+
+    Returns:
+        Number of drugs checked and balances corrected
+    """
+    today = date.today()
+    stmt = select(DrugBatch.drug_id).where(
         and_(
-            DrugBatch.drug_id == drug_id,
             DrugBatch.is_quarantined == False,
-            DrugBatch.expiry_date >= date.today(),
+            DrugBatch.quantity != 0,
+            DrugBatch.expiry_date >= today - timedelta(days=lookback_days),
+            DrugBatch.expiry_date < today,
         )
-    )
+    ).distinct()
     result = await db.execute(stmt)
-    stock = result.scalar()
-    return stock or 0
+    drug_ids = list(result.scalars().all())
+
+    corrected = await reconcile_stock_balances(db, drug_ids)
+    corrected['drugs_checked'] = len(drug_ids)
+    return corrected
 
 
 # =============================================================================
@@ -219,6 +435,8 @@ async def create_batch(
     )
 
     db.add(batch)
+    if batch_counts_toward_stock(batch):
+        await apply_stock_delta(db, batch.drug_id, batch.bin_location, batch.quantity)
     await db.commit()
     await db.refresh(batch)
 
@@ -322,38 +540,20 @@ async def get_low_stock_drugs(
     db: AsyncSession,
 ) -> List[Dict[str, Any]]:
     """Get drugs below minimum stock level."""
+    # Matches the ix_drugs_stock_shortfall expression index
     stmt = select(
         Drug.id,
         Drug.generic_name,
         Drug.drug_code,
         Drug.min_stock_level,
         Drug.reorder_point,
-        func.coalesce(func.sum(
-            case(
-                (and_(
-                    DrugBatch.is_quarantined == False,
-                    DrugBatch.expiry_date >= date.today(),
-                ), DrugBatch.quantity),
-                else_=0
-            )
-        ), 0).label('current_stock'),
-    ).outerjoin(
-        DrugBatch, Drug.id == DrugBatch.drug_id
+        Drug.stock_on_hand.label('current_stock'),
     ).where(
-        Drug.is_active == True
-    ).group_by(
-        Drug.id, Drug.generic_name, Drug.drug_code, Drug.min_stock_level, Drug.reorder_point
-    ).having(
-        func.coalesce(func.sum(
-            case(
-                (and_(
-                    DrugBatch.is_quarantined == False,
-                    DrugBatch.expiry_date >= date.today(),
-                ), DrugBatch.quantity),
-                else_=0
-            )
-        ), 0) < Drug.min_stock_level
-    ).order_by('current_stock')
+        and_(
+            Drug.is_active == True,
+            Drug.stock_on_hand - Drug.min_stock_level < 0,
+        )
+    ).order_by(Drug.stock_on_hand)
 
     result = await db.execute(stmt)
     rows = result.all()
@@ -382,8 +582,7 @@ async def create_stock_transaction(
     user_id: Optional[int] = None,
 ) -> StockTransaction:
     """Create a stock transaction and update inventory."""
-    # Generate transaction number
-    transaction_number = f"TXN-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    transaction_number = await generate_transaction_number()
 
     transaction = StockTransaction(
         transaction_number=transaction_number,
@@ -399,19 +598,23 @@ async def create_stock_transaction(
 
     # Process items
     for item_data in transaction_data.items:
-        # Calculate quantity before
-        current_stock = await get_current_stock(db, item_data.drug_id)
-
-        # Get or create batch if provided
-        batch_id = item_data.batch_id
+        # Update batch quantity and the stock balance it counts toward
+        delta = 0
+        location = None
         if item_data.batch_id:
-            # Update batch quantity
-            batch_stmt = select(DrugBatch).where(DrugBatch.id == item_data.batch_id)
+            batch_stmt = select(DrugBatch).where(
+                DrugBatch.id == item_data.batch_id
+            ).with_for_update()
             batch_result = await db.execute(batch_stmt)
             batch = batch_result.scalar_one_or_none()
             if batch:
                 batch.quantity += item_data.quantity
                 batch.updated_at = datetime.now(timezone.utc)
+                if batch_counts_toward_stock(batch):
+                    delta = item_data.quantity
+                    location = batch.bin_location
+
+        current_stock = await apply_stock_delta(db, item_data.drug_id, location, delta) - delta
 
         # Create transaction item
         item_total = (item_data.unit_cost or Decimal('0')) * abs(item_data.quantity)
@@ -436,6 +639,178 @@ async def create_stock_transaction(
     return transaction
 
 
+async def generate_transaction_number() -> str:
+    """Generate a unique stock transaction number (TXN-YYYYMMDD-NNNNN)."""
+    today = date.today()
+    sequence = await allocate_number("stock_transaction", on_date=today)
+    return f"TXN-{today.strftime('%Y%m%d')}-{sequence:05d}"
+
+
+# =============================================================================
+# FEFO Dispensing Allocation
+# =============================================================================
+
+class InsufficientStockError(ValueError):
+    """Raised when usable batches cannot cover a dispensing request."""
+
+    def __init__(self, shortages: Dict[int, int]):
+        self.shortages = shortages
+        super().__init__(
+            "Insufficient stock for drug(s): " + ", ".join(
+                f"{drug_id} (short {quantity})" for drug_id, quantity in sorted(shortages.items())
+            )
+        )
+
+
+def allocate_fefo(
+    batches: List[Any],
+    requested: Dict[int, int],
+) -> Tuple[List[Tuple[Any, int]], Dict[int, int]]:
+    """
+    Split requested quantities across batches, earliest expiry first.
+
+    Args:
+        batches: Candidate batches (with drug_id and quantity), in FEFO order
+        requested: Quantity still needed per drug ID
+
+    Returns:
+        Tuple of ([(batch, quantity)], quantity still short per drug ID)
+    """
+    remaining = {drug_id: quantity for drug_id, quantity in requested.items() if quantity > 0}
+    allocations = []
+
+    for batch in batches:
+        needed = remaining.get(batch.drug_id, 0)
+        if needed <= 0 or batch.quantity <= 0:
+            continue
+        take = min(batch.quantity, needed)
+        allocations.append((batch, take))
+        remaining[batch.drug_id] = needed - take
+
+    return allocations, {drug_id: quantity for drug_id, quantity in remaining.items() if quantity > 0}
+
+
+async def _lock_fefo_batches(
+    db: AsyncSession,
+    drug_ids: List[int],
+    skip_locked: bool,
+) -> List[DrugBatch]:
+    """Lock the usable batches of the given drugs in FEFO order."""
+    conditions = _usable_batch_conditions(date.today()) + [
+        DrugBatch.drug_id.in_(drug_ids),
+        DrugBatch.quantity > 0,
+    ]
+
+    stmt = select(DrugBatch).where(
+        and_(*conditions)
+    ).order_by(
+        DrugBatch.drug_id, DrugBatch.expiry_date, DrugBatch.id
+    ).with_for_update(
+        skip_locked=skip_locked
+    ).execution_options(populate_existing=True)
+
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def dispense_stock(
+    db: AsyncSession,
+    requested: Dict[int, int],
+    user_id: Optional[int] = None,
+    reference_number: Optional[str] = None,
+    reference_type: Optional[str] = None,
+    allow_partial: bool = False,
+) -> Optional[StockTransaction]:
+    """
+    Allocate and deduct stock for a set of drugs, earliest expiry first.
+
+    All drugs of a request (e.g. a prescription) are first allocated with
+    one SELECT ... FOR UPDATE SKIP LOCKED in a savepoint, so concurrent
+    dispensers take different batches instead of queueing on the same one.
+    If that leaves a drug short, the savepoint is rolled back, releasing
+    those locks, and the batches are locked again waiting for other
+    dispensers. Waiting locks are always taken in (drug_id, expiry_date, id)
+    order with nothing else held, so two dispensers cannot deadlock.
+    Batches only change while locked, so stock can never be oversold.
+
+    Runs in the caller's transaction and does not commit.
+
+    Args:
+        db: Database session
+        requested: Quantity to dispense per drug ID
+        user_id: Dispensing user
+        reference_number: Source document number (e.g. prescription number)
+        reference_type: Source document type (e.g. "prescription")
+        allow_partial: Dispense what is available instead of raising
+
+    Returns:
+        The confirmed "sale" stock transaction, one item per batch used,
+        or None if nothing was dispensed
+
+    Raises:
+        InsufficientStockError: If stock is short and allow_partial is False
+    """
+    drug_ids = sorted(drug_id for drug_id, quantity in requested.items() if quantity > 0)
+    allocations = []
+    shortages = {}
+
+    if drug_ids:
+        savepoint = await db.begin_nested()
+        batches = await _lock_fefo_batches(db, drug_ids, skip_locked=True)
+        allocations, shortages = allocate_fefo(batches, requested)
+
+        if shortages:
+            await savepoint.rollback()
+            batches = await _lock_fefo_batches(db, drug_ids, skip_locked=False)
+            allocations, shortages = allocate_fefo(batches, requested)
+        else:
+            await savepoint.commit()
+
+    if shortages and not allow_partial:
+        raise InsufficientStockError(shortages)
+    if not allocations:
+        return None
+
+    transaction = StockTransaction(
+        transaction_number=await generate_transaction_number(),
+        transaction_type='sale',
+        transaction_date=date.today(),
+        reference_number=reference_number,
+        reference_type=reference_type,
+        status='confirmed',
+        created_by=user_id,
+        confirmed_by=user_id,
+        confirmed_at=datetime.now(timezone.utc),
+    )
+    db.add(transaction)
+    await db.flush()
+
+    now = datetime.now(timezone.utc)
+    total_cost = Decimal('0')
+    for batch, quantity in sorted(allocations, key=lambda allocation: allocation[0].drug_id):
+        batch.quantity -= quantity
+        batch.updated_at = now
+        stock_after = await apply_stock_delta(db, batch.drug_id, batch.bin_location, -quantity)
+
+        item_total = (batch.unit_cost or Decimal('0')) * quantity
+        total_cost += item_total
+        db.add(StockTransactionItem(
+            transaction_id=transaction.id,
+            drug_id=batch.drug_id,
+            batch_id=batch.id,
+            quantity=-quantity,
+            quantity_before=stock_after + quantity,
+            quantity_after=stock_after,
+            unit_cost=batch.unit_cost,
+            total_cost=item_total,
+        ))
+
+    transaction.total_cost = total_cost
+    await db.flush()
+
+    return transaction
+
+
 async def list_stock_transactions(
     db: AsyncSession,
     query: StockMovementQuery,
@@ -544,13 +919,8 @@ async def get_inventory_summary(
     total_drugs_stmt = select(func.count(Drug.id)).where(Drug.is_active == True)
     total_drugs = await db.scalar(total_drugs_stmt) or 0
 
-    # Total items (sum of all batch quantities)
-    total_items_stmt = select(func.coalesce(func.sum(DrugBatch.quantity), 0)).where(
-        and_(
-            DrugBatch.is_quarantined == False,
-            DrugBatch.expiry_date >= date.today(),
-        )
-    )
+    # Total items (sum of the maintained stock balances)
+    total_items_stmt = select(func.coalesce(func.sum(Drug.stock_on_hand), 0))
     total_items = await db.scalar(total_items_stmt) or 0
 
     # Total value
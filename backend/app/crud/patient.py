@@ -4,12 +4,19 @@ This module provides CRUD operations for Patient, EmergencyContact, and PatientI
 All functions are async and follow SQLAlchemy 2.0 patterns.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, func, or_, case, tuple_
 from typing import Optional, List, Tuple
-from datetime import datetime
+from datetime import date, datetime
+import base64
+import json
 
 from app.models.patient import Patient, EmergencyContact, PatientInsurance
 from app.schemas.patient import PatientCreate, PatientUpdate
+from app.services.patient_deduplication import get_deduplication_service
+from app.services.sequence_allocation import allocate_number
+
+# Fields that feed the duplicate-detection blocking keys
+BLOCKING_KEY_FIELDS = ("full_name", "phone", "date_of_birth")
 
 
 async def get_patient_by_id(db: AsyncSession, patient_id: int) -> Optional[Patient]:
@@ -63,12 +70,111 @@ async def get_patient_by_nik(db: AsyncSession, nik: str) -> Optional[Patient]:
     return result.scalar_one_or_none()
 
 
+def encode_patient_cursor(patient: Patient) -> str:
+    """
+    Encode a keyset pagination cursor pointing after the given patient.
+
+    Args:
+        patient: Last patient of the current page
+
+    Returns:
+        Opaque URL-safe cursor string
+    """
+    payload = json.dumps({"c": patient.created_at.isoformat(), "i": patient.id})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_patient_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a keyset pagination cursor.
+
+    Args:
+        cursor: Cursor produced by encode_patient_cursor
+
+    Returns:
+        Tuple of (created_at, id) of the last seen patient
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor}") from e
+
+
+def _search_filter(search_term: str, fuzzy: bool = False):
+    """
+    Build the search predicate over name, phone, MRN and NIK.
+
+    Leading-wildcard ILIKE is served by the pg_trgm GIN indexes created in
+    migration 20250116000021. With fuzzy=True the trigram similarity
+    operator (%) is added so that misspelled names still match.
+    """
+    search_pattern = f"%{search_term}%"
+    conditions = [
+        Patient.full_name.ilike(search_pattern),
+        Patient.phone.ilike(search_pattern),
+        Patient.medical_record_number.ilike(search_pattern),
+        Patient.nik.ilike(search_pattern),
+    ]
+    if fuzzy:
+        conditions.append(Patient.full_name.op("%")(search_term))
+    return or_(*conditions)
+
+
+def _search_rank(search_term: str):
+    """
+    Rank expression for ranked search: exact MRN/NIK first, then prefix
+    matches, then everything else (fuzzy name matches).
+    """
+    prefix_pattern = f"{search_term}%"
+    return case(
+        (or_(Patient.medical_record_number == search_term, Patient.nik == search_term), 0),
+        (
+            or_(
+                Patient.full_name.ilike(prefix_pattern),
+                Patient.medical_record_number.ilike(prefix_pattern),
+                Patient.phone.ilike(prefix_pattern),
+            ),
+            1,
+        ),
+        else_=2,
+    )
+
+
+async def _estimate_row_count(db: AsyncSession, query) -> int:
+    """
+    Estimate the number of rows a query returns from the planner statistics.
+
+    Runs EXPLAIN instead of count(*), so the cost is independent of table size.
+
+    Args:
+        db: Database session
+        query: SELECT statement to estimate
+
+    Returns:
+        Planner row estimate
+    """
+    connection = await db.connection()
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 async def search_patients(
     db: AsyncSession,
     search_term: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    is_active: bool = True
+    is_active: bool = True,
+    cursor: Optional[str] = None,
+    ranked: bool = False,
+    estimate_total: bool = False
 ) -> Tuple[List[Patient], int]:
     """
     Search patients by name, phone, MRN, or NIK with pagination.
@@ -76,49 +182,57 @@ async def search_patients(
     Args:
         db: Database session
         search_term: Search term (matches name, phone, MRN, or NIK)
-        skip: Number of records to skip (for pagination)
+        skip: Number of records to skip (ignored when cursor is given)
         limit: Maximum number of records to return
         is_active: Filter by active status
+        cursor: Keyset cursor from encode_patient_cursor (newest-first listing only)
+        ranked: Order by relevance (exact MRN/NIK, prefix, fuzzy name) instead of recency
+        estimate_total: Return the planner row estimate instead of an exact count
 
     Returns:
         Tuple of (list of patients, total count)
+
+    Raises:
+        ValueError: If the cursor is malformed or combined with ranked search
     """
+    if cursor and ranked:
+        raise ValueError("Cursor pagination is not supported for ranked search")
+
     # Build base query
     query = select(Patient).filter(Patient.is_active == is_active)
-    count_query = select(func.count(Patient.id)).filter(Patient.is_active == is_active)
 
     # Add search conditions if search_term is provided
     if search_term:
-        search_pattern = f"%{search_term}%"
-        query = query.filter(
-            or_(
-                Patient.full_name.ilike(search_pattern),
-                Patient.phone.ilike(search_pattern),
-                Patient.medical_record_number.ilike(search_pattern),
-                Patient.nik.ilike(search_pattern)
-            )
+        query = query.filter(_search_filter(search_term, fuzzy=ranked))
+
+    # Get total count before the page window is applied
+    if estimate_total:
+        total = await _estimate_row_count(db, query)
+    else:
+        total_result = await db.execute(
+            select(func.count()).select_from(query.with_only_columns(Patient.id).subquery())
         )
-        count_query = count_query.filter(
-            or_(
-                Patient.full_name.ilike(search_pattern),
-                Patient.phone.ilike(search_pattern),
-                Patient.medical_record_number.ilike(search_pattern),
-                Patient.nik.ilike(search_pattern)
+        total = total_result.scalar()
+
+    if ranked and search_term:
+        query = query.order_by(
+            _search_rank(search_term),
+            func.similarity(Patient.full_name, search_term).desc(),
+            Patient.id.desc()
+        ).offset(skip)
+    else:
+        # Order by most recently created; id breaks ties for stable keyset paging
+        query = query.order_by(Patient.created_at.desc(), Patient.id.desc())
+        if cursor:
+            last_created_at, last_id = decode_patient_cursor(cursor)
+            query = query.filter(
+                tuple_(Patient.created_at, Patient.id) < tuple_(last_created_at, last_id)
             )
-        )
-
-    # Order by most recently created
-    query = query.order_by(Patient.created_at.desc())
-
-    # Get total count
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
-    # Apply pagination
-    query = query.offset(skip).limit(limit)
+        else:
+            query = query.offset(skip)
 
     # Execute query
-    result = await db.execute(query)
+    result = await db.execute(query.limit(limit))
     patients = result.scalars().all()
 
     return list(patients), total
@@ -211,6 +325,9 @@ async def create_patient(db: AsyncSession, patient_in: PatientCreate) -> Patient
         )
         db.add(db_insurance)
 
+    # Index the new patient for duplicate detection
+    await get_deduplication_service(db).upsert_blocking_keys(db_patient)
+
     await db.commit()
     await db.refresh(db_patient)
 
@@ -294,6 +411,10 @@ async def update_patient(
             )
             db.add(db_insurance)
 
+    # Refresh duplicate-detection blocking keys if matching fields changed
+    if any(field in update_data for field in BLOCKING_KEY_FIELDS):
+        await get_deduplication_service(db).upsert_blocking_keys(db_patient)
+
     await db.commit()
     await db.refresh(db_patient)
 
@@ -331,32 +452,20 @@ async def generate_mrn(db: AsyncSession) -> str:
     Generate a unique Medical Record Number (MRN).
     Format: RM-YYYY-XXXXX (where XXXXX is a sequential number)
 
+    Numbers come from the shared yearly "patient_mrn" sequence, so no
+    table scan is needed and concurrent registrations cannot collide.
+
     Args:
         db: Database session
 
     Returns:
         Unique MRN string
     """
-    current_year = datetime.now().year
-
-    # Find the highest sequence number for the current year
-    mrn_pattern = f"RM-{current_year}-%"
-    result = await db.execute(
-        select(func.max(Patient.medical_record_number)).filter(
-            Patient.medical_record_number.like(mrn_pattern)
-        )
-    )
-    last_mrn = result.scalar()
-
-    if last_mrn:
-        # Extract sequence number from last MRN
-        last_sequence = int(last_mrn.split('-')[-1])
-        new_sequence = last_sequence + 1
-    else:
-        new_sequence = 1
+    today = date.today()
+    new_sequence = await allocate_number("patient_mrn", on_date=today)
 
     # Format: RM-YYYY-XXXXX (5-digit sequence with leading zeros)
-    mrn = f"RM-{current_year}-{new_sequence:05d}"
+    mrn = f"RM-{today.year}-{new_sequence:05d}"
 
     return mrn
 
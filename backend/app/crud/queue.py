@@ -31,6 +31,8 @@ from app.schemas.queue import (
     QueueNotificationRequest, QueueNotificationResponse,
     QueueTransferRequest, QueueCancelRequest,
 )
+from app.services.sequence_allocation import allocate_number
+from app.services.queue_display import queue_display_store
 
 
 # =============================================================================
@@ -67,6 +69,7 @@ async def create_queue_ticket(
 
     # Calculate queue position
     await _update_queue_positions(db, ticket.department, db_ticket.id)
+    queue_display_store.refresh_after_commit(db, db_ticket.department, db_ticket.poli_id)
 
     await db.commit()
     await db.refresh(db_ticket)
@@ -185,6 +188,7 @@ async def recall_queue_ticket(
         called_by_id=called_by_id,
     )
     db.add(recall)
+    queue_display_store.refresh_after_commit(db, ticket.department, ticket.poli_id)
 
     await db.commit()
     await db.refresh(ticket)
@@ -215,6 +219,7 @@ async def mark_ticket_served(
     ticket.status = QueueStatus.SERVED
     ticket.served_at = datetime.utcnow()
     ticket.service_completed_at = datetime.utcnow()
+    queue_display_store.refresh_after_commit(db, ticket.department, ticket.poli_id)
 
     await db.commit()
     await db.refresh(ticket)
@@ -245,6 +250,7 @@ async def mark_ticket_skipped(
         latest_recall.patient_present = False
         latest_recall.no_show_time = datetime.utcnow()
 
+    queue_display_store.refresh_after_commit(db, ticket.department, ticket.poli_id)
     await db.commit()
     await db.refresh(ticket)
 
@@ -549,6 +555,7 @@ async def transfer_queue_ticket(
         transferred_by_id=transferred_by_id,
     )
     db.add(transfer_record)
+    queue_display_store.refresh_after_commit(db, ticket.department, ticket.poli_id)
 
     # Update ticket
     if transfer.new_department:
@@ -560,6 +567,7 @@ async def transfer_queue_ticket(
         ticket.poli_id = transfer.new_poli_id
     if transfer.new_doctor_id:
         ticket.doctor_id = transfer.new_doctor_id
+    queue_display_store.refresh_after_commit(db, ticket.department, ticket.poli_id)
 
     await db.commit()
     await db.refresh(ticket)
@@ -579,6 +587,7 @@ async def cancel_queue_ticket(
     ticket.status = QueueStatus.CANCELLED
     ticket.cancelled_at = datetime.utcnow()
     ticket.cancellation_reason = cancellation.reason
+    queue_display_store.refresh_after_commit(db, ticket.department, ticket.poli_id)
 
     await db.commit()
     await db.refresh(ticket)
@@ -610,18 +619,12 @@ async def _generate_ticket_number(
     elif priority == QueuePriority.EMERGENCY:
         priority_prefix = "E-"
 
-    # Count tickets today for this department
-    stmt = select(sql_func.count(QueueTicket.id)).where(
-        and_(
-            QueueTicket.department == department,
-            QueueTicket.date == target_date,
-        )
+    # Next value of the department's daily ticket sequence
+    number = await allocate_number(
+        "queue_ticket",
+        on_date=target_date,
+        department=department.value,
     )
-    result = await db.execute(stmt)
-    count = result.scalar_one() or 0
-
-    # Generate number
-    number = count + 1
 
     # Format: PREFIX-NNN or P-PREFIX-NNN for priority
     if priority_prefix:
@@ -8,6 +8,12 @@ from datetime import datetime
 
 from app.core.config import settings
 from app.core.metrics import initialize_metrics
+from app.core.audit_writer import audit_log_writer
+from app.core.http_clients import http_client_registry
+from app.services.icd10_index import icd10_index
+from app.services.kpi_cache import dashboard_precomputer
+from app.services.report_execution import report_job_runner
+from app.services.system_metrics_sampler import system_metrics_sampler
 from app.api.v1.api import api_router
 from app.db.session import engine
 from app.db.base_class import Base
@@ -30,6 +36,8 @@ from app.models import backup, master_data, procedure_codes, icd10
 from app.models import system_monitoring, system_alerts
 from app.models import transformation, user_management
 from app.models import hospital  # Required for Department model
+from app.models import number_sequence
+from app.models import satusehat_sync
 
 # Create logs directory if it doesn't exist
 os.makedirs('logs', exist_ok=True)
@@ -69,11 +77,63 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
 
+    # Start buffered audit log writer
+    audit_log_writer.start()
+
+    # Shared connection pools for BPJS and SATUSEHAT
+    http_client_registry.start()
+
+    # Load the in-memory ICD-10 search index
+    await icd10_index.start()
+
+    # Keep the KPIs of recently viewed dashboards warm
+    dashboard_precomputer.start()
+
+    # Sample host metrics in the background for monitoring and Prometheus
+    if settings.MONITORING_SAMPLER_ENABLED:
+        system_metrics_sampler.start()
+
     yield
 
     # Shutdown
     logger.info("Shutting down application...")
 
+    # Stop the metrics sampler and write its closed rollups
+    try:
+        await system_metrics_sampler.stop()
+    except Exception as e:
+        logger.error(f"Error stopping system metrics sampler: {e}")
+
+    # Stop the dashboard KPI precompute loop
+    try:
+        await dashboard_precomputer.stop()
+    except Exception as e:
+        logger.error(f"Error stopping dashboard precompute: {e}")
+
+    # Cancel background report executions
+    try:
+        await report_job_runner.stop()
+    except Exception as e:
+        logger.error(f"Error stopping report executions: {e}")
+
+    # Drain and close the BPJS and SATUSEHAT connection pools
+    try:
+        await http_client_registry.stop()
+    except Exception as e:
+        logger.error(f"Error closing shared HTTP clients: {e}")
+
+    # Flush pending ICD-10 usage counts
+    try:
+        await icd10_index.stop()
+    except Exception as e:
+        logger.error(f"Error stopping ICD-10 index: {e}")
+
+    # Flush buffered audit log entries
+    try:
+        await audit_log_writer.stop()
+    except Exception as e:
+        logger.error(f"Error flushing audit log buffer: {e}")
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -86,6 +146,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Rate limit API requests (added before CORS, which wraps it, so 429
+# answers still carry CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    from app.middleware.rate_limit import RateLimitMiddleware
+    app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
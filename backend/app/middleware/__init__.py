@@ -1,4 +1,5 @@
 """Middleware package for SIMRS."""
 from app.middleware.audit import AuditLoggingMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
 
-__all__ = ["AuditLoggingMiddleware"]
+__all__ = ["AuditLoggingMiddleware", "RateLimitMiddleware"]
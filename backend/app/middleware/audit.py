@@ -11,10 +11,8 @@ from fastapi import Request, Response, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.encryption import encrypt_field
-from app.db.session import get_db_context
+from app.core.audit_writer import audit_log_writer
 
 
 # Sensitive field patterns to exclude from logs
@@ -120,8 +118,8 @@ class AuditLoggingMiddleware(BaseHTTPMiddleware):
     """
     Middleware for automatic audit logging of all requests.
 
-    Logs are written asynchronously to minimize performance impact.
-    Target overhead: <50ms per request.
+    Entries are handed to the buffered audit log writer, which writes them
+    in batches from a background flusher. Target overhead: <50ms per request.
     """
 
     def __init__(
@@ -269,7 +267,7 @@ class AuditLoggingMiddleware(BaseHTTPMiddleware):
         request_body: Optional[dict],
     ):
         """
-        Queue audit log entry for async writing.
+        Queue audit log entry for the buffered audit log writer.
 
         Args:
             user_id: User ID if authenticated
@@ -285,68 +283,36 @@ class AuditLoggingMiddleware(BaseHTTPMiddleware):
             status_code: HTTP status code
             request_body: Filtered request body
         """
-        # Import here to avoid circular dependency
-        import asyncio
-        from app.crud.audit_log import create_audit_log
-
-        async def _write_log():
-            """Write audit log in background."""
-            try:
-                async with get_db_context() as db:
-                    # Encrypt request body
-                    encrypted_body = None
-                    if request_body:
-                        encrypted_body = encrypt_field(json.dumps(request_body))
-
-                    await create_audit_log(
-                        db=db,
-                        action=action,
-                        resource_type=resource_type,
-                        user_id=int(user_id) if user_id else None,
-                        username=username,
-                        resource_id=resource_id,
-                        ip_address=ip_address,
-                        user_agent=user_agent,
-                        request_path=request_path,
-                        request_method=request_method,
-                        success=success,
-                        failure_reason=None if success else f"HTTP {status_code}",
-                        additional_data={
-                            "status_code": status_code,
-                            "request_body_encrypted": encrypted_body,
-                        } if encrypted_body else {"status_code": status_code},
-                    )
-
-                    # Check if this is a sensitive operation that needs alerting
-                    operation_key = f"{action}:{resource_type}"
-                    if operation_key in SENSITIVE_OPERATIONS and success:
-                        self._trigger_alert(
-                            db=db,
-                            user_id=user_id,
-                            username=username,
-                            action=action,
-                            resource_type=resource_type,
-                            resource_id=resource_id,
-                            ip_address=ip_address,
-                        )
-
-            except Exception as e:
-                # Log to stderr but don't fail the request
-                import sys
-                print(f"Audit log write failed: {str(e)}", file=sys.stderr)
-
-        # Schedule background task
-        try:
-            asyncio.create_task(_write_log())
-        except RuntimeError:
-            # No event loop - run synchronously (shouldn't happen in FastAPI)
-            import asyncio
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(_write_log())
+        audit_log_writer.enqueue({
+            "action": action,
+            "resource_type": resource_type,
+            "user_id": int(user_id) if user_id else None,
+            "username": username,
+            "resource_id": resource_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "request_path": request_path,
+            "request_method": request_method,
+            "success": success,
+            "failure_reason": None if success else f"HTTP {status_code}",
+            "status_code": status_code,
+            "request_body": request_body,
+        })
+
+        # Alert straight away; the buffered row is written by the flusher
+        operation_key = f"{action}:{resource_type}"
+        if operation_key in SENSITIVE_OPERATIONS and success:
+            self._trigger_alert(
+                user_id=user_id,
+                username=username,
+                action=action,
+                resource_type=resource_type,
+                resource_id=resource_id,
+                ip_address=ip_address,
+            )
 
     def _trigger_alert(
         self,
-        db: AsyncSession,
         user_id: Optional[int],
         username: Optional[str],
         action: str,
@@ -358,7 +324,6 @@ class AuditLoggingMiddleware(BaseHTTPMiddleware):
         Trigger alert for sensitive operation.
 
         Args:
-            db: Database session
             user_id: User who performed action
             username: Username
             action: Action performed
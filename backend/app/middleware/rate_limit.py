@@ -0,0 +1,177 @@
+"""
+API rate limiting middleware for FastAPI.
+
+Checks every API request against the token bucket rules of
+app.core.rate_limit before it reaches a route, answers 429 with
+Retry-After when a bucket is empty, and adds RateLimit-* headers for the
+most constrained rule to every limited route's response.
+
+Written as plain ASGI middleware rather than BaseHTTPMiddleware, so a
+check adds no extra task or response copy per request.
+"""
+import hashlib
+import json
+import logging
+from typing import FrozenSet, Iterable, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.rate_limit import RateLimiter, RateLimitRule, default_rate_limit_rules, rate_limiter
+from app.core.security import decode_token
+
+
+logger = logging.getLogger(__name__)
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope: Scope, trust_forwarded_for: bool = False) -> str:
+    """Client IP; proxy headers are only used behind a trusted proxy.
+
+    nginx sets X-Real-IP to the address it was connected from and appends
+    that same address to X-Forwarded-For. Earlier X-Forwarded-For hops come
+    from the client, so only the last one is used.
+    """
+    if trust_forwarded_for:
+        real_ip = _header(scope, b"x-real-ip")
+        if real_ip and real_ip.strip():
+            return real_ip.strip()
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded and forwarded.split(",")[-1].strip():
+            return forwarded.split(",")[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def api_key_identity(scope: Scope, api_key_hashes: FrozenSet[str] = frozenset()) -> Optional[str]:
+    """Hashed X-API-Key of an issued key, so keys are never written to Redis.
+
+    Keys whose SHA-256 is not in api_key_hashes get no identity; otherwise
+    a new made-up key on every request would get a fresh bucket each time.
+    """
+    api_key = _header(scope, b"x-api-key")
+    if not api_key or not api_key_hashes:
+        return None
+    digest = hashlib.sha256(api_key.encode()).hexdigest()
+    if digest not in api_key_hashes:
+        return None
+    return "key:" + digest[:32]
+
+
+def user_identity(scope: Scope) -> Optional[str]:
+    """User ID of a valid bearer token; invalid tokens are left to the routes."""
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    payload = decode_token(authorization[7:].strip())
+    if not payload or payload.get("sub") is None:
+        return None
+    return f"user:{payload['sub']}"
+
+
+def rule_identity(
+    rule: RateLimitRule,
+    scope: Scope,
+    trust_forwarded_for: bool = False,
+    api_key_hashes: FrozenSet[str] = frozenset(),
+) -> str:
+    """What a rule's bucket is kept per for this request."""
+    if rule.by == "route":
+        return "all"
+    if rule.by == "api_key":
+        return api_key_identity(scope, api_key_hashes) or "ip:" + client_ip(scope, trust_forwarded_for)
+    if rule.by == "user":
+        return user_identity(scope) or "ip:" + client_ip(scope, trust_forwarded_for)
+    if rule.by == "client":
+        return (
+            api_key_identity(scope, api_key_hashes)
+            or user_identity(scope)
+            or "ip:" + client_ip(scope, trust_forwarded_for)
+        )
+    return "ip:" + client_ip(scope, trust_forwarded_for)
+
+
+class RateLimitMiddleware:
+    """Rejects requests over their rate limit with 429 Too Many Requests."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limiter: Optional[RateLimiter] = None,
+        rules: Optional[List[RateLimitRule]] = None,
+        trust_forwarded_for: Optional[bool] = None,
+        api_key_hashes: Optional[Iterable[str]] = None,
+    ):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+        self.rules = rules if rules is not None else default_rate_limit_rules()
+        self.trust_forwarded_for = (
+            settings.RATE_LIMIT_TRUST_FORWARDED_FOR if trust_forwarded_for is None else trust_forwarded_for
+        )
+        self.api_key_hashes = frozenset(
+            digest.strip().lower()
+            for digest in (settings.RATE_LIMIT_API_KEY_HASHES if api_key_hashes is None else api_key_hashes)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        matching = [rule for rule in self.rules if rule.matches(method, path)]
+        if not matching:
+            await self.app(scope, receive, send)
+            return
+
+        # Identities are resolved once per request and shared by the rules
+        identities = {}
+        tightest = None
+        for rule in matching:
+            if rule.by not in identities:
+                identities[rule.by] = rule_identity(rule, scope, self.trust_forwarded_for, self.api_key_hashes)
+            decision = await self.limiter.check(rule, identities[rule.by])
+
+            if not decision.allowed:
+                logger.info(f"Rate limit {rule.name} exceeded by {identities[rule.by]} on {method} {path}")
+                await self._reject(send, decision)
+                return
+            if decision.remaining is not None and (
+                tightest is None or decision.remaining * tightest.rule.limit < tightest.remaining * rule.limit
+            ):
+                tightest = decision
+
+        if tightest is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = [(name.lower().encode(), value.encode()) for name, value in tightest.headers()]
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers") or []) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def _reject(self, send: Send, decision):
+        body = json.dumps({
+            "detail": "Too many requests. Please try again later.",
+            "retry_after": max(1, int(round(decision.retry_after))),
+        }).encode()
+        headers = [(name.lower().encode(), value.encode()) for name, value in decision.headers()]
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ] + headers,
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -5,7 +5,8 @@ This module provides SQLAlchemy models for:
 - Appointment slot configuration
 - Appointment reminders (SMS, WhatsApp, email, push)
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Time, ForeignKey, Boolean, Enum as SQLEnum, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Time, ForeignKey, Boolean, Enum as SQLEnum, JSON, DDL, event, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from enum import Enum
@@ -134,6 +135,31 @@ class Appointment(Base):
     cancelled_by_user = relationship("User", foreign_keys=[cancelled_by], backref="cancelled_appointments")
     reminders = relationship("AppointmentReminder", back_populates="appointment", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # A doctor cannot have two active appointments overlapping in time
+        ExcludeConstraint(
+            ('doctor_id', '='),
+            (
+                text(
+                    "tsrange(appointment_date + appointment_time, "
+                    "appointment_date + appointment_time + duration_minutes * interval '1 minute')"
+                ),
+                '&&',
+            ),
+            name='ex_appointments_doctor_overlap',
+            using='gist',
+            where=text("doctor_id IS NOT NULL AND status IN ('SCHEDULED', 'CONFIRMED', 'CHECKED_IN')"),
+        ),
+    )
+
+
+# btree_gist provides the integer equality operator used by the exclusion constraint
+event.listen(
+    Appointment.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql"),
+)
+
 
 # =============================================================================
 # Appointment Slot Model
@@ -10,7 +10,7 @@ Python 3.5+ compatible
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, JSON, Float, Enum as SQLEnum, func
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, ForeignKey, DateTime, JSON, Float, Enum as SQLEnum, func
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 
@@ -65,7 +65,7 @@ class BackupJob(Base):
 
     # Results
     backup_path = Column(Text, nullable=True, comment="Path where backup was stored")
-    backup_size_bytes = Column(Integer, nullable=True, comment="Size of backup in bytes")
+    backup_size_bytes = Column(BigInteger, nullable=True, comment="Size of backup in bytes")
     checksum = Column(String(100), nullable=True, comment="Backup file checksum (SHA256)")
     files_count = Column(Integer, nullable=True, comment="Number of files in backup")
 
@@ -178,9 +178,13 @@ class BackupRestore(Base):
 
     # Results
     files_restored = Column(Integer, nullable=True, comment="Number of files restored")
-    bytes_restored = Column(Integer, nullable=True, comment="Bytes restored")
+    bytes_restored = Column(BigInteger, nullable=True, comment="Bytes restored")
     tables_restored = Column(Integer, nullable=True, comment="Number of database tables restored")
 
+    # Progress while running
+    progress_percent = Column(Float, nullable=True, comment="Restore progress (0-100)")
+    progress_message = Column(String(255), nullable=True, comment="Current restore phase")
+
     # Validation
     checksum_verified = Column(Boolean, nullable=True, comment="Whether backup checksum was verified")
     validation_passed = Column(Boolean, nullable=True, comment="Whether post-restore validation passed")
@@ -281,7 +285,7 @@ class BackupMetrics(Base):
 
     # Performance metrics
     duration_seconds = Column(Integer, nullable=False, comment="Backup duration in seconds")
-    backup_size_bytes = Column(Integer, nullable=False, comment="Backup size in bytes")
+    backup_size_bytes = Column(BigInteger, nullable=False, comment="Backup size in bytes")
     compression_ratio = Column(Float, nullable=True, comment="Compression ratio achieved")
     throughput_mb_per_sec = Column(Float, nullable=True, comment="Throughput in MB/s")
 
@@ -160,6 +160,7 @@ class Invoice(Base):
         Index("ix_invoices_invoice_date", "invoice_date"),
         Index("ix_invoices_status", "status"),
         Index("ix_invoices_payer_type", "payer_type"),
+        Index("ix_invoices_updated_at", "updated_at"),
     )
 
 
@@ -318,4 +319,5 @@ class Payment(Base):
         Index("ix_payments_payment_date", "payment_date"),
         Index("ix_payments_payment_method", "payment_method"),
         Index("ix_payments_reference_number", "reference_number"),
+        Index("ix_payments_updated_at", "updated_at"),
     )
@@ -148,6 +148,7 @@ class BPJSClaim(Base):
         Index("ix_bpjs_claims_drg_code", "drg_code"),
         Index("ix_bpjs_claims_bpjs_claim_id", "bpjs_claim_id"),
         Index("ix_bpjs_claims_sep_number", "sep_number"),
+        Index("ix_bpjs_claims_updated_at", "updated_at"),
     )
 
 
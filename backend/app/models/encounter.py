@@ -4,7 +4,7 @@ This module defines the database models for patient encounters, diagnoses, and t
 All models include timestamps and proper relationships.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, ForeignKey, JSON, Index, func, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 
@@ -65,9 +65,10 @@ class Encounter(Base):
     is_urgent = Column(Boolean, default=False, nullable=False)
     bpjs_sep_number = Column(String(50), nullable=True)
     satusehat_encounter_id = Column(String(100), nullable=True, index=True, comment="SATUSEHAT FHIR Encounter resource ID")
+    satusehat_synced_at = Column(DateTime(timezone=True), nullable=True, comment="updated_at of the version last pushed to SATUSEHAT")
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default="NOW()", nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default="NOW()", nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default="NOW()", onupdate=func.now(), nullable=False, index=True)
 
     # Relationships
     patient = relationship("Patient", back_populates="encounters")
@@ -75,6 +76,11 @@ class Encounter(Base):
     diagnoses = relationship("Diagnosis", back_populates="encounter", cascade="all, delete-orphan")
     treatments = relationship("Treatment", back_populates="encounter", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Rows changed since their last SATUSEHAT sync
+        Index("ix_encounters_satusehat_dirty", "id", postgresql_where=text("satusehat_synced_at IS NULL OR updated_at > satusehat_synced_at")),
+    )
+
 
 class Diagnosis(Base):
     """Diagnosis model for patient diagnoses within encounters"""
@@ -5,7 +5,7 @@ including stock levels, expiry dates, batch numbers, and transactions.
 """
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, ForeignKey, Numeric, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Boolean, Float, ForeignKey, Numeric, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 
@@ -42,6 +42,7 @@ class Drug(Base):
     max_stock_level = Column(Integer, nullable=False, default=1000)
     reorder_point = Column(Integer, nullable=False, default=20)
     lead_time_days = Column(Integer, nullable=False, default=7)  # Average lead time for restocking
+    stock_on_hand = Column(Integer, nullable=False, default=0, server_default="0")  # Usable stock, maintained with drug_stock_balances
 
     # Pricing (in IDR)
     purchase_price = Column(Numeric(12, 2), nullable=True)  # Last purchase price
@@ -83,6 +84,14 @@ class Drug(Base):
     purchase_order_items = relationship("PurchaseOrderItem", back_populates="drug")
 
 
+# Low-stock alerts scan this index for drugs with a negative shortfall
+Index(
+    "ix_drugs_stock_shortfall",
+    Drug.stock_on_hand - Drug.min_stock_level,
+    postgresql_where=Drug.is_active == True,
+)
+
+
 class DrugBatch(Base):
     """Drug batch tracking for expiry and FIFO"""
     __tablename__ = "drug_batches"
@@ -356,3 +365,81 @@ class NearExpiryAlert(Base):
     created_at = Column(DateTime(timezone=True), server_default="NOW()", nullable=False)
     resolved_at = Column(DateTime(timezone=True), nullable=True)
     resolved_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+
+class DrugDemandForecast(Base):
+    """Stored demand forecast per drug, written in bulk by the nightly batch forecast"""
+    __tablename__ = "drug_demand_forecasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    drug_id = Column(Integer, ForeignKey("drugs.id"), nullable=False, index=True)
+
+    # Forecast run
+    forecast_date = Column(Date, nullable=False, index=True)  # Last day of history used
+    forecast_horizon = Column(Integer, nullable=False)  # Days forecast (30, 60, 90)
+    algorithm = Column(String(50), nullable=False)
+
+    # Results
+    total_forecast_quantity = Column(Float, nullable=False)
+    mape = Column(Float, nullable=True)
+    forecast = Column(JSONB, nullable=False)  # [{date, quantity}]
+    confidence_intervals = Column(JSONB, nullable=True)
+
+    # Audit fields
+    created_at = Column(DateTime(timezone=True), server_default="NOW()", nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('drug_id', 'forecast_date', 'forecast_horizon', name='uq_drug_demand_forecasts_run'),
+    )
+
+    drug = relationship("Drug")
+
+
+class DrugStockBalance(Base):
+    """Maintained on-hand balance per drug and bin location
+
+    Holds the usable (not quarantined, not expired) quantity of the batches
+    stored in a location, updated in the same transaction as every stock
+    movement. Drug.stock_on_hand holds the total across locations.
+    """
+    __tablename__ = "drug_stock_balances"
+
+    drug_id = Column(Integer, ForeignKey("drugs.id"), primary_key=True)
+    location = Column(String(50), primary_key=True, default="")  # Batch bin_location, "" when unassigned
+    on_hand = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default="NOW()", nullable=False)
+
+    drug = relationship("Drug")
+
+
+class DrugReorderSnapshot(Base):
+    """Latest reorder parameters and ABC/VEN class per drug
+
+    Written for the whole formulary by the reorder classification pass and
+    read by reorder alerts instead of recalculating every drug.
+    """
+    __tablename__ = "drug_reorder_snapshots"
+
+    drug_id = Column(Integer, ForeignKey("drugs.id"), primary_key=True)
+
+    # Demand
+    average_daily_usage = Column(Float, nullable=False)
+    demand_std_dev = Column(Float, nullable=False)
+    annual_demand = Column(Float, nullable=False)
+    annual_value = Column(Float, nullable=False)  # annual_demand x unit cost (IDR)
+
+    # Reorder parameters
+    service_level = Column(Float, nullable=False)
+    lead_time_days = Column(Integer, nullable=False)
+    safety_stock = Column(Float, nullable=False)
+    reorder_point = Column(Float, nullable=False)
+    economic_order_quantity = Column(Float, nullable=False)
+
+    # Classification
+    abc_class = Column(String(1), nullable=False, index=True)  # A, B, C (Pareto on annual value)
+    ven_class = Column(String(1), nullable=False, index=True)  # V(ital), E(ssential), N(on-essential)
+    cumulative_value_share = Column(Float, nullable=False)  # Pareto position, 0-1
+
+    calculated_at = Column(DateTime(timezone=True), server_default="NOW()", nullable=False)
+
+    drug = relationship("Drug")
@@ -0,0 +1,29 @@
+"""Number sequence model for document number allocation
+
+This module defines the NumberSequence counter table used by
+SequenceAllocator to hand out MRNs, invoice, claim, appointment and queue
+ticket numbers without scanning the target tables.
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class NumberSequence(Base):
+    """Counter row per sequence name and reset scope
+
+    The scope encodes the reset period (e.g. "2026" for yearly, "20260116"
+    for daily sequences) and optionally a department, so that each
+    period/department combination counts independently.
+    """
+    __tablename__ = "number_sequences"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, comment="Sequence name (e.g. patient_mrn, invoice)")
+    scope = Column(String(100), nullable=False, comment="Reset scope: period and optional department")
+    last_value = Column(BigInteger, nullable=False, default=0, comment="Last value handed out (end of last reserved block)")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, comment="Record last update timestamp")
+
+    __table_args__ = (
+        UniqueConstraint('name', 'scope', name='uq_number_sequences_name_scope'),
+    )
@@ -3,7 +3,7 @@
 This module defines the Patient, EmergencyContact, and PatientInsurance models
 for managing patient information in the SIMRS system.
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, Enum as SQLEnum, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, Enum as SQLEnum, ForeignKey, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from enum import Enum
@@ -68,6 +68,7 @@ class Patient(Base):
     country = Column(String(100), default="Indonesia", nullable=True, comment="Country of residence")
     bpjs_card_number = Column(String(20), nullable=True, index=True, comment="BPJS card number")
     satusehat_patient_id = Column(String(100), nullable=True, index=True, comment="SATUSEHAT FHIR Patient resource ID")
+    satusehat_synced_at = Column(DateTime(timezone=True), nullable=True, comment="updated_at of the version last pushed to SATUSEHAT")
     is_active = Column(Boolean, default=True, nullable=False, comment="Patient active status")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, comment="Record creation timestamp")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, comment="Record last update timestamp")
@@ -79,6 +80,17 @@ class Patient(Base):
     portal_user = relationship("PatientPortalUser", back_populates="patient", uselist=False, cascade="all, delete-orphan")
     caregiver_links = relationship("CaregiverLink", foreign_keys="CaregiverLink.linked_patient_id", back_populates="linked_patient", cascade="all, delete-orphan")
 
+    # Search indexes (trigram for ILIKE/similarity, composite for keyset pagination)
+    __table_args__ = (
+        Index('ix_patients_full_name_trgm', 'full_name', postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+        Index('ix_patients_phone_trgm', 'phone', postgresql_using='gin', postgresql_ops={'phone': 'gin_trgm_ops'}),
+        Index('ix_patients_medical_record_number_trgm', 'medical_record_number', postgresql_using='gin', postgresql_ops={'medical_record_number': 'gin_trgm_ops'}),
+        Index('ix_patients_nik_trgm', 'nik', postgresql_using='gin', postgresql_ops={'nik': 'gin_trgm_ops'}),
+        Index('ix_patients_active_created_id', 'is_active', created_at.desc(), id.desc()),
+        # Rows changed since their last SATUSEHAT sync
+        Index('ix_patients_satusehat_dirty', 'id', postgresql_where=text('satusehat_synced_at IS NULL OR updated_at > satusehat_synced_at')),
+    )
+
 
 class EmergencyContact(Base):
     """Emergency contact model for patient emergency contacts
@@ -120,3 +132,28 @@ class PatientInsurance(Base):
 
     # Relationships
     patient = relationship("Patient", back_populates="insurance_policies")
+
+
+class PatientBlockingKey(Base):
+    """Blocking keys for patient duplicate detection
+
+    This side table stores precomputed match keys (phonetic name keys, a
+    normalized phone suffix and a date-of-birth bucket) so that duplicate
+    candidates can be found with a single indexed lookup instead of
+    wildcard scans over the patients table.
+    """
+    __tablename__ = "patient_blocking_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), unique=True, nullable=False, index=True, comment="Reference to patient")
+    normalized_name = Column(String(255), nullable=False, comment="Lowercased, punctuation-free full name used for scoring")
+    phonetic_first = Column(String(50), nullable=True, comment="Phonetic key of the first name token")
+    phonetic_last = Column(String(50), nullable=True, comment="Phonetic key of the last name token")
+    phone_suffix = Column(String(10), nullable=True, index=True, comment="Last digits of the normalized phone number")
+    dob_bucket = Column(Integer, nullable=True, comment="Date-of-birth bucket (YYYYMM)")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, comment="Record last update timestamp")
+
+    __table_args__ = (
+        Index('ix_patient_blocking_keys_dob_first', 'dob_bucket', 'phonetic_first'),
+        Index('ix_patient_blocking_keys_dob_last', 'dob_bucket', 'phonetic_last'),
+    )
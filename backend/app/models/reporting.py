@@ -6,12 +6,13 @@ This module provides database models for:
 - Operational metrics
 - Clinical quality metrics
 - Financial metrics
+- Daily fact tables behind the encounter, revenue and claim reports
 
 Python 3.5+ compatible
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Enum as SQLEnum, JSON, Numeric, Float, func
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Date, DateTime, Enum as SQLEnum, JSON, Numeric, Float, func
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 
@@ -258,3 +259,94 @@ class RegulatoryReport(Base):
     __table_args__ = (
         {"extend_existing": True, "comment": "Regulatory report submissions"},
     )
+
+
+class FactDailyEncounter(Base):
+    """Daily encounter counts by department, encounter type and status
+
+    Maintained by ReportFactService; one row per grain combination.
+    """
+    __tablename__ = "fact_daily_encounters"
+
+    fact_date = Column(Date, primary_key=True, comment="Encounter date")
+    department = Column(String(100), primary_key=True, server_default="", comment="Encounter department ('' if none)")
+    encounter_type = Column(String(50), primary_key=True, comment="Encounter type")
+    status = Column(String(20), primary_key=True, comment="Encounter status")
+    encounter_count = Column(Integer, nullable=False, default=0, comment="Number of encounters")
+
+    __table_args__ = (
+        {"extend_existing": True, "comment": "Daily encounter facts"},
+    )
+
+
+class FactDailyInvoice(Base):
+    """Daily invoice totals by department, payer type and status
+
+    Maintained by ReportFactService; one row per grain combination.
+    """
+    __tablename__ = "fact_daily_invoices"
+
+    fact_date = Column(Date, primary_key=True, comment="Invoice date")
+    department = Column(String(100), primary_key=True, server_default="", comment="Department of the invoiced encounter ('' if none)")
+    payer_type = Column(String(20), primary_key=True, comment="Payer type")
+    status = Column(String(20), primary_key=True, comment="Invoice status")
+    invoice_count = Column(Integer, nullable=False, default=0, comment="Number of invoices")
+    total_amount = Column(Numeric(15, 2), nullable=False, default=0, comment="Sum of invoice totals")
+    paid_amount = Column(Numeric(15, 2), nullable=False, default=0, comment="Sum of amounts paid")
+    balance_due = Column(Numeric(15, 2), nullable=False, default=0, comment="Sum of remaining balances")
+
+    __table_args__ = (
+        {"extend_existing": True, "comment": "Daily invoice facts"},
+    )
+
+
+class FactDailyPayment(Base):
+    """Daily payment totals by department, payer type and payment method
+
+    Maintained by ReportFactService; one row per grain combination.
+    """
+    __tablename__ = "fact_daily_payments"
+
+    fact_date = Column(Date, primary_key=True, comment="Payment date")
+    department = Column(String(100), primary_key=True, server_default="", comment="Department of the invoiced encounter ('' if none)")
+    payer_type = Column(String(20), primary_key=True, comment="Payer type of the invoice")
+    payment_method = Column(String(20), primary_key=True, comment="Payment method")
+    payment_count = Column(Integer, nullable=False, default=0, comment="Number of payments")
+    amount = Column(Numeric(15, 2), nullable=False, default=0, comment="Sum of payment amounts")
+
+    __table_args__ = (
+        {"extend_existing": True, "comment": "Daily payment facts"},
+    )
+
+
+class FactDailyClaim(Base):
+    """Daily BPJS claim totals by department, claim type and status
+
+    Maintained by ReportFactService; one row per grain combination.
+    """
+    __tablename__ = "fact_daily_claims"
+
+    fact_date = Column(Date, primary_key=True, comment="Claim creation date")
+    department = Column(String(100), primary_key=True, server_default="", comment="Department of the claimed encounter ('' if none)")
+    claim_type = Column(String(20), primary_key=True, comment="Claim type")
+    status = Column(String(20), primary_key=True, comment="Claim status")
+    claim_count = Column(Integer, nullable=False, default=0, comment="Number of claims")
+    claimed_amount = Column(Numeric(15, 2), nullable=False, default=0, comment="Sum of package amounts claimed")
+    approved_amount = Column(Numeric(15, 2), nullable=False, default=0, comment="Sum of amounts approved by BPJS")
+
+    __table_args__ = (
+        {"extend_existing": True, "comment": "Daily BPJS claim facts"},
+    )
+
+
+class ReportFactWatermark(Base):
+    """Point up to which source changes are folded into a fact table"""
+    __tablename__ = "report_fact_watermarks"
+
+    fact_name = Column(String(50), primary_key=True, comment="Fact table name")
+    refreshed_through = Column(DateTime(timezone=True), nullable=False, comment="Source changes up to this time are applied")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        {"extend_existing": True, "comment": "Report fact refresh watermarks"},
+    )
@@ -0,0 +1,26 @@
+"""SATUSEHAT bulk sync checkpoint model
+
+This module defines the checkpoint row SATUSEHATBulkSync keeps per synced
+resource type, so an interrupted backfill resumes after the last page it
+finished instead of starting over.
+"""
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
+from sqlalchemy.sql import func
+from app.db.session import Base
+
+
+class SATUSEHATSyncCheckpoint(Base):
+    """Progress of the current or last bulk sync of one resource type"""
+    __tablename__ = "satusehat_sync_checkpoints"
+
+    resource_type = Column(String(20), primary_key=True, comment="Synced resource: patients, encounters")
+    status = Column(String(20), nullable=False, default="running", comment="running, paused, completed")
+    full_sync = Column(Boolean, nullable=False, default=False, comment="Whether the run pushes every row, not only changed ones")
+    last_id = Column(Integer, nullable=False, default=0, comment="Resume marker: highest row ID of the last finished page")
+    processed_count = Column(Integer, nullable=False, default=0)
+    success_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
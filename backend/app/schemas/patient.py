@@ -195,6 +195,7 @@ class PatientListResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = None
 
 
 class DuplicatePatientWarning(BaseModel):
@@ -4,27 +4,56 @@ This module provides services for:
 - KPI calculation and tracking
 - Dashboard data aggregation
 - Scheduled report generation
-- Data caching and optimization
+- Data caching and optimization (KPI values are cached per period with
+  single-flight calculation, see app.services.kpi_cache)
 
 Python 3.5+ compatible
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta, date
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func, text
 from sqlalchemy.orm import selectinload
 
+from app.db.session import get_db_context
 from app.models.analytics import (
     KPI, KPIHistory, Dashboard, DashboardWidget, DataCache,
     ScheduledReport, ReportSnapshot, KPICategory
 )
+from app.services.kpi_cache import (
+    DEFAULT_KPI_CACHE_TTL_SECONDS, kpi_cache_key, kpi_result_cache
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+# Widgets evaluated at once across the process, each holding a pooled session
+DASHBOARD_WIDGET_CONCURRENCY = 8
+
+_widget_slots = None  # type: Optional[asyncio.Semaphore]
+
+
+def _widget_semaphore() -> asyncio.Semaphore:
+    """Process-wide limit on widgets holding a session"""
+    global _widget_slots
+    if _widget_slots is None:
+        _widget_slots = asyncio.Semaphore(DASHBOARD_WIDGET_CONCURRENCY)
+    return _widget_slots
+
+
+def _today_period() -> Tuple[datetime, datetime]:
+    """Start and end of today, the period dashboard KPIs show"""
+    today = date.today()
+    return (
+        datetime.combine(today, datetime.min.time()),
+        datetime.combine(today, datetime.max.time())
+    )
+
+
 class KPICalculator(object):
     """Calculates KPI values from database"""
 
@@ -60,24 +89,54 @@ class KPICalculator(object):
             logger.error("Error calculating KPI {}: {}".format(kpi.kpi_code, e))
             return None
 
+    async def calculate_kpi_cached(
+        self,
+        kpi: KPI,
+        period_start: datetime,
+        period_end: datetime,
+        ttl: float = DEFAULT_KPI_CACHE_TTL_SECONDS,
+        min_remaining: float = 0
+    ) -> Optional[float]:
+        """Calculate KPI value for period through the KPI result cache
+
+        Concurrent calls for the same KPI and period share one calculation.
+
+        Args:
+            kpi: KPI model
+            period_start: Period start
+            period_end: Period end
+            ttl: Seconds to cache the value
+            min_remaining: Recalculate if the cached value expires sooner
+
+        Returns:
+            Calculated KPI value
+        """
+        return await kpi_result_cache.get_or_compute(
+            kpi_cache_key(kpi, period_start, period_end),
+            ttl,
+            lambda: self.calculate_kpi(kpi, period_start, period_end),
+            min_remaining=min_remaining
+        )
+
     async def _calculate_from_sql(
         self,
         kpi: KPI,
         period_start: datetime,
         period_end: datetime
     ) -> Optional[float]:
-        """Calculate KPI from SQL query"""
-        try:
-            # Replace date placeholders in query
-            sql = kpi.sql_query
-            sql = sql.replace(":period_start", "'{}'".format(period_start.isoformat()))
-            sql = sql.replace(":period_end", "'{}'".format(period_end.isoformat()))
+        """Calculate KPI from SQL query
 
-            # Execute query
-            result = await self.db.execute(text(sql))
+        :period_start and :period_end are bound parameters, so the KPI is
+        one prepared statement whatever the period.
+        """
+        try:
+            result = await self.db.execute(
+                text(kpi.sql_query),
+                {"period_start": period_start, "period_end": period_end}
+            )
             row = result.first()
 
-            if row and len(row) > 0:
+            if row and len(row) > 0 and row[0] is not None:
                 return float(row[0])
             return None
 
@@ -153,24 +212,30 @@ class DashboardDataService(object):
                 # Implement role-based access check
                 pass
 
-            # Get widget data
+            kpi_result_cache.mark_active(dashboard.dashboard_code)
+
+            # Evaluate widgets concurrently, each on its own pooled session
+            widgets = [widget for widget in dashboard.widgets if widget.is_active]
+            results = await asyncio.gather(*[
+                self._evaluate_widget(widget, dashboard.refresh_interval)
+                for widget in widgets
+            ])
+
             widget_data = []
-            for widget in dashboard.widgets:
-                if widget.is_active:
-                    data = await self._get_widget_data(widget)
-                    widget_data.append({
-                        "widget_id": widget.widget_id,
-                        "widget_type": widget.widget_type,
-                        "widget_name": widget.widget_name,
-                        "position": {
-                            "x": widget.position_x,
-                            "y": widget.position_y,
-                            "width": widget.width,
-                            "height": widget.height
-                        },
-                        "config": widget.config,
-                        "data": data
-                    })
+            for widget, data in zip(widgets, results):
+                widget_data.append({
+                    "widget_id": widget.widget_id,
+                    "widget_type": widget.widget_type,
+                    "widget_name": widget.widget_name,
+                    "position": {
+                        "x": widget.position_x,
+                        "y": widget.position_y,
+                        "width": widget.width,
+                        "height": widget.height
+                    },
+                    "config": widget.config,
+                    "data": data
+                })
 
             return {
                 "dashboard_code": dashboard.dashboard_code,
@@ -187,12 +252,68 @@ class DashboardDataService(object):
             logger.error("Error getting dashboard data: {}".format(e))
             raise ValueError("Failed to get dashboard data: {}".format(str(e)))
 
-    async def _get_widget_data(self, widget: DashboardWidget) -> Any:
+    @staticmethod
+    async def _evaluate_widget(widget: DashboardWidget, ttl: float) -> Any:
+        """Get widget data on a separate pooled session
+
+        At most DASHBOARD_WIDGET_CONCURRENCY widgets hold a session at once
+        across the process, so busy dashboards cannot drain the pool.
+        """
+        if not widget.kpi_id:
+            return await DashboardDataService(None)._get_widget_data(widget, ttl)
+
+        async with _widget_semaphore():
+            async with get_db_context() as db:
+                return await DashboardDataService(db)._get_widget_data(widget, ttl)
+
+    @classmethod
+    async def warm_dashboard(cls, dashboard_code: str, min_remaining: float = 0) -> int:
+        """Calculate the KPIs of a dashboard into the KPI result cache
+
+        Args:
+            dashboard_code: Dashboard code
+            min_remaining: Recalculate values expiring within this many
+                seconds
+
+        Returns:
+            Number of KPIs warmed
+        """
+        async with get_db_context() as db:
+            query = select(Dashboard).options(
+                selectinload(Dashboard.widgets)
+            ).where(
+                and_(
+                    Dashboard.dashboard_code == dashboard_code,
+                    Dashboard.is_active == True
+                )
+            )
+            result = await db.execute(query)
+            dashboard = result.scalar_one_or_none()
+            if not dashboard:
+                return 0
+
+            kpi_ids = set(w.kpi_id for w in dashboard.widgets if w.is_active and w.kpi_id)
+            if not kpi_ids:
+                return 0
+
+            kpi_result = await db.execute(select(KPI).where(KPI.id.in_(kpi_ids)))
+            calculator = KPICalculator(db)
+            period_start, period_end = _today_period()
+            kpis = kpi_result.scalars().all()
+            for kpi in kpis:
+                await calculator.calculate_kpi_cached(
+                    kpi, period_start, period_end,
+                    ttl=dashboard.refresh_interval,
+                    min_remaining=min_remaining
+                )
+            return len(kpis)
+
+    async def _get_widget_data(self, widget: DashboardWidget, ttl: float = DEFAULT_KPI_CACHE_TTL_SECONDS) -> Any:
         """Get data for widget"""
         try:
             if widget.kpi_id:
                 # Get KPI data
-                return await self._get_kpi_widget_data(widget)
+                return await self._get_kpi_widget_data(widget, ttl)
             else:
                 # Get data from custom source
                 return await self._get_custom_widget_data(widget)
@@ -201,7 +322,7 @@ class DashboardDataService(object):
             logger.error("Error getting widget data: {}".format(e))
             return None
 
-    async def _get_kpi_widget_data(self, widget: DashboardWidget) -> Any:
+    async def _get_kpi_widget_data(self, widget: DashboardWidget, ttl: float = DEFAULT_KPI_CACHE_TTL_SECONDS) -> Any:
         """Get KPI data for widget"""
         try:
             # Get KPI
@@ -212,13 +333,11 @@ class DashboardDataService(object):
             if not kpi:
                 return None
 
-            # Get current value
+            # Get current value, shared by all viewers for the refresh interval
             calculator = KPICalculator(self.db)
-            today = date.today()
-            period_start = datetime.combine(today, datetime.min.time())
-            period_end = datetime.combine(today, datetime.max.time())
+            period_start, period_end = _today_period()
 
-            current_value = await calculator.calculate_kpi(kpi, period_start, period_end)
+            current_value = await calculator.calculate_kpi_cached(kpi, period_start, period_end, ttl=ttl)
 
             # Get historical data (last 30 days)
             history_query = select(KPIHistory).where(
@@ -368,7 +487,7 @@ class AnalyticsService(object):
             # Calculate values
             values = {}
             for kpi in kpis:
-                value = await self.kpi_calculator.calculate_kpi(kpi, period_start, period_end)
+                value = await self.kpi_calculator.calculate_kpi_cached(kpi, period_start, period_end)
                 values[kpi.kpi_code] = {
                     "kpi_name": kpi.kpi_name,
                     "kpi_category": kpi.kpi_category,
@@ -15,16 +15,23 @@ import logging
 from datetime import datetime, date, time, timedelta
 from typing import Optional, List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, desc, func, not_
+from sqlalchemy import select, and_
+from sqlalchemy.exc import IntegrityError
 
 from app.models.appointments import (
-    Appointment, AppointmentSlot, AppointmentType,
+    Appointment, AppointmentType,
     AppointmentStatus, BookingChannel, AppointmentPriority,
 )
 from app.models.patient import Patient
 from app.models.user import User
 from app.models.queue import QueueTicket, QueueDepartment, QueueStatus, QueuePriority
 from app.models.audit_log import AuditLog
+from app.services.sequence_allocation import allocate_number
+from app.services.slot_availability import (
+    SlotAvailabilityEngine,
+    availability_cache,
+    DOCTOR_OVERLAP_CONSTRAINT,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -90,20 +97,22 @@ class AppointmentBookingService(object):
             appointment_date, appointment_time, duration_minutes
         )
 
-        # Check slot availability
-        is_available = await self._check_slot_availability(
-            department_id=department_id,
-            doctor_id=doctor_id,
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            duration_minutes=duration_minutes,
-        )
-
-        if not is_available:
-            raise AppointmentUnavailableError(
-                "Slot tidak tersedia pada tanggal dan jam tersebut"
+        # Doctor bookings are guarded by the overlap exclusion constraint;
+        # department-level bookings have no doctor to constrain, so check them
+        if not doctor_id:
+            is_available = await self._check_slot_availability(
+                department_id=department_id,
+                doctor_id=doctor_id,
+                appointment_date=appointment_date,
+                appointment_time=appointment_time,
+                duration_minutes=duration_minutes,
             )
 
+            if not is_available:
+                raise AppointmentUnavailableError(
+                    "Slot tidak tersedia pada tanggal dan jam tersebut"
+                )
+
         # Generate appointment number
         appointment_number = await self._generate_appointment_number()
 
@@ -130,8 +139,18 @@ class AppointmentBookingService(object):
             symptoms=symptoms,
         )
 
-        self.db.add(appointment)
-        await self.db.flush()
+        try:
+            async with self.db.begin_nested():
+                self.db.add(appointment)
+                await self.db.flush()
+        except IntegrityError as e:
+            if self._is_overlap_violation(e):
+                raise AppointmentUnavailableError(
+                    "Slot tidak tersedia pada tanggal dan jam tersebut"
+                )
+            raise
+
+        availability_cache.invalidate_after_commit(self.db, department_id, [appointment_date])
 
         # Create audit log
         await self._create_appointment_audit_log(
@@ -167,49 +186,68 @@ class AppointmentBookingService(object):
         Returns:
             List of available time slots
         """
-        # Get slot configuration for doctor/department
-        slots = await self._get_slot_configuration(
+        engine = SlotAvailabilityEngine(self.db)
+        return await engine.get_free_slots(
             department_id=department_id,
             doctor_id=doctor_id,
             appointment_date=appointment_date,
         )
 
-        # Get existing appointments
-        existing_appointments = await self._get_existing_appointments(
-            department_id=department_id,
-            doctor_id=doctor_id,
-            appointment_date=appointment_date,
-        )
-
-        # Calculate available slots
-        available_slots = []
+    async def get_availability_calendar(
+        self,
+        department_id: int,
+        doctor_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        days: int = 14,
+    ) -> Dict[str, any]:
+        """Get available slots for a date range
 
-        for slot in slots:
-            slot_start = slot["start_time"]
-            slot_end = slot["end_time"]
+        Without doctor_id, returns the department-level slots and the slots
+        of every doctor with a schedule or appointments in the range, all
+        computed from one pass over the range.
 
-            # Check if slot is already booked
-            is_booked = False
-            for appt in existing_appointments:
-                appt_start = appt.appointment_time
-                appt_end = appt.end_time
+        Args:
+            department_id: Department ID
+            doctor_id: Doctor ID (optional)
+            start_date: First date (defaults to today)
+            days: Number of days
 
-                # Check for overlap
-                if self._time_ranges_overlap(
-                    slot_start, slot_end,
-                    appt_start, appt_end
-                ):
-                    is_booked = True
-                    break
+        Returns:
+            Available slots per doctor and date
+        """
+        start_date = start_date or date.today()
+        engine = SlotAvailabilityEngine(self.db)
 
-            if not is_booked:
-                available_slots.append({
-                    "start_time": slot_start.strftime("%H:%M"),
-                    "end_time": slot_end.strftime("%H:%M"),
-                    "available": True,
-                })
+        if doctor_id:
+            availability = {
+                doctor_id: await engine.get_availability(
+                    department_id, doctor_id, start_date, days
+                )
+            }
+        else:
+            availability = await engine.get_department_availability(
+                department_id, start_date, days
+            )
 
-        return available_slots
+        return {
+            "department_id": department_id,
+            "start_date": start_date.isoformat(),
+            "days": days,
+            "doctors": [
+                {
+                    "doctor_id": doctor,
+                    "dates": [
+                        {
+                            "date": day.isoformat(),
+                            "available_slots": slots,
+                            "count": len(slots),
+                        }
+                        for day, slots in sorted(per_day.items())
+                    ],
+                }
+                for doctor, per_day in availability.items()
+            ],
+        }
 
     async def cancel_appointment(
         self,
@@ -257,6 +295,10 @@ class AppointmentBookingService(object):
 
         await self.db.flush()
 
+        availability_cache.invalidate_after_commit(
+            self.db, appointment.department_id, [appointment.appointment_date]
+        )
+
         # Cancel associated queue ticket if exists
         if appointment.queue_number:
             await self._cancel_queue_ticket(appointment)
@@ -325,31 +367,45 @@ class AppointmentBookingService(object):
         old_date = appointment.appointment_date
         old_time = appointment.appointment_time
 
-        # Check new slot availability
-        is_available = await self._check_slot_availability(
-            department_id=appointment.department_id,
-            doctor_id=appointment.doctor_id,
-            appointment_date=new_appointment_date,
-            appointment_time=new_appointment_time,
-            duration_minutes=appointment.duration_minutes,
-            exclude_appointment_id=appointment_id,
-        )
-
-        if not is_available:
-            raise AppointmentUnavailableError(
-                "Slot baru tidak tersedia"
+        # Check new slot availability (doctor appointments are guarded by
+        # the overlap exclusion constraint on flush)
+        if not appointment.doctor_id:
+            is_available = await self._check_slot_availability(
+                department_id=appointment.department_id,
+                doctor_id=appointment.doctor_id,
+                appointment_date=new_appointment_date,
+                appointment_time=new_appointment_time,
+                duration_minutes=appointment.duration_minutes,
+                exclude_appointment_id=appointment_id,
             )
 
-        # Update appointment
-        appointment.appointment_date = new_appointment_date
-        appointment.appointment_time = new_appointment_time
+            if not is_available:
+                raise AppointmentUnavailableError(
+                    "Slot baru tidak tersedia"
+                )
 
-        # Recalculate end time
-        start_datetime = datetime.combine(new_appointment_date, new_appointment_time)
-        end_datetime = start_datetime + timedelta(minutes=appointment.duration_minutes)
-        appointment.end_time = end_datetime.time()
+        try:
+            async with self.db.begin_nested():
+                # Update appointment
+                appointment.appointment_date = new_appointment_date
+                appointment.appointment_time = new_appointment_time
+
+                # Recalculate end time
+                start_datetime = datetime.combine(new_appointment_date, new_appointment_time)
+                end_datetime = start_datetime + timedelta(minutes=appointment.duration_minutes)
+                appointment.end_time = end_datetime.time()
+
+                await self.db.flush()
+        except IntegrityError as e:
+            if self._is_overlap_violation(e):
+                raise AppointmentUnavailableError(
+                    "Slot baru tidak tersedia"
+                )
+            raise
 
-        await self.db.flush()
+        availability_cache.invalidate_after_commit(
+            self.db, appointment.department_id, [old_date, new_appointment_date]
+        )
 
         # Cancel old queue ticket if exists
         if appointment.queue_number:
@@ -702,183 +758,26 @@ class AppointmentBookingService(object):
         Returns:
             True if available, False otherwise
         """
-        # Get existing appointments
-        query = select(Appointment).where(
-            and_(
-                Appointment.department_id == department_id,
-                Appointment.appointment_date == appointment_date,
-                Appointment.status.in_([
-                    AppointmentStatus.SCHEDULED,
-                    AppointmentStatus.CONFIRMED,
-                    AppointmentStatus.CHECKED_IN,
-                ]),
-            )
-        )
-
-        if doctor_id:
-            query = query.where(Appointment.doctor_id == doctor_id)
-
-        if exclude_appointment_id:
-            query = query.where(Appointment.id != exclude_appointment_id)
-
-        result = await self.db.execute(query)
-        existing_appointments = result.scalars().all()
-
-        # Calculate new appointment time range
-        new_start = appointment_time
-        new_end = (datetime.combine(date.today(), appointment_time) +
-                  timedelta(minutes=duration_minutes)).time()
-
-        # Check for overlaps
-        for appt in existing_appointments:
-            appt_start = appt.appointment_time
-            appt_end = appt.end_time
-
-            if self._time_ranges_overlap(
-                new_start, new_end,
-                appt_start, appt_end
-            ):
-                return False  # Slot is taken
-
-        return True  # Slot is available
-
-    async def _get_slot_configuration(
-        self,
-        department_id: int,
-        doctor_id: Optional[int],
-        appointment_date: date,
-    ) -> List[Dict[str, any]]:
-        """Get slot configuration for doctor/department
-
-        Args:
-            department_id: Department ID
-            doctor_id: Doctor ID
-            appointment_date: Appointment date
-
-        Returns:
-            List of configured time slots
-        """
-        # Check for explicit slot configuration
-        query = select(AppointmentSlot).where(
-            and_(
-                AppointmentSlot.department_id == department_id,
-                AppointmentSlot.slot_date == appointment_date,
-                AppointmentSlot.is_available == True,
-            )
-        )
-
-        if doctor_id:
-            query = query.where(AppointmentSlot.doctor_id == doctor_id)
-        else:
-            query = query.where(AppointmentSlot.doctor_id.is_(None))
-
-        query = query.order_by(AppointmentSlot.start_time)
-
-        result = await self.db.execute(query)
-        slots = result.scalars().all()
-
-        if slots:
-            # Return configured slots
-            return [
-                {
-                    "start_time": s.start_time,
-                    "end_time": s.end_time,
-                    "max_bookings": s.max_bookings,
-                }
-                for s in slots
-            ]
-
-        # Return default working hours slots
-        return self._get_default_slots()
-
-    def _get_default_slots(self) -> List[Dict[str, any]]:
-        """Get default time slots based on working hours
-
-        Returns:
-            List of default time slots
-        """
-        # Default working hours: 08:00 - 17:00
-        # Default slot duration: 30 minutes
-        slots = []
-
-        start_hour = 8
-        end_hour = 17
-        slot_duration = 30  # minutes
-
-        current_time = time(hour=start_hour, minute=0)
-
-        while current_time < time(hour=end_hour):
-            end_time = (
-                datetime.combine(date.today(), current_time) +
-                timedelta(minutes=slot_duration)
-            ).time()
-
-            slots.append({
-                "start_time": current_time,
-                "end_time": end_time,
-                "max_bookings": 1,
-            })
-
-            # Move to next slot
-            current_time = end_time
-
-        return slots
-
-    async def _get_existing_appointments(
-        self,
-        department_id: int,
-        doctor_id: Optional[int],
-        appointment_date: date,
-    ) -> List[Appointment]:
-        """Get existing appointments for slot calculation
-
-        Args:
-            department_id: Department ID
-            doctor_id: Doctor ID
-            appointment_date: Appointment date
-
-        Returns:
-            List of existing appointments
-        """
-        query = select(Appointment).where(
-            and_(
-                Appointment.department_id == department_id,
-                Appointment.appointment_date == appointment_date,
-                Appointment.status.in_([
-                    AppointmentStatus.SCHEDULED,
-                    AppointmentStatus.CONFIRMED,
-                    AppointmentStatus.CHECKED_IN,
-                ]),
-            )
+        engine = SlotAvailabilityEngine(self.db)
+        return await engine.is_available(
+            department_id=department_id,
+            doctor_id=doctor_id,
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            duration_minutes=duration_minutes,
+            exclude_appointment_id=exclude_appointment_id,
         )
 
-        if doctor_id:
-            query = query.where(Appointment.doctor_id == doctor_id)
-
-        query = query.order_by(Appointment.appointment_time)
-
-        result = await self.db.execute(query)
-        return result.scalars().all()
-
-    def _time_ranges_overlap(
-        self,
-        start1: time,
-        end1: time,
-        start2: time,
-        end2: time,
-    ) -> bool:
-        """Check if two time ranges overlap
+    def _is_overlap_violation(self, error: IntegrityError) -> bool:
+        """Check whether an IntegrityError comes from the doctor overlap constraint
 
         Args:
-            start1: First range start
-            end1: First range end
-            start2: Second range start
-            end2: Second range end
+            error: Error raised on flush
 
         Returns:
-            True if ranges overlap
+            True if the appointment overlaps another one of the same doctor
         """
-        return start1 < end2 and start2 < end1
+        return DOCTOR_OVERLAP_CONSTRAINT in str(error.orig)
 
     def _is_working_hours(self, appointment_time: time) -> bool:
         """Check if time is within working hours
@@ -904,15 +803,8 @@ class AppointmentBookingService(object):
         today = date.today()
         date_str = today.strftime("%Y%m%d")
 
-        # Get count for today
-        query = select(func.count()).select_from(Appointment).where(
-            Appointment.created_at >= datetime.combine(today, datetime.min.time())
-        )
-
-        result = await self.db.execute(query)
-        count = result.scalar() or 0
-
-        sequence = count + 1
+        # Next value of the shared daily appointment sequence
+        sequence = await allocate_number("appointment", on_date=today)
 
         return "APT-{0}-{1:05d}".format(date_str, sequence)
 
@@ -10,23 +10,24 @@ This module provides services for:
 Python 3.5+ compatible
 """
 
+import asyncio
 import os
-import subprocess
-import hashlib
 import logging
-import shutil
-import gzip
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, update
 from sqlalchemy.orm import selectinload
 
 from app.models.backup import (
     BackupJob, BackupRestore, BackupVerification, BackupMetrics,
     BackupStatus, BackupType,
 )
+from app.db.session import get_db_context
 from app.models.system_alerts import SystemAlert, AlertSeverity, AlertStatus
+from app.services.backup_engine import (
+    BackupIntegrityError, RestoreProgress, create_backup_engine, file_checksum,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -37,6 +38,9 @@ DEFAULT_BACKUP_DIR = "/var/backups/simrs"
 DEFAULT_RETENTION_DAYS = 30
 DEFAULT_COMPRESSION_LEVEL = 6
 
+# How often a running restore writes its progress to BackupRestore
+RESTORE_PROGRESS_INTERVAL_SECONDS = 5
+
 
 class BackupCreationService(object):
     """Service for creating database and file system backups"""
@@ -62,7 +66,7 @@ class BackupCreationService(object):
             job_name: Human-readable job name
             backup_type: Type of backup (full, differential, incremental)
             source_type: Source type (database, files, uploads)
-            storage_type: Storage type (local, s3, gcs, azure)
+            storage_type: Storage type (local, minio, s3, gcs, azure)
             storage_path: Storage destination path
             source_path: Source path for file backups
             encryption_enabled: Whether to encrypt backup
@@ -161,7 +165,7 @@ class BackupCreationService(object):
             raise
 
     async def _backup_database(self, backup_job: BackupJob) -> Dict[str, Any]:
-        """Perform PostgreSQL database backup using pg_dump
+        """Perform PostgreSQL database backup using parallel pg_dump
 
         Args:
             backup_job: The backup job
@@ -169,74 +173,20 @@ class BackupCreationService(object):
         Returns:
             Dict with backup results
         """
-        # Get database URL from environment
-        from app.core.config import settings
-
-        # Build backup filename
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        filename = "{}_{}.sql".format(
-            backup_job.job_name.replace(" ", "_").lower(),
-            timestamp
-        )
-
-        # Full path
-        backup_dir = backup_job.storage_path or DEFAULT_BACKUP_DIR
-        backup_path = os.path.join(backup_dir, filename)
-
-        # Ensure directory exists
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # Build pg_dump command
-        # For production, use environment variables for credentials
-        pg_dump_cmd = [
-            "pg_dump",
-            "-h", settings.DATABASE_HOST if hasattr(settings, "DATABASE_HOST") else "localhost",
-            "-p", str(settings.DATABASE_PORT if hasattr(settings, "DATABASE_PORT") else 5432),
-            "-U", settings.DATABASE_USER if hasattr(settings, "DATABASE_USER") else "postgres",
-            "-d", settings.DATABASE_NAME if hasattr(settings, "DATABASE_NAME") else "simrs",
-            "-F", "c",  # Custom format
-            "-f", backup_path,
-            "-Z", str(DEFAULT_COMPRESSION_LEVEL),  # Compression level
-        ]
-
-        # Set password environment variable
-        env = os.environ.copy()
-        if hasattr(settings, "DATABASE_PASSWORD"):
-            env["PGPASSWORD"] = settings.DATABASE_PASSWORD
-
-        # Execute pg_dump
-        process = subprocess.Popen(
-            pg_dump_cmd,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+        engine = create_backup_engine()
+        return await engine.backup_database(
+            name=backup_job.job_name,
+            storage_type=backup_job.storage_type,
+            storage_path=backup_job.storage_path or DEFAULT_BACKUP_DIR,
         )
 
-        stdout, stderr = process.communicate()
-
-        if process.returncode != 0:
-            raise RuntimeError(
-                "pg_dump failed: {}".format(stderr.decode("utf-8", errors="ignore"))
-            )
-
-        # Get file size and checksum
-        file_size = os.path.getsize(backup_path)
-        checksum = self._calculate_checksum(backup_path)
-
-        logger.info("Database backup created: {} ({} bytes)".format(
-            backup_path, file_size
-        ))
-
-        return {
-            "backup_path": backup_path,
-            "size_bytes": file_size,
-            "checksum": checksum,
-            "files_count": 1,
-        }
-
     async def _backup_files(self, backup_job: BackupJob) -> Dict[str, Any]:
         """Perform file system backup
 
+        Incremental backups archive what changed since the last completed
+        backup of the same source, differential ones what changed since the
+        last full backup. Without a usable base a full backup is taken.
+
         Args:
             backup_job: The backup job
 
@@ -244,66 +194,70 @@ class BackupCreationService(object):
             Dict with backup results
         """
         source_path = backup_job.source_path
-        if not source_path or not os.path.exists(source_path):
+        if not source_path or not os.path.isdir(source_path):
             raise ValueError("Source path does not exist: {}".format(source_path))
 
-        # Build backup filename
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        dirname = os.path.basename(source_path)
-        filename = "{}_{}.tar.gz".format(
-            dirname.replace(" ", "_").lower(),
-            timestamp
-        )
-
-        # Full path
-        backup_dir = backup_job.storage_path or DEFAULT_BACKUP_DIR
-        backup_path = os.path.join(backup_dir, filename)
+        engine = create_backup_engine()
 
-        # Ensure directory exists
-        os.makedirs(backup_dir, exist_ok=True)
+        base_manifest = None
+        base_backup = await self._find_base_backup(backup_job)
+        if base_backup is not None:
+            base_manifest = await engine.load_manifest(base_backup.backup_path)
+            if base_manifest is None:
+                logger.warning("No manifest for base backup {}, taking a full backup".format(
+                    base_backup.job_id
+                ))
 
-        # Create tar.gz archive
-        shutil.make_archive(
-            base_name=os.path.join(backup_dir, filename.replace(".tar.gz", "")),
-            format="gztar",
-            root_dir=os.path.dirname(source_path),
-            base_dir=os.path.basename(source_path),
+        return await engine.backup_files(
+            source_path=source_path,
+            backup_id=backup_job.job_id,
+            storage_type=backup_job.storage_type,
+            storage_path=backup_job.storage_path or DEFAULT_BACKUP_DIR,
+            base_manifest=base_manifest,
         )
 
-        # Get file size and checksum
-        file_size = os.path.getsize(backup_path)
-        checksum = self._calculate_checksum(backup_path)
+    async def _find_base_backup(self, backup_job: BackupJob) -> Optional[BackupJob]:
+        """Find the backup an incremental or differential file backup builds on
 
-        # Count files
-        files_count = sum(1 for _, _, files in os.walk(source_path) for _ in files)
+        Args:
+            backup_job: The backup job
 
-        logger.info("File backup created: {} ({} files, {} bytes)".format(
-            backup_path, files_count, file_size
-        ))
+        Returns:
+            Base BackupJob, or None for full backups and when there is none
+        """
+        if backup_job.backup_type not in (BackupType.INCREMENTAL, BackupType.DIFFERENTIAL):
+            return None
+
+        conditions = [
+            BackupJob.id != backup_job.id,
+            BackupJob.source_type == backup_job.source_type,
+            BackupJob.source_path == backup_job.source_path,
+            BackupJob.status == BackupStatus.COMPLETED,
+            BackupJob.backup_path.isnot(None),
+        ]
+        if backup_job.backup_type == BackupType.DIFFERENTIAL:
+            conditions.append(BackupJob.backup_type == BackupType.FULL)
 
-        return {
-            "backup_path": backup_path,
-            "size_bytes": file_size,
-            "checksum": checksum,
-            "files_count": files_count,
-        }
+        result = await self.db.execute(
+            select(BackupJob)
+            .where(and_(*conditions))
+            .order_by(BackupJob.completed_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
 
     def _calculate_checksum(self, file_path: str) -> str:
         """Calculate SHA256 checksum of a file
 
+        Blocking; call it from a worker thread.
+
         Args:
             file_path: Path to file
 
         Returns:
             Hexadecimal checksum string
         """
-        sha256_hash = hashlib.sha256()
-
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-
-        return sha256_hash.hexdigest()
+        return file_checksum(file_path)
 
     async def _record_metrics(self, backup_job: BackupJob):
         """Record backup performance metrics
@@ -436,7 +390,11 @@ class BackupRestorationService(object):
             # Update status
             restore_job.status = BackupStatus.RUNNING
             restore_job.started_at = datetime.utcnow()
-            await self.db.flush()
+            restore_job.progress_percent = 0.0
+            restore_job.progress_message = None
+            # Commit so the running state and progress are visible, and no lock
+            # on backup_restores is held while pg_restore runs
+            await self.db.commit()
 
             # Execute based on type
             if restore_job.target_type == "database":
@@ -458,6 +416,8 @@ class BackupRestorationService(object):
             restore_job.tables_restored = result.get("tables_restored")
             restore_job.checksum_verified = result.get("checksum_verified", False)
             restore_job.validation_passed = result.get("validation_passed", True)
+            restore_job.progress_percent = 100.0
+            restore_job.progress_message = None
 
             logger.info("Restore completed: {} - {}".format(
                 restore_job.restore_id, restore_job.backup_path
@@ -469,6 +429,16 @@ class BackupRestorationService(object):
             restore_job.status = BackupStatus.FAILED
             restore_job.completed_at = datetime.utcnow()
             restore_job.error_message = str(e)
+            if isinstance(e, BackupIntegrityError):
+                restore_job.checksum_verified = False
+                restore_job.validation_passed = False
+                restore_job.validation_errors = "\n".join(e.errors)
+
+            # The running state was already committed; record the failure too
+            try:
+                await self.db.commit()
+            except Exception as commit_error:
+                logger.error("Could not record restore failure: {}".format(commit_error))
 
             logger.error("Restore failed: {} - {}".format(
                 restore_job.restore_id, str(e)
@@ -477,7 +447,7 @@ class BackupRestorationService(object):
             raise
 
     async def _restore_database(self, restore_job: BackupRestore) -> Dict[str, Any]:
-        """Restore PostgreSQL database from backup
+        """Restore PostgreSQL database from backup with parallel pg_restore
 
         Args:
             restore_job: The restore job
@@ -485,10 +455,16 @@ class BackupRestorationService(object):
         Returns:
             Dict with restore results
         """
-        # In dry run mode, just verify the backup file exists
+        engine = create_backup_engine()
+        backup_job = await self.db.get(BackupJob, restore_job.backup_job_id)
+        expected_checksum = backup_job.checksum if backup_job else None
+        progress = RestoreProgress()
+
+        # In dry run mode, only read the backup through once to verify it
         if restore_job.dry_run:
-            if not os.path.exists(restore_job.backup_path):
-                raise ValueError("Backup file not found: {}".format(restore_job.backup_path))
+            await self._with_progress(restore_job, progress, engine.verify_archive(
+                restore_job.backup_path, expected_checksum, progress
+            ))
 
             logger.info("Dry run: Database backup verified: {}".format(
                 restore_job.backup_path
@@ -498,123 +474,166 @@ class BackupRestorationService(object):
                 "files_restored": 0,
                 "bytes_restored": 0,
                 "tables_restored": 0,
-                "checksum_verified": True,
+                "checksum_verified": expected_checksum is not None,
                 "validation_passed": True,
             }
 
-        # Actual restoration would use pg_restore
-        # For safety, this should only be done with explicit approval
-        from app.core.config import settings
-
-        # Build pg_restore command
-        target_db = settings.DATABASE_NAME if hasattr(settings, "DATABASE_NAME") else "simrs"
-
-        pg_restore_cmd = [
-            "pg_restore",
-            "-h", settings.DATABASE_HOST if hasattr(settings, "DATABASE_HOST") else "localhost",
-            "-p", str(settings.DATABASE_PORT if hasattr(settings, "DATABASE_PORT") else 5432),
-            "-U", settings.DATABASE_USER if hasattr(settings, "DATABASE_USER") else "postgres",
-            "-d", target_db,
-            "-c",  # Clean existing database objects
-            "--if-exists",
+        # Actual restoration; only reached with explicit approval
+        options = restore_job.restore_options or {}
+        result = await self._with_progress(restore_job, progress, engine.restore_database(
             restore_job.backup_path,
-        ]
-
-        # Set password environment variable
-        env = os.environ.copy()
-        if hasattr(settings, "DATABASE_PASSWORD"):
-            env["PGPASSWORD"] = settings.DATABASE_PASSWORD
-
-        # Execute pg_restore
-        process = subprocess.Popen(
-            pg_restore_cmd,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
-        stdout, stderr = process.communicate()
-
-        if process.returncode != 0:
-            raise RuntimeError(
-                "pg_restore failed: {}".format(stderr.decode("utf-8", errors="ignore"))
-            )
+            expected_checksum,
+            progress,
+            target_database=options.get("target_database"),
+        ))
 
-        logger.info("Database restored from: {}".format(restore_job.backup_path))
+        logger.info("Database restored from: {} ({} tables)".format(
+            restore_job.backup_path, result["tables_restored"]
+        ))
 
         return {
-            "files_restored": 1,
-            "bytes_restored": os.path.getsize(restore_job.backup_path),
-            "tables_restored": 0,  # Would need to query pg_tables
-            "checksum_verified": True,
+            "files_restored": result["files_restored"],
+            "bytes_restored": result["bytes_restored"],
+            "tables_restored": result["tables_restored"],
+            "checksum_verified": expected_checksum is not None,
             "validation_passed": True,
         }
 
     async def _restore_files(self, restore_job: BackupRestore) -> Dict[str, Any]:
         """Restore files from backup
 
+        Incremental and differential backups are restored together with the
+        base archives their manifest points to.
+
         Args:
             restore_job: The restore job
 
         Returns:
             Dict with restore results
         """
-        target_path = restore_job.target_path or "/tmp/restore"
-        backup_path = restore_job.backup_path
+        engine = create_backup_engine()
+        backup_job = await self.db.get(BackupJob, restore_job.backup_job_id)
+        expected_checksum = backup_job.checksum if backup_job else None
+        progress = RestoreProgress()
 
         # In dry run mode
         if restore_job.dry_run:
-            if not os.path.exists(backup_path):
-                raise ValueError("Backup file not found: {}".format(backup_path))
-
-            # Get file count from archive
-            result = subprocess.run(
-                ["tar", "-tzf", backup_path],
-                capture_output=True,
-                text=True
-            )
-
-            if result.returncode != 0:
-                files_count = 0
-            else:
-                files_count = len(result.stdout.strip().split("\n"))
+            result = await self._with_progress(restore_job, progress, engine.verify_archive(
+                restore_job.backup_path, expected_checksum, progress
+            ))
 
             logger.info("Dry run: File backup verified: {} ({} files)".format(
-                backup_path, files_count
+                restore_job.backup_path, result["files_count"]
             ))
 
             return {
                 "files_restored": 0,
                 "bytes_restored": 0,
-                "checksum_verified": True,
+                "checksum_verified": result["checksum_verified"],
                 "validation_passed": True,
             }
 
         # Actual restoration
-        os.makedirs(target_path, exist_ok=True)
-
-        # Extract archive
-        shutil.unpack_archive(backup_path, target_path)
-
-        # Count restored files
-        files_count = sum(1 for _, _, files in os.walk(target_path) for _ in files)
-        total_size = sum(
-            os.path.getsize(os.path.join(dirpath, filename))
-            for dirpath, _, filenames in os.walk(target_path)
-            for filename in filenames
-        )
+        target_path = restore_job.target_path or "/tmp/restore"
+        manifest = await engine.load_manifest(restore_job.backup_path)
+        archives = [(
+            backup_job.job_id if backup_job else None,
+            restore_job.backup_path,
+            expected_checksum,
+        )]
+        if manifest is not None:
+            archives = await self._restore_archives(restore_job, backup_job, manifest)
 
-        logger.info("Files restored from {} to {} ({} files, {} bytes)".format(
-            backup_path, target_path, files_count, total_size
+        result = await self._with_progress(restore_job, progress, engine.restore_files(
+            archives, target_path, manifest, progress
         ))
 
         return {
-            "files_restored": files_count,
-            "bytes_restored": total_size,
-            "checksum_verified": True,
+            "files_restored": result["files_restored"],
+            "bytes_restored": result["bytes_restored"],
+            "checksum_verified": all(checksum for _, _, checksum in archives),
             "validation_passed": True,
         }
 
+    async def _restore_archives(
+        self,
+        restore_job: BackupRestore,
+        backup_job: Optional[BackupJob],
+        manifest: Dict[str, Any],
+    ) -> List[Any]:
+        """(job ID, path, checksum) of every archive holding files of a manifest
+
+        Args:
+            restore_job: The restore job
+            backup_job: The backup being restored
+            manifest: Its manifest
+
+        Returns:
+            Archives to read, the restored backup first
+        """
+        job_ids = set(entry.get("backup_id") for entry in manifest.get("files", {}).values())
+        job_ids.discard(manifest.get("backup_id"))
+
+        archives = [(manifest.get("backup_id"), restore_job.backup_path, backup_job.checksum if backup_job else None)]
+        if not job_ids:
+            return archives
+
+        result = await self.db.execute(
+            select(BackupJob).where(and_(
+                BackupJob.job_id.in_(job_ids),
+                BackupJob.status == BackupStatus.COMPLETED,
+            ))
+        )
+        bases = dict((base.job_id, base) for base in result.scalars().all())
+        missing = sorted(job_ids - set(bases))
+        if missing:
+            raise ValueError("Base backups not available: {}".format(", ".join(missing)))
+
+        for job_id in sorted(job_ids):
+            archives.append((job_id, bases[job_id].backup_path, bases[job_id].checksum))
+        return archives
+
+    async def _with_progress(self, restore_job: BackupRestore, progress: RestoreProgress, operation):
+        """Await a restore operation, writing its progress to the restore job
+
+        Progress is committed every RESTORE_PROGRESS_INTERVAL_SECONDS so it
+        can be polled while the restore runs. It is written on a session of
+        its own, and the reporter is stopped between writes, so the caller's
+        session is never used concurrently or left mid-commit.
+        """
+        stopped = asyncio.Event()
+
+        async def report():
+            while True:
+                try:
+                    await asyncio.wait_for(stopped.wait(), RESTORE_PROGRESS_INTERVAL_SECONDS)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    await self._record_progress(restore_job.id, progress)
+                except Exception as e:
+                    logger.warning("Could not record restore progress for {}: {}".format(
+                        restore_job.restore_id, e
+                    ))
+                    return
+
+        reporter = asyncio.ensure_future(report())
+        try:
+            return await operation
+        finally:
+            stopped.set()
+            await reporter
+
+    async def _record_progress(self, restore_job_id: int, progress: RestoreProgress):
+        """Commit the progress of a running restore on a separate session"""
+        async with get_db_context() as db:
+            await db.execute(
+                update(BackupRestore)
+                .where(BackupRestore.id == restore_job_id)
+                .values(progress_percent=progress.percent(), progress_message=progress.describe())
+            )
+
 
 class BackupVerificationService(object):
     """Service for verifying backup integrity"""
@@ -701,18 +720,18 @@ class BackupVerificationService(object):
             backup_job: Backup job
             verification: Verification record to update
         """
-        if not backup_job.backup_path or not os.path.exists(backup_job.backup_path):
+        # Calculate current checksum, streamed off the event loop
+        actual_checksum = None
+        if backup_job.backup_path:
+            actual_checksum = await create_backup_engine().checksum(backup_job.backup_path)
+
+        if actual_checksum is None:
             verification.checksum_match = False
             verification.issues_found = 1
             verification.corruption_detected = True
             verification.corruption_details = "Backup file not found"
             return
 
-        # Calculate current checksum
-        from app.services.backup import BackupCreationService
-        service = BackupCreationService(self.db)
-        actual_checksum = service._calculate_checksum(backup_job.backup_path)
-
         verification.checksum_algorithm = "SHA256"
         verification.expected_checksum = backup_job.checksum
         verification.actual_checksum = actual_checksum
@@ -733,8 +752,11 @@ class BackupVerificationService(object):
             verification: Verification record to update
         """
         # This would perform a test restoration to a temporary database
-        # For now, just check if file exists and can be read
-        if backup_job.backup_path and os.path.exists(backup_job.backup_path):
+        # For now, just check if the backup is still stored
+        size = None
+        if backup_job.backup_path:
+            size = await create_backup_engine().stat(backup_job.backup_path)
+        if size is not None:
             verification.test_restore_successful = True
         else:
             verification.test_restore_successful = False
@@ -748,11 +770,10 @@ class BackupVerificationService(object):
             verification: Verification record to update
         """
         # Check for file corruption
-        if backup_job.backup_path and os.path.exists(backup_job.backup_path):
+        if backup_job.backup_path:
             try:
-                # Try to read the file
-                with open(backup_job.backup_path, "rb") as f:
-                    f.read(1024)  # Read first 1KB
+                # Try to read the first 1KB
+                await create_backup_engine().read_head(backup_job.backup_path, 1024)
             except Exception as e:
                 verification.corruption_detected = True
                 verification.corruption_details = str(e)
@@ -796,6 +817,9 @@ class BackupRetentionService(object):
     async def cleanup_old_backups(self, dry_run: bool = True) -> Dict[str, Any]:
         """Clean up backups older than their retention period
 
+        Backups whose files a retained incremental or differential backup
+        still reads from are kept, along with their manifests.
+
         Args:
             dry_run: If True, only report what would be deleted
 
@@ -815,34 +839,77 @@ class BackupRetentionService(object):
         result = await self.db.execute(query)
         old_backups = result.scalars().all()
 
-        to_delete = len(old_backups)
+        engine = create_backup_engine()
+        referenced = await self._referenced_backup_ids(engine, cutoff_date)
+
+        to_delete = 0
         deleted = 0
+        kept = 0
         total_size = 0
 
         for backup in old_backups:
-            file_size = 0
-            if backup.backup_path and os.path.exists(backup.backup_path):
-                file_size = os.path.getsize(backup.backup_path)
-                total_size += file_size
-
-                if not dry_run:
-                    try:
-                        os.remove(backup.backup_path)
-                        deleted += 1
-                    except Exception as e:
-                        logger.error("Failed to delete backup file: {}".format(e))
-            else:
+            if backup.job_id in referenced:
+                kept += 1
+                continue
+            to_delete += 1
+
+            file_size = None
+            if backup.backup_path:
+                file_size = await engine.stat(backup.backup_path)
+            if file_size is None:
                 deleted += 1
+                continue
+
+            total_size += file_size
+            if not dry_run:
+                try:
+                    await engine.delete(backup.backup_path)
+                    deleted += 1
+                except Exception as e:
+                    logger.error("Failed to delete backup file: {}".format(e))
 
         return {
             "cutoff_date": cutoff_date.isoformat(),
             "retention_days": DEFAULT_RETENTION_DAYS,
             "backups_to_delete": to_delete,
             "backups_deleted": deleted,
+            "backups_kept_as_base": kept,
             "total_size_bytes": total_size,
             "dry_run": dry_run,
         }
 
+    async def _referenced_backup_ids(self, engine, cutoff_date: datetime) -> Set[str]:
+        """Job IDs of the archives that retained backups restore files from
+
+        Every manifest entry names the backup whose archive holds the file,
+        so a retained backup's bases are all listed in its own manifest.
+
+        Args:
+            engine: Backup engine to read manifests with
+            cutoff_date: Backups completed before this are past retention
+
+        Returns:
+            Set of referenced job IDs
+        """
+        result = await self.db.execute(
+            select(BackupJob).where(
+                and_(
+                    BackupJob.completed_at >= cutoff_date,
+                    BackupJob.status == BackupStatus.COMPLETED,
+                    BackupJob.backup_type.in_([BackupType.INCREMENTAL, BackupType.DIFFERENTIAL]),
+                    BackupJob.backup_path.isnot(None),
+                )
+            )
+        )
+
+        referenced = set()
+        for backup in result.scalars().all():
+            manifest = await engine.load_manifest(backup.backup_path)
+            if manifest is None:
+                continue
+            referenced.update(entry.get("backup_id") for entry in manifest.get("files", {}).values())
+        return referenced
+
 
 # Factory functions
 def get_backup_service(db: AsyncSession) -> BackupCreationService:
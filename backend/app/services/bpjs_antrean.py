@@ -20,6 +20,8 @@ import asyncio
 import hashlib
 import hmac
 import logging
+import random
+import time
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 from urllib.parse import urljoin
@@ -27,6 +29,16 @@ from urllib.parse import urljoin
 import httpx
 
 from app.core.config import settings
+from app.core.http_clients import http_client_registry
+from app.core.upstream_resilience import (
+    CONNECT_ERROR_CODE,
+    REQUEST_ERROR_CODE,
+    TIMEOUT_CODE,
+    UPSTREAM_UNAVAILABLE_CODE,
+    UpstreamUnavailableError,
+    is_transient_code,
+    upstream_guards,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -76,32 +88,29 @@ class BPJSAntreanClient:
             )
 
         self._client = None  # type: Optional[httpx.AsyncClient]
+        self._owns_client = False
 
     async def __aenter__(self):
         """Async context manager entry."""
-        self._client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0, connect=10.0),
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
-        )
+        await self.get_client()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        if self._client:
-            await self._client.aclose()
+        await self.close()
 
     async def get_client(self) -> httpx.AsyncClient:
         """
-        Get or create HTTP client.
+        Get HTTP client.
+
+        Borrows the application's shared "bpjs_antrean" connection pool when it is
+        running, otherwise creates a private client that close() releases.
 
         Returns:
             httpx.AsyncClient instance
         """
         if self._client is None:
-            self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0, connect=10.0),
-                limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
-            )
+            self._client, self._owns_client = http_client_registry.acquire("bpjs_antrean")
         return self._client
 
     def _generate_timestamp(self) -> str:
@@ -237,26 +246,31 @@ class BPJSAntreanClient:
                 "Mohon set BPJS_CONSUMER_ID dan BPJS_CONSUMER_SECRET."
             )
 
+        if method.upper() not in ("GET", "POST", "DELETE", "PUT"):
+            raise BPJSAntreanError(f"HTTP method tidak didukung: {method}")
+
         client = await self.get_client()
         url = self._build_url(endpoint)
-        headers = self._get_headers()
 
         logger.info(f"Request BPJS API: {method} {url}")
 
         if json_data:
             logger.debug(f"Request body: {json_data}")
 
-        try:
+        async def send(timeout: httpx.Timeout) -> httpx.Response:
+            headers = self._get_headers()
             if method.upper() == "GET":
-                response = await client.get(url, headers=headers, params=params)
+                return await client.get(url, headers=headers, params=params, timeout=timeout)
             elif method.upper() == "POST":
-                response = await client.post(url, headers=headers, json=json_data)
+                return await client.post(url, headers=headers, json=json_data, timeout=timeout)
             elif method.upper() == "DELETE":
-                response = await client.delete(url, headers=headers)
-            elif method.upper() == "PUT":
-                response = await client.put(url, headers=headers, json=json_data)
-            else:
-                raise BPJSAntreanError(f"HTTP method tidak didukung: {method}")
+                return await client.delete(url, headers=headers, timeout=timeout)
+            return await client.put(url, headers=headers, json=json_data, timeout=timeout)
+
+        try:
+            response = await upstream_guards["bpjs_antrean"].call(
+                endpoint, send, hedge=method.upper() == "GET"
+            )
 
             # Log status response
             logger.info(f"Response BPJS API: {response.status_code}")
@@ -265,20 +279,36 @@ class BPJSAntreanClient:
             if response.status_code >= 400:
                 error_msg = f"HTTP {response.status_code}: {response.text}"
                 logger.error(f"Error HTTP BPJS API: {error_msg}")
-                raise BPJSAntreanError(message=error_msg)
+                raise BPJSAntreanError(message=error_msg, code=str(response.status_code))
 
             return await self._handle_response(response)
 
+        except UpstreamUnavailableError as e:
+            logger.warning(f"Request BPJS API ditolak: {e}")
+            raise BPJSAntreanError(
+                message="BPJS API sedang tidak tersedia, silakan coba lagi nanti",
+                code=UPSTREAM_UNAVAILABLE_CODE,
+                details=e.reason,
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            logger.error(f"Error koneksi BPJS API: {e}")
+            raise BPJSAntreanError(
+                message="Gagal terhubung ke BPJS API",
+                code=CONNECT_ERROR_CODE,
+                details=str(e)
+            )
         except httpx.TimeoutException as e:
             logger.error(f"Timeout BPJS API: {e}")
             raise BPJSAntreanError(
                 message="Request ke BPJS API timeout",
+                code=TIMEOUT_CODE,
                 details=str(e)
             )
         except httpx.RequestError as e:
             logger.error(f"Error request BPJS API: {e}")
             raise BPJSAntreanError(
                 message="Gagal terhubung ke BPJS API",
+                code=REQUEST_ERROR_CODE,
                 details=str(e)
             )
         except BPJSAntreanError:
@@ -550,9 +580,9 @@ class BPJSAntreanClient:
 
     async def close(self):
         """Tutup HTTP client."""
-        if self._client:
+        if self._client is not None and self._owns_client:
             await self._client.aclose()
-            self._client = None
+        self._client = None
 
 
 class BPJSAntreanClientWithRetry(BPJSAntreanClient):
@@ -560,6 +590,9 @@ class BPJSAntreanClientWithRetry(BPJSAntreanClient):
     BPJS Antrean Client dengan retry logic otomatis dan exponential backoff.
 
     Extends BPJSAntreanClient untuk menambahkan kemampuan retry untuk kegagalan transient.
+    Hanya request yang aman diulang yang di-retry: request GET, dan request
+    metode apa pun yang belum sampai ke BPJS. Request yang ditolak circuit
+    breaker tidak di-retry, dan retry berhenti setelah retry_budget detik.
     """
 
     def __init__(
@@ -567,6 +600,7 @@ class BPJSAntreanClientWithRetry(BPJSAntreanClient):
         max_retries: int = 3,
         initial_backoff: float = 1.0,
         max_backoff: float = 10.0,
+        retry_budget: float = 15.0,
         **kwargs
     ):
         """
@@ -576,12 +610,15 @@ class BPJSAntreanClientWithRetry(BPJSAntreanClient):
             max_retries: Jumlah maksimum percobaan retry
             initial_backoff: Waktu backoff awal dalam detik
             max_backoff: Waktu backoff maksimum dalam detik
+            retry_budget: Tidak ada retry yang dimulai lebih dari sekian
+                detik setelah percobaan pertama
             **kwargs: Arguments yang diteruskan ke BPJSAntreanClient
         """
         super().__init__(**kwargs)
         self.max_retries = max_retries
         self.initial_backoff = initial_backoff
         self.max_backoff = max_backoff
+        self.retry_budget = retry_budget
 
     async def _request_with_retry(
         self,
@@ -589,17 +626,18 @@ class BPJSAntreanClientWithRetry(BPJSAntreanClient):
         endpoint: str,
         params: Optional[Dict[str, Any]] = None,
         json_data: Optional[Dict[str, Any]] = None,
-        retry_count: int = 0,
     ) -> Dict[str, Any]:
         """
         Buat HTTP request ke BPJS API dengan retry logic.
 
+        Backoff eksponensial dengan full jitter, agar retry dari banyak
+        loket tidak menghantam BPJS secara bersamaan.
+
         Args:
             method: HTTP method (GET, POST, DELETE, dll)
             endpoint: API endpoint path
             params: Query parameters
             json_data: JSON body data
-            retry_count: Percobaan retry saat ini
 
         Returns:
             JSON response yang telah diparsing
@@ -607,57 +645,35 @@ class BPJSAntreanClientWithRetry(BPJSAntreanClient):
         Raises:
             BPJSAntreanError: Jika semua percobaan retry gagal
         """
-        try:
-            return await self._request(method, endpoint, params=params, json_data=json_data)
-
-        except (httpx.TimeoutException, httpx.RequestError) as e:
-            if retry_count < self.max_retries:
-                # Hitung exponential backoff delay
-                backoff_delay = min(
-                    self.initial_backoff * (2 ** retry_count),
-                    self.max_backoff
-                )
-
-                logger.warning(
-                    f"Request BPJS API gagal (percobaan {retry_count + 1}/{self.max_retries}): {e}. "
-                    f"Retry dalam {backoff_delay} detik..."
-                )
-
-                # Tunggu sebelum retry
-                await asyncio.sleep(backoff_delay)
-
-                # Retry request
-                return await self._request_with_retry(
-                    method, endpoint, params, json_data, retry_count + 1
-                )
-            else:
-                logger.error(f"Request BPJS API gagal setelah {self.max_retries} retry: {e}")
-                raise BPJSAntreanError(
-                    message=f"Request gagal setelah {self.max_retries} percobaan",
-                    details=str(e)
-                )
-
-        except BPJSAntreanError as e:
-            # Cek jika ini adalah error transient (5xx status codes)
-            if e.code and e.code.startswith("5") and retry_count < self.max_retries:
-                backoff_delay = min(
-                    self.initial_backoff * (2 ** retry_count),
-                    self.max_backoff
+        deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        while True:
+            try:
+                return await self._request(method, endpoint, params=params, json_data=json_data)
+            except BPJSAntreanError as e:
+                if not self._should_retry(method, e, attempt):
+                    raise
+
+                backoff_delay = random.uniform(
+                    0, min(self.initial_backoff * (2 ** attempt), self.max_backoff)
                 )
+                if time.monotonic() + backoff_delay >= deadline:
+                    logger.error(f"Request BPJS API gagal, batas waktu retry habis: {e.message}")
+                    raise
 
+                attempt += 1
                 logger.warning(
-                    f"BPJS API mengembalikan error transient (percobaan {retry_count + 1}/{self.max_retries}): {e.message}. "
-                    f"Retry dalam {backoff_delay} detik..."
+                    f"Request BPJS API gagal (percobaan {attempt}/{self.max_retries + 1}): {e.message}. "
+                    f"Retry dalam {backoff_delay:.2f} detik..."
                 )
-
                 await asyncio.sleep(backoff_delay)
 
-                return await self._request_with_retry(
-                    method, endpoint, params, json_data, retry_count + 1
-                )
-            else:
-                # Tidak bisa di-retry atau max retries tercapai
-                raise
+    def _should_retry(self, method: str, error: BPJSAntreanError, attempt: int) -> bool:
+        if attempt >= self.max_retries or error.code == UPSTREAM_UNAVAILABLE_CODE:
+            return False
+        if error.code == CONNECT_ERROR_CODE:
+            return True
+        return method.upper() == "GET" and is_transient_code(error.code)
 
     # Override semua endpoint methods untuk menggunakan _request_with_retry
     async def update_queue_status(self, queue_data: Dict[str, Any]) -> Dict[str, Any]:
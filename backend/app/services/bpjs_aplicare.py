@@ -24,6 +24,15 @@ from typing import Optional, Dict, Any, List
 import httpx
 
 from app.core.config import settings
+from app.core.http_clients import http_client_registry
+from app.core.upstream_resilience import (
+    CONNECT_ERROR_CODE,
+    REQUEST_ERROR_CODE,
+    TIMEOUT_CODE,
+    UPSTREAM_UNAVAILABLE_CODE,
+    UpstreamUnavailableError,
+    upstream_guards,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -73,32 +82,29 @@ class BPJSAplicareClient:
             )
 
         self._client = None  # type: Optional[httpx.AsyncClient]
+        self._owns_client = False
 
     async def __aenter__(self):
         """Async context manager entry."""
-        self._client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0, connect=10.0),
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
-        )
+        await self.get_client()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        if self._client:
-            await self._client.aclose()
+        await self.close()
 
     async def get_client(self) -> httpx.AsyncClient:
         """
-        Get or create HTTP client.
+        Get HTTP client.
+
+        Borrows the application's shared "bpjs_aplicare" connection pool when it is
+        running, otherwise creates a private client that close() releases.
 
         Returns:
             httpx.AsyncClient instance
         """
         if self._client is None:
-            self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0, connect=10.0),
-                limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
-            )
+            self._client, self._owns_client = http_client_registry.acquire("bpjs_aplicare")
         return self._client
 
     def _generate_timestamp(self) -> str:
@@ -174,24 +180,29 @@ class BPJSAplicareClient:
         Raises:
             BPJSAplicareError: If API request fails
         """
+        if method.upper() not in ("GET", "POST", "PUT", "DELETE"):
+            raise BPJSAplicareError(f"Unsupported HTTP method: {method}")
+
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
-        headers = self._get_headers()
 
         client = await self.get_client()
 
-        try:
-            logger.info(f"BPJS Aplicare API Request: {method} {url}")
-
+        async def send(timeout: httpx.Timeout) -> httpx.Response:
+            headers = self._get_headers()
             if method.upper() == "GET":
-                response = await client.get(url, headers=headers, params=params)
+                return await client.get(url, headers=headers, params=params, timeout=timeout)
             elif method.upper() == "POST":
-                response = await client.post(url, headers=headers, json=json_data)
+                return await client.post(url, headers=headers, json=json_data, timeout=timeout)
             elif method.upper() == "PUT":
-                response = await client.put(url, headers=headers, json=json_data)
-            elif method.upper() == "DELETE":
-                response = await client.delete(url, headers=headers, params=params)
-            else:
-                raise BPJSAplicareError(f"Unsupported HTTP method: {method}")
+                return await client.put(url, headers=headers, json=json_data, timeout=timeout)
+            return await client.delete(url, headers=headers, params=params, timeout=timeout)
+
+        try:
+            logger.info(f"BPJS Aplicare API Request: {method} {url}")
+
+            response = await upstream_guards["bpjs_aplicare"].call(
+                endpoint, send, hedge=method.upper() == "GET"
+            )
 
             # Log response status
             logger.info(f"BPJS Aplicare API Response: {response.status_code}")
@@ -212,10 +223,27 @@ class BPJSAplicareClient:
 
             return data
 
+        except BPJSAplicareError:
+            raise
+        except UpstreamUnavailableError as e:
+            logger.warning(f"BPJS Aplicare API call rejected: {e}")
+            raise BPJSAplicareError(
+                message="BPJS API is temporarily unavailable, please try again later",
+                code=UPSTREAM_UNAVAILABLE_CODE,
+                details=e.reason,
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            logger.error(f"BPJS Aplicare API connection error: {e}")
+            raise BPJSAplicareError(
+                message="Failed to connect to BPJS API",
+                code=CONNECT_ERROR_CODE,
+                details=str(e)
+            )
         except httpx.TimeoutException as e:
             logger.error(f"BPJS Aplicare API timeout: {e}")
             raise BPJSAplicareError(
                 message="BPJS API request timed out",
+                code=TIMEOUT_CODE,
                 details=str(e)
             )
         except httpx.HTTPStatusError as e:
@@ -229,6 +257,7 @@ class BPJSAplicareClient:
             logger.error(f"BPJS Aplicare API request error: {e}")
             raise BPJSAplicareError(
                 message="Failed to connect to BPJS API",
+                code=REQUEST_ERROR_CODE,
                 details=str(e)
             )
         except Exception as e:
@@ -400,6 +429,12 @@ class BPJSAplicareClient:
         endpoint = f"bed/{kodekelas}/gettotalbed"
         return await self._request("GET", endpoint)
 
+    async def close(self):
+        """Close the HTTP client."""
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+        self._client = None
+
 
 # =============================================================================
 # Convenience Functions
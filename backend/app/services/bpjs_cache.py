@@ -1,31 +1,108 @@
 """BPJS Eligibility Verification Service for STORY-008
 
 This module provides caching and history tracking for BPJS eligibility verification.
+
+Eligibility is cached in two tiers: a small in-process LRU (L1) in front of
+Redis (L2). Redis TTLs are jittered so entries written together (e.g. by the
+nightly prewarm) do not expire together, "not found"/"not active" answers are
+cached briefly so repeated lookups of a bad card do not reach BPJS, and
+concurrent misses for the same card share one BPJS request.
 """
+import asyncio
 import json
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Awaitable, Callable, Tuple
 from redis.asyncio import Redis
 
 from app.core.config import settings
+from app.core.metrics import bpjs_eligibility_cache_requests_total
 from app.schemas.bpjs import BPJSEligibilityResponse
 
 logger = logging.getLogger(__name__)
 
+# Redis TTLs vary by up to this fraction either way
+TTL_JITTER = 0.1
+
+# "Not found" / "not active" answers are cached this long
+NEGATIVE_CACHE_TTL_SECONDS = 3600
+
+# In-process tier; kept short so invalidations on other workers converge
+L1_MAX_ENTRIES = 10000
+L1_TTL_SECONDS = 300
+
+# Messages of BPJS answers meaning the member is not eligible
+NOT_ELIGIBLE_MARKERS = (" tidak aktif", " tidak ditemukan")
+
+
+def is_not_eligible_message(message: Optional[str]) -> bool:
+    """Whether a BPJS error message is a "not found" or "not active" answer."""
+    message = (message or "").lower()
+    return any(marker in message for marker in NOT_ELIGIBLE_MARKERS)
+
+
+def jittered_ttl(ttl: int) -> int:
+    return max(1, int(ttl * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)))
+
+
+class LocalTTLCache:
+    """Bounded in-process LRU cache whose entries expire."""
+
+    def __init__(self, max_entries: int = L1_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # type: OrderedDict
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Process-wide L1 tier and in-flight BPJS lookups, shared by all
+# BPJSCacheManager instances
+eligibility_l1_cache = LocalTTLCache()
+_inflight_lookups = {}  # type: Dict[str, asyncio.Future]
+
 
 class BPJSCacheManager:
-    """Manages caching of BPJS eligibility results in Redis."""
+    """Manages caching of BPJS eligibility results in memory and Redis."""
 
-    def __init__(self, redis_client: Optional[Redis] = None):
+    def __init__(self, redis_client: Optional[Redis] = None, local_cache: Optional[LocalTTLCache] = None):
         """
         Initialize cache manager.
 
         Args:
             redis_client: Optional Redis client (for testing)
+            local_cache: In-process tier (default: the process-wide one)
         """
         self.redis = redis_client
+        self.local = local_cache if local_cache is not None else eligibility_l1_cache
         self.cache_ttl = 86400  # 24 hours in seconds
+        self.stale_ttl = 7 * 86400  # last known result, served while BPJS is down
 
     async def get_cached_eligibility(self, key: str) -> Optional[Dict[str, Any]]:
         """
@@ -35,22 +112,35 @@ class BPJSCacheManager:
             key: Cache key (card number or NIK)
 
         Returns:
-            Cached eligibility data or None if not found/expired
+            Cached eligibility data or None if not found/expired. Cached
+            "not eligible" answers have negative set to True.
         """
+        data = self.local.get(key)
+        if data is not None:
+            bpjs_eligibility_cache_requests_total.labels(result="l1_hit").inc()
+            logger.debug(f"L1 cache hit for BPJS eligibility: {key}")
+            return data
+
         if not self.redis:
+            bpjs_eligibility_cache_requests_total.labels(result="miss").inc()
             return None
 
         try:
             cached = await self.redis.get(f"bpjs:eligibility:{key}")
-            if cached:
-                data = json.loads(cached)
-                logger.info(f"Cache hit for BPJS eligibility: {key}")
-                return data
-            return None
         except Exception as e:
             logger.error(f"Error getting cached eligibility: {e}")
             return None
 
+        if not cached:
+            bpjs_eligibility_cache_requests_total.labels(result="miss").inc()
+            return None
+
+        data = json.loads(cached)
+        self.local.set(key, data, L1_TTL_SECONDS)
+        bpjs_eligibility_cache_requests_total.labels(result="l2_hit").inc()
+        logger.debug(f"Cache hit for BPJS eligibility: {key}")
+        return data
+
     async def set_cached_eligibility(self, key: str, data: Dict[str, Any]) -> None:
         """
         Cache eligibility result.
@@ -59,28 +149,137 @@ class BPJSCacheManager:
             key: Cache key (card number or NIK)
             data: Eligibility data to cache
         """
+        # Add cache timestamp
+        data["cached_at"] = datetime.now(timezone.utc).isoformat()
+        self.local.set(key, data, L1_TTL_SECONDS)
+
+        if not self.redis:
+            return
+
+        try:
+            payload = json.dumps(data)
+            await self.redis.setex(f"bpjs:eligibility:{key}", jittered_ttl(self.cache_ttl), payload)
+            await self.redis.setex(f"bpjs:eligibility:stale:{key}", self.stale_ttl, payload)
+            logger.debug(f"Cached BPJS eligibility for: {key}")
+        except Exception as e:
+            logger.error(f"Error caching eligibility: {e}")
+
+    async def set_negative_eligibility(self, key: str, message: str) -> None:
+        """
+        Cache a "not found" / "not active" answer for a short time.
+
+        Args:
+            key: Cache key (card number or NIK)
+            message: BPJS message
+        """
+        data = {
+            "is_eligible": False,
+            "message": message,
+            "negative": True,
+            "cached_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.local.set(key, data, min(NEGATIVE_CACHE_TTL_SECONDS, L1_TTL_SECONDS))
+
         if not self.redis:
             return
 
         try:
-            # Add cache timestamp
-            data["cached_at"] = datetime.now(timezone.utc).isoformat()
             await self.redis.setex(
-                f"bpjs:eligibility:{key}",
-                self.cache_ttl,
-                json.dumps(data)
+                f"bpjs:eligibility:{key}", jittered_ttl(NEGATIVE_CACHE_TTL_SECONDS), json.dumps(data)
             )
-            logger.info(f"Cached BPJS eligibility for: {key}")
         except Exception as e:
-            logger.error(f"Error caching eligibility: {e}")
+            logger.error(f"Error caching negative eligibility: {e}")
+
+    async def get_or_fetch_eligibility(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        use_cache: bool = True,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Get eligibility from the cache, or from BPJS on a miss.
+
+        Concurrent misses for the same key in this process share one call
+        to fetch. "Not found" / "not active" errors are cached as negative
+        entries and re-raised.
+
+        Args:
+            key: Cache key (card number or NIK)
+            fetch: Coroutine function calling BPJS
+            use_cache: Whether cached results may be returned
+
+        Returns:
+            Tuple of (eligibility data, whether it came from the cache)
+
+        Raises:
+            Whatever fetch raises
+        """
+        if use_cache:
+            cached = await self.get_cached_eligibility(key)
+            if cached is not None:
+                return cached, True
+
+        inflight = _inflight_lookups.get(key)
+        if inflight is not None:
+            return dict(await asyncio.shield(inflight)), False
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight_lookups[key] = future
+        try:
+            data = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if is_not_eligible_message(getattr(e, "message", None)):
+                await self.set_negative_eligibility(key, e.message)
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        else:
+            await self.set_cached_eligibility(key, data)
+            future.set_result(data)
+            return dict(data), False
+        finally:
+            _inflight_lookups.pop(key, None)
+
+    async def get_stale_eligibility(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the last known eligibility result, even if it is past the cache TTL.
+
+        Only meant for when BPJS cannot be reached; check cached_at before
+        relying on it.
+
+        Args:
+            key: Cache key (card number or NIK)
+
+        Returns:
+            Last cached eligibility data or None
+        """
+        if not self.redis:
+            return None
+
+        try:
+            cached = await self.redis.get(f"bpjs:eligibility:stale:{key}")
+            if cached:
+                logger.warning(f"Serving stale BPJS eligibility for: {key}")
+                return json.loads(cached)
+            return None
+        except Exception as e:
+            logger.error(f"Error getting stale eligibility: {e}")
+            return None
 
     async def invalidate_cache(self, key: str) -> None:
         """
         Invalidate cached eligibility for a specific key.
 
+        Other workers drop their in-process copy within L1_TTL_SECONDS.
+
         Args:
             key: Cache key to invalidate
         """
+        self.local.delete(key)
+
         if not self.redis:
             return
 
@@ -106,11 +305,17 @@ class BPJSCacheManager:
 
             # Count BPJS eligibility keys
             bpjs_keys = 0
+            stale_keys = 0
             async for key in self.redis.scan_iter(match="bpjs:eligibility:*"):
-                bpjs_keys += 1
+                if ":stale:" in str(key):
+                    stale_keys += 1
+                else:
+                    bpjs_keys += 1
 
             return {
                 "total_keys": bpjs_keys,
+                "stale_keys": stale_keys,
+                "local_entries": len(self.local),
                 "cache_hits": info.get("keyspace_hits", 0),
                 "cache_misses": info.get("keyspace_misses", 0),
                 "hit_rate": self._calculate_hit_rate(info),
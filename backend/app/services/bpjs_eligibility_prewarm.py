@@ -0,0 +1,108 @@
+"""BPJS Eligibility Prewarm Service
+
+This module refreshes the BPJS eligibility cache the night before, for every
+BPJS patient with an appointment the next day, so registration desks answer
+from the cache in the morning instead of queueing on BPJS:
+- Card numbers come from the next day's scheduled and confirmed appointments
+- Lookups run with bounded concurrency, through the same upstream guard as
+  desk traffic
+- "Not found" / "not active" answers are cached as negative entries
+- The run stops early when BPJS is unavailable (circuit open or shedding)
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Optional, Dict, Any
+
+from app.core.upstream_resilience import UPSTREAM_UNAVAILABLE_CODE
+from app.crud.appointments import get_appointment_bpjs_cards
+from app.db.redis import get_redis_client
+from app.db.session import get_db_context
+from app.services.bpjs_cache import BPJSCacheManager, is_not_eligible_message
+from app.services.bpjs_vclaim import BPJSVClaimClient, BPJSVClaimError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Concurrent BPJS lookups; kept low so a prewarm never crowds out desk traffic
+PREWARM_CONCURRENCY = 5
+
+
+class BPJSEligibilityPrewarmer(object):
+    """Refreshes cached eligibility of the next day's BPJS appointments"""
+
+    def __init__(self, cache_manager: BPJSCacheManager, concurrency: int = PREWARM_CONCURRENCY):
+        self.cache_manager = cache_manager
+        self.concurrency = concurrency
+
+    async def prewarm(self, appointment_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Refresh cached eligibility for the patients of one day's appointments
+
+        Args:
+            appointment_date: Appointment and SEP date (default: tomorrow)
+
+        Returns:
+            Run summary
+        """
+        appointment_date = appointment_date or date.today() + timedelta(days=1)
+
+        async with get_db_context() as db:
+            members = await get_appointment_bpjs_cards(db, appointment_date)
+        cards = sorted(set(card for _, card in members))
+
+        summary = {
+            "appointment_date": appointment_date.isoformat(),
+            "cards": len(cards),
+            "refreshed": 0,
+            "not_eligible": 0,
+            "failed": 0,
+            "skipped": 0,
+        }
+        if not cards:
+            return summary
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        unavailable = asyncio.Event()
+
+        async with BPJSVClaimClient() as client:
+
+            async def refresh(card_number: str):
+                async with semaphore:
+                    if unavailable.is_set():
+                        summary["skipped"] += 1
+                        return
+                    try:
+                        data = await client.check_eligibility_by_card(
+                            card_number=card_number,
+                            sep_date=appointment_date.isoformat(),
+                        )
+                    except BPJSVClaimError as e:
+                        if is_not_eligible_message(e.message):
+                            await self.cache_manager.set_negative_eligibility(card_number, e.message)
+                            summary["not_eligible"] += 1
+                            return
+                        if e.code == UPSTREAM_UNAVAILABLE_CODE:
+                            unavailable.set()
+                        summary["failed"] += 1
+                        return
+                    await self.cache_manager.set_cached_eligibility(card_number, data)
+                    summary["refreshed"] += 1
+
+            await asyncio.gather(*[refresh(card) for card in cards])
+
+        if unavailable.is_set():
+            logger.warning("BPJS eligibility prewarm for {} stopped early: BPJS unavailable".format(
+                appointment_date
+            ))
+        logger.info("BPJS eligibility prewarm for {}: {}".format(appointment_date, summary))
+        return summary
+
+
+def create_bpjs_eligibility_prewarmer(concurrency: int = PREWARM_CONCURRENCY) -> BPJSEligibilityPrewarmer:
+    """Create BPJS eligibility prewarmer on the shared Redis cache"""
+    return BPJSEligibilityPrewarmer(BPJSCacheManager(get_redis_client()), concurrency)
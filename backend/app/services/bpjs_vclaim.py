@@ -14,9 +14,12 @@ Key Endpoints:
 - POST /SEP/create - Create SEP letter
 - DELETE /SEP/{sepNumber} - Delete SEP
 """
+import asyncio
 import hashlib
 import hmac
 import logging
+import random
+import time
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 from urllib.parse import urljoin
@@ -24,6 +27,16 @@ from urllib.parse import urljoin
 import httpx
 
 from app.core.config import settings
+from app.core.http_clients import http_client_registry
+from app.core.upstream_resilience import (
+    CONNECT_ERROR_CODE,
+    REQUEST_ERROR_CODE,
+    TIMEOUT_CODE,
+    UPSTREAM_UNAVAILABLE_CODE,
+    UpstreamUnavailableError,
+    is_transient_code,
+    upstream_guards,
+)
 from app.schemas.bpjs import (
     BPJSConfig,
     BPJSEligibilityRequest,
@@ -88,32 +101,29 @@ class BPJSVClaimClient:
             )
 
         self._client = None  # type: Optional[httpx.AsyncClient]
+        self._owns_client = False
 
     async def __aenter__(self):
         """Async context manager entry."""
-        self._client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0, connect=10.0),
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
-        )
+        await self.get_client()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        if self._client:
-            await self._client.aclose()
+        await self.close()
 
     async def get_client(self) -> httpx.AsyncClient:
         """
-        Get or create HTTP client.
+        Get HTTP client.
+
+        Borrows the application's shared "bpjs_vclaim" connection pool when it is
+        running, otherwise creates a private client that close() releases.
 
         Returns:
             httpx.AsyncClient instance
         """
         if self._client is None:
-            self._client = httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0, connect=10.0),
-                limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
-            )
+            self._client, self._owns_client = http_client_registry.acquire("bpjs_vclaim")
         return self._client
 
     def _generate_timestamp(self) -> str:
@@ -249,23 +259,28 @@ class BPJSVClaimClient:
                 "Please set BPJS_CONSUMER_ID and BPJS_CONSUMER_SECRET."
             )
 
+        if method.upper() not in ("GET", "POST", "DELETE", "PUT"):
+            raise BPJSVClaimError(f"Unsupported HTTP method: {method}")
+
         client = await self.get_client()
         url = self._build_url(endpoint)
-        headers = self._get_headers()
 
         logger.info(f"BPJS API request: {method} {url}")
 
-        try:
+        async def send(timeout: httpx.Timeout) -> httpx.Response:
+            headers = self._get_headers()
             if method.upper() == "GET":
-                response = await client.get(url, headers=headers, params=params)
+                return await client.get(url, headers=headers, params=params, timeout=timeout)
             elif method.upper() == "POST":
-                response = await client.post(url, headers=headers, json=json_data)
+                return await client.post(url, headers=headers, json=json_data, timeout=timeout)
             elif method.upper() == "DELETE":
-                response = await client.delete(url, headers=headers)
-            elif method.upper() == "PUT":
-                response = await client.put(url, headers=headers, json=json_data)
-            else:
-                raise BPJSVClaimError(f"Unsupported HTTP method: {method}")
+                return await client.delete(url, headers=headers, timeout=timeout)
+            return await client.put(url, headers=headers, json=json_data, timeout=timeout)
+
+        try:
+            response = await upstream_guards["bpjs_vclaim"].call(
+                endpoint, send, hedge=method.upper() == "GET"
+            )
 
             # Log response status
             logger.info(f"BPJS API response: {response.status_code}")
@@ -274,20 +289,36 @@ class BPJSVClaimClient:
             if response.status_code >= 400:
                 error_msg = f"HTTP {response.status_code}: {response.text}"
                 logger.error(f"BPJS API HTTP error: {error_msg}")
-                raise BPJSVClaimError(message=error_msg)
+                raise BPJSVClaimError(message=error_msg, code=str(response.status_code))
 
             return await self._handle_response(response)
 
+        except UpstreamUnavailableError as e:
+            logger.warning(f"BPJS API call rejected: {e}")
+            raise BPJSVClaimError(
+                message="BPJS API is temporarily unavailable, please try again later",
+                code=UPSTREAM_UNAVAILABLE_CODE,
+                details=e.reason,
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            logger.error(f"BPJS API connection error: {e}")
+            raise BPJSVClaimError(
+                message="Failed to connect to BPJS API",
+                code=CONNECT_ERROR_CODE,
+                details=str(e)
+            )
         except httpx.TimeoutException as e:
             logger.error(f"BPJS API timeout: {e}")
             raise BPJSVClaimError(
                 message="Request to BPJS API timed out",
+                code=TIMEOUT_CODE,
                 details=str(e)
             )
         except httpx.RequestError as e:
             logger.error(f"BPJS API request error: {e}")
             raise BPJSVClaimError(
                 message="Failed to connect to BPJS API",
+                code=REQUEST_ERROR_CODE,
                 details=str(e)
             )
         except BPJSVClaimError:
@@ -751,9 +782,9 @@ class BPJSVClaimClient:
 
     async def close(self):
         """Close the HTTP client."""
-        if self._client:
+        if self._client is not None and self._owns_client:
             await self._client.aclose()
-            self._client = None
+        self._client = None
 
 
 class BPJSVClaimClientWithRetry(BPJSVClaimClient):
@@ -761,6 +792,10 @@ class BPJSVClaimClientWithRetry(BPJSVClaimClient):
     BPJS VClaim Client with automatic retry logic and exponential backoff.
 
     Extends BPJSVClaimClient to add retry capability for transient failures.
+    Only requests that are safe to repeat are retried: GET requests, and
+    requests of any method that never reached BPJS. Calls rejected by the
+    circuit breaker are not retried, and retries stop once retry_budget
+    seconds have passed.
     """
 
     def __init__(
@@ -768,6 +803,7 @@ class BPJSVClaimClientWithRetry(BPJSVClaimClient):
         max_retries: int = 3,
         initial_backoff: float = 1.0,
         max_backoff: float = 10.0,
+        retry_budget: float = 15.0,
         **kwargs
     ):
         """
@@ -777,12 +813,24 @@ class BPJSVClaimClientWithRetry(BPJSVClaimClient):
             max_retries: Maximum number of retry attempts
             initial_backoff: Initial backoff time in seconds
             max_backoff: Maximum backoff time in seconds
+            retry_budget: No retry starts later than this many seconds
+                after the first attempt
             **kwargs: Arguments passed to BPJSVClaimClient
         """
         super().__init__(**kwargs)
         self.max_retries = max_retries
         self.initial_backoff = initial_backoff
         self.max_backoff = max_backoff
+        self.retry_budget = retry_budget
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        json_data: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        return await self._request_with_retry(method, endpoint, params, json_data)
 
     async def _request_with_retry(
         self,
@@ -790,17 +838,18 @@ class BPJSVClaimClientWithRetry(BPJSVClaimClient):
         endpoint: str,
         params: Optional[Dict[str, Any]] = None,
         json_data: Optional[Dict[str, Any]] = None,
-        retry_count: int = 0,
     ) -> Dict[str, Any]:
         """
         Make HTTP request to BPJS API with retry logic.
 
+        Backoff is exponential with full jitter, so desks retrying at the
+        same moment do not hit BPJS in lockstep.
+
         Args:
             method: HTTP method (GET, POST, DELETE, etc.)
             endpoint: API endpoint path
             params: Query parameters
             json_data: JSON body data
-            retry_count: Current retry attempt
 
         Returns:
             Parsed JSON response
@@ -808,59 +857,35 @@ class BPJSVClaimClientWithRetry(BPJSVClaimClient):
         Raises:
             BPJSVClaimError: If all retry attempts fail
         """
-        try:
-            return await self._request(method, endpoint, params=params, json_data=json_data)
-
-        except (httpx.TimeoutException, httpx.RequestError) as e:
-            if retry_count < self.max_retries:
-                # Calculate exponential backoff delay
-                backoff_delay = min(
-                    self.initial_backoff * (2 ** retry_count),
-                    self.max_backoff
-                )
-
-                logger.warning(
-                    f"BPJS API request failed (attempt {retry_count + 1}/{self.max_retries}): {e}. "
-                    f"Retrying in {backoff_delay} seconds..."
-                )
-
-                # Wait before retry
-                import asyncio
-                await asyncio.sleep(backoff_delay)
-
-                # Retry the request
-                return await self._request_with_retry(
-                    method, endpoint, params, json_data, retry_count + 1
-                )
-            else:
-                logger.error(f"BPJS API request failed after {self.max_retries} retries: {e}")
-                raise BPJSVClaimError(
-                    message=f"Request failed after {self.max_retries} retries",
-                    details=str(e)
-                )
-
-        except BPJSVClaimError as e:
-            # Check if this is a transient error (5xx status codes)
-            if e.code and e.code.startswith("5") and retry_count < self.max_retries:
-                backoff_delay = min(
-                    self.initial_backoff * (2 ** retry_count),
-                    self.max_backoff
+        deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        while True:
+            try:
+                return await super()._request(method, endpoint, params=params, json_data=json_data)
+            except BPJSVClaimError as e:
+                if not self._should_retry(method, e, attempt):
+                    raise
+
+                backoff_delay = random.uniform(
+                    0, min(self.initial_backoff * (2 ** attempt), self.max_backoff)
                 )
+                if time.monotonic() + backoff_delay >= deadline:
+                    logger.error(f"BPJS API request failed, retry budget exhausted: {e.message}")
+                    raise
 
+                attempt += 1
                 logger.warning(
-                    f"BPJS API returned transient error (attempt {retry_count + 1}/{self.max_retries}): {e.message}. "
-                    f"Retrying in {backoff_delay} seconds..."
+                    f"BPJS API request failed (attempt {attempt}/{self.max_retries + 1}): {e.message}. "
+                    f"Retrying in {backoff_delay:.2f} seconds..."
                 )
-
-                import asyncio
                 await asyncio.sleep(backoff_delay)
 
-                return await self._request_with_retry(
-                    method, endpoint, params, json_data, retry_count + 1
-                )
-            else:
-                # Not retryable or max retries reached
-                raise
+    def _should_retry(self, method: str, error: BPJSVClaimError, attempt: int) -> bool:
+        if attempt >= self.max_retries or error.code == UPSTREAM_UNAVAILABLE_CODE:
+            return False
+        if error.code == CONNECT_ERROR_CODE:
+            return True
+        return method.upper() == "GET" and is_transient_code(error.code)
 
 
 # Convenience function for creating client instance
@@ -9,28 +9,41 @@ Advanced inventory management with:
 - Predictive ordering with budget impact
 - Multi-horizon forecasting (30, 60, 90 days)
 - Confidence intervals (80%, 90%, 95%)
+- Bulk forecasting: one grouped consumption query into a NumPy matrix, every
+  algorithm vectorized across drugs on a process pool, results upserted in bulk
 
 Python 3.5+ compatible - uses .format() instead of f-strings
 """
 
+import asyncio
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date, timedelta
 from typing import List, Dict, Optional, Tuple
 from decimal import Decimal
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, case, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 
-from app.models.inventory import Drug, StockTransaction, StockTransactionItem
-from app.models.dispensing import MedicationDispense
+from app.models.inventory import Drug, DrugDemandForecast, StockTransaction, StockTransactionItem
+from app.models.pharmacy_integration import MedicationDispense
 from app.core.config import settings
 
 
 logger = logging.getLogger(__name__)
 
 
+# Bulk forecasting configuration
+FORECAST_CHUNK_SIZE = 500  # Drugs per process-pool task
+CONSUMPTION_YIELD_PER = 10000
+FORECAST_WRITE_BATCH_SIZE = 500
+CONFIDENCE_LEVELS = (('80', 1.28), ('90', 1.645), ('95', 1.96))
+
+
 # =============================================================================
 # Forecasting Algorithms
 # =============================================================================
@@ -272,6 +285,242 @@ class LinearRegression(ForecastingAlgorithm):
         }
 
 
+# =============================================================================
+# Vectorized Batch Forecasting
+# =============================================================================
+#
+# Matrix versions of the algorithms above: each row of the consumption
+# matrix is one drug's daily series, and every algorithm runs on all of its
+# rows at once. Results match the per-drug classes.
+
+def select_algorithms(matrix):
+    """Select the forecasting algorithm of every row (vectorized analyze_demand_pattern)
+
+    Args:
+        matrix: (drugs x days) daily consumption matrix
+
+    Returns:
+        Object array of algorithm names, one per row
+    """
+    n_drugs, n_days = matrix.shape
+    if n_days < 30:
+        return np.full(n_drugs, 'simple_moving_average', dtype=object)
+
+    # Coefficient of variation
+    avg = matrix.mean(axis=1)
+    cv = np.divide(matrix.std(axis=1), avg, out=np.zeros(n_drugs), where=avg > 0)
+
+    # Trend between the two halves of the history
+    half = n_days // 2
+    first_half_avg = matrix[:, :half].mean(axis=1)
+    second_half_avg = matrix[:, half:].mean(axis=1)
+    trend_change = np.divide(
+        second_half_avg - first_half_avg, first_half_avg,
+        out=np.zeros(n_drugs), where=first_half_avg > 0
+    )
+
+    algorithms = np.full(n_drugs, 'linear_regression', dtype=object)
+    algorithms[cv < 0.5] = 'exponential_smoothing'
+    algorithms[(cv < 0.3) & (np.abs(trend_change) < 0.1)] = 'simple_moving_average'
+    return algorithms
+
+
+def _mape_rows(actual, predicted, count):
+    """MAPE of every row, skipping zero actuals but dividing by count"""
+    errors = np.divide(
+        np.abs(actual - predicted), actual,
+        out=np.zeros(actual.shape), where=actual > 0
+    )
+    return errors.sum(axis=1) * 100 / count
+
+
+def _moving_average_rows(matrix, forecast_horizon, window=30):
+    """SimpleMovingAverage over every row
+
+    Returns:
+        Tuple of (forecast values, std dev, MAPE (NaN if none), parameters)
+    """
+    n_drugs, n_days = matrix.shape
+    window = min(window, n_days)
+    recent = matrix[:, -window:]
+    avg = recent.mean(axis=1)
+
+    mape = np.full(n_drugs, np.nan)
+    if n_days >= window * 2:
+        mape = _mape_rows(recent, avg[:, None], window)
+
+    values = np.repeat(avg[:, None], forecast_horizon, axis=1)
+    return values, recent.std(axis=1), mape, [{'window': window}] * n_drugs
+
+
+def _exponential_smoothing_rows(matrix, forecast_horizon, alpha=0.3, beta=0.2):
+    """ExponentialSmoothing (Holt's linear method) over every row"""
+    n_drugs, n_days = matrix.shape
+    level = matrix[:, 0].copy()
+    trend = (matrix[:, 1] - matrix[:, 0]) / 2 if n_days >= 2 else np.zeros(n_drugs)
+
+    for i in range(1, n_days):
+        prev_level = level
+        level = alpha * matrix[:, i] + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev_level) + (1 - beta) * trend
+
+    values = level[:, None] + np.arange(1, forecast_horizon + 1) * trend[:, None]
+
+    mape = np.full(n_drugs, np.nan)
+    if n_days >= 10:
+        recent = matrix[:, -10:]
+        std_dev = np.abs(recent - level[:, None]).sum(axis=1) / 10
+        predictions = level[:, None] + np.arange(-10, 0) * trend[:, None]
+        mape = _mape_rows(recent, predictions, 10)
+    else:
+        std_dev = level * 0.2
+
+    return values, std_dev, mape, [{'alpha': alpha}] * n_drugs
+
+
+def _linear_regression_rows(matrix, forecast_horizon):
+    """LinearRegression (least squares on day offsets) over every row"""
+    n_days = matrix.shape[1]
+    x = np.arange(n_days, dtype=float)
+    sum_x = x.sum()
+    sum_x2 = (x ** 2).sum()
+    sum_y = matrix.sum(axis=1)
+    sum_xy = matrix.dot(x)
+
+    slope = (n_days * sum_xy - sum_x * sum_y) / (n_days * sum_x2 - sum_x ** 2)
+    intercept = (sum_y - slope * sum_x) / n_days
+
+    fitted = slope[:, None] * x + intercept[:, None]
+    std_error = np.sqrt(((matrix - fitted) ** 2).sum(axis=1) / (n_days - 2))
+    mape = _mape_rows(matrix, fitted, n_days)
+
+    future_x = np.arange(n_days, n_days + forecast_horizon)
+    values = slope[:, None] * future_x + intercept[:, None]
+
+    parameters = [
+        {'slope': round(m, 6), 'intercept': round(b, 2)}
+        for m, b in zip(slope.tolist(), intercept.tolist())
+    ]
+    return values, std_error, mape, parameters
+
+
+def _build_forecasts(drug_ids, algorithm, values, std_dev, mape, parameters, dates):
+    """Assemble per-drug result dicts in the format of the algorithm classes"""
+    quantities = np.round(np.maximum(values, 0), 2).tolist()
+    bounds = []
+    for level, z in CONFIDENCE_LEVELS:
+        margin = z * std_dev[:, None]
+        bounds.append(('lower_' + level, np.round(np.maximum(values - margin, 0), 2).tolist()))
+        bounds.append(('upper_' + level, np.round(values + margin, 2).tolist()))
+
+    results = []
+    for row, drug_id in enumerate(drug_ids):
+        row_mape = mape[row]
+        results.append({
+            'algorithm': algorithm,
+            'parameters': parameters[row],
+            'forecast': [
+                {'date': d, 'quantity': q} for d, q in zip(dates, quantities[row])
+            ],
+            'confidence_intervals': [
+                dict([('date', d)] + [(key, column[row][i]) for key, column in bounds])
+                for i, d in enumerate(dates)
+            ],
+            'mape': round(float(row_mape), 2) if row_mape and not np.isnan(row_mape) else None,
+            'drug_id': drug_id
+        })
+    return results
+
+
+def forecast_matrix(drug_ids, matrix, end_date, forecast_horizon, algorithm=None):
+    """Forecast many drugs at once (runs in a worker process for large batches)
+
+    Args:
+        drug_ids: Drug IDs, one per matrix row
+        matrix: (drugs x days) daily consumption ending at end_date
+        end_date: Date of the last matrix column
+        forecast_horizon: Number of days to forecast
+        algorithm: Algorithm for every drug (auto-detect per drug if None)
+
+    Returns:
+        List of forecast dicts in drug_ids order
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    dates = [
+        (end_date + timedelta(days=i)).isoformat()
+        for i in range(1, forecast_horizon + 1)
+    ]
+
+    if algorithm is None:
+        algorithms = select_algorithms(matrix)
+    else:
+        algorithms = np.full(len(drug_ids), algorithm, dtype=object)
+
+    # LinearRegression falls back to the moving average on short series
+    if matrix.shape[1] < 3:
+        algorithms[algorithms == 'linear_regression'] = 'simple_moving_average'
+
+    kernels = {
+        'simple_moving_average': _moving_average_rows,
+        'exponential_smoothing': _exponential_smoothing_rows,
+        'linear_regression': _linear_regression_rows,
+    }
+
+    results = [None] * len(drug_ids)
+    for name in set(algorithms.tolist()):
+        kernel = kernels.get(name, _moving_average_rows)
+        rows = np.flatnonzero(algorithms == name)
+        group = kernel(matrix[rows], forecast_horizon)
+        group_ids = [drug_ids[row] for row in rows]
+        algorithm_name = name if name in kernels else 'simple_moving_average'
+        for row, forecast in zip(rows, _build_forecasts(group_ids, algorithm_name, *group, dates=dates)):
+            results[row] = forecast
+
+    return results
+
+
+async def run_forecast_matrix(drug_ids, matrix, end_date, forecast_horizon, max_workers=None):
+    """Run forecast_matrix off the event loop
+
+    Batches up to FORECAST_CHUNK_SIZE drugs run on a worker thread; larger
+    batches are split into chunks forecast on a process pool.
+
+    Args:
+        drug_ids: Drug IDs, one per matrix row
+        matrix: (drugs x days) daily consumption ending at end_date
+        end_date: Date of the last matrix column
+        forecast_horizon: Number of days to forecast
+        max_workers: Process pool size (defaults to CPU count)
+
+    Returns:
+        List of forecast dicts in drug_ids order
+    """
+    loop = asyncio.get_event_loop()
+    if len(drug_ids) <= FORECAST_CHUNK_SIZE:
+        forecasts = await loop.run_in_executor(
+            None, forecast_matrix, drug_ids, matrix, end_date, forecast_horizon
+        )
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                loop.run_in_executor(
+                    pool, forecast_matrix,
+                    drug_ids[i:i + FORECAST_CHUNK_SIZE],
+                    matrix[i:i + FORECAST_CHUNK_SIZE],
+                    end_date,
+                    forecast_horizon
+                )
+                for i in range(0, len(drug_ids), FORECAST_CHUNK_SIZE)
+            ]
+            forecasts = [
+                forecast
+                for chunk in await asyncio.gather(*futures)
+                for forecast in chunk
+            ]
+
+    return forecasts
+
+
 # =============================================================================
 # Main Service
 # =============================================================================
@@ -312,18 +561,18 @@ class DemandForecastingService(object):
         try:
             # Get consumption from medication dispenses
             stmt = select(
-                func.date(MedicationDispense.dispensed_at).label('date'),
-                func.sum(MedicationDispense.quantity).label('quantity')
+                func.date(MedicationDispense.dispense_date).label('date'),
+                func.sum(MedicationDispense.quantity_dispensed).label('quantity')
             ).where(
                 and_(
-                    MedicationDispense.drug_id == drug_id,
-                    MedicationDispense.dispensed_at >= start_date,
-                    MedicationDispense.dispensed_at <= end_date
+                    MedicationDispense.medication_id == drug_id,
+                    MedicationDispense.dispense_date >= start_date,
+                    MedicationDispense.dispense_date <= end_date
                 )
             ).group_by(
-                func.date(MedicationDispense.dispensed_at)
+                func.date(MedicationDispense.dispense_date)
             ).order_by(
-                func.date(MedicationDispense.dispensed_at)
+                func.date(MedicationDispense.dispense_date)
             )
 
             result = await self.db.execute(stmt)
@@ -504,15 +753,7 @@ class DemandForecastingService(object):
             Current stock quantity
         """
         try:
-            stmt = select(
-                func.sum(DrugBatch.quantity)
-            ).where(
-                and_(
-                    DrugBatch.drug_id == drug_id,
-                    DrugBatch.is_quarantined == False,
-                    DrugBatch.expiry_date > date.today()
-                )
-            )
+            stmt = select(Drug.stock_on_hand).where(Drug.id == drug_id)
 
             result = await self.db.execute(stmt)
             stock = result.scalar() or 0
@@ -540,35 +781,184 @@ class DemandForecastingService(object):
             logger.error("Error getting open orders: {}".format(str(e)))
             return 0
 
+    async def get_consumption_matrix(
+        self,
+        drug_ids: List[int],
+        days: int = 365,
+        end_date: date = None
+    ) -> np.ndarray:
+        """Get daily consumption of many drugs with one grouped query
+
+        Args:
+            drug_ids: Drug IDs, one per matrix row
+            days: Number of days of history to retrieve
+            end_date: End date for data retrieval (default: today)
+
+        Returns:
+            (len(drug_ids) x days + 1) matrix; column j is end_date - days + j,
+            days without dispenses are zero
+        """
+        if end_date is None:
+            end_date = date.today()
+        start_date = end_date - timedelta(days=days)
+
+        row_of = dict((drug_id, row) for row, drug_id in enumerate(drug_ids))
+        matrix = np.zeros((len(drug_ids), days + 1))
+
+        dispense_day = func.date(MedicationDispense.dispense_date)
+        stmt = select(
+            MedicationDispense.medication_id,
+            dispense_day.label('date'),
+            func.sum(MedicationDispense.quantity_dispensed).label('quantity')
+        ).where(
+            and_(
+                MedicationDispense.medication_id.in_(drug_ids),
+                MedicationDispense.dispense_date >= start_date,
+                MedicationDispense.dispense_date <= end_date
+            )
+        ).group_by(
+            MedicationDispense.medication_id,
+            dispense_day
+        ).execution_options(yield_per=CONSUMPTION_YIELD_PER)
+
+        result = await self.db.stream(stmt)
+        async for partition in result.partitions():
+            rows = [row_of[row.medication_id] for row in partition]
+            columns = [(row.date - start_date).days for row in partition]
+            matrix[rows, columns] = [int(row.quantity) for row in partition]
+
+        return matrix
+
     async def batch_forecast(
         self,
         drug_ids: List[int],
-        forecast_horizon: int = 30
+        forecast_horizon: int = 30,
+        historical_days: int = 365,
+        max_workers: Optional[int] = None,
+        persist: bool = False
     ) -> List[Dict]:
         """Generate forecasts for multiple drugs
 
+        Loads the consumption of every drug with one grouped query and runs
+        the algorithms vectorized across drugs. Batches larger than
+        FORECAST_CHUNK_SIZE are split across a process pool.
+
         Args:
             drug_ids: List of drug IDs
             forecast_horizon: Forecast horizon in days
+            historical_days: Days of historical data to use
+            max_workers: Process pool size (defaults to CPU count)
+            persist: Upsert the results into drug_demand_forecasts
 
         Returns:
             List of forecast results
         """
-        forecasts = []
-
-        for drug_id in drug_ids:
-            try:
-                forecast = await self.generate_forecast(drug_id, forecast_horizon)
-                forecasts.append(forecast)
-            except Exception as e:
-                logger.error("Error forecasting drug {}: {}".format(drug_id, str(e)))
-                forecasts.append({
-                    'drug_id': drug_id,
-                    'error': str(e)
-                })
+        drug_ids = list(OrderedDict.fromkeys(drug_ids))
+        if not drug_ids:
+            return []
+
+        end_date = date.today()
+        try:
+            matrix = await self.get_consumption_matrix(drug_ids, historical_days, end_date)
+        except Exception as e:
+            logger.error("Error loading consumption for batch forecast: {}".format(str(e)))
+            return [{'drug_id': drug_id, 'error': str(e)} for drug_id in drug_ids]
+
+        forecasts = await run_forecast_matrix(
+            drug_ids, matrix, end_date, forecast_horizon, max_workers=max_workers
+        )
+
+        if persist:
+            await self.save_forecasts(forecasts, forecast_horizon, end_date)
 
         return forecasts
 
+    async def save_forecasts(
+        self,
+        forecasts: List[Dict],
+        forecast_horizon: int,
+        forecast_date: date
+    ) -> int:
+        """Upsert forecast results in multi-row statements
+
+        Args:
+            forecasts: Forecast dicts from batch_forecast
+            forecast_horizon: Forecast horizon in days
+            forecast_date: Last day of history the forecasts are based on
+
+        Returns:
+            Number of forecasts written
+        """
+        rows = [
+            {
+                'drug_id': forecast['drug_id'],
+                'forecast_date': forecast_date,
+                'forecast_horizon': forecast_horizon,
+                'algorithm': forecast['algorithm'],
+                'total_forecast_quantity': round(sum(f['quantity'] for f in forecast['forecast']), 2),
+                'mape': forecast.get('mape'),
+                'forecast': forecast['forecast'],
+                'confidence_intervals': forecast.get('confidence_intervals'),
+            }
+            for forecast in forecasts
+            if 'error' not in forecast
+        ]
+
+        for i in range(0, len(rows), FORECAST_WRITE_BATCH_SIZE):
+            stmt = pg_insert(DrugDemandForecast).values(rows[i:i + FORECAST_WRITE_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_drug_demand_forecasts_run',
+                set_={
+                    'algorithm': stmt.excluded.algorithm,
+                    'total_forecast_quantity': stmt.excluded.total_forecast_quantity,
+                    'mape': stmt.excluded.mape,
+                    'forecast': stmt.excluded.forecast,
+                    'confidence_intervals': stmt.excluded.confidence_intervals,
+                    'created_at': func.now(),
+                }
+            )
+            await self.db.execute(stmt)
+
+        await self.db.commit()
+        logger.info("Saved {} demand forecasts for {}".format(len(rows), forecast_date))
+        return len(rows)
+
+    async def forecast_all_drugs(
+        self,
+        forecast_horizon: int = 30,
+        historical_days: int = 365,
+        max_workers: Optional[int] = None
+    ) -> Dict:
+        """Forecast every active drug and store the results
+
+        Args:
+            forecast_horizon: Forecast horizon in days
+            historical_days: Days of historical data to use
+            max_workers: Process pool size (defaults to CPU count)
+
+        Returns:
+            Dict with drug and error counts
+        """
+        result = await self.db.execute(
+            select(Drug.id).where(Drug.is_active == True).order_by(Drug.id)
+        )
+        drug_ids = list(result.scalars().all())
+
+        forecasts = await self.batch_forecast(
+            drug_ids,
+            forecast_horizon=forecast_horizon,
+            historical_days=historical_days,
+            max_workers=max_workers,
+            persist=True
+        )
+        errors = [f for f in forecasts if 'error' in f]
+
+        return {
+            'drug_count': len(drug_ids),
+            'forecast_count': len(forecasts) - len(errors),
+            'error_count': len(errors)
+        }
+
     async def get_forecast_accuracy_report(
         self,
         drug_id: int,
@@ -0,0 +1,348 @@
+"""ICD-10 Code Index for diagnosis typeahead search
+
+This module keeps the whole ICD-10 table in process memory so code
+searches never reach PostgreSQL:
+- A prefix trie over codes (with and without the decimal point)
+- An inverted token index over the Indonesian and English descriptions,
+  with prefix lookup on the sorted terms and trigram lookup for matches
+  inside a word
+- Ranking by is_common, usage_count and code, as the SQL search did
+
+The index is loaded at startup. A background sync loop rebuilds it when
+the table fingerprint (row count, highest ID and latest updated_at)
+changes, and writes batched usage_count increments back to the database.
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import bisect
+import logging
+import re
+from typing import Optional, List, Dict, Set, Tuple, Iterable
+
+from sqlalchemy import select, update, bindparam, func
+
+from app.db.session import get_db_context
+from app.models.icd10 import ICD10Code
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds between usage flushes and change checks
+ICD10_INDEX_SYNC_INTERVAL_SECONDS = 10
+
+# Shortest query token matched inside words through trigrams
+MIN_INFIX_LENGTH = 3
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Columns copied into the index, i.e. everything ICD10CodeResponse needs
+INDEXED_COLUMNS = (
+    "id", "code", "code_full", "chapter", "block",
+    "description_indonesian", "description_english",
+    "is_chapter", "is_block", "is_category", "severity",
+    "inclusion_terms", "exclusion_terms", "notes",
+    "usage_count", "is_common",
+)
+
+
+def normalize_code(value: str) -> str:
+    """Normalize a code for prefix lookup ("a09.0" -> "A090")"""
+    return re.sub(r"[\s.]", "", value or "").upper()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a description or query into lowercase word tokens"""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def trigrams(term: str) -> Set[str]:
+    """Trigrams of a term"""
+    return set(term[i:i + 3] for i in range(len(term) - 2))
+
+
+class ICD10Entry(object):
+    """In-memory copy of an ICD-10 code row"""
+
+    __slots__ = INDEXED_COLUMNS
+
+    def __init__(self, **values):
+        for column in INDEXED_COLUMNS:
+            setattr(self, column, values.get(column))
+
+
+class CodeTrie(object):
+    """Prefix trie over normalized codes
+
+    Every node keeps the IDs of all codes below it, so a prefix lookup is
+    a walk of len(prefix) nodes.
+    """
+
+    def __init__(self):
+        self._root = ({}, set())  # (children, ids)
+
+    def insert(self, code: str, entry_id: int):
+        node = self._root
+        for char in code:
+            node[1].add(entry_id)
+            node = node[0].setdefault(char, ({}, set()))
+        node[1].add(entry_id)
+
+    def search(self, prefix: str) -> Set[int]:
+        node = self._root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return set()
+        return node[1]
+
+
+class ICD10SearchIndex(object):
+    """Immutable search structure over a set of ICD-10 entries
+
+    Only ranking changes after construction (see rerank); a reload builds
+    a new index and swaps it in.
+    """
+
+    def __init__(self, entries: Iterable[ICD10Entry]):
+        self.entries = dict((entry.id, entry) for entry in entries)
+        self._codes = CodeTrie()
+        self._postings = {}  # type: Dict[str, Set[int]]
+        self._trigrams = {}  # type: Dict[str, Set[str]]
+
+        for entry in self.entries.values():
+            for code in set((normalize_code(entry.code), normalize_code(entry.code_full))):
+                if code:
+                    self._codes.insert(code, entry.id)
+
+            text = "{} {}".format(entry.description_indonesian or "", entry.description_english or "")
+            for term in set(tokenize(text)):
+                self._postings.setdefault(term, set()).add(entry.id)
+
+        self._terms = sorted(self._postings)
+        for term in self._terms:
+            for gram in trigrams(term):
+                self._trigrams.setdefault(gram, set()).add(term)
+
+        self._rank = {}  # type: Dict[int, int]
+        self.rerank()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rerank(self):
+        """Recompute result order from is_common and usage_count"""
+        ordered = sorted(
+            self.entries.values(),
+            key=lambda e: (not e.is_common, -(e.usage_count or 0), e.code),
+        )
+        self._rank = dict((entry.id, rank) for rank, entry in enumerate(ordered))
+
+    def _match_term(self, token: str) -> Set[int]:
+        """IDs of entries with a description word starting with or containing token"""
+        matched = set()
+
+        start = bisect.bisect_left(self._terms, token)
+        for term in self._terms[start:]:
+            if not term.startswith(token):
+                break
+            matched |= self._postings[term]
+
+        if len(token) >= MIN_INFIX_LENGTH:
+            candidates = None
+            for gram in trigrams(token):
+                terms = self._trigrams.get(gram)
+                if not terms:
+                    return matched
+                candidates = set(terms) if candidates is None else candidates & terms
+            for term in candidates:
+                if token in term:
+                    matched |= self._postings[term]
+
+        return matched
+
+    def search(
+        self,
+        query: str,
+        limit: int = 50,
+        chapter_filter: Optional[str] = None,
+        severity_filter: Optional[str] = None,
+        common_only: bool = False,
+    ) -> Tuple[List[ICD10Entry], int]:
+        """Search codes by code prefix or description words
+
+        Every query word must match a description word (by prefix, or
+        anywhere inside it for words of MIN_INFIX_LENGTH or more). Codes
+        whose code starts with the query match as well.
+
+        Args:
+            query: Search query
+            limit: Maximum results
+            chapter_filter: Filter by chapter
+            severity_filter: Filter by severity
+            common_only: Show only common codes
+
+        Returns:
+            Tuple of (ranked entries, total match count)
+        """
+        code = normalize_code(query)
+        matched = set(self._codes.search(code)) if code else set()
+
+        text_matches = None
+        for token in tokenize(query):
+            ids = self._match_term(token)
+            text_matches = ids if text_matches is None else text_matches & ids
+            if not text_matches:
+                break
+        if text_matches:
+            matched |= text_matches
+
+        entries = self.entries
+        if chapter_filter or severity_filter or common_only:
+            matched = [
+                entry_id for entry_id in matched
+                if (not chapter_filter or entries[entry_id].chapter == chapter_filter)
+                and (not severity_filter or entries[entry_id].severity == severity_filter)
+                and (not common_only or entries[entry_id].is_common)
+            ]
+
+        ranked = sorted(matched, key=self._rank.__getitem__)[:limit]
+        return [entries[entry_id] for entry_id in ranked], len(matched)
+
+
+class ICD10IndexManager(object):
+    """Process-wide ICD-10 index with background refresh and usage batching
+
+    Until the first load succeeds, ready is False and callers fall back to
+    the database search.
+    """
+
+    def __init__(self, sync_interval: float = ICD10_INDEX_SYNC_INTERVAL_SECONDS):
+        self.sync_interval = sync_interval
+        self._index = None  # type: Optional[ICD10SearchIndex]
+        self._fingerprint = None  # type: Optional[Tuple]
+        self._usage = {}  # type: Dict[int, int]
+        self._task = None  # type: Optional[asyncio.Task]
+
+    @property
+    def ready(self) -> bool:
+        """Whether the index is loaded"""
+        return self._index is not None
+
+    def search(self, *args, **kwargs) -> Tuple[List[ICD10Entry], int]:
+        """Search the loaded index (see ICD10SearchIndex.search)"""
+        return self._index.search(*args, **kwargs)
+
+    async def start(self):
+        """Load the index and start the background sync loop"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.error("Error loading ICD-10 index, searching the database until it loads: {}".format(e))
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the sync loop and flush pending usage counts"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_usage()
+
+    async def reload(self):
+        """Rebuild the index from the database and swap it in"""
+        async with get_db_context() as db:
+            fingerprint = await self._read_fingerprint(db)
+            result = await db.execute(
+                select(*[getattr(ICD10Code, column) for column in INDEXED_COLUMNS])
+            )
+            rows = [dict(row._mapping) for row in result]
+
+        # Apply increments not yet written, so counts never go backwards
+        for row in rows:
+            row["usage_count"] = (row["usage_count"] or 0) + self._usage.get(row["id"], 0)
+
+        loop = asyncio.get_event_loop()
+        index = await loop.run_in_executor(
+            None, ICD10SearchIndex, [ICD10Entry(**row) for row in rows]
+        )
+        self._index = index
+        self._fingerprint = fingerprint
+        logger.info("ICD-10 index loaded with {} codes".format(len(index)))
+
+    def record_usage(self, code_id: int, count: int = 1):
+        """Count a use of a code; written to the database in the next flush
+
+        Args:
+            code_id: ICD-10 code ID
+            count: Number of uses
+        """
+        self._usage[code_id] = self._usage.get(code_id, 0) + count
+        if self._index is not None:
+            entry = self._index.entries.get(code_id)
+            if entry is not None:
+                entry.usage_count = (entry.usage_count or 0) + count
+
+    async def flush_usage(self):
+        """Write pending usage increments with one executemany UPDATE"""
+        if not self._usage:
+            return
+        pending, self._usage = self._usage, {}
+
+        table = ICD10Code.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("code_id"))
+            .values(usage_count=table.c.usage_count + bindparam("increment"))
+        )
+        try:
+            async with get_db_context() as db:
+                await db.execute(stmt, [
+                    {"code_id": code_id, "increment": count}
+                    for code_id, count in pending.items()
+                ])
+        except Exception as e:
+            logger.error("Error flushing ICD-10 usage counts: {}".format(e))
+            for code_id, count in pending.items():
+                self._usage[code_id] = self._usage.get(code_id, 0) + count
+            return
+
+        if self._index is not None:
+            self._index.rerank()
+
+    @staticmethod
+    async def _read_fingerprint(db) -> Tuple:
+        """Row count, highest ID and latest updated_at of the ICD-10 table"""
+        result = await db.execute(
+            select(
+                func.count(ICD10Code.id),
+                func.max(ICD10Code.id),
+                func.max(ICD10Code.updated_at),
+            )
+        )
+        return tuple(result.one())
+
+    async def _run(self):
+        """Sync loop: flush usage counts and rebuild after table changes"""
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.flush_usage()
+
+                async with get_db_context() as db:
+                    fingerprint = await self._read_fingerprint(db)
+                if self._index is None or fingerprint != self._fingerprint:
+                    await self.reload()
+            except Exception as e:
+                logger.error("Error in ICD-10 index sync: {}".format(e))
+
+
+# Process-wide ICD-10 index, started and stopped from the application lifespan
+icd10_index = ICD10IndexManager()
@@ -0,0 +1,187 @@
+"""KPI Result Cache for analytics dashboards
+
+This module keeps computed KPI values in process memory so dashboard loads
+do not rerun the KPI SQL:
+- Values are cached per KPI and period for the dashboard refresh_interval
+- Concurrent requests for the same value share one computation
+  (single-flight), so many viewers of a dashboard trigger one query
+- A precompute loop recomputes the KPIs of recently viewed dashboards
+  shortly before their cached values expire
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List, Any, Callable, Awaitable
+
+
+logger = logging.getLogger(__name__)
+
+
+# TTL of KPI values requested outside a dashboard
+DEFAULT_KPI_CACHE_TTL_SECONDS = 300
+
+# Seconds between precompute passes
+DASHBOARD_PRECOMPUTE_INTERVAL_SECONDS = 30
+
+# Dashboards viewed within this many seconds are kept warm
+DASHBOARD_ACTIVE_WINDOW_SECONDS = 900
+
+
+def kpi_cache_key(kpi, period_start: datetime, period_end: datetime) -> str:
+    """Cache key of a KPI value
+
+    Includes the KPI's updated_at, so editing a KPI's SQL takes effect
+    without waiting for the cached value to expire.
+    """
+    return "{}:{}:{}:{}".format(
+        kpi.id,
+        kpi.updated_at.isoformat() if kpi.updated_at else "",
+        period_start.isoformat(),
+        period_end.isoformat(),
+    )
+
+
+class KPIResultCache(object):
+    """In-process KPI value cache with single-flight computation"""
+
+    def __init__(self):
+        self._entries = {}  # type: Dict[str, Tuple[float, Any]]
+        self._inflight = {}  # type: Dict[str, asyncio.Future]
+        self._active = {}  # type: Dict[str, float]
+
+    async def get_or_compute(
+        self,
+        key: str,
+        ttl: float,
+        compute: Callable[[], Awaitable[Any]],
+        min_remaining: float = 0,
+    ) -> Any:
+        """Return the cached value of key, computing it once if missing
+
+        Args:
+            key: Cache key (see kpi_cache_key)
+            ttl: Seconds to keep a computed value
+            compute: Coroutine function computing the value; None results
+                are returned but not cached
+            min_remaining: Treat values expiring within this many seconds
+                as missing (used to refresh ahead of expiry)
+
+        Returns:
+            KPI value
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] - time.monotonic() > min_remaining:
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The computing request was cancelled; compute again
+                return await self.get_or_compute(key, ttl, compute, min_remaining)
+
+        future = asyncio.get_event_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved; waiters re-raise it
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if value is not None and ttl > 0:
+            self._entries[key] = (time.monotonic() + ttl, value)
+        future.set_result(value)
+        return value
+
+    def purge_expired(self):
+        """Drop expired values"""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+    def mark_active(self, dashboard_code: str):
+        """Record a view of a dashboard, keeping its KPIs warm"""
+        self._active[dashboard_code] = time.monotonic()
+
+    def active_dashboards(self, window: float = DASHBOARD_ACTIVE_WINDOW_SECONDS) -> List[str]:
+        """Codes of dashboards viewed within window seconds"""
+        cutoff = time.monotonic() - window
+        for code in [c for c, viewed in self._active.items() if viewed < cutoff]:
+            del self._active[code]
+        return list(self._active)
+
+
+class DashboardPrecomputer(object):
+    """Background loop recomputing the KPIs of active dashboards
+
+    Each pass refreshes values that would expire before the next pass, so
+    viewers of an active dashboard keep hitting the cache.
+    """
+
+    def __init__(
+        self,
+        cache: KPIResultCache,
+        interval: float = DASHBOARD_PRECOMPUTE_INTERVAL_SECONDS,
+    ):
+        self.cache = cache
+        self.interval = interval
+        self._task = None  # type: Optional[asyncio.Task]
+
+    def start(self):
+        """Start the precompute loop"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the precompute loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def precompute(self) -> int:
+        """Warm the KPIs of every active dashboard
+
+        Returns:
+            Number of dashboards warmed
+        """
+        from app.services.analytics import DashboardDataService
+
+        codes = self.cache.active_dashboards()
+        for code in codes:
+            try:
+                await DashboardDataService.warm_dashboard(code, min_remaining=self.interval)
+            except Exception as e:
+                logger.error("Error precomputing dashboard {}: {}".format(code, e))
+        self.cache.purge_expired()
+        return len(codes)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.precompute()
+            except Exception as e:
+                logger.error("Error in dashboard precompute loop: {}".format(e))
+
+
+# Process-wide KPI cache and precompute loop, started from the application lifespan
+kpi_result_cache = KPIResultCache()
+dashboard_precomputer = DashboardPrecomputer(kpi_result_cache)
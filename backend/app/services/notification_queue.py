@@ -3,19 +3,32 @@
 Asynchronous queue-based notification processing system with Redis backend.
 Handles priority queues, retry logic, and delivery tracking.
 
+Workers block on BZPOPMIN across the priority queues, so a notification is
+picked up as soon as it is enqueued. Each pop drains up to BATCH_SIZE
+notifications in one round trip; the batch is loaded with one query,
+delivered concurrently within per-channel limits, and written back with one
+bulk status UPDATE and one multi-row log INSERT.
+
+Popped notifications stay in the processing set until their batch is
+written. The reaper puts entries whose visibility timeout expired (e.g. a
+worker died mid-batch) back on their queue, and promotes due retries from
+the delayed set.
+
 Python 3.5+ compatible - uses .format() instead of f-strings
 """
 
 import asyncio
 import json
 import logging
+import time
+import uuid
 from datetime import datetime, timedelta
 
-import redis
-import aioredis
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, update
+import redis.asyncio as redis
+from sqlalchemy import select, update, insert
 
+from app.db.redis import get_redis_client
+from app.db.session import get_db_context
 from app.models.notifications import (
     Notification,
     NotificationLog,
@@ -27,8 +40,15 @@ from app.services.notification_channels import (
     ChannelProviderFactory,
     DeliveryResult,
     ChannelStatus,
+    create_delivery_result,
 )
 from app.core.config import settings
+from app.core.metrics import (
+    notification_queue_depth,
+    notification_queue_lag_seconds,
+    notification_queue_processed_total,
+    notification_delivery_duration_seconds,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -42,37 +62,144 @@ class QueuePriority(object):
     LOW = "low"
 
 
+# Queues in the order workers serve them
+PRIORITY_ORDER = [QueuePriority.URGENT, QueuePriority.HIGH, QueuePriority.NORMAL, QueuePriority.LOW]
+
+# Pop up to ARGV[1] members across the priority queues KEYS[2..] in order
+# and record them in the processing set KEYS[1] with visibility deadline
+# ARGV[2]. ARGV[3] is a member already popped by BZPOPMIN ('' if none),
+# ARGV[4..] the priority names of KEYS[2..]. Returns member, score pairs.
+POP_BATCH_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local popped = {}
+if ARGV[3] ~= '' then
+  redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+end
+for i = 2, #KEYS do
+  if limit <= 0 then break end
+  local items = redis.call('ZPOPMIN', KEYS[i], limit)
+  for j = 1, #items, 2 do
+    local member = ARGV[i + 2] .. ':' .. items[j]
+    redis.call('ZADD', KEYS[1], ARGV[2], member)
+    table.insert(popped, member)
+    table.insert(popped, items[j + 1])
+  end
+  limit = limit - #items / 2
+end
+return popped
+"""
+
+# Move up to ARGV[3] members of KEYS[1] scored at or below ARGV[1] back to
+# their priority queue (prefix ARGV[2]). Members are "<priority>:<id>".
+# Returns the number of members moved.
+REQUEUE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[3]))
+for _, member in ipairs(due) do
+  local sep = string.find(member, ':', 1, true)
+  redis.call('ZADD', ARGV[2] .. string.sub(member, 1, sep - 1), ARGV[1], string.sub(member, sep + 1))
+  redis.call('ZREM', KEYS[1], member)
+end
+return #due
+"""
+
+
+def delivery_outcome(notification, delivery_result, retry_delays, now):
+    """Compute the status update for a delivery attempt
+
+    Args:
+        notification: Notification row (status, retry_count, max_retries and
+            the delivery columns)
+        delivery_result: DeliveryResult of the attempt
+        retry_delays: Retry delay in seconds by attempt number
+        now: Current UTC time
+
+    Returns:
+        Tuple of (column values, retry delay in seconds or None)
+    """
+    values = {
+        "status": notification.status,
+        "sent_at": notification.sent_at,
+        "delivered_at": notification.delivered_at,
+        "message_id": notification.message_id,
+        "failed_reason": notification.failed_reason,
+        "retry_count": notification.retry_count,
+        "scheduled_at": notification.scheduled_at,
+        "updated_at": now,
+    }
+    retry_delay = None
+
+    if delivery_result.success:
+        values["status"] = NotificationStatus.SENT
+        values["sent_at"] = now
+        values["message_id"] = delivery_result.message_id
+
+        if delivery_result.status == ChannelStatus.DELIVERED:
+            values["status"] = NotificationStatus.DELIVERED
+            values["delivered_at"] = now
+    else:
+        values["status"] = NotificationStatus.FAILED
+        values["failed_reason"] = delivery_result.error_message
+        values["retry_count"] = notification.retry_count + 1
+
+        if values["retry_count"] < notification.max_retries:
+            values["status"] = NotificationStatus.PENDING
+            retry_delay = retry_delays.get(values["retry_count"], retry_delays[max(retry_delays)])
+            values["scheduled_at"] = now + timedelta(seconds=retry_delay)
+
+    return values, retry_delay
+
+
 class NotificationQueueProcessor(object):
     """Process notification queue with priority and retry logic"""
 
     QUEUE_PATTERN = "notification_queue:{priority}"
     PROCESSING_QUEUE = "notification_processing"
+    DELAYED_QUEUE = "notification_delayed"
     FAILED_QUEUE = "notification_failed"
 
     BATCH_SIZE = 50
-    POLL_INTERVAL = 5
+    BLOCK_TIMEOUT = 5
+    REAPER_INTERVAL = 5
     MAX_PROCESSING_TIME = 300
+    ERROR_BACKOFF = 1
     RETRY_DELAYS = {
         1: 60,
         2: 300,
         3: 900,
     }
 
-    def __init__(self, db):
+    # Concurrent deliveries per channel, shared by all workers
+    CHANNEL_CONCURRENCY = {
+        NotificationChannel.SMS: 10,
+        NotificationChannel.EMAIL: 20,
+        NotificationChannel.WHATSAPP: 10,
+        NotificationChannel.PUSH: 50,
+        NotificationChannel.IN_APP: 100,
+    }
+
+    def __init__(self, db=None):
         self.db = db
         self.redis_client = None
         self.running = False
         self.worker_tasks = []
+        self._channel_limits = {}
+        self._pop_batch = None
+        self._requeue_due = None
+
+    @property
+    def _queue_names(self):
+        return [self.QUEUE_PATTERN.format(priority=p) for p in PRIORITY_ORDER]
 
     async def start(self, num_workers=3):
-        """Start queue processor with multiple workers"""
+        """Start queue processor with multiple workers and the reaper"""
         if self.running:
             logger.warning("Queue processor already running")
             return
 
         try:
-            # Connect to Redis
-            self.redis_client = await aioredis.from_url(
+            # Dedicated connection pool without a socket timeout, so
+            # blocking pops are not cut off
+            self.redis_client = redis.from_url(
                 settings.REDIS_URL,
                 encoding="utf-8",
                 decode_responses=True
@@ -80,12 +207,20 @@ class NotificationQueueProcessor(object):
             await self.redis_client.ping()
             logger.info("Connected to Redis at {}".format(settings.REDIS_URL))
 
+            self._pop_batch = self.redis_client.register_script(POP_BATCH_SCRIPT)
+            self._requeue_due = self.redis_client.register_script(REQUEUE_DUE_SCRIPT)
+            self._channel_limits = dict(
+                (channel.value, asyncio.Semaphore(limit))
+                for channel, limit in self.CHANNEL_CONCURRENCY.items()
+            )
+
             self.running = True
 
             # Start worker tasks
             for i in range(num_workers):
                 task = asyncio.create_task(self._worker("worker-{}".format(i)))
                 self.worker_tasks.append(task)
+            self.worker_tasks.append(asyncio.create_task(self._reaper()))
 
             logger.info("Started {} queue processor workers".format(num_workers))
 
@@ -94,127 +229,225 @@ class NotificationQueueProcessor(object):
             raise
 
     async def stop(self):
-        """Stop queue processor gracefully"""
-        self.running = False
+        """Stop queue processor gracefully
 
-        for task in self.worker_tasks:
-            task.cancel()
+        Workers finish their current batch; anything still running after
+        one blocking timeout is cancelled and recovered by the reaper.
+        """
+        self.running = False
 
-        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        if self.worker_tasks:
+            _, pending = await asyncio.wait(self.worker_tasks, timeout=self.BLOCK_TIMEOUT + 1)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self.worker_tasks, return_exceptions=True)
         self.worker_tasks.clear()
 
         if self.redis_client:
             await self.redis_client.close()
+            self.redis_client = None
             logger.info("Queue processor stopped")
 
     async def enqueue(self, notification_id, priority=NotificationPriority.NORMAL):
-        """Add notification to queue"""
-        if not self.redis_client:
-            logger.warning("Redis not connected, skipping queue")
-            return
+        """Add notification to queue
+
+        Works without start(): producers use the shared Redis client.
+        """
+        client = self.redis_client or get_redis_client()
 
         queue_priority = self._map_priority(priority)
         queue_name = self.QUEUE_PATTERN.format(priority=queue_priority)
 
-        score = datetime.utcnow().timestamp()
-        await self.redis_client.zadd(queue_name, {str(notification_id): score})
+        score = time.time()
+        await client.zadd(queue_name, {str(notification_id): score})
 
         logger.info("Enqueued notification {} to {}".format(notification_id, queue_name))
 
     async def _worker(self, worker_name):
-        """Worker task that processes notifications from queue"""
+        """Worker task that blocks on the queues and processes batches"""
         logger.info("Worker {} started".format(worker_name))
 
         while self.running:
             try:
-                processed = await self._process_batch(worker_name)
-
-                if processed == 0:
-                    await asyncio.sleep(self.POLL_INTERVAL)
+                batch = await self._dequeue_batch()
+                if batch:
+                    await self._process_batch(batch, worker_name)
 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error("Worker {} error: {}".format(worker_name, e))
-                await asyncio.sleep(self.POLL_INTERVAL)
+                await asyncio.sleep(self.ERROR_BACKOFF)
 
         logger.info("Worker {} stopped".format(worker_name))
 
-    async def _process_batch(self, worker_name):
-        """Process a batch of notifications from priority queues"""
-        processed = 0
-
-        priorities = [QueuePriority.URGENT, QueuePriority.HIGH, QueuePriority.NORMAL, QueuePriority.LOW]
-
-        for priority in priorities:
-            if processed >= self.BATCH_SIZE:
-                break
-
-            queue_name = self.QUEUE_PATTERN.format(priority=priority)
-            notifications = await self._dequeue_batch(queue_name, self.BATCH_SIZE - processed)
-
-            for notification_id_str in notifications:
-                try:
-                    notification_id = int(notification_id_str)
-                    await self._process_notification(notification_id, worker_name)
-                    processed += 1
+    async def _dequeue_batch(self):
+        """Block until a notification is queued, then drain up to BATCH_SIZE
 
-                except Exception as e:
-                    logger.error("Error processing notification {}: {}".format(notification_id_str, e))
-                    await self._move_to_failed(notification_id_str, str(e))
-
-        return processed
-
-    async def _dequeue_batch(self, queue_name, count):
-        """Dequeue multiple notifications from queue"""
-        if not self.redis_client:
+        Returns:
+            List of (processing member, enqueue score) tuples
+        """
+        popped = await self.redis_client.bzpopmin(self._queue_names, timeout=self.BLOCK_TIMEOUT)
+        if not popped:
             return []
 
-        results = await self.redis_client.zpopmin(queue_name, count)
-        return [item[0] for item in results] if results else []
+        queue_name, notification_id, score = popped
+        first = "{}:{}".format(queue_name.split(":", 1)[1], notification_id)
+        deadline = time.time() + self.MAX_PROCESSING_TIME
 
-    async def _process_notification(self, notification_id, worker_name):
-        """Process a single notification"""
-        result = await self.db.execute(
-            select(Notification).where(Notification.id == notification_id)
+        # The blocking pop is not atomic with the processing set; an entry
+        # lost in between stays PENDING in the database
+        more = await self._pop_batch(
+            keys=[self.PROCESSING_QUEUE] + self._queue_names,
+            args=[self.BATCH_SIZE - 1, deadline, first] + PRIORITY_ORDER,
         )
-        notification = result.scalar_one_or_none()
-
-        if not notification:
-            logger.warning("Notification {} not found".format(notification_id))
-            return
-
-        if notification.status != NotificationStatus.PENDING:
-            logger.info("Notification {} already processed (status: {})".format(
-                notification_id, notification.status
-            ))
-            return
-
-        logger.info("{}: Processing notification {}".format(worker_name, notification_id))
 
-        try:
-            provider = ChannelProviderFactory.get_provider(
-                notification.channel,
-                self.db
-            )
-
-            recipient = await self._get_recipient_contact(
-                notification.recipient_id,
-                notification.user_type,
-                notification.channel
-            )
+        batch = [(first, float(score))]
+        batch.extend((more[i], float(more[i + 1])) for i in range(0, len(more), 2))
+
+        now = time.time()
+        for member, enqueued_at in batch:
+            notification_queue_lag_seconds.labels(
+                priority=member.split(":", 1)[0]
+            ).observe(max(0.0, now - enqueued_at))
+        return batch
+
+    async def _process_batch(self, batch, worker_name):
+        """Deliver a batch and write all results in bulk
+
+        Args:
+            batch: List of (processing member, enqueue score) tuples
+            worker_name: Worker name for the delivery log
+
+        Returns:
+            Number of notifications delivered
+        """
+        members = {}
+        invalid = []
+        for member, _ in batch:
+            try:
+                members[uuid.UUID(member.split(":", 1)[1])] = member
+            except ValueError:
+                invalid.append(member)
+        for member in invalid:
+            await self._move_to_failed(member.split(":", 1)[1], "Invalid notification ID")
+
+        retries = {}
+        delivered = 0
+        if members:
+            async with get_db_context() as db:
+                result = await db.execute(
+                    select(
+                        Notification.id,
+                        Notification.recipient_id,
+                        Notification.user_type,
+                        Notification.channel,
+                        Notification.status,
+                        Notification.title,
+                        Notification.message,
+                        Notification.notification_metadata,
+                        Notification.message_id,
+                        Notification.sent_at,
+                        Notification.delivered_at,
+                        Notification.failed_reason,
+                        Notification.scheduled_at,
+                        Notification.retry_count,
+                        Notification.max_retries,
+                    ).where(Notification.id.in_(list(members)))
+                )
+                notifications = [
+                    n for n in result
+                    if n.status == NotificationStatus.PENDING
+                ]
+
+                outcomes = await asyncio.gather(*[
+                    self._deliver(notification, db) for notification in notifications
+                ])
+
+                updates = []
+                logs = []
+                now = datetime.utcnow()
+                for notification, (delivery_result, error) in zip(notifications, outcomes):
+                    if error is not None:
+                        values, retry_delay = self._processing_error_values(notification, error, now)
+                        status = "error"
+                        logs.append({
+                            "notification_id": notification.id,
+                            "status": "processing_error",
+                            "message": "{}: {}".format(worker_name, error),
+                            "error_details": None,
+                        })
+                    else:
+                        values, retry_delay = delivery_outcome(
+                            notification, delivery_result, self.RETRY_DELAYS, now
+                        )
+                        status = "retry" if retry_delay else getattr(
+                            values["status"], "value", values["status"]
+                        )
+                        logs.append({
+                            "notification_id": notification.id,
+                            "status": delivery_result.status,
+                            "message": "Processed by {}: {}".format(
+                                worker_name,
+                                delivery_result.error_message or "Sent successfully"
+                            ),
+                            "error_details": delivery_result.provider_response,
+                        })
+                        delivered += 1
+
+                    values["id"] = notification.id
+                    updates.append(values)
+                    if retry_delay:
+                        retries[members[notification.id]] = time.time() + retry_delay
+                    notification_queue_processed_total.labels(
+                        channel=notification.channel, status=status
+                    ).inc()
+
+                if updates:
+                    await db.execute(update(Notification), updates)
+                    await db.execute(insert(NotificationLog), logs)
+
+        await self._finish_batch([member for member, _ in batch], retries)
+        return delivered
+
+    async def _deliver(self, notification, db):
+        """Send one notification within its channel's concurrency limit
+
+        Returns:
+            Tuple of (DeliveryResult, None) or (None, error message)
+        """
+        limit = self._channel_limits.get(notification.channel)
+        if limit is None:
+            limit = self._channel_limits[notification.channel] = asyncio.Semaphore(1)
+
+        async with limit:
+            start = time.monotonic()
+            try:
+                provider = ChannelProviderFactory.get_provider(notification.channel, db)
+                recipient = await self._get_recipient_contact(
+                    notification.recipient_id,
+                    notification.user_type,
+                    notification.channel
+                )
 
-            delivery_result = await provider.send_with_retry(
-                recipient=recipient,
-                subject=notification.title or "",
-                message=notification.message,
-                metadata=notification.metadata
-            )
+                # One attempt per pass; failures are retried through the
+                # delayed queue instead of sleeping inside the batch
+                delivery_result = await provider.send(
+                    recipient,
+                    notification.title or "",
+                    notification.message,
+                    notification.notification_metadata
+                )
+                return delivery_result, None
 
-            await self._update_notification_status(notification, delivery_result)
-            await self._log_delivery(notification, delivery_result, worker_name)
+            except Exception as e:
+                logger.error("Failed to process notification {}: {}".format(notification.id, e))
+                return None, str(e)
 
-        except Exception as e:
-            logger.error("Failed to process notification {}: {}".format(notification_id, e))
-            await self._handle_processing_error(notification, str(e), worker_name)
+            finally:
+                notification_delivery_duration_seconds.labels(
+                    channel=notification.channel
+                ).observe(time.monotonic() - start)
 
     async def _get_recipient_contact(self, recipient_id, user_type, channel):
         """Get recipient contact information for channel"""
@@ -227,81 +460,69 @@ class NotificationQueueProcessor(object):
         else:
             return str(recipient_id)
 
-    async def _update_notification_status(self, notification, delivery_result):
-        """Update notification status in database"""
-        if delivery_result.success:
-            notification.status = NotificationStatus.SENT
-            notification.sent_at = datetime.utcnow()
-            notification.message_id = delivery_result.message_id
-
-            if delivery_result.status == ChannelStatus.DELIVERED:
-                notification.status = NotificationStatus.DELIVERED
-                notification.delivered_at = datetime.utcnow()
-        else:
-            notification.status = NotificationStatus.FAILED
-            notification.failed_at = datetime.utcnow()
-            notification.failed_reason = delivery_result.error_message
-            notification.retry_count += 1
-
-            if notification.retry_count < notification.max_retries:
-                notification.status = NotificationStatus.PENDING
-                delay = self.RETRY_DELAYS.get(
-                    notification.retry_count,
-                    self.RETRY_DELAYS[3]
-                )
-                await self._schedule_retry(notification, delay)
-
-        notification.updated_at = datetime.utcnow()
-
-    async def _schedule_retry(self, notification, delay_seconds):
-        """Schedule notification for retry"""
-        if not self.redis_client:
-            return
-
-        retry_time = datetime.utcnow() + timedelta(seconds=delay_seconds)
-        notification.scheduled_at = retry_time
+    def _processing_error_values(self, notification, error_message, now):
+        """Status update for a notification whose processing raised"""
+        values, _ = delivery_outcome(
+            notification,
+            create_delivery_result(
+                success=False,
+                status=ChannelStatus.FAILED,
+                error_message=error_message
+            ),
+            self.RETRY_DELAYS,
+            now
+        )
+        # Processing errors are not retried
+        values["status"] = NotificationStatus.FAILED
+        values["scheduled_at"] = notification.scheduled_at
+        return values, None
+
+    async def _finish_batch(self, members, retries):
+        """Release a written batch and schedule its retries in one transaction
+
+        Args:
+            members: Processing members of the batch
+            retries: Retry due timestamps by processing member
+        """
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            if retries:
+                pipe.zadd(self.DELAYED_QUEUE, retries)
+            pipe.zrem(self.PROCESSING_QUEUE, *members)
+            await pipe.execute()
+
+        for member, due in retries.items():
+            logger.info("Scheduled notification {} for retry at {}".format(
+                member.split(":", 1)[1], datetime.utcfromtimestamp(due).isoformat()
+            ))
 
-        queue_priority = self._map_priority(NotificationPriority(notification.priority))
-        queue_name = self.QUEUE_PATTERN.format(priority=queue_priority)
-        score = retry_time.timestamp()
+    async def _reaper(self):
+        """Requeue expired processing entries and due retries; export depth"""
+        while self.running:
+            try:
+                await asyncio.sleep(self.REAPER_INTERVAL)
+                now = time.time()
+                prefix = self.QUEUE_PATTERN.format(priority="")
 
-        await self.redis_client.zadd(queue_name, {str(notification.id): score})
+                expired = await self._requeue_due(
+                    keys=[self.PROCESSING_QUEUE], args=[now, prefix, self.BATCH_SIZE * 10]
+                )
+                if expired:
+                    logger.warning("Requeued {} notifications past their visibility timeout".format(expired))
 
-        logger.info(
-            "Scheduled notification {} for retry in {}s (attempt {})".format(
-                notification.id, delay_seconds, notification.retry_count
-            )
-        )
+                await self._requeue_due(
+                    keys=[self.DELAYED_QUEUE], args=[now, prefix, self.BATCH_SIZE * 10]
+                )
 
-    async def _log_delivery(self, notification, delivery_result, worker_name):
-        """Log notification delivery attempt"""
-        log = NotificationLog(
-            notification_id=notification.id,
-            status=delivery_result.status,
-            message="Processed by {}: {}".format(
-                worker_name,
-                delivery_result.error_message or "Sent successfully"
-            ),
-            error_details=delivery_result.provider_response
-        )
-        self.db.add(log)
-
-    async def _handle_processing_error(self, notification, error_message, worker_name):
-        """Handle processing error"""
-        notification.status = NotificationStatus.FAILED
-        notification.failed_at = datetime.utcnow()
-        notification.failed_reason = error_message
-        notification.retry_count += 1
-        notification.updated_at = datetime.utcnow()
-
-        log = NotificationLog(
-            notification_id=notification.id,
-            status="processing_error",
-            message="{}: {}".format(worker_name, error_message),
-        )
-        self.db.add(log)
+                stats = await self.get_queue_stats()
+                for priority, count in stats["queues"].items():
+                    notification_queue_depth.labels(queue=priority).set(count)
+                notification_queue_depth.labels(queue="processing").set(stats["processing"])
+                notification_queue_depth.labels(queue="delayed").set(stats["delayed"])
 
-        await self.db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Notification queue reaper error: {}".format(e))
 
     async def _move_to_failed(self, notification_id_str, error_message):
         """Move notification to failed queue"""
@@ -332,30 +553,28 @@ class NotificationQueueProcessor(object):
 
     async def get_queue_stats(self):
         """Get queue statistics"""
-        if not self.redis_client:
-            return {"error": "Redis not connected"}
-
-        stats = {
-            "queues": {},
-            "processing": 0,
-            "failed": 0
+        client = self.redis_client or get_redis_client()
+
+        async with client.pipeline(transaction=False) as pipe:
+            for queue_name in self._queue_names:
+                pipe.zcard(queue_name)
+            pipe.zcard(self.PROCESSING_QUEUE)
+            pipe.zcard(self.DELAYED_QUEUE)
+            pipe.hlen(self.FAILED_QUEUE)
+            counts = await pipe.execute()
+
+        return {
+            "queues": dict(zip(PRIORITY_ORDER, counts[:len(PRIORITY_ORDER)])),
+            "processing": counts[-3],
+            "delayed": counts[-2],
+            "failed": counts[-1],
         }
 
-        for priority in [QueuePriority.URGENT, QueuePriority.HIGH, QueuePriority.NORMAL, QueuePriority.LOW]:
-            queue_name = self.QUEUE_PATTERN.format(priority=priority)
-            count = await self.redis_client.zcard(queue_name)
-            stats["queues"][priority] = count
-
-        stats["processing"] = await self.redis_client.zcard(self.PROCESSING_QUEUE)
-        stats["failed"] = await self.redis_client.hlen(self.FAILED_QUEUE)
-
-        return stats
-
 
 _processor_instance = None
 
 
-def get_queue_processor(db):
+def get_queue_processor(db=None):
     """Get or create queue processor instance"""
     global _processor_instance
 
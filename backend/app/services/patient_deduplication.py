@@ -5,16 +5,24 @@ This module provides services for:
 - Patient record merging
 - Master patient record management
 
+Duplicate detection uses precomputed blocking keys (see PatientBlockingKey):
+phonetic keys for Indonesian names, a normalized phone suffix and a
+date-of-birth bucket. Candidates are found with one indexed query and scored
+with Jaro-Winkler similarity.
+
 Python 3.5+ compatible
 """
 
+import asyncio
 import logging
-from datetime import datetime
-from typing import Optional, List, Dict
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Optional, List, Dict, Tuple, Iterable
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, union
 
-from app.models.patient import Patient
+from app.models.patient import Patient, PatientBlockingKey
 from app.models.audit_log import AuditLog
 from app.models.user import User
 
@@ -22,6 +30,259 @@ from app.models.user import User
 logger = logging.getLogger(__name__)
 
 
+# Blocking configuration
+PHONE_SUFFIX_LENGTH = 8
+MIN_PHONE_DIGITS = 9
+MAX_BLOCK_SIZE = 500  # Skip pathological blocks (e.g. very common names) in registry scans
+SCAN_CHUNK_BLOCKS = 200  # Blocks per process-pool task
+SCAN_YIELD_PER = 5000
+
+# Honorifics commonly typed into the name field at registration
+NAME_TITLES = {
+    "tn", "ny", "nn", "an", "by", "sdr", "sdri", "bpk", "ibu", "h", "hj",
+    "dr", "drg", "ir", "prof",
+}
+
+# Spelling variants of Muhammad, including the usual abbreviations
+MUHAMMAD_VARIANTS = {
+    "m", "mhd", "moh", "moch", "mochd", "mohd", "muh", "much", "mukh",
+    "mohammad", "mohamad", "mochammad", "mochamad", "muhammad", "muhamad",
+    "muhammed", "mohammed", "muchammad", "muchamad",
+}
+
+# Ordered spelling rules: old (Van Ophuijsen / Soewandi) spelling and common
+# transliteration variants mapped to one canonical form
+PHONETIC_RULES = (
+    ("oe", "u"),
+    ("dj", "j"),
+    ("tj", "c"),
+    ("sj", "sy"),
+    ("nj", "ny"),
+    ("j", "y"),
+    ("ch", "h"),
+    ("kh", "h"),
+    ("ph", "f"),
+    ("th", "t"),
+    ("dh", "d"),
+    ("q", "k"),
+    ("x", "ks"),
+    ("v", "f"),
+    ("w", "u"),
+    ("y", "i"),
+)
+
+
+def normalize_name(full_name: str) -> str:
+    """Normalize a patient name for matching
+
+    Lowercases, drops academic degrees written after a comma, strips
+    punctuation and honorifics, and collapses the Muhammad spelling variants.
+
+    Args:
+        full_name: Name as entered
+
+    Returns:
+        Normalized name (space separated tokens)
+    """
+    name = (full_name or "").split(",")[0].lower()
+    tokens = re.sub(r"[^a-z\s]", " ", name).split()
+    normalized = []
+    for token in tokens:
+        if token in NAME_TITLES:
+            continue
+        if token in MUHAMMAD_VARIANTS:
+            token = "muhammad"
+        normalized.append(token)
+    return " ".join(normalized)
+
+
+def indonesian_phonetic_key(token: str) -> str:
+    """Compute a phonetic key for one Indonesian name token
+
+    Applies old-spelling and transliteration rules, keeps the first letter,
+    drops later vowels and 'h', and collapses repeated letters, so that
+    e.g. Soekarno/Sukarno, Achmad/Ahmad and Djoko/Joko share a key.
+
+    Args:
+        token: Single lowercase name token
+
+    Returns:
+        Phonetic key (empty string for empty input)
+    """
+    if not token:
+        return ""
+
+    word = token
+    for source, target in PHONETIC_RULES:
+        word = word.replace(source, target)
+
+    key = word[0]
+    for char in word[1:]:
+        if char in "aeiouh":
+            continue
+        if char != key[-1]:
+            key += char
+    return key
+
+
+def normalize_phone_suffix(phone: Optional[str]) -> Optional[str]:
+    """Normalize a phone number to its trailing digits
+
+    Args:
+        phone: Phone number in any format (+62, 62, 0 prefixes)
+
+    Returns:
+        Last PHONE_SUFFIX_LENGTH digits, or None if too short
+    """
+    if not phone:
+        return None
+    digits = "".join(c for c in phone if c.isdigit())
+    if digits.startswith("62"):
+        digits = "0" + digits[2:]
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return digits[-PHONE_SUFFIX_LENGTH:]
+
+
+def dob_bucket(date_of_birth: Optional[date]) -> Optional[int]:
+    """Bucket a date of birth by year and month (YYYYMM)"""
+    if not date_of_birth:
+        return None
+    return date_of_birth.year * 100 + date_of_birth.month
+
+
+def build_blocking_keys(
+    full_name: str,
+    phone: Optional[str],
+    date_of_birth: Optional[date],
+) -> Dict[str, any]:
+    """Build the blocking keys stored in PatientBlockingKey
+
+    Args:
+        full_name: Patient full name
+        phone: Patient phone number
+        date_of_birth: Patient date of birth
+
+    Returns:
+        Dict of PatientBlockingKey column values
+    """
+    normalized = normalize_name(full_name)
+    tokens = normalized.split()
+    return {
+        "normalized_name": normalized,
+        "phonetic_first": indonesian_phonetic_key(tokens[0]) if tokens else None,
+        "phonetic_last": indonesian_phonetic_key(tokens[-1]) if tokens else None,
+        "phone_suffix": normalize_phone_suffix(phone),
+        "dob_bucket": dob_bucket(date_of_birth),
+    }
+
+
+def jaro_winkler(s1: str, s2: str, prefix_scale: float = 0.1) -> float:
+    """Jaro-Winkler similarity between two strings
+
+    Args:
+        s1: First string
+        s2: Second string
+        prefix_scale: Winkler prefix bonus (standard 0.1)
+
+    Returns:
+        Similarity score (0-1)
+    """
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+
+    match_distance = max(max(len1, len2) // 2 - 1, 0)
+    s1_matches = [False] * len1
+    s2_matches = [False] * len2
+
+    matches = 0
+    for i in range(len1):
+        start = max(0, i - match_distance)
+        end = min(i + match_distance + 1, len2)
+        for j in range(start, end):
+            if s2_matches[j] or s1[i] != s2[j]:
+                continue
+            s1_matches[i] = s2_matches[j] = True
+            matches += 1
+            break
+
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    k = 0
+    for i in range(len1):
+        if not s1_matches[i]:
+            continue
+        while not s2_matches[k]:
+            k += 1
+        if s1[i] != s2[k]:
+            transpositions += 1
+        k += 1
+
+    jaro = (
+        matches / len1
+        + matches / len2
+        + (matches - transpositions / 2) / matches
+    ) / 3
+
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def jaro_winkler_many(name: str, candidates: Iterable[str]) -> List[float]:
+    """Score one normalized name against a batch of normalized candidates
+
+    Args:
+        name: Normalized name to compare
+        candidates: Normalized candidate names
+
+    Returns:
+        Similarity scores in candidate order
+    """
+    return [jaro_winkler(name, candidate) for candidate in candidates]
+
+
+def _score_blocks(
+    blocks: List[List[Tuple[int, str, Optional[int]]]],
+    threshold: float,
+    match_type: str,
+) -> List[Tuple[int, int, float, str]]:
+    """Score all record pairs within each block (runs in a worker process)
+
+    Args:
+        blocks: Blocks of (patient_id, normalized_name, dob_bucket) tuples
+        threshold: Minimum similarity to report
+        match_type: Match type label for the blocking pass
+
+    Returns:
+        List of (patient_id_a, patient_id_b, score, match_type)
+    """
+    pairs = []
+    for block in blocks:
+        for i in range(len(block) - 1):
+            patient_id, name, _ = block[i]
+            rest = block[i + 1:]
+            scores = jaro_winkler_many(name, [other[1] for other in rest])
+            for other, score in zip(rest, scores):
+                if score >= threshold:
+                    pairs.append((
+                        min(patient_id, other[0]),
+                        max(patient_id, other[0]),
+                        round(score, 4),
+                        match_type,
+                    ))
+    return pairs
+
+
 class PatientDeduplicationService(object):
     """Service for detecting and handling duplicate patient records"""
 
@@ -35,6 +296,10 @@ class PatientDeduplicationService(object):
     ) -> List[Dict[str, any]]:
         """Find potential duplicate patient records
 
+        Candidates sharing a NIK, phone suffix, or a phonetic name key within
+        the same date-of-birth bucket are fetched in one indexed query and
+        scored with Jaro-Winkler similarity.
+
         Args:
             patient_data: Patient data to check for duplicates
             threshold: Similarity threshold (0-1)
@@ -42,154 +307,262 @@ class PatientDeduplicationService(object):
         Returns:
             List of potential duplicates with similarity scores
         """
-        duplicates = []
-
-        # Check by NIK (exact match)
         nik = patient_data.get("nik")
+        dob = patient_data.get("date_of_birth")
+        keys = build_blocking_keys(
+            patient_data.get("full_name") or "",
+            patient_data.get("phone"),
+            dob,
+        )
+
+        block_conditions = []
+        if keys["phone_suffix"]:
+            block_conditions.append(PatientBlockingKey.phone_suffix == keys["phone_suffix"])
+        if keys["dob_bucket"] and keys["phonetic_first"]:
+            block_conditions.append(and_(
+                PatientBlockingKey.dob_bucket == keys["dob_bucket"],
+                PatientBlockingKey.phonetic_first == keys["phonetic_first"],
+            ))
+            block_conditions.append(and_(
+                PatientBlockingKey.dob_bucket == keys["dob_bucket"],
+                PatientBlockingKey.phonetic_last == keys["phonetic_last"],
+            ))
+
+        candidate_queries = []
+        if block_conditions:
+            candidate_queries.append(
+                select(PatientBlockingKey.patient_id).where(or_(*block_conditions))
+            )
         if nik:
-            query = select(Patient).where(
+            candidate_queries.append(select(Patient.id).where(Patient.nik == nik))
+        if not candidate_queries:
+            return []
+
+        candidate_ids = (
+            union(*candidate_queries) if len(candidate_queries) > 1 else candidate_queries[0]
+        )
+        query = (
+            select(Patient, PatientBlockingKey)
+            .outerjoin(PatientBlockingKey, PatientBlockingKey.patient_id == Patient.id)
+            .where(
                 and_(
-                    Patient.nik == nik,
+                    Patient.id.in_(candidate_ids),
                     Patient.is_active == True
                 )
             )
-            result = await self.db.execute(query)
-            patient = result.scalar_one_or_none()
+        )
+        result = await self.db.execute(query)
+        candidates = result.all()
 
-            if patient:
-                duplicates.append({
-                    "patient_id": patient.id,
-                    "mrn": patient.medical_record_number,
-                    "full_name": patient.full_name,
-                    "nik": patient.nik,
-                    "similarity_score": 1.0,
-                    "match_type": "nik_exact",
-                })
-
-        # Check by name + date of birth
-        full_name = patient_data.get("full_name")
-        dob = patient_data.get("date_of_birth")
+        candidate_names = [
+            block_key.normalized_name if block_key else normalize_name(p.full_name)
+            for p, block_key in candidates
+        ]
+        scores = jaro_winkler_many(keys["normalized_name"], candidate_names)
 
-        if full_name and dob:
-            # Exact match
-            query = select(Patient).where(
-                and_(
-                    Patient.full_name.ilike(full_name),
-                    Patient.date_of_birth == dob,
-                    Patient.is_active == True
-                )
-            )
-            result = await self.db.execute(query)
-            patients = result.scalars().all()
+        duplicates = []
+        for (p, block_key), candidate_name, score in zip(candidates, candidate_names, scores):
+            phone_suffix = block_key.phone_suffix if block_key else None
+            entry = {
+                "patient_id": p.id,
+                "mrn": p.medical_record_number,
+                "full_name": p.full_name,
+                "nik": p.nik,
+            }
+
+            if nik and p.nik == nik:
+                entry.update(similarity_score=1.0, match_type="nik_exact")
+            elif dob and p.date_of_birth == dob and candidate_name == keys["normalized_name"]:
+                entry.update(similarity_score=1.0, match_type="name_dob_exact")
+            elif dob and p.date_of_birth == dob and score >= threshold:
+                entry.update(similarity_score=round(score, 4), match_type="name_dob_fuzzy")
+            elif keys["phone_suffix"] and phone_suffix == keys["phone_suffix"]:
+                # Phone match is weaker
+                entry.update(phone=p.phone, similarity_score=0.6, match_type="phone")
+            else:
+                continue
+
+            duplicates.append(entry)
+
+        duplicates.sort(key=lambda d: d["similarity_score"], reverse=True)
+        return duplicates
 
-            for p in patients:
-                if not any(d.get("patient_id") == p.id for d in duplicates):
-                    duplicates.append({
-                        "patient_id": p.id,
-                        "mrn": p.medical_record_number,
-                        "full_name": p.full_name,
-                        "nik": p.nik,
-                        "similarity_score": 1.0,
-                        "match_type": "name_dob_exact",
-                    })
-
-            # Partial name match + same DOB
-            name_parts = full_name.split()
-            if len(name_parts) >= 2:
-                # Try matching first 2 name parts
-                first_two = " ".join(name_parts[:2])
-                query = select(Patient).where(
-                    and_(
-                        Patient.full_name.ilike("%{}%".format(first_two)),
-                        Patient.date_of_birth == dob,
-                        Patient.is_active == True
-                    )
-                )
-                result = await self.db.execute(query)
-                patients = result.scalars().all()
-
-                for p in patients:
-                    if not any(d.get("patient_id") == p.id for d in duplicates):
-                        # Calculate similarity score
-                        similarity = self._calculate_name_similarity(
-                            full_name,
-                            p.full_name
-                        )
-
-                        if similarity >= threshold:
-                            duplicates.append({
-                                "patient_id": p.id,
-                                "mrn": p.medical_record_number,
-                                "full_name": p.full_name,
-                                "nik": p.nik,
-                                "similarity_score": similarity,
-                                "match_type": "name_dob_fuzzy",
-                            })
-
-        # Check by phone number
-        phone = patient_data.get("phone")
-        if phone and len(phone) >= 10:
-            # Remove non-numeric characters
-            clean_phone = "".join(c for c in phone if c.isdigit())
-
-            query = select(Patient).where(
-                and_(
-                    Patient.phone.ilike("%{}%".format(clean_phone)),
-                    Patient.is_active == True
-                )
+    async def upsert_blocking_keys(self, patient: Patient) -> PatientBlockingKey:
+        """Create or refresh the blocking keys for a patient
+
+        Must be called whenever name, phone or date of birth change. The
+        caller owns the transaction; this method only flushes.
+
+        Args:
+            patient: Patient with a database ID
+
+        Returns:
+            Current PatientBlockingKey row
+        """
+        keys = build_blocking_keys(patient.full_name, patient.phone, patient.date_of_birth)
+
+        query = select(PatientBlockingKey).where(PatientBlockingKey.patient_id == patient.id)
+        result = await self.db.execute(query)
+        block_key = result.scalar_one_or_none()
+
+        if block_key is None:
+            block_key = PatientBlockingKey(patient_id=patient.id, **keys)
+            self.db.add(block_key)
+        else:
+            for field, value in keys.items():
+                setattr(block_key, field, value)
+
+        await self.db.flush()
+        return block_key
+
+    async def rebuild_blocking_keys(self, batch_size: int = 1000) -> int:
+        """Backfill blocking keys for every patient that has none
+
+        Args:
+            batch_size: Patients per commit
+
+        Returns:
+            Number of patients indexed
+        """
+        indexed = 0
+        while True:
+            query = (
+                select(Patient)
+                .outerjoin(PatientBlockingKey, PatientBlockingKey.patient_id == Patient.id)
+                .where(PatientBlockingKey.id.is_(None))
+                .order_by(Patient.id)
+                .limit(batch_size)
             )
             result = await self.db.execute(query)
             patients = result.scalars().all()
+            if not patients:
+                break
 
             for p in patients:
-                if not any(d.get("patient_id") == p.id for d in duplicates):
-                    duplicates.append({
-                        "patient_id": p.id,
-                        "mrn": p.medical_record_number,
-                        "full_name": p.full_name,
-                        "nik": p.nik,
-                        "phone": p.phone,
-                        "similarity_score": 0.6,  # Phone match is weaker
-                        "match_type": "phone",
-                    })
+                self.db.add(PatientBlockingKey(
+                    patient_id=p.id,
+                    **build_blocking_keys(p.full_name, p.phone, p.date_of_birth)
+                ))
+            await self.db.commit()
+            indexed += len(patients)
 
-        return duplicates
+        logger.info("Blocking keys rebuilt for {} patients".format(indexed))
+        return indexed
 
-    def _calculate_name_similarity(self, name1: str, name2: str) -> float:
-        """Calculate similarity between two names using Jaro-Winkler distance
+    async def scan_registry_for_duplicates(
+        self,
+        threshold: float = 0.9,
+        max_workers: Optional[int] = None,
+    ) -> List[Dict[str, any]]:
+        """Scan the whole registry for likely duplicate pairs
+
+        Streams blocking keys ordered by each blocking pass (first-name key,
+        last-name key, phone suffix), groups rows into blocks and scores
+        the pairs inside each block on a process pool.
 
         Args:
-            name1: First name
-            name2: Second name
+            threshold: Minimum Jaro-Winkler similarity to report
+            max_workers: Process pool size (defaults to CPU count)
 
         Returns:
-            Similarity score (0-1)
+            List of duplicate pairs sorted by similarity score
         """
-        # Simple implementation - can be enhanced with proper Jaro-Winkler
-        name1_lower = name1.lower().strip()
-        name2_lower = name2.lower().strip()
+        blocking_passes = (
+            ("dob_first", (PatientBlockingKey.dob_bucket, PatientBlockingKey.phonetic_first)),
+            ("dob_last", (PatientBlockingKey.dob_bucket, PatientBlockingKey.phonetic_last)),
+            ("phone", (PatientBlockingKey.phone_suffix,)),
+        )
 
-        if name1_lower == name2_lower:
-            return 1.0
+        loop = asyncio.get_event_loop()
+        found = {}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for match_type, block_columns in blocking_passes:
+                futures = []
+                async for chunk in self._iter_block_chunks(block_columns):
+                    futures.append(loop.run_in_executor(
+                        pool, _score_blocks, chunk, threshold, match_type
+                    ))
+                for pairs in await asyncio.gather(*futures):
+                    for id_a, id_b, score, pair_type in pairs:
+                        existing = found.get((id_a, id_b))
+                        if existing is None or existing[0] < score:
+                            found[(id_a, id_b)] = (score, pair_type)
+
+        results = [
+            {
+                "patient_id": id_a,
+                "duplicate_patient_id": id_b,
+                "similarity_score": score,
+                "match_type": match_type,
+            }
+            for (id_a, id_b), (score, match_type) in found.items()
+        ]
+        results.sort(key=lambda d: d["similarity_score"], reverse=True)
+
+        logger.info("Registry duplicate scan found {} candidate pairs".format(len(results)))
+        return results
+
+    async def _iter_block_chunks(self, block_columns: Tuple):
+        """Stream blocking keys and yield chunks of complete blocks
 
-        # Check if one name contains the other
-        if name1_lower in name2_lower or name2_lower in name1_lower:
-            return 0.8
+        Args:
+            block_columns: Columns that define a block
 
-        # Calculate word overlap
-        words1 = set(name1_lower.split())
-        words2 = set(name2_lower.split())
+        Yields:
+            Lists of blocks, each a list of (patient_id, normalized_name, dob_bucket)
+        """
+        query = (
+            select(
+                PatientBlockingKey.patient_id,
+                PatientBlockingKey.normalized_name,
+                PatientBlockingKey.dob_bucket,
+                *block_columns
+            )
+            .join(Patient, Patient.id == PatientBlockingKey.patient_id)
+            .where(
+                and_(
+                    Patient.is_active == True,
+                    *[column.isnot(None) for column in block_columns]
+                )
+            )
+            .order_by(*block_columns)
+            .execution_options(yield_per=SCAN_YIELD_PER)
+        )
 
-        if not words1 or not words2:
-            return 0.0
+        chunk = []
+        block = []
+        block_key = None
+        result = await self.db.stream(query)
+        async for row in result:
+            row_key = tuple(row[3:])
+            if row_key != block_key:
+                if 1 < len(block) <= MAX_BLOCK_SIZE:
+                    chunk.append(block)
+                elif len(block) > MAX_BLOCK_SIZE:
+                    logger.warning("Skipping oversized block {} ({} rows)".format(block_key, len(block)))
+                if len(chunk) >= SCAN_CHUNK_BLOCKS:
+                    yield chunk
+                    chunk = []
+                block = []
+                block_key = row_key
+            block.append((row[0], row[1], row[2]))
+
+        if 1 < len(block) <= MAX_BLOCK_SIZE:
+            chunk.append(block)
+        if chunk:
+            yield chunk
 
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
+    def _calculate_name_similarity(self, name1: str, name2: str) -> float:
+        """Calculate similarity between two names using Jaro-Winkler distance
 
-        if not union:
-            return 0.0
+        Args:
+            name1: First name
+            name2: Second name
 
-        return len(intersection) / len(union)
+        Returns:
+            Similarity score (0-1)
+        """
+        return jaro_winkler(normalize_name(name1), normalize_name(name2))
 
     async def merge_patient_records(
         self,
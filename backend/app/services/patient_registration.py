@@ -19,6 +19,8 @@ from app.models.patient import Patient, EmergencyContact, PatientInsurance
 from app.models.user import User
 from app.models.audit_log import AuditLog
 from app.models.system_alerts import SystemAlert, AlertSeverity, AlertStatus
+from app.services.patient_deduplication import get_deduplication_service
+from app.services.sequence_allocation import allocate_number
 
 
 logger = logging.getLogger(__name__)
@@ -27,7 +29,6 @@ logger = logging.getLogger(__name__)
 # MRN Configuration
 MRN_PREFIX = "RM"
 MRN_FORMAT = "{prefix}{year:04d}{sequence:06d}"
-MRN_SEQUENCE_START = 1
 
 
 class PatientValidationError(Exception):
@@ -140,6 +141,9 @@ class PatientRegistrationService(object):
                 )
                 self.db.add(policy)
 
+        # Index the new patient for duplicate detection
+        await get_deduplication_service(self.db).upsert_blocking_keys(patient)
+
         # Create audit log
         await self._create_registration_audit_log(patient, created_by)
 
@@ -303,6 +307,10 @@ class PatientRegistrationService(object):
 
         await self.db.flush()
 
+        # Refresh duplicate-detection blocking keys if matching fields changed
+        if "full_name" in patient_data or "phone" in patient_data:
+            await get_deduplication_service(self.db).upsert_blocking_keys(patient)
+
         # Create audit log
         await self._create_update_audit_log(patient, updated_by)
 
@@ -534,27 +542,8 @@ class PatientRegistrationService(object):
         Returns:
             Next sequence number
         """
-        # Find the last MRN for this year
-        pattern = "{}{}%".format(MRN_PREFIX, year)
-        query = select(Patient).where(
-            Patient.medical_record_number.like(pattern)
-        ).order_by(Patient.medical_record_number.desc())
-
-        result = await self.db.execute(query)
-        last_patient = result.scalar_one_or_none()
-
-        if last_patient:
-            # Extract sequence from last MRN
-            last_mrn = last_patient.medical_record_number
-            # Format: RM + YYYY (4) + sequence (6) = 12 characters total
-            sequence_str = last_mrn[-6:]
-            try:
-                last_sequence = int(sequence_str)
-                return last_sequence + 1
-            except ValueError:
-                pass
-
-        return MRN_SEQUENCE_START
+        # Shared yearly MRN sequence (also used by crud.patient.generate_mrn)
+        return await allocate_number("patient_mrn", on_date=date(year, 1, 1))
 
     async def _create_registration_audit_log(
         self,
@@ -434,6 +434,11 @@ async def sync_all_patients_to_satusehat(
     """
     Sync all patients to SATUSEHAT (batch operation).
 
+    Delegates to SATUSEHATBulkSync, which pushes the patients changed since
+    their last sync with bounded concurrency and resumes an interrupted run
+    from its checkpoint. The engine reads and writes on its own short
+    sessions; db is kept for compatibility.
+
     Args:
         db: Database session
         satusehat_client: SATUSEHAT API client
@@ -443,37 +448,29 @@ async def sync_all_patients_to_satusehat(
     Returns:
         Sync result summary
     """
-    # Get all patients
-    query = select(Patient)
-    if limit:
-        query = query.limit(limit)
-
-    patients_result = await db.execute(query)
-    patients = patients_result.scalars().all()
-
-    success_count = 0
-    failure_count = 0
-    results = []
-
-    for patient in patients:
-        result = await sync_patient_to_satusehat(
-            db,
-            patient.id,
-            satusehat_client,
-            organization_id
-        )
-        results.append(result)
+    from app.services.satusehat_bulk_sync import create_satusehat_bulk_sync
 
-        if result["success"]:
-            success_count += 1
-        else:
-            failure_count += 1
+    summary = await create_satusehat_bulk_sync(satusehat_client, organization_id).run(
+        "patients", limit=limit
+    )
+    if summary["status"] == "skipped":
+        return {
+            "total_patients": 0,
+            "success_count": 0,
+            "failure_count": 0,
+            "results": [],
+            "message": summary["message"],
+        }
 
     return {
-        "total_patients": len(patients),
-        "success_count": success_count,
-        "failure_count": failure_count,
-        "results": results,
+        "total_patients": summary["processed"],
+        "success_count": summary["success_count"],
+        "failure_count": summary["failure_count"],
+        "results": [
+            {"success": False, "patient_id": failure["id"], "message": failure["error"]}
+            for failure in summary["failures"]
+        ],
+        "status": summary["status"],
     }
 
 
@@ -0,0 +1,308 @@
+"""Queue Display Snapshot Service for digital queue displays
+
+This module keeps the digital display state of each department (and
+polyclinic) as a precomputed snapshot instead of querying the queue on
+every display poll:
+- Snapshots are stored in Redis and rebuilt after a ticket change commits
+- Each rebuild is published so SSE streams push it to the displays
+- Every snapshot carries an ETag so polling displays get 304 responses
+
+When Redis is unavailable the snapshots and change notifications fall
+back to process memory.
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import date
+from typing import Optional, Dict, Set, Tuple, AsyncIterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.redis import get_redis_client
+from app.db.session import get_db_context
+from app.schemas.queue import QueueDepartment
+
+
+logger = logging.getLogger(__name__)
+
+
+# Snapshots expire as a safety net; ticket changes rebuild them sooner
+DISPLAY_SNAPSHOT_TTL_SECONDS = 300
+
+# Session.info key collecting displays to rebuild after commit
+PENDING_REFRESH_KEY = "queue_display_refresh"
+
+
+def display_key(department: QueueDepartment, poli_id: Optional[int] = None) -> str:
+    """Build the snapshot key of a display
+
+    Args:
+        department: Queue department
+        poli_id: Optional polyclinic ID
+
+    Returns:
+        Key string (e.g. "poli:3", "farmasi:all")
+    """
+    return "{}:{}".format(department.value, poli_id if poli_id else "all")
+
+
+def snapshot_etag(snapshot: Dict) -> str:
+    """Compute the ETag of a display snapshot
+
+    The generation timestamp is excluded, so rebuilding an unchanged
+    display keeps its ETag.
+
+    Args:
+        snapshot: Display snapshot
+
+    Returns:
+        Quoted ETag string
+    """
+    content = dict(
+        (k, v) for k, v in snapshot.items() if k not in ("timestamp", "etag")
+    )
+    digest = hashlib.sha1(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return '"{}"'.format(digest[:20])
+
+
+class QueueDisplayStore(object):
+    """Precomputed digital display snapshots
+
+    Rebuilds run on their own session after the triggering transaction
+    commits. Rebuilds of the same display are coalesced: a change during a
+    running rebuild schedules exactly one more.
+    """
+
+    def __init__(self):
+        self._local = {}  # type: Dict[str, Dict]
+        self._events = {}  # type: Dict[str, asyncio.Event]
+        self._refreshing = set()  # type: Set[str]
+        self._pending = set()  # type: Set[str]
+
+    @staticmethod
+    def _snapshot_key(key: str) -> str:
+        return "queue:display:snapshot:{}".format(key)
+
+    @staticmethod
+    def _channel(key: str) -> str:
+        return "queue:display:updates:{}".format(key)
+
+    async def get(
+        self,
+        department: QueueDepartment,
+        poli_id: Optional[int] = None,
+        db: Optional[AsyncSession] = None,
+    ) -> Dict:
+        """Get the current display snapshot, building it on a miss
+
+        Args:
+            department: Queue department
+            poli_id: Optional polyclinic ID
+            db: Session to build with on a miss (a new one if omitted)
+
+        Returns:
+            Display snapshot with "etag"
+        """
+        key = display_key(department, poli_id)
+        snapshot = await self._read(key)
+
+        if snapshot is None or snapshot.get("date") != date.today().isoformat():
+            if db is not None:
+                snapshot = await self._build(db, department, poli_id)
+            else:
+                async with get_db_context() as session:
+                    snapshot = await self._build(session, department, poli_id)
+            await self._write(key, snapshot, publish=False)
+
+        return snapshot
+
+    def refresh_after_commit(
+        self,
+        db: AsyncSession,
+        department: QueueDepartment,
+        poli_id: Optional[int] = None,
+    ):
+        """Rebuild the affected displays once the session commits
+
+        Args:
+            db: Session the ticket change is made in
+            department: Department of the changed ticket
+            poli_id: Polyclinic of the changed ticket
+        """
+        pending = db.info.setdefault(PENDING_REFRESH_KEY, set())
+        if not pending:
+            event.listen(db.sync_session, "after_commit", self._on_commit, once=True)
+
+        pending.add((department, None))
+        if poli_id:
+            pending.add((department, poli_id))
+
+    def _on_commit(self, session):
+        """after_commit hook: schedule rebuilds of the changed displays"""
+        targets = session.info.pop(PENDING_REFRESH_KEY, set())  # type: Set[Tuple]
+        for department, poli_id in targets:
+            self.schedule_refresh(department, poli_id)
+
+    def schedule_refresh(self, department: QueueDepartment, poli_id: Optional[int] = None):
+        """Schedule a background rebuild of a display
+
+        Args:
+            department: Queue department
+            poli_id: Optional polyclinic ID
+        """
+        key = display_key(department, poli_id)
+        if key in self._refreshing:
+            self._pending.add(key)
+            return
+
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+
+        self._refreshing.add(key)
+        loop.create_task(self._refresh(key, department, poli_id))
+
+    async def _refresh(self, key: str, department: QueueDepartment, poli_id: Optional[int]):
+        """Rebuild and publish a display until no change is pending"""
+        try:
+            while True:
+                self._pending.discard(key)
+                async with get_db_context() as db:
+                    snapshot = await self._build(db, department, poli_id)
+                await self._write(key, snapshot, publish=True)
+                if key not in self._pending:
+                    break
+        except Exception as e:
+            logger.error("Error refreshing queue display {}: {}".format(key, e))
+        finally:
+            self._refreshing.discard(key)
+
+    async def _build(
+        self,
+        db: AsyncSession,
+        department: QueueDepartment,
+        poli_id: Optional[int],
+    ) -> Dict:
+        """Build a display snapshot from the database"""
+        from app.services.queue_management import QueueManagementService
+
+        snapshot = await QueueManagementService(db).get_digital_display_data(
+            department=department,
+            poli_id=poli_id,
+        )
+        snapshot["date"] = date.today().isoformat()
+        snapshot["etag"] = snapshot_etag(snapshot)
+        return snapshot
+
+    async def _read(self, key: str) -> Optional[Dict]:
+        """Read a snapshot from Redis, or from memory if Redis is down"""
+        try:
+            payload = await get_redis_client().get(self._snapshot_key(key))
+        except Exception as e:
+            logger.debug("Redis unavailable for queue display {}: {}".format(key, e))
+            return self._local.get(key)
+
+        return json.loads(payload) if payload else None
+
+    async def _write(self, key: str, snapshot: Dict, publish: bool):
+        """Store a snapshot and notify the display streams"""
+        previous = self._local.get(key)
+        self._local[key] = snapshot
+
+        changed = previous is None or previous.get("etag") != snapshot["etag"]
+        if changed:
+            waiter = self._events.pop(key, None)
+            if waiter is not None:
+                waiter.set()
+
+        try:
+            redis = get_redis_client()
+            await redis.set(
+                self._snapshot_key(key),
+                json.dumps(snapshot, default=str),
+                ex=DISPLAY_SNAPSHOT_TTL_SECONDS,
+            )
+            if publish:
+                await redis.publish(self._channel(key), snapshot["etag"])
+        except Exception as e:
+            logger.warning("Could not store queue display {} in Redis: {}".format(key, e))
+
+    async def watch(
+        self,
+        department: QueueDepartment,
+        poli_id: Optional[int] = None,
+        etag: Optional[str] = None,
+        heartbeat_seconds: float = 15.0,
+    ) -> AsyncIterator[Optional[Dict]]:
+        """Yield the display snapshot whenever it changes
+
+        Args:
+            department: Queue department
+            poli_id: Optional polyclinic ID
+            etag: ETag the client already has
+            heartbeat_seconds: Maximum wait before yielding None as a
+                keep-alive
+
+        Yields:
+            Changed snapshots, or None on heartbeat
+        """
+        key = display_key(department, poli_id)
+
+        pubsub = None
+        try:
+            pubsub = get_redis_client().pubsub()
+            await pubsub.subscribe(self._channel(key))
+        except Exception as e:
+            logger.debug("Queue display {} streaming without Redis: {}".format(key, e))
+            pubsub = None
+
+        try:
+            while True:
+                snapshot = await self.get(department, poli_id)
+                if snapshot["etag"] != etag:
+                    etag = snapshot["etag"]
+                    yield snapshot
+
+                changed = await self._wait_for_change(key, pubsub, heartbeat_seconds)
+                if not changed:
+                    yield None
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.unsubscribe()
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def _wait_for_change(self, key: str, pubsub, timeout: float) -> bool:
+        """Wait for a change notification; False on timeout"""
+        if pubsub is not None:
+            try:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=timeout,
+                )
+                return message is not None
+            except Exception as e:
+                logger.debug("Queue display pubsub error for {}: {}".format(key, e))
+
+        waiter = self._events.get(key)
+        if waiter is None:
+            waiter = self._events[key] = asyncio.Event()
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# Process-wide display store
+queue_display_store = QueueDisplayStore()
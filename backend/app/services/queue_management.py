@@ -28,6 +28,8 @@ from app.models.patient import Patient
 from app.models.user import User
 from app.models.audit_log import AuditLog
 from app.schemas.queue import QueueDepartment, QueueStatus, QueuePriority
+from app.services.sequence_allocation import allocate_number
+from app.services.queue_display import queue_display_store
 
 
 logger = logging.getLogger(__name__)
@@ -103,6 +105,7 @@ class QueueManagementService(object):
 
         self.db.add(ticket)
         await self.db.flush()
+        self._refresh_displays(ticket)
 
         # Send notification if enabled
         await self._send_queue_notification(ticket, "issued")
@@ -155,6 +158,7 @@ class QueueManagementService(object):
 
         self.db.add(recall)
         await self.db.flush()
+        self._refresh_displays(ticket)
 
         # Send notification
         await self._send_queue_notification(ticket, "called")
@@ -211,6 +215,7 @@ class QueueManagementService(object):
             service_time = None
 
         await self.db.flush()
+        self._refresh_displays(ticket)
 
         # Update recall record
         query = select(QueueRecall).where(
@@ -272,6 +277,7 @@ class QueueManagementService(object):
         ticket.cancellation_reason = reason
 
         await self.db.flush()
+        self._refresh_displays(ticket)
 
         # Update recall record
         query = select(QueueRecall).where(
@@ -337,6 +343,7 @@ class QueueManagementService(object):
         ticket.cancellation_reason = reason
 
         await self.db.flush()
+        self._refresh_displays(ticket)
 
         # Send notification
         await self._send_queue_notification(ticket, "cancelled")
@@ -412,6 +419,7 @@ class QueueManagementService(object):
         ticket.status = QueueStatus.CANCELLED
         ticket.cancelled_at = datetime.utcnow()
         ticket.cancellation_reason = "Transferred to {}".format(to_department.value)
+        self._refresh_displays(ticket)
 
         # Create new ticket
         new_ticket = await self.create_queue_ticket(
@@ -527,6 +535,10 @@ class QueueManagementService(object):
     ) -> Dict[str, any]:
         """Get data for digital queue display
 
+        Loads called, waiting and recently served tickets with patient names
+        in a single query. Displays normally read the precomputed snapshot
+        from queue_display_store instead of calling this directly.
+
         Args:
             department: Department to display
             poli_id: Filter by polyclinic
@@ -536,89 +548,81 @@ class QueueManagementService(object):
         """
         today = date.today()
 
-        # Get currently serving
-        serving_query = select(QueueTicket).where(
-            and_(
-                QueueTicket.department == department,
-                QueueTicket.date == today,
-                QueueTicket.status == QueueStatus.CALLED,
-            )
-        )
-
+        filters = [
+            QueueTicket.department == department,
+            QueueTicket.date == today,
+            QueueTicket.status.in_([QueueStatus.CALLED, QueueStatus.WAITING, QueueStatus.SERVED]),
+        ]
         if poli_id:
-            serving_query = serving_query.where(QueueTicket.poli_id == poli_id)
-
-        serving_query = serving_query.order_by(QueueTicket.called_at.desc())
-
-        serving_result = await self.db.execute(serving_query)
-        serving_tickets = serving_result.scalars().all()
-
-        current_serving = []
-        for t in serving_tickets:
-            patient = await self._get_patient(t.patient_id)
-            current_serving.append({
-                "ticket_number": t.ticket_number,
-                "counter": t.serving_counter,
-                "patient_name": patient.full_name if patient else "Unknown",
-                "called_at": t.called_at.isoformat() if t.called_at else None,
-            })
+            filters.append(QueueTicket.poli_id == poli_id)
 
-        # Get waiting (next 5)
-        waiting_query = select(QueueTicket).where(
-            and_(
-                QueueTicket.department == department,
-                QueueTicket.date == today,
-                QueueTicket.status == QueueStatus.WAITING,
+        # Rank tickets within each status in its display order: latest
+        # called first, highest priority then position for waiting, latest
+        # served first
+        display_rank = func.row_number().over(
+            partition_by=QueueTicket.status,
+            order_by=[
+                case((QueueTicket.status == QueueStatus.CALLED, QueueTicket.called_at)).desc().nullslast(),
+                case((QueueTicket.status == QueueStatus.WAITING, QueueTicket.priority)).desc().nullslast(),
+                case((QueueTicket.status == QueueStatus.WAITING, QueueTicket.queue_position)).asc(),
+                case((QueueTicket.status == QueueStatus.SERVED, QueueTicket.served_at)).desc().nullslast(),
+            ],
+        ).label("display_rank")
+        status_total = func.count().over(partition_by=QueueTicket.status).label("status_total")
+
+        ranked = select(
+            QueueTicket.ticket_number,
+            QueueTicket.status,
+            QueueTicket.serving_counter,
+            QueueTicket.queue_position,
+            QueueTicket.estimated_wait_minutes,
+            QueueTicket.called_at,
+            QueueTicket.served_at,
+            Patient.full_name.label("patient_name"),
+            display_rank,
+            status_total,
+        ).select_from(QueueTicket).outerjoin(
+            Patient, Patient.id == QueueTicket.patient_id
+        ).where(and_(*filters)).subquery()
+
+        # One round-trip: every called ticket, next 5 waiting, last 3 served
+        query = select(ranked).where(
+            or_(
+                ranked.c.status == QueueStatus.CALLED,
+                and_(ranked.c.status == QueueStatus.WAITING, ranked.c.display_rank <= 5),
+                and_(ranked.c.status == QueueStatus.SERVED, ranked.c.display_rank <= 3),
             )
-        )
-
-        if poli_id:
-            waiting_query = waiting_query.where(QueueTicket.poli_id == poli_id)
+        ).order_by(ranked.c.status, ranked.c.display_rank)
 
-        waiting_query = waiting_query.order_by(
-            QueueTicket.priority.desc(),
-            QueueTicket.queue_position.asc()
-        ).limit(5)
-
-        waiting_result = await self.db.execute(waiting_query)
-        waiting_tickets = waiting_result.scalars().all()
+        result = await self.db.execute(query)
 
+        current_serving = []
         waiting_list = []
-        for t in waiting_tickets:
-            waiting_list.append({
-                "ticket_number": t.ticket_number,
-                "queue_position": t.queue_position,
-                "estimated_wait_minutes": t.estimated_wait_minutes,
-            })
-
-        # Get recently served (last 3)
-        recent_query = select(QueueTicket).where(
-            and_(
-                QueueTicket.department == department,
-                QueueTicket.date == today,
-                QueueTicket.status == QueueStatus.SERVED,
-            )
-        )
-
-        if poli_id:
-            recent_query = recent_query.where(QueueTicket.poli_id == poli_id)
-
-        recent_query = recent_query.order_by(
-            QueueTicket.served_at.desc()
-        ).limit(3)
-
-        recent_result = await self.db.execute(recent_query)
-        recent_tickets = recent_result.scalars().all()
-
         recent_list = []
-        for t in recent_tickets:
-            patient = await self._get_patient(t.patient_id)
-            recent_list.append({
-                "ticket_number": t.ticket_number,
-                "counter": t.serving_counter,
-                "patient_name": patient.full_name if patient else "Unknown",
-                "served_at": t.served_at.isoformat() if t.served_at else None,
-            })
+        total_waiting = 0
+
+        for row in result:
+            if row.status == QueueStatus.CALLED:
+                current_serving.append({
+                    "ticket_number": row.ticket_number,
+                    "counter": row.serving_counter,
+                    "patient_name": row.patient_name or "Unknown",
+                    "called_at": row.called_at.isoformat() if row.called_at else None,
+                })
+            elif row.status == QueueStatus.WAITING:
+                total_waiting = row.status_total
+                waiting_list.append({
+                    "ticket_number": row.ticket_number,
+                    "queue_position": row.queue_position,
+                    "estimated_wait_minutes": row.estimated_wait_minutes,
+                })
+            else:
+                recent_list.append({
+                    "ticket_number": row.ticket_number,
+                    "counter": row.serving_counter,
+                    "patient_name": row.patient_name or "Unknown",
+                    "served_at": row.served_at.isoformat() if row.served_at else None,
+                })
 
         # Get queue settings
         settings = await self._get_department_settings(department)
@@ -629,7 +633,7 @@ class QueueManagementService(object):
             "current_serving": current_serving,
             "waiting": waiting_list,
             "recently_served": recent_list,
-            "total_waiting": len(waiting_list),
+            "total_waiting": total_waiting,
             "refresh_interval_seconds": settings.display_refresh_interval_seconds if settings else 10,
             "timestamp": datetime.utcnow().isoformat(),
         }
@@ -812,6 +816,14 @@ class QueueManagementService(object):
     # Private Helper Methods
     # ==============================================================================
 
+    def _refresh_displays(self, ticket: QueueTicket):
+        """Rebuild the ticket's display snapshots after the transaction commits
+
+        Args:
+            ticket: Changed queue ticket
+        """
+        queue_display_store.refresh_after_commit(self.db, ticket.department, ticket.poli_id)
+
     async def _get_ticket_by_id(self, ticket_id: int) -> Optional[QueueTicket]:
         """Get ticket by ID
 
@@ -861,21 +873,13 @@ class QueueManagementService(object):
 
         prefix = prefixes.get(department, "X")
 
-        # Get next sequence
-        today = date.today()
-
-        query = select(func.count()).select_from(QueueTicket).where(
-            and_(
-                QueueTicket.department == department,
-                QueueTicket.date == today
-            )
+        # Next value of the department's daily ticket sequence
+        sequence = await allocate_number(
+            "queue_ticket",
+            on_date=date.today(),
+            department=department.value,
         )
 
-        result = await self.db.execute(query)
-        count = result.scalar() or 0
-
-        sequence = count + 1
-
         return "{0}-{1:03d}".format(prefix, sequence)
 
     async def _get_next_queue_position(
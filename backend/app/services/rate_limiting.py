@@ -8,7 +8,7 @@ Python 3.5+ compatible
 
 import logging
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
@@ -34,6 +34,19 @@ class RateLimitExceeded(Exception):
         super(RateLimitExceeded, self).__init__(message)
 
 
+async def _increment(redis_client, key: str, window_seconds: int) -> int:
+    """Count an attempt and restart the window
+
+    INCR and EXPIRE go in one MULTI/EXEC, so a counter can never be left
+    without an expiry.
+    """
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.incr(key)
+        pipe.expire(key, window_seconds)
+        attempts, _ = await pipe.execute()
+    return attempts
+
+
 class RateLimitingService(object):
     """Service for rate limiting authentication and other sensitive operations"""
 
@@ -61,11 +74,11 @@ class RateLimitingService(object):
 
         # Check rate limit by identifier
         key = "rate_limit:login:{}".format(identifier.lower())
-        attempts = redis_client.get(key)
+        attempts = await redis_client.get(key)
 
         if attempts and int(attempts) >= LOGIN_RATE_LIMIT:
             # Calculate retry after time
-            ttl = redis_client.ttl(key)
+            ttl = await redis_client.ttl(key)
             raise RateLimitExceeded(
                 "Too many login attempts. Please try again later.",
                 retry_after=ttl
@@ -74,11 +87,11 @@ class RateLimitingService(object):
         # Check rate limit by IP
         if ip_address:
             ip_key = "rate_limit:login:ip:{}".format(ip_address)
-            ip_attempts = redis_client.get(ip_key)
+            ip_attempts = await redis_client.get(ip_key)
 
             if ip_attempts and int(ip_attempts) >= LOGIN_RATE_LIMIT * 2:
                 # IP has higher limit (to account for multiple users)
-                ttl = redis_client.ttl(ip_key)
+                ttl = await redis_client.ttl(ip_key)
                 raise RateLimitExceeded(
                     "Too many login attempts from this IP. Please try again later.",
                     retry_after=ttl
@@ -105,14 +118,12 @@ class RateLimitingService(object):
         if not success:
             # Increment counter for identifier
             key = "rate_limit:login:{}".format(identifier.lower())
-            attempts = redis_client.incr(key)
-            redis_client.expire(key, LOGIN_RATE_WINDOW_MINUTES * 60)
+            attempts = await _increment(redis_client, key, LOGIN_RATE_WINDOW_MINUTES * 60)
 
             # Increment counter for IP
             if ip_address:
                 ip_key = "rate_limit:login:ip:{}".format(ip_address)
-                redis_client.incr(ip_key)
-                redis_client.expire(ip_key, LOGIN_RATE_WINDOW_MINUTES * 60)
+                await _increment(redis_client, ip_key, LOGIN_RATE_WINDOW_MINUTES * 60)
 
             # Create alert if limit exceeded
             if attempts >= LOGIN_RATE_LIMIT:
@@ -124,7 +135,7 @@ class RateLimitingService(object):
         else:
             # Clear rate limit on successful login
             key = "rate_limit:login:{}".format(identifier.lower())
-            redis_client.delete(key)
+            await redis_client.delete(key)
 
     async def check_password_reset_rate_limit(self, email: str) -> None:
         """Check if password reset rate limit is exceeded
@@ -141,10 +152,10 @@ class RateLimitingService(object):
             return
 
         key = "rate_limit:password_reset:{}".format(email.lower())
-        attempts = redis_client.get(key)
+        attempts = await redis_client.get(key)
 
         if attempts and int(attempts) >= PASSWORD_RESET_RATE_LIMIT:
-            ttl = redis_client.ttl(key)
+            ttl = await redis_client.ttl(key)
             raise RateLimitExceeded(
                 "Too many password reset attempts. Please try again later.",
                 retry_after=ttl
@@ -162,8 +173,7 @@ class RateLimitingService(object):
             return
 
         key = "rate_limit:password_reset:{}".format(email.lower())
-        redis_client.incr(key)
-        redis_client.expire(key, PASSWORD_RESET_WINDOW_HOURS * 3600)
+        await _increment(redis_client, key, PASSWORD_RESET_WINDOW_HOURS * 3600)
 
     async def get_rate_limit_status(
         self,
@@ -188,8 +198,8 @@ class RateLimitingService(object):
             }
 
         key = "rate_limit:login:{}".format(identifier.lower())
-        attempts = redis_client.get(key)
-        ttl = redis_client.ttl(key) if attempts else 0
+        attempts = await redis_client.get(key)
+        ttl = await redis_client.ttl(key) if attempts else 0
 
         return {
             "limited": int(attempts or 0) >= LOGIN_RATE_LIMIT,
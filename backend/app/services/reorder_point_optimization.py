@@ -6,7 +6,7 @@ Advanced inventory optimization with:
 - Reorder Point (ROP) calculation based on demand variability
 - Safety Stock calculation with service levels
 - Economic Order Quantity (EOQ) optimization
-- ABC analysis for inventory classification
+- Formulary-wide ABC (Pareto on consumption value) and VEN classification
 - Dynamic reorder point adjustments
 - Automatic reorder triggers
 - Order consolidation and optimization
@@ -17,14 +17,15 @@ Python 3.5+ compatible - uses .format() instead of f-strings
 import logging
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional, Tuple
-from decimal import Decimal
 from collections import defaultdict
 
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 
-from app.models.inventory import Drug, DrugBatch, Supplier
+from app.models.inventory import Drug, DrugBatch, DrugReorderSnapshot, Supplier
 from app.services.demand_forecasting import DemandForecastingService
 
 
@@ -50,6 +51,15 @@ ABC_THRESHOLDS = {
     'C': {'value_max': 1.0, 'volume_min': 0.80}   # Low value, high volume
 }
 
+# Cost parameters for EOQ
+ORDERING_COST = 50000  # IDR per order
+HOLDING_COST_RATE = 0.25  # Annual holding cost as a fraction of unit cost
+DEFAULT_UNIT_COST = 1000  # IDR, for drugs without a purchase price
+
+# Days of consumption used for demand parameters
+REORDER_HISTORY_DAYS = 90
+SNAPSHOT_WRITE_BATCH_SIZE = 500
+
 # Review frequencies (in days)
 ABC_REVIEW_FREQUENCY = {
     'A': 7,    # Weekly
@@ -58,6 +68,101 @@ ABC_REVIEW_FREQUENCY = {
 }
 
 
+# =============================================================================
+# Vectorized Calculations
+# =============================================================================
+
+def reorder_parameters(matrix, lead_times, unit_costs, z_factor):
+    """Reorder point, safety stock and EOQ for many drugs at once
+
+    Args:
+        matrix: (drugs x days) daily consumption
+        lead_times: Lead time in days per drug
+        unit_costs: Unit cost per drug (IDR)
+        z_factor: Service level Z-value
+
+    Returns:
+        Dict of per-drug arrays: adu, std_dev, safety_stock, reorder_point,
+        annual_demand, annual_value, holding_cost, eoq
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    lead_times = np.asarray(lead_times, dtype=float)
+    unit_costs = np.asarray(unit_costs, dtype=float)
+
+    adu = matrix.mean(axis=1)
+    std_dev = matrix.std(axis=1)
+
+    # SS = Z x sd x sqrt(Lead Time); ROP = (ADU x Lead Time) + SS
+    safety_stock = z_factor * std_dev * np.sqrt(lead_times)
+    reorder_point = adu * lead_times + safety_stock
+
+    # EOQ = sqrt((2 x D x S) / H); drugs without a positive cost are held at
+    # the default cost, so H never reaches zero
+    annual_demand = adu * 365
+    holding_cost = np.where(unit_costs > 0, unit_costs, DEFAULT_UNIT_COST) * HOLDING_COST_RATE
+    eoq = np.sqrt(2 * annual_demand * ORDERING_COST / holding_cost)
+
+    return {
+        'adu': adu,
+        'std_dev': std_dev,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'annual_demand': annual_demand,
+        'annual_value': annual_demand * unit_costs,
+        'holding_cost': holding_cost,
+        'eoq': eoq,
+    }
+
+
+def abc_classify(annual_values) -> Tuple[np.ndarray, np.ndarray]:
+    """Pareto ABC classes from annual consumption values
+
+    Drugs are ranked by value; a drug is A while the drugs ranked above it
+    hold less than 80% of the total value, B below 95%, C otherwise. Drugs
+    without consumption are always C.
+
+    Args:
+        annual_values: Annual consumption value per drug
+
+    Returns:
+        Tuple of (class per drug, cumulative value share per drug)
+    """
+    values = np.asarray(annual_values, dtype=float)
+    total = values.sum()
+    classes = np.full(len(values), 'C', dtype='<U1')
+    cumulative = np.ones(len(values))
+    if total <= 0:
+        return classes, cumulative
+
+    order = np.argsort(-values, kind='stable')
+    share = values[order] / total
+    ranked_cumulative = np.cumsum(share)
+    share_above = ranked_cumulative - share
+
+    ranked = np.full(len(values), 'C', dtype='<U1')
+    ranked[share_above < ABC_THRESHOLDS['B']['value_max']] = 'B'
+    ranked[share_above < ABC_THRESHOLDS['A']['value_max']] = 'A'
+    ranked[values[order] <= 0] = 'C'
+
+    classes[order] = ranked
+    cumulative[order] = ranked_cumulative
+    return classes, cumulative
+
+
+def ven_classify(drug: Drug) -> str:
+    """VEN class of a drug
+
+    The drug master has no VEN field, so it is derived: narcotics and
+    antibiotics are Vital, other prescription drugs Essential and
+    over-the-counter drugs Non-essential.
+    """
+    if drug.is_narcotic or drug.is_antibiotic:
+        return 'V'
+    if drug.requires_prescription:
+        return 'E'
+    return 'N'
+
+
 # =============================================================================
 # Main Service
 # =============================================================================
@@ -106,7 +211,7 @@ class ReorderPointOptimizationService(object):
         # Get historical consumption
         historical_data = await forecast_service.get_historical_consumption(
             drug_id=drug_id,
-            days=90  # Use 90 days for calculation
+            days=REORDER_HISTORY_DAYS
         )
 
         if not historical_data:
@@ -114,75 +219,30 @@ class ReorderPointOptimizationService(object):
                 'error': 'Insufficient historical data'
             }
 
-        # Calculate Average Daily Usage (ADU)
-        quantities = [q for _, q in historical_data]
-        adu = sum(quantities) / len(quantities)
-
-        # Calculate demand standard deviation
-        variance = sum((q - adu) ** 2 for q in quantities) / len(quantities)
-        std_dev_demand = variance ** 0.5
-
         # Get service level Z-factor
         z_factor = SERVICE_LEVELS.get(service_level, 1.645)
 
-        # Calculate Safety Stock
-        # SS = Z × σd × √(Lead Time)
-        safety_stock = z_factor * std_dev_demand * (lead_time_days ** 0.5)
-
-        # Calculate Reorder Point
-        # ROP = (ADU × Lead Time) + Safety Stock
-        reorder_point = (adu * lead_time_days) + safety_stock
-
-        # Calculate Economic Order Quantity (EOQ)
-        # EOQ = √((2 × D × S) / H)
-        annual_demand = adu * 365
-        ordering_cost = Decimal('50000')  # 50,000 IDR per order
-        holding_cost_rate = Decimal('0.25')  # 25% annual holding cost
-        unit_cost = drug.purchase_price or Decimal('1000')
-        holding_cost = float(unit_cost * holding_cost_rate)
-
-        eoq = ((2 * annual_demand * float(ordering_cost)) / holding_cost) ** 0.5
+        unit_cost = float(drug.purchase_price or DEFAULT_UNIT_COST)
+        params = reorder_parameters(
+            [[q for _, q in historical_data]], [lead_time_days], [unit_cost], z_factor
+        )
+        adu = float(params['adu'][0])
+        std_dev_demand = float(params['std_dev'][0])
+        safety_stock = float(params['safety_stock'][0])
+        reorder_point = float(params['reorder_point'][0])
+        annual_demand = float(params['annual_demand'][0])
+        holding_cost = float(params['holding_cost'][0])
+        eoq = float(params['eoq'][0])
 
-        # Calculate Days Stock on Hand (DSO)
         current_stock = await self._get_current_stock(drug_id)
-        dso = current_stock / adu if adu > 0 else 0
 
         # Determine ABC classification
         abc_class = await self._calculate_abc_classification(drug, annual_demand)
 
-        return {
-            'drug_id': drug_id,
-            'drug_name': drug.generic_name,
-            'drug_code': drug.drug_code,
-            'parameters': {
-                'average_daily_usage': round(adu, 2),
-                'demand_std_dev': round(std_dev_demand, 2),
-                'lead_time_days': lead_time_days,
-                'service_level': service_level,
-                'review_period_days': review_period_days
-            },
-            'reorder_point': {
-                'calculated_rop': round(reorder_point),
-                'safety_stock': round(safety_stock),
-                'demand_during_lead_time': round(adu * lead_time_days)
-            },
-            'economic_order_quantity': {
-                'eoq': round(eoq),
-                'annual_demand': round(annual_demand),
-                'ordering_cost': float(ordering_cost),
-                'holding_cost_per_unit': round(holding_cost, 2)
-            },
-            'current_status': {
-                'current_stock': current_stock,
-                'days_stock_on_hand': round(dso, 1),
-                'should_reorder': current_stock <= reorder_point,
-                'suggested_order_quantity': round(max(0, eoq - (current_stock - reorder_point))),
-                'abc_classification': abc_class
-            },
-            'recommendations': self._generate_recommendations(
-                current_stock, reorder_point, safety_stock, adu, abc_class
-            )
-        }
+        return self._format_result(
+            drug, adu, std_dev_demand, lead_time_days, service_level, review_period_days,
+            safety_stock, reorder_point, eoq, annual_demand, holding_cost, current_stock, abc_class
+        )
 
     async def batch_calculate_reorder_points(
         self,
@@ -191,6 +251,10 @@ class ReorderPointOptimizationService(object):
     ) -> List[Dict]:
         """Calculate reorder points for multiple drugs
 
+        Loads consumption for all drugs with one grouped query and computes
+        every reorder point in one vectorized step. ABC classes come from
+        the latest formulary snapshot.
+
         Args:
             drug_ids: List of drug IDs
             service_level: Target service level
@@ -198,67 +262,166 @@ class ReorderPointOptimizationService(object):
         Returns:
             List of reorder point calculations
         """
-        results = []
+        drugs, params = await self._calculate_formulary(drug_ids, service_level)
+        if drugs is None:
+            return [
+                {'drug_id': drug_id, 'error': 'Error loading consumption data'}
+                for drug_id in drug_ids
+            ]
 
+        found = dict((drug.id, i) for i, drug in enumerate(drugs))
+        snapshot_classes = await self._get_snapshot_classes([drug.id for drug in drugs])
+
+        results = []
         for drug_id in drug_ids:
-            try:
-                result = await self.calculate_reorder_point(
-                    drug_id=drug_id,
-                    service_level=service_level
-                )
-                results.append(result)
-            except Exception as e:
-                logger.error("Error calculating ROP for drug {}: {}".format(drug_id, str(e)))
-                results.append({
-                    'drug_id': drug_id,
-                    'error': str(e)
-                })
+            i = found.get(drug_id)
+            if i is None:
+                results.append({'drug_id': drug_id, 'error': 'Drug not found'})
+                continue
+
+            drug = drugs[i]
+            abc_class = snapshot_classes.get(drug.id) or self._estimate_abc_class(drug)
+            results.append(self._format_result(
+                drug,
+                float(params['adu'][i]),
+                float(params['std_dev'][i]),
+                drug.lead_time_days or 7,
+                service_level,
+                30,
+                float(params['safety_stock'][i]),
+                float(params['reorder_point'][i]),
+                float(params['eoq'][i]),
+                float(params['annual_demand'][i]),
+                float(params['holding_cost'][i]),
+                drug.stock_on_hand or 0,
+                abc_class
+            ))
 
         return results
 
+    async def refresh_reorder_snapshot(
+        self,
+        service_level: float = 0.95
+    ) -> Dict:
+        """Classify the whole formulary and store its reorder parameters
+
+        Runs one grouped consumption query for every active drug, ranks the
+        formulary by annual consumption value for ABC, derives VEN classes
+        and upserts everything into drug_reorder_snapshots.
+
+        Args:
+            service_level: Target service level
+
+        Returns:
+            Dict with drug count and drugs per ABC and VEN class
+        """
+        result = await self.db.execute(
+            select(Drug.id).where(Drug.is_active == True).order_by(Drug.id)
+        )
+        drug_ids = list(result.scalars().all())
+
+        drugs, params = await self._calculate_formulary(drug_ids, service_level)
+        if drugs is None:
+            raise RuntimeError("Error loading consumption data")
+
+        abc_classes, cumulative = abc_classify(params['annual_value'])
+        ven_classes = [ven_classify(drug) for drug in drugs]
+
+        rows = [
+            {
+                'drug_id': drug.id,
+                'average_daily_usage': float(params['adu'][i]),
+                'demand_std_dev': float(params['std_dev'][i]),
+                'annual_demand': float(params['annual_demand'][i]),
+                'annual_value': float(params['annual_value'][i]),
+                'service_level': service_level,
+                'lead_time_days': drug.lead_time_days or 7,
+                'safety_stock': float(params['safety_stock'][i]),
+                'reorder_point': float(params['reorder_point'][i]),
+                'economic_order_quantity': float(params['eoq'][i]),
+                'abc_class': str(abc_classes[i]),
+                'ven_class': ven_classes[i],
+                'cumulative_value_share': float(cumulative[i]),
+            }
+            for i, drug in enumerate(drugs)
+        ]
+
+        for i in range(0, len(rows), SNAPSHOT_WRITE_BATCH_SIZE):
+            stmt = pg_insert(DrugReorderSnapshot).values(rows[i:i + SNAPSHOT_WRITE_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DrugReorderSnapshot.drug_id],
+                set_=dict(
+                    [(column, getattr(stmt.excluded, column)) for column in rows[0] if column != 'drug_id']
+                    + [('calculated_at', func.now())]
+                )
+            )
+            await self.db.execute(stmt)
+
+        await self.db.commit()
+        logger.info("Saved reorder snapshot for {} drugs".format(len(rows)))
+
+        return {
+            'drug_count': len(rows),
+            'abc_classes': dict((c, int((abc_classes == c).sum())) for c in 'ABC'),
+            'ven_classes': dict((c, ven_classes.count(c)) for c in 'VEN'),
+        }
+
     async def get_reorder_alerts(
         self,
         location_id: int = None
     ) -> List[Dict]:
         """Get drugs that need reordering
 
+        Reads the stored reorder snapshot; the snapshot is built first if
+        none exists yet.
+
         Args:
             location_id: Filter by location (None = all locations)
 
         Returns:
             List of drugs at or below reorder point
         """
-        # Get all active drugs
-        stmt = select(Drug).where(Drug.is_active == True)
+        has_snapshot = await self.db.scalar(select(DrugReorderSnapshot.drug_id).limit(1))
+        if has_snapshot is None:
+            await self.refresh_reorder_snapshot()
+
+        stmt = select(Drug, DrugReorderSnapshot).join(
+            DrugReorderSnapshot, DrugReorderSnapshot.drug_id == Drug.id
+        ).where(
+            and_(
+                Drug.is_active == True,
+                Drug.stock_on_hand <= DrugReorderSnapshot.reorder_point
+            )
+        )
         result = await self.db.execute(stmt)
-        drugs = result.scalars().all()
 
         alerts = []
 
-        for drug in drugs:
-            # Calculate ROP
-            rop_result = await self.calculate_reorder_point(drug.id)
-
-            if 'error' in rop_result:
-                continue
+        for drug, snapshot in result.all():
+            current_stock = drug.stock_on_hand or 0
+            adu = snapshot.average_daily_usage
+            dso = round(current_stock / adu if adu > 0 else 0, 1)
+            suggested = round(max(0, snapshot.economic_order_quantity - (current_stock - snapshot.reorder_point)))
 
-            current_status = rop_result['current_status']
-
-            # Check if should reorder
-            if current_status['should_reorder']:
-                alerts.append({
-                    'drug_id': drug.id,
-                    'drug_name': drug.generic_name,
-                    'drug_code': drug.drug_code,
-                    'current_stock': current_status['current_stock'],
-                    'reorder_point': rop_result['reorder_point']['calculated_rop'],
-                    'safety_stock': rop_result['reorder_point']['safety_stock'],
-                    'suggested_order_quantity': current_status['suggested_order_quantity'],
-                    'days_stock_on_hand': current_status['days_stock_on_hand'],
-                    'is_critical': self._is_critical_drug(drug),
-                    'abc_classification': current_status['abc_classification'],
-                    'priority': self._calculate_reorder_priority(rop_result)
+            alerts.append({
+                'drug_id': drug.id,
+                'drug_name': drug.generic_name,
+                'drug_code': drug.drug_code,
+                'current_stock': current_stock,
+                'reorder_point': round(snapshot.reorder_point),
+                'safety_stock': round(snapshot.safety_stock),
+                'suggested_order_quantity': suggested,
+                'days_stock_on_hand': dso,
+                'is_critical': self._is_critical_drug(drug),
+                'abc_classification': snapshot.abc_class,
+                'ven_classification': snapshot.ven_class,
+                'priority': self._calculate_reorder_priority({
+                    'current_status': {
+                        'days_stock_on_hand': dso,
+                        'abc_classification': snapshot.abc_class
+                    }
                 })
+            })
 
         # Sort by priority
         alerts.sort(key=lambda x: x['priority'], reverse=True)
@@ -408,15 +571,7 @@ class ReorderPointOptimizationService(object):
     async def _get_current_stock(self, drug_id: int) -> int:
         """Get current stock level"""
         try:
-            stmt = select(
-                func.sum(DrugBatch.quantity)
-            ).where(
-                and_(
-                    DrugBatch.drug_id == drug_id,
-                    DrugBatch.is_quarantined == False,
-                    DrugBatch.expiry_date > date.today()
-                )
-            )
+            stmt = select(Drug.stock_on_hand).where(Drug.id == drug_id)
 
             result = await self.db.execute(stmt)
             stock = result.scalar() or 0
@@ -426,8 +581,58 @@ class ReorderPointOptimizationService(object):
             logger.error("Error getting current stock: {}".format(str(e)))
             return 0
 
+    async def _calculate_formulary(
+        self,
+        drug_ids: List[int],
+        service_level: float
+    ) -> Tuple[Optional[List[Drug]], Optional[Dict]]:
+        """Load drugs and consumption and compute their reorder parameters
+
+        Returns:
+            Tuple of (drugs found, per-drug parameter arrays in the same
+            order), or (None, None) if consumption could not be loaded
+        """
+        if drug_ids:
+            result = await self.db.execute(
+                select(Drug).where(Drug.id.in_(drug_ids)).order_by(Drug.id)
+            )
+            drugs = list(result.scalars().all())
+        else:
+            drugs = []
+
+        try:
+            matrix = await DemandForecastingService(self.db).get_consumption_matrix(
+                [drug.id for drug in drugs], days=REORDER_HISTORY_DAYS
+            )
+        except Exception as e:
+            logger.error("Error loading consumption for reorder points: {}".format(str(e)))
+            return None, None
+
+        params = reorder_parameters(
+            matrix.reshape(len(drugs), REORDER_HISTORY_DAYS + 1),
+            [drug.lead_time_days or 7 for drug in drugs],
+            [float(drug.purchase_price or DEFAULT_UNIT_COST) for drug in drugs],
+            SERVICE_LEVELS.get(service_level, 1.645)
+        )
+        return drugs, params
+
+    async def _get_snapshot_classes(self, drug_ids: List[int]) -> Dict[int, str]:
+        """ABC classes of drugs from the latest formulary snapshot"""
+        if not drug_ids:
+            return {}
+        result = await self.db.execute(
+            select(DrugReorderSnapshot.drug_id, DrugReorderSnapshot.abc_class).where(
+                DrugReorderSnapshot.drug_id.in_(drug_ids)
+            )
+        )
+        return dict((row.drug_id, row.abc_class) for row in result.all())
+
     async def _calculate_abc_classification(self, drug: Drug, annual_demand: float) -> str:
-        """Calculate ABC classification based on value and volume
+        """Get the ABC classification of a drug
+
+        ABC ranks the whole formulary, so the class comes from the latest
+        snapshot (see refresh_reorder_snapshot); drugs not classified yet
+        get a price-based estimate.
 
         Args:
             drug: Drug model
@@ -436,12 +641,11 @@ class ReorderPointOptimizationService(object):
         Returns:
             ABC class (A, B, or C)
         """
-        # Calculate annual value
-        unit_cost = drug.purchase_price or Decimal('1000')
-        annual_value = float(unit_cost * annual_demand)
+        classes = await self._get_snapshot_classes([drug.id])
+        return classes.get(drug.id) or self._estimate_abc_class(drug)
 
-        # This is simplified - real ABC would rank all drugs
-        # For now, use drug cost as proxy
+    def _estimate_abc_class(self, drug: Drug) -> str:
+        """Price-based ABC estimate for drugs missing from the snapshot"""
         if drug.is_narcotic or (drug.purchase_price and drug.purchase_price > 500000):
             return 'A'  # High value
         elif drug.purchase_price and drug.purchase_price > 100000:
@@ -449,6 +653,59 @@ class ReorderPointOptimizationService(object):
         else:
             return 'C'  # Low value
 
+    def _format_result(
+        self,
+        drug: Drug,
+        adu: float,
+        std_dev_demand: float,
+        lead_time_days: int,
+        service_level: float,
+        review_period_days: int,
+        safety_stock: float,
+        reorder_point: float,
+        eoq: float,
+        annual_demand: float,
+        holding_cost: float,
+        current_stock: int,
+        abc_class: str
+    ) -> Dict:
+        """Build the reorder point result of one drug"""
+        dso = current_stock / adu if adu > 0 else 0
+
+        return {
+            'drug_id': drug.id,
+            'drug_name': drug.generic_name,
+            'drug_code': drug.drug_code,
+            'parameters': {
+                'average_daily_usage': round(adu, 2),
+                'demand_std_dev': round(std_dev_demand, 2),
+                'lead_time_days': lead_time_days,
+                'service_level': service_level,
+                'review_period_days': review_period_days
+            },
+            'reorder_point': {
+                'calculated_rop': round(reorder_point),
+                'safety_stock': round(safety_stock),
+                'demand_during_lead_time': round(adu * lead_time_days)
+            },
+            'economic_order_quantity': {
+                'eoq': round(eoq),
+                'annual_demand': round(annual_demand),
+                'ordering_cost': float(ORDERING_COST),
+                'holding_cost_per_unit': round(holding_cost, 2)
+            },
+            'current_status': {
+                'current_stock': current_stock,
+                'days_stock_on_hand': round(dso, 1),
+                'should_reorder': current_stock <= reorder_point,
+                'suggested_order_quantity': round(max(0, eoq - (current_stock - reorder_point))),
+                'abc_classification': abc_class
+            },
+            'recommendations': self._generate_recommendations(
+                current_stock, reorder_point, safety_stock, adu, abc_class
+            )
+        }
+
     def _is_critical_drug(self, drug: Drug) -> bool:
         """Determine if drug is critical"""
         return drug.is_narcotic or drug.is_antibiotic
@@ -0,0 +1,473 @@
+"""Report Execution Pipeline for EPIC-013 reports
+
+This module provides the building blocks ReportingService runs reports with:
+- Custom report queries with bound parameters: declared parameters are
+  sent as typed binds, so a report is one prepared statement whatever their
+  values; undeclared ones are rendered as escaped literals, which PostgreSQL
+  types from the query as it always has
+- A Redis result cache keyed by report, parameters and output format, with
+  the TTL configured on the report
+- Background execution tracked in the ReportExecution status fields
+- CSV, XLSX and JSON writers fed in batches from a server-side cursor, so
+  exports never hold the whole result in memory, and removal of output
+  files past their retention
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+
+from sqlalchemy import text, bindparam, Boolean, Date, DateTime, Float, Integer, String
+from sqlalchemy.sql.sqltypes import NullType
+
+from app.core.config import settings
+from app.db.redis import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+
+# Result cache TTL of reports that do not set config["cache_ttl_seconds"]
+DEFAULT_REPORT_CACHE_TTL_SECONDS = 300
+
+# Rows fetched from the server-side cursor per batch
+REPORT_STREAM_BATCH_SIZE = 1000
+
+# Background report executions running at once
+REPORT_MAX_CONCURRENT_EXECUTIONS = 4
+
+OUTPUT_FORMATS = ("json", "csv", "xlsx")
+
+# "{name}" placeholders of custom report queries
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+
+PARAMETER_TYPES = {
+    "str": String,
+    "int": Integer,
+    "float": Float,
+    "bool": Boolean,
+    "date": Date,
+    "datetime": DateTime,
+}
+
+# SQL literal types of undeclared parameter values, by Python type
+LITERAL_TYPES = (
+    (bool, Boolean),
+    (int, Integer),
+    (float, Float),
+    (str, String),
+)
+
+# File name prefix of report outputs in REPORT_OUTPUT_DIR
+REPORT_OUTPUT_PREFIX = "report_execution_"
+
+
+def parameterize_query(query_text: str) -> Tuple[str, List[str]]:
+    """Turn "{name}" placeholders into "(:name)" bind parameters
+
+    The parentheses keep a following cast such as "{start}::date" valid.
+
+    Args:
+        query_text: Custom report query
+
+    Returns:
+        Tuple of (SQL with bind parameters, parameter names in order of
+        first use)
+    """
+    names = []
+
+    def replace(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return "(:{})".format(name)
+
+    return PLACEHOLDER_PATTERN.sub(replace, query_text), names
+
+
+def coerce_parameter(value: Any, type_name: Optional[str]) -> Any:
+    """Convert a JSON parameter value to the declared parameter type
+
+    Args:
+        value: Value from the request
+        type_name: Declared type (see PARAMETER_TYPES), or None to pass
+            the value through
+
+    Returns:
+        Converted value
+    """
+    if value is None or type_name is None:
+        return value
+    if type_name == "date" and isinstance(value, str):
+        return date.fromisoformat(value)
+    if type_name == "datetime" and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if type_name == "int":
+        return int(value)
+    if type_name == "float":
+        return float(value)
+    if type_name == "bool" and isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    if type_name == "str":
+        return str(value)
+    return value
+
+
+def _literal_bind(name: str, value: Any):
+    """Bind of an undeclared parameter, rendered as an escaped SQL literal
+
+    asyncpg encodes a bind by the type PostgreSQL infers for it and rejects
+    e.g. a str for a date column, so an undeclared value is sent the way
+    these reports always sent it: as a quoted literal the server casts.
+    """
+    if value is None:
+        return bindparam(name, None, type_=NullType(), literal_execute=True)
+    for python_type, sql_type in LITERAL_TYPES:
+        if isinstance(value, python_type):
+            return bindparam(name, value, type_=sql_type(), literal_execute=True)
+    return bindparam(name, str(value), type_=String(), literal_execute=True)
+
+
+def build_report_statement(
+    query_text: str,
+    parameters: Optional[Dict[str, Any]] = None,
+    parameter_types: Optional[Dict[str, str]] = None,
+):
+    """Build the bound statement of a custom report query
+
+    Args:
+        query_text: Custom report query with "{name}" placeholders
+        parameters: Parameter values; missing ones are bound as NULL
+        parameter_types: Declared parameter types by name; undeclared
+            parameters are rendered as literals (see _literal_bind)
+
+    Returns:
+        Tuple of (TextClause, bind values)
+    """
+    parameters = parameters or {}
+    parameter_types = parameter_types or {}
+    sql, names = parameterize_query(query_text)
+
+    binds = []
+    values = {}
+    for name in names:
+        type_name = parameter_types.get(name)
+        if type_name is not None and type_name not in PARAMETER_TYPES:
+            raise ValueError("Unknown type {!r} for report parameter {}".format(type_name, name))
+        value = coerce_parameter(parameters.get(name), type_name)
+        if type_name is None:
+            bind = _literal_bind(name, value)
+            value = bind.value
+        else:
+            bind = bindparam(name, type_=PARAMETER_TYPES[type_name]())
+        binds.append(bind)
+        values[name] = value
+
+    statement = text(sql)
+    if binds:
+        statement = statement.bindparams(*binds)
+    return statement, values
+
+
+def report_parameter_types(report) -> Dict[str, str]:
+    """Declared parameter types of a report
+
+    Read from config["parameters"], either {"name": "date"} or
+    {"name": {"type": "date", ...}}.
+    """
+    declared = (report.config or {}).get("parameters") or {}
+    if not isinstance(declared, dict):
+        return {}
+    types = {}
+    for name, spec in declared.items():
+        type_name = spec.get("type") if isinstance(spec, dict) else spec
+        if isinstance(type_name, str):
+            types[name] = type_name
+    return types
+
+
+def report_cache_ttl(report) -> int:
+    """Result cache TTL of a report in seconds; 0 disables caching"""
+    ttl = (report.config or {}).get("cache_ttl_seconds")
+    if ttl is None:
+        return DEFAULT_REPORT_CACHE_TTL_SECONDS
+    return max(int(ttl), 0)
+
+
+def report_cache_key(report_id: int, parameters: Optional[Dict[str, Any]], output_format: str) -> str:
+    """Cache key of a report result
+
+    Parameters are serialized canonically, so the key does not depend on
+    their order.
+    """
+    canonical = json.dumps(parameters or {}, sort_keys=True, default=str)
+    digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+    return "report:result:{}:{}:{}".format(report_id, output_format, digest)
+
+
+def report_output_path(execution_id: int, output_format: str) -> str:
+    """File a report execution writes its output to"""
+    return os.path.join(
+        settings.REPORT_OUTPUT_DIR,
+        "{}{}.{}".format(REPORT_OUTPUT_PREFIX, execution_id, output_format),
+    )
+
+
+def remove_expired_report_outputs(retention_days: int, now: Optional[float] = None) -> List[str]:
+    """Delete report output files older than retention_days
+
+    Blocking; run it in an executor.
+
+    Returns:
+        Paths removed, in the form report_output_path gives them
+    """
+    directory = settings.REPORT_OUTPUT_DIR
+    if not os.path.isdir(directory):
+        return []
+    cutoff = (now or time.time()) - retention_days * 86400
+
+    removed = []
+    for entry in os.scandir(directory):
+        if not entry.name.startswith(REPORT_OUTPUT_PREFIX) or not entry.is_file():
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed.append(entry.path)
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+# =============================================================================
+# Output Writers
+# =============================================================================
+
+class ReportFileWriter(ABC):
+    """Writes report rows to a file in batches
+
+    Usage:
+        writer = open_report_writer("csv", path)
+        writer.write_header(columns)
+        writer.write_rows(rows)   # repeatedly
+        writer.close()
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.columns = []  # type: List[str]
+        self.row_count = 0
+
+    def write_header(self, columns: Iterable[str]):
+        self.columns = list(columns)
+
+    @abstractmethod
+    def write_rows(self, rows: Iterable[Iterable[Any]]):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class CsvReportWriter(ReportFileWriter):
+    """CSV output"""
+
+    def __init__(self, path: str):
+        super(CsvReportWriter, self).__init__(path)
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+
+    def write_header(self, columns: Iterable[str]):
+        super(CsvReportWriter, self).write_header(columns)
+        self._writer.writerow(self.columns)
+
+    def write_rows(self, rows: Iterable[Iterable[Any]]):
+        for row in rows:
+            self._writer.writerow(list(row))
+            self.row_count += 1
+
+    def close(self):
+        self._file.close()
+
+
+class JsonReportWriter(ReportFileWriter):
+    """JSON output: an array of row objects"""
+
+    def __init__(self, path: str):
+        super(JsonReportWriter, self).__init__(path)
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+
+    def write_rows(self, rows: Iterable[Iterable[Any]]):
+        for row in rows:
+            if self.row_count:
+                self._file.write(",")
+            self._file.write(json.dumps(dict(zip(self.columns, row)), default=_json_default))
+            self.row_count += 1
+
+    def close(self):
+        self._file.write("]")
+        self._file.close()
+
+
+class XlsxReportWriter(ReportFileWriter):
+    """XLSX output using an openpyxl write-only workbook"""
+
+    def __init__(self, path: str):
+        super(XlsxReportWriter, self).__init__(path)
+        from openpyxl import Workbook
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Report")
+
+    def write_header(self, columns: Iterable[str]):
+        super(XlsxReportWriter, self).write_header(columns)
+        self._sheet.append(self.columns)
+
+    def write_rows(self, rows: Iterable[Iterable[Any]]):
+        for row in rows:
+            self._sheet.append([self._cell(value) for value in row])
+            self.row_count += 1
+
+    def close(self):
+        self._workbook.save(self.path)
+
+    @staticmethod
+    def _cell(value: Any) -> Any:
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.replace(tzinfo=None)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=_json_default)
+        return value
+
+
+REPORT_WRITERS = {
+    "csv": CsvReportWriter,
+    "json": JsonReportWriter,
+    "xlsx": XlsxReportWriter,
+}
+
+
+def open_report_writer(output_format: str, path: str) -> ReportFileWriter:
+    """Open the writer of an output format"""
+    if output_format not in REPORT_WRITERS:
+        raise ValueError("Unsupported report output format: {}".format(output_format))
+    return REPORT_WRITERS[output_format](path)
+
+
+def tabulate(data: Any) -> Tuple[List[str], List[List[Any]]]:
+    """Columns and rows of a built-in report result for file output
+
+    Lists of dicts become one row per item; a dict becomes one row per
+    key with its value.
+    """
+    if isinstance(data, list):
+        columns = []  # type: List[str]
+        for item in data:
+            for key in item:
+                if key not in columns:
+                    columns.append(key)
+        return columns, [[item.get(column) for column in columns] for item in data]
+    if isinstance(data, dict):
+        return ["key", "value"], [[key, value] for key, value in data.items()]
+    return ["value"], [[data]]
+
+
+# =============================================================================
+# Result Cache
+# =============================================================================
+
+class ReportResultCache(object):
+    """Report results in Redis; errors are logged and treated as misses"""
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            payload = await get_redis_client().get(key)
+        except Exception as e:
+            logger.debug("Report cache unavailable for {}: {}".format(key, e))
+            return None
+        return json.loads(payload) if payload else None
+
+    async def set(self, key: str, result: Dict[str, Any], ttl: int):
+        if ttl <= 0:
+            return
+        try:
+            await get_redis_client().set(key, json.dumps(result, default=_json_default), ex=ttl)
+        except Exception as e:
+            logger.warning("Could not cache report result {}: {}".format(key, e))
+
+
+# =============================================================================
+# Background Execution
+# =============================================================================
+
+class ReportJobRunner(object):
+    """Runs report executions in the background, a few at a time
+
+    Each execution runs on its own session; its progress is recorded in
+    the ReportExecution row created by the request.
+    """
+
+    def __init__(self, max_concurrent: int = REPORT_MAX_CONCURRENT_EXECUTIONS):
+        self.max_concurrent = max_concurrent
+        self._semaphore = None  # type: Optional[asyncio.Semaphore]
+        self._tasks = set()  # type: set
+
+    def submit(self, execution_id: int):
+        """Schedule a pending execution
+
+        Args:
+            execution_id: ReportExecution ID, committed with status "pending"
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        task = asyncio.get_event_loop().create_task(self._run(execution_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        """Cancel running executions (they are marked failed)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, execution_id: int):
+        from app.db.session import get_db_context
+        from app.services.reporting import get_reporting_service
+
+        async with self._semaphore:
+            try:
+                async with get_db_context() as db:
+                    await get_reporting_service(db).run_execution(execution_id)
+            except Exception as e:
+                logger.error("Background report execution {} failed: {}".format(execution_id, e))
+
+
+# Process-wide cache and background runner
+report_result_cache = ReportResultCache()
+report_job_runner = ReportJobRunner()
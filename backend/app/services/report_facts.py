@@ -0,0 +1,341 @@
+"""Report Fact Service for daily reporting fact tables
+
+This module maintains the daily fact tables that revenue, aging, claim and
+census reports read instead of scanning invoices, payments, claims and
+encounters:
+- fact_daily_encounters: encounters by department, type and status
+- fact_daily_invoices: invoices by department, payer type and status
+- fact_daily_payments: payments by department, payer type and method
+- fact_daily_claims: BPJS claims by department, claim type and status
+
+Facts are maintained per day. An incremental refresh finds the days of
+source rows changed since the fact's watermark and recomputes just those
+days (DELETE + INSERT ... SELECT, so a refresh is idempotent). Changes the
+watermark cannot see, such as deleted rows, rows moved to another day or
+a renamed encounter department, are corrected by the nightly rebuild of
+the trailing FACT_REBUILD_DAYS days.
+
+Python 3.5+ compatible
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, List, Any, Callable
+
+from sqlalchemy import select, delete, insert, and_, func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.billing import Invoice, Payment
+from app.models.bpjs_claims import BPJSClaim
+from app.models.encounter import Encounter
+from app.models.reporting import (
+    FactDailyEncounter, FactDailyInvoice, FactDailyPayment, FactDailyClaim,
+    ReportFactWatermark,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Changes committed this long after their updated_at are still picked up
+FACT_REFRESH_OVERLAP_SECONDS = 300
+
+# Trailing days recomputed by the nightly rebuild
+FACT_REBUILD_DAYS = 35
+
+# Days recomputed per statement
+FACT_REFRESH_BATCH_DAYS = 31
+
+
+def _department(encounter_department):
+    """Department dimension value; facts store '' for missing departments"""
+    return func.coalesce(encounter_department, literal_column("''"))
+
+
+def _on_days(column, days: List[date]):
+    """Condition matching timestamps on any of the given days
+
+    The range bounds let PostgreSQL use the index on the timestamp column;
+    the date() test drops the days in between that are not listed.
+    """
+    return and_(
+        column >= min(days),
+        column < max(days) + timedelta(days=1),
+        func.date(column).in_(days),
+    )
+
+
+def _encounter_facts(days: List[date]):
+    department = _department(Encounter.department)
+    return select(
+        Encounter.encounter_date,
+        department,
+        Encounter.encounter_type,
+        Encounter.status,
+        func.count(Encounter.id),
+    ).where(
+        Encounter.encounter_date.in_(days)
+    ).group_by(
+        Encounter.encounter_date, department, Encounter.encounter_type, Encounter.status
+    )
+
+
+def _invoice_facts(days: List[date]):
+    department = _department(Encounter.department)
+    return select(
+        Invoice.invoice_date,
+        department,
+        Invoice.payer_type,
+        Invoice.status,
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.total_amount), 0),
+        func.coalesce(func.sum(Invoice.paid_amount), 0),
+        func.coalesce(func.sum(Invoice.balance_due), 0),
+    ).select_from(Invoice).outerjoin(
+        Encounter, Encounter.id == Invoice.encounter_id
+    ).where(
+        Invoice.invoice_date.in_(days)
+    ).group_by(
+        Invoice.invoice_date, department, Invoice.payer_type, Invoice.status
+    )
+
+
+def _payment_facts(days: List[date]):
+    payment_day = func.date(Payment.payment_date)
+    department = _department(Encounter.department)
+    return select(
+        payment_day,
+        department,
+        Invoice.payer_type,
+        Payment.payment_method,
+        func.count(Payment.id),
+        func.coalesce(func.sum(Payment.amount), 0),
+    ).select_from(Payment).join(
+        Invoice, Invoice.id == Payment.invoice_id
+    ).outerjoin(
+        Encounter, Encounter.id == Invoice.encounter_id
+    ).where(
+        _on_days(Payment.payment_date, days)
+    ).group_by(
+        payment_day, department, Invoice.payer_type, Payment.payment_method
+    )
+
+
+def _claim_facts(days: List[date]):
+    claim_day = func.date(BPJSClaim.created_at)
+    department = _department(Encounter.department)
+    return select(
+        claim_day,
+        department,
+        BPJSClaim.claim_type,
+        BPJSClaim.status,
+        func.count(BPJSClaim.id),
+        func.coalesce(func.sum(BPJSClaim.package_amount), 0),
+        func.coalesce(func.sum(BPJSClaim.approved_amount), 0),
+    ).select_from(BPJSClaim).outerjoin(
+        Encounter, Encounter.id == BPJSClaim.encounter_id
+    ).where(
+        _on_days(BPJSClaim.created_at, days)
+    ).group_by(
+        claim_day, department, BPJSClaim.claim_type, BPJSClaim.status
+    )
+
+
+class FactSpec(object):
+    """How one fact table is derived from its source table
+
+    Attributes:
+        model: Fact model
+        columns: Fact columns, in the order the aggregate selects them
+        build: Function of a list of days returning the aggregate SELECT
+        source_day: Expression of the fact day of a source row
+        source_updated_at: Source column bumped on every change
+    """
+
+    def __init__(
+        self,
+        model,
+        columns: List[str],
+        build: Callable,
+        source_day,
+        source_updated_at,
+    ):
+        self.model = model
+        self.columns = columns
+        self.build = build
+        self.source_day = source_day
+        self.source_updated_at = source_updated_at
+
+
+FACTS = {
+    "encounters": FactSpec(
+        FactDailyEncounter,
+        ["fact_date", "department", "encounter_type", "status", "encounter_count"],
+        _encounter_facts,
+        Encounter.encounter_date,
+        Encounter.updated_at,
+    ),
+    "invoices": FactSpec(
+        FactDailyInvoice,
+        ["fact_date", "department", "payer_type", "status",
+         "invoice_count", "total_amount", "paid_amount", "balance_due"],
+        _invoice_facts,
+        Invoice.invoice_date,
+        Invoice.updated_at,
+    ),
+    "payments": FactSpec(
+        FactDailyPayment,
+        ["fact_date", "department", "payer_type", "payment_method", "payment_count", "amount"],
+        _payment_facts,
+        func.date(Payment.payment_date),
+        Payment.updated_at,
+    ),
+    "claims": FactSpec(
+        FactDailyClaim,
+        ["fact_date", "department", "claim_type", "status",
+         "claim_count", "claimed_amount", "approved_amount"],
+        _claim_facts,
+        func.date(BPJSClaim.created_at),
+        BPJSClaim.updated_at,
+    ),
+}  # type: Dict[str, FactSpec]
+
+
+def day_batches(days, batch_size: int = FACT_REFRESH_BATCH_DAYS) -> List[List[date]]:
+    """Split days into sorted batches of at most batch_size days
+
+    Args:
+        days: Days to recompute (duplicates and None are dropped)
+        batch_size: Maximum days per batch
+
+    Returns:
+        List of day lists
+    """
+    ordered = sorted(set(day for day in days if day is not None))
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
+class ReportFactService(object):
+    """Service maintaining the daily reporting fact tables"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def refresh_days(self, fact_name: str, days: List[date]) -> int:
+        """
+        Recompute the facts of the given days from the source table
+
+        Does not commit.
+
+        Args:
+            fact_name: Key in FACTS
+            days: Days to recompute
+
+        Returns:
+            Number of days recomputed
+        """
+        spec = FACTS[fact_name]
+        table = spec.model.__table__
+        count = 0
+
+        for batch in day_batches(days):
+            await self.db.execute(
+                delete(table).where(table.c.fact_date.in_(batch))
+            )
+            await self.db.execute(
+                insert(table).from_select(spec.columns, spec.build(batch))
+            )
+            count += len(batch)
+
+        return count
+
+    async def refresh_changed(self) -> Dict[str, Any]:
+        """
+        Recompute the days touched by source changes since the last refresh
+
+        Each fact's watermark row is locked for the refresh, so concurrent
+        runs queue behind each other instead of racing on the same days.
+
+        Returns:
+            Dictionary with the days recomputed per fact
+        """
+        refreshed = {}
+
+        for fact_name, spec in FACTS.items():
+            started = (await self.db.execute(select(func.now()))).scalar()
+
+            result = await self.db.execute(
+                select(ReportFactWatermark.refreshed_through)
+                .where(ReportFactWatermark.fact_name == fact_name)
+                .with_for_update()
+            )
+            watermark = result.scalar()
+
+            query = select(spec.source_day).distinct()
+            if watermark is not None:
+                since = watermark - timedelta(seconds=FACT_REFRESH_OVERLAP_SECONDS)
+                query = query.where(spec.source_updated_at > since)
+            days = list((await self.db.execute(query)).scalars().all())
+
+            refreshed[fact_name] = await self.refresh_days(fact_name, days)
+            await self._set_watermark(fact_name, started)
+            await self.db.commit()
+
+        logger.info("Report facts refreshed: {}".format(refreshed))
+        return {"days_refreshed": refreshed}
+
+    async def rebuild(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Recompute every fact table over a date range
+
+        Catches changes the incremental refresh cannot see, such as hard
+        deletes and rows moved to another day.
+
+        Args:
+            start_date: First day (default: FACT_REBUILD_DAYS days ago)
+            end_date: Last day (default: today)
+
+        Returns:
+            Dictionary with the rebuilt range
+        """
+        end_date = end_date or date.today()
+        start_date = start_date or end_date - timedelta(days=FACT_REBUILD_DAYS)
+        days = [
+            start_date + timedelta(days=offset)
+            for offset in range((end_date - start_date).days + 1)
+        ]
+
+        for fact_name in FACTS:
+            await self.refresh_days(fact_name, days)
+            await self.db.commit()
+
+        logger.info("Report facts rebuilt from {} to {}".format(start_date, end_date))
+        return {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "days_rebuilt": len(days),
+        }
+
+    async def _set_watermark(self, fact_name: str, refreshed_through: datetime):
+        stmt = pg_insert(ReportFactWatermark.__table__).values(
+            fact_name=fact_name,
+            refreshed_through=refreshed_through,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["fact_name"],
+            set_={
+                "refreshed_through": stmt.excluded.refreshed_through,
+                "updated_at": func.now(),
+            },
+        )
+        await self.db.execute(stmt)
+
+
+def create_report_fact_service(db: AsyncSession) -> ReportFactService:
+    """Create report fact service instance"""
+    return ReportFactService(db)
@@ -1,7 +1,8 @@
 """Reporting & Analytics Service for EPIC-013
 
 This module provides services for:
-- Report generation and execution
+- Report generation and execution (cached, background and streamed
+  exports through app.services.report_execution)
 - Metric aggregation (operational, clinical, financial)
 - Report scheduling and distribution
 - Regulatory report generation
@@ -9,26 +10,48 @@ This module provides services for:
 Python 3.5+ compatible
 """
 
+import asyncio
 import logging
+import os
+import traceback
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, case, text
+from sqlalchemy import select, and_, or_, func, case, text, update
 from sqlalchemy.orm import selectinload
 
 from app.models.reporting import (
     Report, ReportSchedule, ReportExecution,
     OperationalMetric, ClinicalQualityMetric, FinancialMetric, RegulatoryReport,
+    FactDailyEncounter, FactDailyInvoice, FactDailyClaim,
     ReportType
 )
 from app.models.user import User
 from app.models.encounter import Encounter
 from app.models.patient import Patient
+from app.services.report_execution import (
+    OUTPUT_FORMATS, REPORT_STREAM_BATCH_SIZE,
+    build_report_statement, report_parameter_types, report_cache_key, report_cache_ttl,
+    report_output_path, open_report_writer, tabulate, remove_expired_report_outputs,
+    report_result_cache, report_job_runner,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+# Built-in reports by code, mapped to their ReportingService generator
+REPORT_GENERATORS = {
+    "daily_census": "_generate_daily_census",
+    "department_utilization": "_generate_department_utilization",
+    "bed_occupancy": "_generate_bed_occupancy",
+    "patient_wait_times": "_generate_patient_wait_times",
+    "revenue_summary": "_generate_revenue_summary",
+    "bpjs_claim_analytics": "_generate_bpjs_claim_analytics",
+    "clinical_quality_summary": "_generate_clinical_quality_summary",
+}
+
+
 class ReportingService(object):
     """Service for reporting and analytics"""
 
@@ -245,20 +268,32 @@ class ReportingService(object):
         report_id: int,
         parameters: Optional[dict] = None,
         output_format: str = "json",
-        triggered_by: Optional[int] = None
+        triggered_by: Optional[int] = None,
+        background: bool = False,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """Execute a report and return results
 
+        Results are served from the report result cache while fresh. JSON
+        results are returned inline; CSV and XLSX results are written to a
+        file. Background executions return at once with status "pending";
+        poll get_execution for the outcome.
+
         Args:
             report_id: Report ID
             parameters: Report parameters
-            output_format: Output format (json, csv, pdf, xlsx)
+            output_format: Output format (json, csv, xlsx)
             triggered_by: User ID who triggered execution
+            background: Run in the background instead of in this request
+            use_cache: Serve a cached result if there is one
 
         Returns:
             Dict with execution results
         """
         try:
+            if output_format not in OUTPUT_FORMATS:
+                raise ValueError("Unsupported output format: {}".format(output_format))
+
             # Get report
             query = select(Report).where(Report.id == report_id)
             result = await self.db.execute(query)
@@ -267,125 +302,257 @@ class ReportingService(object):
             if not report:
                 raise ValueError("Report {} not found".format(report_id))
 
+            parameters = parameters or {}
+            if use_cache and report_cache_ttl(report):
+                cached = await report_result_cache.get(
+                    report_cache_key(report_id, parameters, output_format)
+                )
+                if cached is not None:
+                    cached["cached"] = True
+                    return cached
+
             # Create execution record
             execution = ReportExecution(
                 report_id=report_id,
-                status="running",
-                started_at=datetime.utcnow(),
-                parameters=parameters or {},
+                status="pending" if background else "running",
+                started_at=None if background else datetime.utcnow(),
+                parameters=parameters,
                 output_format=output_format,
                 triggered_by=triggered_by
             )
             self.db.add(execution)
-            await self.db.flush()
-
-            # Generate report data based on type
-            data = None
-            if report.code == "daily_census":
-                data = await self._generate_daily_census(parameters)
-            elif report.code == "department_utilization":
-                data = await self._generate_department_utilization(parameters)
-            elif report.code == "bed_occupancy":
-                data = await self._generate_bed_occupancy(parameters)
-            elif report.code == "patient_wait_times":
-                data = await self._generate_patient_wait_times(parameters)
-            elif report.code == "revenue_summary":
-                data = await self._generate_revenue_summary(parameters)
-            elif report.code == "bpjs_claim_analytics":
-                data = await self._generate_bpjs_claim_analytics(parameters)
-            elif report.code == "clinical_quality_summary":
-                data = await self._generate_clinical_quality_summary(parameters)
-            elif report.query_definition:
-                # Execute custom query
-                data = await self._execute_custom_query(report.query_definition, parameters)
-            else:
-                data = {"message": "Report type not implemented"}
+            await self.db.commit()
 
-            # Update execution record
-            execution.status = "completed"
-            execution.completed_at = datetime.utcnow()
-            execution.duration_seconds = int((execution.completed_at - execution.started_at).total_seconds())
-            execution.row_count = len(data) if isinstance(data, list) else 1
+            if background:
+                report_job_runner.submit(execution.id)
+                return self._execution_result(report, execution)
 
-            await self.db.commit()
+            try:
+                data = await self._run_report(report, execution, inline=output_format == "json")
+                await self.db.commit()
+            except Exception as e:
+                # Update execution with error
+                await self.db.rollback()
+                self._fail_execution(execution, e)
+                await self.db.commit()
+                raise
 
             logger.info("Executed report: {} in {} seconds".format(
                 report.name, execution.duration_seconds
             ))
 
-            return {
-                "execution_id": execution.id,
-                "report_id": report_id,
-                "report_name": report.name,
-                "status": execution.status,
-                "duration_seconds": execution.duration_seconds,
-                "row_count": execution.row_count,
-                "data": data,
-                "executed_at": execution.started_at.isoformat()
-            }
+            return await self._cache_result(report, execution, data)
 
         except ValueError:
             await self.db.rollback()
             raise
         except Exception as e:
             logger.error("Error executing report: {}".format(e))
-            # Update execution with error
-            if execution:
-                execution.status = "failed"
-                execution.completed_at = datetime.utcnow()
-                execution.error_message = str(e)
-                await self.db.commit()
             await self.db.rollback()
             raise ValueError("Failed to execute report: {}".format(str(e)))
 
+    async def run_execution(self, execution_id: int) -> Dict[str, Any]:
+        """Run a pending background execution to completion
+
+        The output is always written to a file, which get_execution and the
+        download endpoint serve.
+
+        Args:
+            execution_id: ReportExecution ID
+
+        Returns:
+            Dict with execution results
+        """
+        query = select(ReportExecution).options(
+            selectinload(ReportExecution.report)
+        ).where(ReportExecution.id == execution_id)
+        result = await self.db.execute(query)
+        execution = result.scalar_one_or_none()
+
+        if not execution:
+            raise ValueError("Report execution {} not found".format(execution_id))
+
+        report = execution.report
+        execution.status = "running"
+        execution.started_at = datetime.utcnow()
+        await self.db.commit()
+
+        try:
+            await self._run_report(report, execution, inline=False)
+            await self.db.commit()
+        except (Exception, asyncio.CancelledError) as e:
+            await self.db.rollback()
+            self._fail_execution(execution, e)
+            await self.db.commit()
+            raise
+
+        logger.info("Executed report {} in the background in {} seconds".format(
+            report.name, execution.duration_seconds
+        ))
+        return await self._cache_result(report, execution, None)
+
+    async def get_execution(self, execution_id: int) -> Dict[str, Any]:
+        """Get the status and output of a report execution
+
+        Args:
+            execution_id: ReportExecution ID
+
+        Returns:
+            Dict with execution details
+        """
+        query = select(ReportExecution).options(
+            selectinload(ReportExecution.report)
+        ).where(ReportExecution.id == execution_id)
+        result = await self.db.execute(query)
+        execution = result.scalar_one_or_none()
+
+        if not execution:
+            raise ValueError("Report execution {} not found".format(execution_id))
+
+        details = self._execution_result(execution.report, execution)
+        details["file_path"] = execution.file_path
+        details["error_message"] = execution.error_message
+        return details
+
+    async def purge_expired_outputs(self, retention_days: int) -> Dict[str, Any]:
+        """Delete report output files past their retention
+
+        Executions whose file was removed lose their file_path, so the
+        download endpoint answers 409 instead of failing on a missing file.
+
+        Args:
+            retention_days: Days an output file is kept
+
+        Returns:
+            Dict with the number of files removed
+        """
+        loop = asyncio.get_event_loop()
+        removed = await loop.run_in_executor(None, remove_expired_report_outputs, retention_days)
+        if removed:
+            await self.db.execute(
+                update(ReportExecution)
+                .where(ReportExecution.file_path.in_(removed))
+                .values(file_path=None, file_size_bytes=None)
+            )
+            await self.db.commit()
+
+        logger.info("Removed {} report output files older than {} days".format(len(removed), retention_days))
+        return {"files_removed": len(removed)}
+
+    async def _run_report(self, report: Report, execution: ReportExecution, inline: bool) -> Any:
+        """Generate a report for an execution and record the outcome
+
+        Args:
+            report: Report to run
+            execution: Running execution record
+            inline: Return JSON data instead of writing the output file
+
+        Returns:
+            Report data if inline, else None
+        """
+        parameters = execution.parameters or {}
+        generator = REPORT_GENERATORS.get(report.code)
+        data = None
+
+        if inline:
+            if generator is not None:
+                data = await getattr(self, generator)(parameters)
+            elif report.query_definition:
+                data = await self._execute_custom_query(
+                    report.query_definition, parameters, report_parameter_types(report)
+                )
+            else:
+                data = {"message": "Report type not implemented"}
+            execution.row_count = len(data) if isinstance(data, list) else 1
+        else:
+            path = report_output_path(execution.id, execution.output_format)
+            if generator is None and report.query_definition:
+                row_count = await self._export_custom_query(
+                    report.query_definition, parameters, report_parameter_types(report),
+                    execution.output_format, path
+                )
+            else:
+                if generator is not None:
+                    data = await getattr(self, generator)(parameters)
+                else:
+                    data = {"message": "Report type not implemented"}
+                row_count = await self._export_data(data, execution.output_format, path)
+                data = None
+            execution.row_count = row_count
+            execution.file_path = path
+            execution.file_size_bytes = os.path.getsize(path)
+
+        execution.status = "completed"
+        execution.completed_at = datetime.utcnow()
+        execution.duration_seconds = int((execution.completed_at - execution.started_at).total_seconds())
+        return data
+
+    async def _cache_result(self, report: Report, execution: ReportExecution, data: Any) -> Dict[str, Any]:
+        """Build the result of a completed execution and cache it"""
+        result = self._execution_result(report, execution)
+        result["data"] = data
+        await report_result_cache.set(
+            report_cache_key(report.id, execution.parameters, execution.output_format),
+            result,
+            report_cache_ttl(report),
+        )
+        return result
+
+    @staticmethod
+    def _execution_result(report: Report, execution: ReportExecution) -> Dict[str, Any]:
+        return {
+            "execution_id": execution.id,
+            "report_id": report.id,
+            "report_name": report.name,
+            "status": execution.status,
+            "output_format": execution.output_format,
+            "duration_seconds": execution.duration_seconds,
+            "row_count": execution.row_count,
+            "file_size_bytes": execution.file_size_bytes,
+            "executed_at": execution.started_at.isoformat() if execution.started_at else None
+        }
+
+    @staticmethod
+    def _fail_execution(execution: ReportExecution, error: BaseException):
+        execution.status = "failed"
+        execution.completed_at = datetime.utcnow()
+        execution.error_message = str(error) or error.__class__.__name__
+        execution.stack_trace = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+
     # ==========================================================================
     # Operational Reports
     # ==========================================================================
 
     async def _generate_daily_census(self, parameters: dict) -> Dict[str, Any]:
-        """Generate daily census report"""
+        """Generate daily census report from the daily encounter facts"""
         try:
             report_date = parameters.get("report_date", datetime.utcnow().date())
 
-            # Count inpatients by department
-            from app.models.encounter import Encounter
-            from app.models.department import Department
-
             query = select(
-                Department.name,
-                func.count(Encounter.id).label("count")
-            ).join(
-                Encounter, Department.id == Encounter.department_id
+                FactDailyEncounter.department,
+                FactDailyEncounter.encounter_type,
+                FactDailyEncounter.status,
+                FactDailyEncounter.encounter_count,
             ).where(
                 and_(
-                    Encounter.encounter_type == "inpatient",
-                    Encounter.status == "active",
-                    func.date(Encounter.created_at) == report_date
-                )
-            ).group_by(Department.name)
-
-            result = await self.db.execute(query)
-            inpatient_by_dept = {row[0]: row[1] for row in result.all()}
-
-            # Count outpatient visits
-            outpatient_query = select(func.count(Encounter.id)).where(
-                and_(
-                    Encounter.encounter_type == "outpatient",
-                    func.date(Encounter.created_at) == report_date
+                    FactDailyEncounter.fact_date == report_date,
+                    FactDailyEncounter.encounter_type.in_(("inpatient", "outpatient", "emergency"))
                 )
             )
-            outpatient_result = await self.db.execute(outpatient_query)
-            outpatient_count = outpatient_result.scalar() or 0
+            result = await self.db.execute(query)
 
-            # Count emergency visits
-            emergency_query = select(func.count(Encounter.id)).where(
-                and_(
-                    Encounter.encounter_type == "emergency",
-                    func.date(Encounter.created_at) == report_date
-                )
-            )
-            emergency_result = await self.db.execute(emergency_query)
-            emergency_count = emergency_result.scalar() or 0
+            inpatient_by_dept = {}
+            outpatient_count = 0
+            emergency_count = 0
+            for department, encounter_type, status, count in result.all():
+                if encounter_type == "inpatient":
+                    if status == "active":
+                        key = department or "Unassigned"
+                        inpatient_by_dept[key] = inpatient_by_dept.get(key, 0) + count
+                elif encounter_type == "outpatient":
+                    outpatient_count += count
+                else:
+                    emergency_count += count
 
             return {
                 "report_date": str(report_date),
@@ -520,51 +687,30 @@ class ReportingService(object):
     # ==========================================================================
 
     async def _generate_revenue_summary(self, parameters: dict) -> Dict[str, Any]:
-        """Generate revenue summary report"""
+        """Generate revenue summary report from the daily invoice facts"""
         try:
-            from app.models.billing import Invoice, InvoiceStatus
+            from app.models.billing import InvoiceStatus
 
             start_date = parameters.get("start_date")
             end_date = parameters.get("end_date")
 
-            # Total revenue
-            query = select(func.sum(Invoice.total_amount))
+            query = select(
+                FactDailyInvoice.payer_type,
+                func.sum(FactDailyInvoice.total_amount).label("amount"),
+                func.sum(FactDailyInvoice.invoice_count).label("count")
+            ).where(FactDailyInvoice.status != InvoiceStatus.CANCELLED.value)
             if start_date:
-                query = query.where(func.date(Invoice.created_at) >= start_date)
+                query = query.where(FactDailyInvoice.fact_date >= start_date)
             if end_date:
-                query = query.where(func.date(Invoice.created_at) <= end_date)
-            query = query.where(Invoice.status != InvoiceStatus.CANCELLED)
+                query = query.where(FactDailyInvoice.fact_date <= end_date)
+            query = query.group_by(FactDailyInvoice.payer_type)
 
             result = await self.db.execute(query)
-            total_revenue = result.scalar() or 0
-
-            # Revenue by payer type
-            payer_query = select(
-                Invoice.payer_type,
-                func.sum(Invoice.total_amount).label("amount")
-            ).where(Invoice.status != InvoiceStatus.CANCELLED)
+            rows = result.all()
 
-            if start_date:
-                payer_query = payer_query.where(func.date(Invoice.created_at) >= start_date)
-            if end_date:
-                payer_query = payer_query.where(func.date(Invoice.created_at) <= end_date)
-
-            payer_query = payer_query.group_by(Invoice.payer_type)
-
-            payer_result = await self.db.execute(payer_query)
-            revenue_by_payer = {row[0]: float(row[1]) for row in payer_result.all()}
-
-            # Invoice count
-            count_query = select(func.count(Invoice.id)).where(
-                Invoice.status != InvoiceStatus.CANCELLED
-            )
-            if start_date:
-                count_query = count_query.where(func.date(Invoice.created_at) >= start_date)
-            if end_date:
-                count_query = count_query.where(func.date(Invoice.created_at) <= end_date)
-
-            count_result = await self.db.execute(count_query)
-            invoice_count = count_result.scalar() or 0
+            revenue_by_payer = {row[0]: float(row[1] or 0) for row in rows}
+            total_revenue = sum(revenue_by_payer.values())
+            invoice_count = sum(int(row[2] or 0) for row in rows)
 
             return {
                 "period": {
@@ -582,60 +728,37 @@ class ReportingService(object):
             raise
 
     async def _generate_bpjs_claim_analytics(self, parameters: dict) -> Dict[str, Any]:
-        """Generate BPJS claim analytics report"""
+        """Generate BPJS claim analytics report from the daily claim facts"""
         try:
-            from app.models.bpjs import BPJSClaim, ClaimStatus
+            from app.models.bpjs_claims import BPJSClaimStatus
 
             start_date = parameters.get("start_date")
             end_date = parameters.get("end_date")
 
-            # Total claims
-            total_query = select(func.count(BPJSClaim.id))
-            if start_date:
-                total_query = total_query.where(func.date(BPJSClaim.submitted_at) >= start_date)
-            if end_date:
-                total_query = total_query.where(func.date(BPJSClaim.submitted_at) <= end_date)
-
-            total_result = await self.db.execute(total_query)
-            total_claims = total_result.scalar() or 0
-
-            # Claims by status
-            status_query = select(
-                BPJSClaim.status,
-                func.count(BPJSClaim.id).label("count")
-            ).group_by(BPJSClaim.status)
-
-            if start_date:
-                status_query = status_query.where(func.date(BPJSClaim.submitted_at) >= start_date)
-            if end_date:
-                status_query = status_query.where(func.date(BPJSClaim.submitted_at) <= end_date)
-
-            status_result = await self.db.execute(status_query)
-            claims_by_status = {row[0]: row[1] for row in status_result.all()}
-
-            # Total claim amount
-            amount_query = select(func.sum(BPJSClaim.claim_amount))
-            if start_date:
-                amount_query = amount_query.where(func.date(BPJSClaim.submitted_at) >= start_date)
-            if end_date:
-                amount_query = amount_query.where(func.date(BPJSClaim.submitted_at) <= end_date)
-
-            amount_result = await self.db.execute(amount_query)
-            total_amount = amount_result.scalar() or 0
-
-            # Approved amount
-            approved_query = select(func.sum(BPJSClaim.approved_amount)).where(
-                BPJSClaim.status == ClaimStatus.APPROVED
+            query = select(
+                FactDailyClaim.status,
+                func.sum(FactDailyClaim.claim_count).label("count"),
+                func.sum(FactDailyClaim.claimed_amount).label("claimed"),
+                func.sum(FactDailyClaim.approved_amount).label("approved")
             )
             if start_date:
-                approved_query = approved_query.where(func.date(BPJSClaim.submitted_at) >= start_date)
+                query = query.where(FactDailyClaim.fact_date >= start_date)
             if end_date:
-                approved_query = approved_query.where(func.date(BPJSClaim.submitted_at) <= end_date)
+                query = query.where(FactDailyClaim.fact_date <= end_date)
+            query = query.group_by(FactDailyClaim.status)
 
-            approved_result = await self.db.execute(approved_query)
-            approved_amount = approved_result.scalar() or 0
+            result = await self.db.execute(query)
+            rows = result.all()
+
+            claims_by_status = {row[0]: int(row[1] or 0) for row in rows}
+            total_claims = sum(claims_by_status.values())
+            total_amount = sum(float(row[2] or 0) for row in rows)
+            approved_amount = sum(
+                float(row[3] or 0) for row in rows
+                if row[0] == BPJSClaimStatus.APPROVED.value
+            )
 
-            approval_rate = (claims_by_status.get(ClaimStatus.APPROVED, 0) / total_claims * 100) if total_claims > 0 else 0
+            approval_rate = (claims_by_status.get(BPJSClaimStatus.APPROVED.value, 0) / total_claims * 100) if total_claims > 0 else 0
 
             return {
                 "period": {
@@ -714,30 +837,68 @@ class ReportingService(object):
     # Custom Query Execution
     # ==========================================================================
 
-    async def _execute_custom_query(self, query_text: str, parameters: dict) -> List[Dict[str, Any]]:
-        """Execute custom SQL query"""
+    async def _execute_custom_query(
+        self,
+        query_text: str,
+        parameters: dict,
+        parameter_types: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Execute custom SQL query with bound parameters"""
         try:
-            # Simple parameter substitution
-            # WARNING: This is a basic implementation. For production, use proper parameterized queries
-            for key, value in parameters.items():
-                if isinstance(value, str):
-                    query_text = query_text.replace("{{{}}}".format(key), "'{}'".format(value))
-                elif value is None:
-                    query_text = query_text.replace("{{{}}}".format(key), "NULL")
-                else:
-                    query_text = query_text.replace("{{{}}}".format(key), str(value))
+            statement, values = build_report_statement(query_text, parameters, parameter_types)
+            result = await self.db.execute(statement, values)
+            columns = list(result.keys())
 
-            # Execute query
-            result = await self.db.execute(text(query_text))
-            rows = result.fetchall()
-            columns = result.keys()
-
-            return [dict(zip(columns, row)) for row in rows]
+            return [dict(zip(columns, row)) for row in result]
 
         except Exception as e:
             logger.error("Error executing custom query: {}".format(e))
             raise
 
+    async def _export_custom_query(
+        self,
+        query_text: str,
+        parameters: dict,
+        parameter_types: Optional[Dict[str, str]],
+        output_format: str,
+        path: str
+    ) -> int:
+        """Stream a custom query from a server-side cursor into a file
+
+        Returns:
+            Number of rows written
+        """
+        statement, values = build_report_statement(query_text, parameters, parameter_types)
+        loop = asyncio.get_event_loop()
+        writer = await loop.run_in_executor(None, open_report_writer, output_format, path)
+        try:
+            result = await self.db.stream(statement, values)
+            writer.write_header(result.keys())
+            async for rows in result.partitions(REPORT_STREAM_BATCH_SIZE):
+                await loop.run_in_executor(None, writer.write_rows, rows)
+        finally:
+            await loop.run_in_executor(None, writer.close)
+        return writer.row_count
+
+    async def _export_data(self, data: Any, output_format: str, path: str) -> int:
+        """Write a built-in report result into a file
+
+        Returns:
+            Number of rows written
+        """
+        columns, rows = tabulate(data)
+
+        def write():
+            writer = open_report_writer(output_format, path)
+            try:
+                writer.write_header(columns)
+                writer.write_rows(rows)
+            finally:
+                writer.close()
+            return writer.row_count
+
+        return await asyncio.get_event_loop().run_in_executor(None, write)
+
     # ==========================================================================
     # Metric Aggregation
     # ==========================================================================
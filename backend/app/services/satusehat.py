@@ -7,10 +7,12 @@ import logging
 import json
 import hashlib
 import hmac
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime
 from httpx import AsyncClient, HTTPStatusError, TimeoutException
 from app.core.config import settings
+from app.core.http_clients import http_client_registry
+from app.services.satusehat_token import satusehat_token_manager, token_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -69,16 +71,23 @@ class SATUSEHATClient:
 
         # HTTP client
         self._client: Optional[AsyncClient] = None
+        self._owns_client = False
 
     async def __aenter__(self):
-        """Enter async context manager."""
-        self._client = AsyncClient(timeout=30.0)
+        """Enter async context manager.
+
+        Borrows the application's shared SATUSEHAT connection pool when it
+        is running, otherwise creates a private client closed on exit.
+        """
+        if self._client is None:
+            self._client, self._owns_client = http_client_registry.acquire("satusehat")
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Exit async context manager."""
-        if self._client:
+        if self._client is not None and self._owns_client:
             await self._client.aclose()
+        self._client = None
 
     # =============================================================================
     # OAuth 2.0 Authentication
@@ -86,7 +95,10 @@ class SATUSEHATClient:
 
     async def _get_valid_token(self) -> str:
         """
-        Get a valid access token, refreshing if necessary.
+        Get a valid access token from the shared token cache.
+
+        Tokens are shared by every client with the same credentials, across
+        workers, and refreshed once shortly before they expire.
 
         Returns:
             Valid access token
@@ -94,18 +106,16 @@ class SATUSEHATClient:
         Raises:
             SATUSEHATAuthError: If token acquisition fails
         """
-        # Check if we have a valid token
-        if self._access_token and self._token_expires_at:
-            # Add 5-minute buffer to avoid using expired tokens
-            if datetime.now() + timedelta(minutes=5) < self._token_expires_at:
-                return self._access_token
-
-        # Need to refresh token
-        return await self._refresh_token()
+        token = await satusehat_token_manager.get_token(
+            token_cache_key(self.client_id, self.auth_url), self._request_token
+        )
+        self._access_token = token.access_token
+        self._token_expires_at = datetime.fromtimestamp(token.expires_at)
+        return token.access_token
 
     async def _refresh_token(self) -> str:
         """
-        Refresh access token using client credentials grant.
+        Discard the cached access token and get a new one.
 
         Returns:
             New access token
@@ -113,6 +123,21 @@ class SATUSEHATClient:
         Raises:
             SATUSEHATAuthError: If token refresh fails
         """
+        await satusehat_token_manager.invalidate(
+            token_cache_key(self.client_id, self.auth_url), self._access_token
+        )
+        return await self._get_valid_token()
+
+    async def _request_token(self) -> Tuple[str, float]:
+        """
+        Request an access token using client credentials grant.
+
+        Returns:
+            Tuple of (access token, seconds until it expires)
+
+        Raises:
+            SATUSEHATAuthError: If the token request fails
+        """
         if not self._client:
             raise SATUSEHATError("Client not initialized. Use async context manager.")
 
@@ -137,17 +162,16 @@ class SATUSEHATClient:
             token_data = response.json()
 
             # Extract token and expiration
-            self._access_token = token_data.get("access_token")
-            if not self._access_token:
+            access_token = token_data.get("access_token")
+            if not access_token:
                 raise SATUSEHATAuthError("No access token in response")
 
-            # Calculate expiration (expires_in is in seconds)
+            # expires_in is in seconds
             expires_in = token_data.get("expires_in", 3600)  # Default 1 hour
-            self._token_expires_at = datetime.now() + timedelta(seconds=expires_in)
 
-            logger.info(f"Access token obtained, expires at {self._token_expires_at}")
+            logger.info(f"Access token obtained, expires in {expires_in}s")
 
-            return self._access_token
+            return access_token, float(expires_in)
 
         except HTTPStatusError as e:
             error_msg = f"HTTP error refreshing token: {e.response.status_code}"
@@ -175,16 +199,20 @@ class SATUSEHATClient:
         resource_id: Optional[str] = None,
         data: Optional[Dict[str, Any]] = None,
         params: Optional[Dict[str, Any]] = None,
+        retry_unauthorized: bool = True,
     ) -> Dict[str, Any]:
         """
         Make authenticated FHIR API request.
 
         Args:
             method: HTTP method (GET, POST, PUT, DELETE)
-            resource_type: FHIR resource type (Patient, Organization, etc.)
+            resource_type: FHIR resource type (Patient, Organization, etc.);
+                empty to POST a transaction Bundle to the base URL
             resource_id: Resource ID for PUT/DELETE operations
             data: Request body data
             params: Query parameters
+            retry_unauthorized: On HTTP 401, drop the cached token and retry
+                once with a new one
 
         Returns:
             FHIR response data
@@ -199,7 +227,7 @@ class SATUSEHATClient:
         token = await self._get_valid_token()
 
         # Build URL
-        url = f"{self.api_url}/{resource_type}"
+        url = f"{self.api_url}/{resource_type}" if resource_type else self.api_url
         if resource_id:
             url += f"/{resource_id}"
 
@@ -222,6 +250,13 @@ class SATUSEHATClient:
             else:
                 raise SATUSEHATError(f"Unsupported HTTP method: {method}")
 
+            # The shared token was revoked or expired early
+            if response.status_code == 401 and retry_unauthorized:
+                await self._refresh_token()
+                return await self._make_fhir_request(
+                    method, resource_type, resource_id, data, params, retry_unauthorized=False
+                )
+
             # Check for errors
             try:
                 response.raise_for_status()
@@ -0,0 +1,492 @@
+"""SATUSEHAT Bulk Sync Engine
+
+This module pushes patients and encounters to SATUSEHAT in bulk, for the
+first-time backfill of the registry and for incremental catch-up runs:
+- Rows are read in keyset pages ordered by ID, each page on a short
+  session, so neither the rows nor a long-running transaction are held
+  for the whole run
+- Requests run with bounded concurrency and are paced to stay under the
+  SATUSEHAT rate limit; HTTP 429 responses back off and retry
+- Encounters are sent with their conditions as one FHIR transaction
+  Bundle. Patients are sent one resource at a time, because SATUSEHAT
+  does not accept Patient resources in transaction Bundles
+- A checkpoint row per resource type records the last finished page, so
+  an interrupted run resumes where it stopped
+- satusehat_synced_at holds the updated_at of the version last pushed, so
+  incremental runs only read rows changed since their last sync
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Callable
+
+from sqlalchemy import select, update, or_, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.db.session import get_db_context
+from app.models.encounter import Encounter, Diagnosis
+from app.models.patient import Patient
+from app.models.satusehat_sync import SATUSEHATSyncCheckpoint
+from app.services.condition_sync import build_fhir_condition_resource
+from app.services.encounter_sync import build_fhir_encounter_resource
+from app.services.patient_sync import build_fhir_patient_resource
+from app.services.satusehat import SATUSEHATClient, SATUSEHATError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Rows read and pushed per page
+SYNC_PAGE_SIZE = 200
+
+# Retries of a request SATUSEHAT rejected with HTTP 429
+RATE_LIMIT_RETRIES = 3
+
+# Back-off before the first retry; doubles per attempt
+RATE_LIMIT_BACKOFF_SECONDS = 5.0
+
+# A running checkpoint untouched this long belongs to a crashed run
+STALE_CHECKPOINT_SECONDS = 600
+
+# Failures listed in a run summary
+MAX_REPORTED_FAILURES = 50
+
+SYNC_RESOURCES = ("patients", "encounters")
+
+
+def dirty_filter(model):
+    """Rows changed since they were last pushed to SATUSEHAT"""
+    return or_(
+        model.satusehat_synced_at.is_(None),
+        model.updated_at > model.satusehat_synced_at,
+    )
+
+
+def _bundle_entry(resource: Dict[str, Any], resource_type: str, resource_id: Optional[str]) -> Dict[str, Any]:
+    if resource_id:
+        resource["id"] = resource_id
+        return {
+            "fullUrl": "{}/{}/{}".format(settings.SATUSEHAT_API_URL, resource_type, resource_id),
+            "resource": resource,
+            "request": {"method": "PUT", "url": "{}/{}".format(resource_type, resource_id)},
+        }
+    return {
+        "fullUrl": "urn:uuid:{}".format(uuid.uuid4()),
+        "resource": resource,
+        "request": {"method": "POST", "url": resource_type},
+    }
+
+
+def build_encounter_bundle(
+    encounter: Encounter,
+    patient: Patient,
+    doctor=None,
+    diagnoses: Optional[List[Diagnosis]] = None,
+    organization_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build the transaction Bundle of an encounter and its conditions
+
+    New resources are POSTed under urn:uuid full URLs, so conditions can
+    reference an encounter created in the same transaction; resources
+    that already have a SATUSEHAT ID are PUT.
+
+    Returns:
+        FHIR Bundle; entry 0 is the encounter, then one per diagnosis
+    """
+    encounter_entry = _bundle_entry(
+        build_fhir_encounter_resource(encounter, patient, doctor, organization_id),
+        "Encounter",
+        encounter.satusehat_encounter_id,
+    )
+    encounter_reference = (
+        "Encounter/{}".format(encounter.satusehat_encounter_id)
+        if encounter.satusehat_encounter_id else encounter_entry["fullUrl"]
+    )
+
+    entries = [encounter_entry]
+    for diagnosis in diagnoses or []:
+        condition = build_fhir_condition_resource(diagnosis, encounter, patient)
+        condition["encounter"] = {
+            "reference": encounter_reference,
+            "display": "Encounter {}".format(encounter.id),
+        }
+        entries.append(_bundle_entry(condition, "Condition", diagnosis.satusehat_condition_id))
+
+    return {"resourceType": "Bundle", "type": "transaction", "entry": entries}
+
+
+def bundle_resource_ids(response: Dict[str, Any]) -> List[Optional[str]]:
+    """Resource IDs of a transaction response, in entry order"""
+    ids = []
+    for entry in response.get("entry") or []:
+        result = entry.get("response") or {}
+        resource_id = result.get("resourceID")
+        if not resource_id and result.get("location"):
+            # "Encounter/<id>/_history/<version>"
+            parts = result["location"].split("/")
+            resource_id = parts[1] if len(parts) > 1 else None
+        if not resource_id:
+            resource_id = (entry.get("resource") or {}).get("id")
+        ids.append(resource_id)
+    return ids
+
+
+class RequestPacer(object):
+    """Spaces request starts to at most rate per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class SyncOutcome(object):
+    """Result of pushing one row"""
+
+    def __init__(
+        self,
+        row_id: int,
+        version: Optional[datetime] = None,
+        satusehat_id: Optional[str] = None,
+        condition_ids: Optional[Dict[int, str]] = None,
+        error: Optional[str] = None,
+    ):
+        self.row_id = row_id
+        self.version = version
+        self.satusehat_id = satusehat_id
+        self.condition_ids = condition_ids or {}
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class SATUSEHATBulkSync(object):
+    """Bulk patient and encounter sync to SATUSEHAT
+
+    Usage:
+        async with SATUSEHATClient() as client:
+            summary = await SATUSEHATBulkSync(client, organization_id).run("patients")
+    """
+
+    def __init__(
+        self,
+        client: SATUSEHATClient,
+        organization_id: Optional[str] = None,
+        concurrency: int = settings.SATUSEHAT_SYNC_CONCURRENCY,
+        requests_per_second: float = settings.SATUSEHAT_SYNC_REQUESTS_PER_SECOND,
+        page_size: int = SYNC_PAGE_SIZE,
+        session_factory: Callable = get_db_context,
+    ):
+        self.client = client
+        self.organization_id = organization_id
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.session_factory = session_factory
+        self._pacer = RequestPacer(requests_per_second)
+        self._semaphore = None  # type: Optional[asyncio.Semaphore]
+
+    async def run(self, resource_type: str, full: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Push the changed (or, with full, all) rows of a resource type
+
+        Resumes after the checkpoint of an unfinished run of the same type.
+
+        Args:
+            resource_type: "patients" or "encounters"
+            full: Push every row, not only rows changed since their last sync
+            limit: Stop after about this many rows; the run is paused and
+                the next run continues from there
+
+        Returns:
+            Run summary
+        """
+        if resource_type not in SYNC_RESOURCES:
+            raise ValueError("Unknown SATUSEHAT sync resource: {}".format(resource_type))
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.session_factory() as db:
+            checkpoint = await self._start(db, resource_type, full)
+            if checkpoint is None:
+                return {"resource_type": resource_type, "status": "skipped",
+                        "message": "Another sync of this resource is running"}
+            last_id = checkpoint.last_id
+            full = checkpoint.full_sync
+            resumed = last_id > 0
+
+        processed = 0
+        failure_count = 0
+        failures = []  # type: List[Dict[str, Any]]
+        status = "completed"
+
+        while True:
+            async with self.session_factory() as db:
+                rows = await self._load_page(db, resource_type, last_id, full)
+            if not rows:
+                break
+
+            outcomes = await asyncio.gather(*[self._push(resource_type, row) for row in rows])
+            last_id = rows[-1].id
+            processed += len(rows)
+
+            async with self.session_factory() as db:
+                await self._record(db, resource_type, outcomes)
+                await self._advance(db, resource_type, last_id, outcomes)
+
+            for outcome in outcomes:
+                if outcome.success:
+                    continue
+                failure_count += 1
+                if len(failures) < MAX_REPORTED_FAILURES:
+                    failures.append({"id": outcome.row_id, "error": outcome.error})
+
+            if limit and processed >= limit:
+                status = "paused"
+                break
+
+        async with self.session_factory() as db:
+            checkpoint = await self._finish(db, resource_type, status)
+
+        logger.info("SATUSEHAT {} sync {}: {} rows, {} failed".format(
+            resource_type, status, processed, failure_count
+        ))
+        return {
+            "resource_type": resource_type,
+            "status": status,
+            "full_sync": full,
+            "resumed": resumed,
+            "processed": processed,
+            "success_count": processed - failure_count,
+            "failure_count": failure_count,
+            "last_id": last_id,
+            "total_processed": checkpoint.processed_count,
+            "total_failure_count": checkpoint.failure_count,
+            "failures": failures,
+        }
+
+    # -------------------------------------------------------------------------
+    # Checkpoint
+    # -------------------------------------------------------------------------
+
+    async def _start(self, db: AsyncSession, resource_type: str, full: bool) -> Optional[SATUSEHATSyncCheckpoint]:
+        """Lock and reset or resume the checkpoint; None if a run is active"""
+        result = await db.execute(
+            select(SATUSEHATSyncCheckpoint)
+            .where(SATUSEHATSyncCheckpoint.resource_type == resource_type)
+            .with_for_update()
+        )
+        checkpoint = result.scalar_one_or_none()
+        now = datetime.now(timezone.utc)
+
+        if checkpoint is None:
+            checkpoint = SATUSEHATSyncCheckpoint(resource_type=resource_type)
+            db.add(checkpoint)
+        elif checkpoint.status == "running" and checkpoint.updated_at > now - timedelta(seconds=STALE_CHECKPOINT_SECONDS):
+            return None
+        elif checkpoint.status in ("running", "paused") and (checkpoint.full_sync or not full):
+            checkpoint.status = "running"
+            checkpoint.finished_at = None
+            await db.flush()
+            return checkpoint
+
+        checkpoint.status = "running"
+        checkpoint.full_sync = full
+        checkpoint.last_id = 0
+        checkpoint.processed_count = 0
+        checkpoint.success_count = 0
+        checkpoint.failure_count = 0
+        checkpoint.last_error = None
+        checkpoint.started_at = now
+        checkpoint.finished_at = None
+        await db.flush()
+        return checkpoint
+
+    async def _advance(self, db: AsyncSession, resource_type: str, last_id: int, outcomes: List[SyncOutcome]):
+        failed = [outcome for outcome in outcomes if not outcome.success]
+        values = {
+            "last_id": last_id,
+            "processed_count": SATUSEHATSyncCheckpoint.processed_count + len(outcomes),
+            "success_count": SATUSEHATSyncCheckpoint.success_count + len(outcomes) - len(failed),
+            "failure_count": SATUSEHATSyncCheckpoint.failure_count + len(failed),
+        }
+        if failed:
+            values["last_error"] = failed[-1].error
+        await db.execute(
+            update(SATUSEHATSyncCheckpoint)
+            .where(SATUSEHATSyncCheckpoint.resource_type == resource_type)
+            .values(**values)
+        )
+
+    async def _finish(self, db: AsyncSession, resource_type: str, status: str) -> SATUSEHATSyncCheckpoint:
+        result = await db.execute(
+            select(SATUSEHATSyncCheckpoint)
+            .where(SATUSEHATSyncCheckpoint.resource_type == resource_type)
+        )
+        checkpoint = result.scalar_one()
+        checkpoint.status = status
+        if status == "completed":
+            checkpoint.finished_at = datetime.now(timezone.utc)
+        await db.flush()
+        return checkpoint
+
+    # -------------------------------------------------------------------------
+    # Reading and recording
+    # -------------------------------------------------------------------------
+
+    async def _load_page(self, db: AsyncSession, resource_type: str, after_id: int, full: bool) -> List[Any]:
+        if resource_type == "patients":
+            query = select(Patient)
+            model = Patient
+        else:
+            query = select(Encounter).options(
+                selectinload(Encounter.patient),
+                selectinload(Encounter.doctor),
+                selectinload(Encounter.diagnoses),
+            )
+            model = Encounter
+
+        query = query.where(model.id > after_id)
+        if not full:
+            query = query.where(dirty_filter(model))
+        result = await db.execute(query.order_by(model.id).limit(self.page_size))
+        return list(result.scalars().all())
+
+    async def _record(self, db: AsyncSession, resource_type: str, outcomes: List[SyncOutcome]):
+        """Store SATUSEHAT IDs and synced versions of the pushed rows"""
+        synced = [outcome for outcome in outcomes if outcome.success]
+        if not synced:
+            return
+
+        if resource_type == "patients":
+            await mark_synced(db, Patient, "satusehat_patient_id", synced)
+            return
+
+        await mark_synced(db, Encounter, "satusehat_encounter_id", synced)
+        conditions = [
+            {"diagnosis_id": diagnosis_id, "satusehat_id": condition_id}
+            for outcome in synced
+            for diagnosis_id, condition_id in outcome.condition_ids.items()
+        ]
+        if conditions:
+            table = Diagnosis.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("diagnosis_id"))
+                .values(satusehat_condition_id=bindparam("satusehat_id")),
+                conditions,
+            )
+
+    # -------------------------------------------------------------------------
+    # Pushing
+    # -------------------------------------------------------------------------
+
+    async def _push(self, resource_type: str, row) -> SyncOutcome:
+        try:
+            if resource_type == "patients":
+                return await self._push_patient(row)
+            return await self._push_encounter(row)
+        except SATUSEHATError as e:
+            return SyncOutcome(row.id, error=e.message)
+        except Exception as e:
+            logger.exception("Unexpected error pushing {} {} to SATUSEHAT".format(resource_type, row.id))
+            return SyncOutcome(row.id, error=str(e))
+
+    async def _push_patient(self, patient: Patient) -> SyncOutcome:
+        resource = build_fhir_patient_resource(patient, self.organization_id)
+        if patient.satusehat_patient_id:
+            resource["id"] = patient.satusehat_patient_id
+            result = await self._request("PUT", "Patient", patient.satusehat_patient_id, resource)
+        else:
+            result = await self._request("POST", "Patient", None, resource)
+        return SyncOutcome(patient.id, patient.updated_at, result.get("id") or patient.satusehat_patient_id)
+
+    async def _push_encounter(self, encounter: Encounter) -> SyncOutcome:
+        if not encounter.patient or not encounter.patient.satusehat_patient_id:
+            return SyncOutcome(encounter.id, error="Patient must be synced to SATUSEHAT first")
+
+        diagnoses = list(encounter.diagnoses)
+        bundle = build_encounter_bundle(
+            encounter, encounter.patient, encounter.doctor, diagnoses, self.organization_id
+        )
+        ids = bundle_resource_ids(await self._request("POST", "", None, bundle))
+        if not ids or not (ids[0] or encounter.satusehat_encounter_id):
+            return SyncOutcome(encounter.id, error="Transaction response has no Encounter ID")
+
+        condition_ids = {}
+        for diagnosis, condition_id in zip(diagnoses, ids[1:]):
+            if condition_id and condition_id != diagnosis.satusehat_condition_id:
+                condition_ids[diagnosis.id] = condition_id
+        return SyncOutcome(
+            encounter.id,
+            encounter.updated_at,
+            ids[0] or encounter.satusehat_encounter_id,
+            condition_ids,
+        )
+
+    async def _request(self, method: str, resource_type: str, resource_id: Optional[str], data: Dict[str, Any]):
+        """FHIR request within the concurrency and rate limits"""
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            async with self._semaphore:
+                await self._pacer.wait()
+                try:
+                    return await self.client._make_fhir_request(
+                        method, resource_type, resource_id=resource_id, data=data
+                    )
+                except SATUSEHATError as e:
+                    if e.code != "429" or attempt == RATE_LIMIT_RETRIES:
+                        raise
+            await asyncio.sleep(RATE_LIMIT_BACKOFF_SECONDS * (2 ** attempt))
+
+
+async def mark_synced(db: AsyncSession, model, id_column: str, outcomes: List[SyncOutcome]):
+    """Store SATUSEHAT IDs and mark the pushed versions as synced
+
+    updated_at is kept as is, so recording the sync does not make the row
+    look changed again; a row edited while it was being pushed stays dirty
+    because its updated_at is newer than the version pushed.
+
+    Args:
+        db: Database session
+        model: Patient or Encounter
+        id_column: Column holding the SATUSEHAT resource ID
+        outcomes: Successful sync outcomes
+    """
+    table = model.__table__
+    await db.execute(
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(**{
+            id_column: bindparam("satusehat_id"),
+            "satusehat_synced_at": bindparam("version"),
+            "updated_at": table.c.updated_at,
+        }),
+        [
+            {"row_id": outcome.row_id, "satusehat_id": outcome.satusehat_id, "version": outcome.version}
+            for outcome in outcomes
+        ],
+    )
+
+
+def create_satusehat_bulk_sync(
+    client: SATUSEHATClient,
+    organization_id: Optional[str] = None,
+) -> SATUSEHATBulkSync:
+    """Create SATUSEHAT bulk sync instance"""
+    return SATUSEHATBulkSync(client, organization_id or settings.SATUSEHAT_ORGANIZATION_ID or None)
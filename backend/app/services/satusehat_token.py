@@ -0,0 +1,220 @@
+"""SATUSEHAT OAuth Token Manager
+
+This module keeps SATUSEHAT access tokens in one cache shared by every
+SATUSEHATClient, so short-lived clients (patient, encounter and condition
+sync, API endpoints) stop requesting a new token per call:
+- Tokens are kept in process memory and in Redis, shared across workers
+- A token is refreshed TOKEN_REFRESH_MARGIN_SECONDS before it expires
+- Only one refresh runs at a time: an asyncio lock within the process and
+  a Redis lock across workers; while a refresh runs, callers holding a
+  token that has not expired yet keep using it
+- Redis errors fall back to the in-process cache
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Optional, Callable, Awaitable, Tuple
+
+from app.core.metrics import satusehat_token_refreshes_total, satusehat_token_requests_total
+from app.db.redis import get_redis_client
+
+
+logger = logging.getLogger(__name__)
+
+
+# Refresh tokens expiring within this many seconds
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Expiry of the cross-worker refresh lock
+TOKEN_LOCK_TTL_SECONDS = 15
+
+# How long a worker waits for another worker's refresh before fetching itself
+TOKEN_LOCK_WAIT_SECONDS = 10
+
+TOKEN_LOCK_POLL_SECONDS = 0.1
+
+# Deletes the refresh lock only if this worker still holds it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def token_cache_key(client_id: str, auth_url: str) -> str:
+    """Cache key of the token of one set of SATUSEHAT credentials"""
+    digest = hashlib.sha1("{}|{}".format(auth_url, client_id).encode("utf-8")).hexdigest()
+    return "satusehat:token:{}".format(digest[:16])
+
+
+class CachedToken(object):
+    """Access token with its absolute expiry (epoch seconds)"""
+
+    def __init__(self, access_token: str, expires_at: float):
+        self.access_token = access_token
+        self.expires_at = expires_at
+
+    def remaining(self) -> float:
+        """Seconds until the token expires"""
+        return self.expires_at - time.time()
+
+    def to_json(self) -> str:
+        return json.dumps({"access_token": self.access_token, "expires_at": self.expires_at})
+
+    @classmethod
+    def from_json(cls, payload: str) -> "CachedToken":
+        data = json.loads(payload)
+        return cls(data["access_token"], float(data["expires_at"]))
+
+
+class SATUSEHATTokenManager(object):
+    """Process-wide, Redis-backed SATUSEHAT token cache with single-flight refresh"""
+
+    def __init__(self, refresh_margin: float = TOKEN_REFRESH_MARGIN_SECONDS):
+        self.refresh_margin = refresh_margin
+        self._tokens = {}  # type: Dict[str, CachedToken]
+        self._locks = {}  # type: Dict[str, asyncio.Lock]
+
+    async def get_token(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Tuple[str, float]]],
+    ) -> CachedToken:
+        """Return a valid token, refreshing it if it is about to expire
+
+        Args:
+            key: Cache key (see token_cache_key)
+            fetch: Coroutine function requesting a new token from
+                SATUSEHAT, returning (access_token, expires_in seconds)
+
+        Returns:
+            CachedToken
+
+        Raises:
+            Whatever fetch raises when a refresh fails
+        """
+        token = self._tokens.get(key)
+        if token is not None and token.remaining() > self.refresh_margin:
+            satusehat_token_requests_total.labels(source="memory").inc()
+            return token
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        if token is not None and token.remaining() > 0 and lock.locked():
+            # Another coroutine is refreshing; this token is still valid
+            satusehat_token_requests_total.labels(source="memory").inc()
+            return token
+
+        async with lock:
+            token = self._tokens.get(key)
+            if token is not None and token.remaining() > self.refresh_margin:
+                satusehat_token_requests_total.labels(source="memory").inc()
+                return token
+
+            token = await self._read_shared(key)
+            if token is None:
+                token = await self._refresh(key, fetch)
+            else:
+                satusehat_token_requests_total.labels(source="redis").inc()
+
+            self._tokens[key] = token
+            return token
+
+    async def invalidate(self, key: str, access_token: Optional[str] = None):
+        """Drop a cached token, e.g. after SATUSEHAT rejected it
+
+        Args:
+            key: Cache key
+            access_token: Only drop the token if it is this one, so a token
+                another worker already replaced is kept
+        """
+        token = self._tokens.get(key)
+        if token is not None and (access_token is None or token.access_token == access_token):
+            del self._tokens[key]
+
+        try:
+            redis = get_redis_client()
+            payload = await redis.get(key)
+            if payload and (access_token is None or CachedToken.from_json(payload).access_token == access_token):
+                await redis.delete(key)
+        except Exception as e:
+            logger.warning("Could not invalidate shared SATUSEHAT token: {}".format(e))
+
+    async def _read_shared(self, key: str) -> Optional[CachedToken]:
+        """Token from Redis if it is not about to expire"""
+        try:
+            payload = await get_redis_client().get(key)
+        except Exception as e:
+            logger.debug("SATUSEHAT token cache unavailable: {}".format(e))
+            return None
+        if not payload:
+            return None
+        token = CachedToken.from_json(payload)
+        return token if token.remaining() > self.refresh_margin else None
+
+    async def _refresh(self, key: str, fetch) -> CachedToken:
+        """Fetch a new token, letting only one worker fetch at a time"""
+        lock_key = "{}:lock".format(key)
+        owner = uuid.uuid4().hex
+        try:
+            acquired = await get_redis_client().set(lock_key, owner, nx=True, ex=TOKEN_LOCK_TTL_SECONDS)
+        except Exception as e:
+            logger.warning("SATUSEHAT token lock unavailable, refreshing locally: {}".format(e))
+            return await self._fetch(fetch)
+
+        if not acquired:
+            token = await self._wait_for_shared(key)
+            if token is not None:
+                satusehat_token_requests_total.labels(source="redis").inc()
+                return token
+            logger.warning("Timed out waiting for another worker's SATUSEHAT token refresh")
+
+        try:
+            token = await self._fetch(fetch)
+            await self._write_shared(key, token)
+            return token
+        finally:
+            if acquired:
+                try:
+                    await get_redis_client().eval(RELEASE_LOCK_SCRIPT, 1, lock_key, owner)
+                except Exception as e:
+                    logger.warning("Could not release SATUSEHAT token lock: {}".format(e))
+
+    async def _wait_for_shared(self, key: str) -> Optional[CachedToken]:
+        """Wait for the worker holding the refresh lock to publish its token"""
+        deadline = time.monotonic() + TOKEN_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(TOKEN_LOCK_POLL_SECONDS)
+            token = await self._read_shared(key)
+            if token is not None:
+                return token
+        return None
+
+    async def _fetch(self, fetch) -> CachedToken:
+        try:
+            access_token, expires_in = await fetch()
+        except Exception:
+            satusehat_token_refreshes_total.labels(status="failure").inc()
+            raise
+        satusehat_token_refreshes_total.labels(status="success").inc()
+        satusehat_token_requests_total.labels(source="refresh").inc()
+        return CachedToken(access_token, time.time() + float(expires_in))
+
+    async def _write_shared(self, key: str, token: CachedToken):
+        ttl = int(token.remaining())
+        if ttl <= 0:
+            return
+        try:
+            await get_redis_client().set(key, token.to_json(), ex=ttl)
+        except Exception as e:
+            logger.warning("Could not share SATUSEHAT token: {}".format(e))
+
+
+# Process-wide token cache used by every SATUSEHATClient
+satusehat_token_manager = SATUSEHATTokenManager()
@@ -0,0 +1,328 @@
+"""Sequence Allocation Service for document numbers
+
+This module provides one shared allocator for:
+- Medical record numbers (MRN)
+- Invoice numbers
+- BPJS claim numbers
+- Appointment numbers
+- Queue ticket numbers
+- Stock transaction numbers
+
+Numbers come from the number_sequences counter table. Each allocation is a
+single INSERT ... ON CONFLICT DO UPDATE ... RETURNING on a short-lived
+session of its own, so the counter row lock is released immediately instead
+of being held until the caller's transaction commits. Sequences with a
+block size above one reserve a block of values per worker process and hand
+them out from memory, so most allocations do not touch the database.
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import logging
+from datetime import date
+from typing import Optional, Dict, Tuple, List, Callable, Awaitable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.session import AsyncSessionLocal
+from app.models.number_sequence import NumberSequence
+
+
+logger = logging.getLogger(__name__)
+
+
+class SequenceReset(object):
+    """Sequence reset period constants"""
+    NEVER = "never"
+    YEARLY = "yearly"
+    DAILY = "daily"
+
+
+class SequenceSpec(object):
+    """Configuration of a named sequence
+
+    Args:
+        name: Sequence name
+        reset: Reset period (SequenceReset)
+        block_size: Values reserved per database round-trip. Values above
+            one leave gaps on restart and are not strictly ordered across
+            workers, so keep 1 where numbers are called out in order.
+        seed: Optional coroutine (session, on_date, department) returning
+            the highest number already in use, run once when a scope row is
+            first created
+    """
+
+    def __init__(
+        self,
+        name: str,
+        reset: str = SequenceReset.YEARLY,
+        block_size: int = 1,
+        seed: Optional[Callable[[AsyncSession, date, Optional[str]], Awaitable[int]]] = None,
+    ):
+        self.name = name
+        self.reset = reset
+        self.block_size = block_size
+        self.seed = seed
+
+
+def _parse_sequence(number: Optional[str], separator: str = "-") -> int:
+    """Parse the trailing numeric part of a document number"""
+    if not number:
+        return 0
+    try:
+        return int(number.split(separator)[-1])
+    except ValueError:
+        return 0
+
+
+async def _max_number(session: AsyncSession, column, pattern: str, *criteria) -> Optional[str]:
+    """Highest existing number matching a LIKE pattern"""
+    query = select(func.max(column)).where(and_(column.like(pattern), *criteria))
+    result = await session.execute(query)
+    return result.scalar()
+
+
+async def _seed_patient_mrn(session: AsyncSession, on_date: date, department: Optional[str]) -> int:
+    """Highest MRN sequence in use this year (RM-YYYY-NNNNN and RMYYYYNNNNNN formats)"""
+    from app.models.patient import Patient
+
+    year = on_date.year
+    dashed = await _max_number(session, Patient.medical_record_number, "RM-{}-%".format(year))
+    compact = await _max_number(session, Patient.medical_record_number, "RM{}%".format(year))
+
+    compact_sequence = 0
+    if compact:
+        try:
+            compact_sequence = int(compact[-6:])
+        except ValueError:
+            pass
+
+    return max(_parse_sequence(dashed), compact_sequence)
+
+
+async def _seed_invoice(session: AsyncSession, on_date: date, department: Optional[str]) -> int:
+    """Highest invoice sequence in use this year"""
+    from app.models.billing import Invoice
+
+    last = await _max_number(session, Invoice.invoice_number, "INV-{}-%".format(on_date.year))
+    return _parse_sequence(last)
+
+
+async def _seed_bpjs_claim(session: AsyncSession, on_date: date, department: Optional[str]) -> int:
+    """Highest claim sequence in use this year"""
+    from app.models.bpjs_claims import BPJSClaim
+
+    last = await _max_number(session, BPJSClaim.claim_number, "CLAIM-{}-%".format(on_date.year))
+    return _parse_sequence(last)
+
+
+async def _seed_appointment(session: AsyncSession, on_date: date, department: Optional[str]) -> int:
+    """Highest appointment sequence in use today"""
+    from app.models.appointments import Appointment
+
+    pattern = "APT-{}-%".format(on_date.strftime("%Y%m%d"))
+    last = await _max_number(session, Appointment.appointment_number, pattern)
+    return _parse_sequence(last)
+
+
+async def _seed_queue_ticket(session: AsyncSession, on_date: date, department: Optional[str]) -> int:
+    """Highest ticket sequence in use today for the department"""
+    from app.models.queue import QueueTicket
+    from app.schemas.queue import QueueDepartment
+
+    query = select(QueueTicket.ticket_number).where(
+        and_(
+            QueueTicket.department == QueueDepartment(department),
+            QueueTicket.date == on_date,
+        )
+    )
+    result = await session.execute(query)
+    return max([_parse_sequence(number) for number in result.scalars().all()] or [0])
+
+
+async def _seed_stock_transaction(session: AsyncSession, on_date: date, department: Optional[str]) -> int:
+    """Highest stock transaction sequence in use today"""
+    from app.models.inventory import StockTransaction
+
+    pattern = "TXN-{}-%".format(on_date.strftime("%Y%m%d"))
+    last = await _max_number(session, StockTransaction.transaction_number, pattern)
+    return _parse_sequence(last)
+
+
+# Sequence registry
+SEQUENCES = {
+    "patient_mrn": SequenceSpec("patient_mrn", SequenceReset.YEARLY, block_size=20, seed=_seed_patient_mrn),
+    "invoice": SequenceSpec("invoice", SequenceReset.YEARLY, block_size=1, seed=_seed_invoice),
+    "bpjs_claim": SequenceSpec("bpjs_claim", SequenceReset.YEARLY, block_size=1, seed=_seed_bpjs_claim),
+    "appointment": SequenceSpec("appointment", SequenceReset.DAILY, block_size=10, seed=_seed_appointment),
+    "queue_ticket": SequenceSpec("queue_ticket", SequenceReset.DAILY, block_size=1, seed=_seed_queue_ticket),
+    "stock_transaction": SequenceSpec("stock_transaction", SequenceReset.DAILY, block_size=20, seed=_seed_stock_transaction),
+}
+
+
+class SequenceAllocator(object):
+    """Allocates numbers from the number_sequences counter table
+
+    Keeps one reserved block per (sequence, scope) in memory and refills it
+    with one atomic upsert when exhausted. An asyncio lock per key keeps
+    concurrent coroutines in the same worker from taking the same value;
+    the database upsert keeps workers from overlapping.
+    """
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._blocks = {}  # type: Dict[Tuple[str, str], List[int]]
+        self._locks = {}  # type: Dict[Tuple[str, str], asyncio.Lock]
+
+    @staticmethod
+    def scope_for(spec: SequenceSpec, on_date: date, department: Optional[str] = None) -> str:
+        """Build the reset scope key for a sequence
+
+        Args:
+            spec: Sequence configuration
+            on_date: Date the number is allocated for
+            department: Optional department for per-department sequences
+
+        Returns:
+            Scope string (e.g. "2026", "20260116:poli")
+        """
+        if spec.reset == SequenceReset.YEARLY:
+            period = on_date.strftime("%Y")
+        elif spec.reset == SequenceReset.DAILY:
+            period = on_date.strftime("%Y%m%d")
+        else:
+            period = "all"
+
+        if department:
+            return "{}:{}".format(period, department)
+        return period
+
+    async def next_value(
+        self,
+        name: str,
+        on_date: Optional[date] = None,
+        department: Optional[str] = None,
+    ) -> int:
+        """Allocate the next value of a sequence
+
+        Args:
+            name: Sequence name (key of SEQUENCES)
+            on_date: Date for the reset period (defaults to today)
+            department: Optional department for per-department sequences
+
+        Returns:
+            Allocated sequence value
+
+        Raises:
+            ValueError: If the sequence is not registered
+        """
+        spec = SEQUENCES.get(name)
+        if spec is None:
+            raise ValueError("Unknown sequence: {}".format(name))
+
+        on_date = on_date or date.today()
+        scope = self.scope_for(spec, on_date, department)
+        key = (name, scope)
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            block = self._blocks.get(key)
+            if block is None or block[0] > block[1]:
+                end = await self._reserve_block(spec, scope, on_date, department)
+                block = [end - spec.block_size + 1, end]
+                self._drop_stale_scopes(name, scope)
+                self._blocks[key] = block
+
+            value = block[0]
+            block[0] += 1
+            return value
+
+    async def _reserve_block(
+        self,
+        spec: SequenceSpec,
+        scope: str,
+        on_date: date,
+        department: Optional[str],
+    ) -> int:
+        """Reserve the next block of values in the database
+
+        Args:
+            spec: Sequence configuration
+            scope: Reset scope key
+            on_date: Date for the reset period
+            department: Optional department
+
+        Returns:
+            Last value of the reserved block
+        """
+        async with self._session_factory() as session:
+            if spec.seed is not None:
+                exists = await session.execute(
+                    select(NumberSequence.id).where(
+                        and_(NumberSequence.name == spec.name, NumberSequence.scope == scope)
+                    )
+                )
+                if exists.scalar_one_or_none() is None:
+                    start = await spec.seed(session, on_date, department)
+                    await session.execute(
+                        pg_insert(NumberSequence)
+                        .values(name=spec.name, scope=scope, last_value=start)
+                        .on_conflict_do_nothing(index_elements=["name", "scope"])
+                    )
+
+            stmt = (
+                pg_insert(NumberSequence)
+                .values(name=spec.name, scope=scope, last_value=spec.block_size)
+                .on_conflict_do_update(
+                    index_elements=["name", "scope"],
+                    set_={
+                        "last_value": NumberSequence.last_value + spec.block_size,
+                        "updated_at": func.now(),
+                    },
+                )
+                .returning(NumberSequence.last_value)
+            )
+            result = await session.execute(stmt)
+            end = result.scalar_one()
+            await session.commit()
+
+        logger.debug("Reserved {} block ending at {} for scope {}".format(spec.name, end, scope))
+        return end
+
+    def _drop_stale_scopes(self, name: str, current_scope: str):
+        """Forget in-memory blocks of earlier periods for a sequence"""
+        period = current_scope.split(":")[0]
+        stale = [
+            key for key in self._blocks
+            if key[0] == name and key[1].split(":")[0] != period
+        ]
+        for key in stale:
+            del self._blocks[key]
+            self._locks.pop(key, None)
+
+
+# Process-wide allocator
+sequence_allocator = SequenceAllocator()
+
+
+async def allocate_number(
+    name: str,
+    on_date: Optional[date] = None,
+    department: Optional[str] = None,
+) -> int:
+    """Allocate the next value of a registered sequence
+
+    Args:
+        name: Sequence name (key of SEQUENCES)
+        on_date: Date for the reset period (defaults to today)
+        department: Optional department for per-department sequences
+
+    Returns:
+        Allocated sequence value
+    """
+    return await sequence_allocator.next_value(name, on_date=on_date, department=department)
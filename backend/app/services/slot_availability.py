@@ -0,0 +1,449 @@
+"""Slot Availability Engine for appointment booking
+
+This module provides:
+- Per doctor/day busy bitmaps (one bit per minute of the day)
+- Free slot calculation for a single day or a date range in one pass
+- Department-wide availability for every doctor at once
+- A short-lived in-process cache invalidated on book, cancel and reschedule
+
+Appointments and slot configuration for the whole requested range are
+loaded with one query each; every candidate slot is then checked against
+the bitmap with a single AND instead of scanning the appointments.
+
+Double booking of a doctor is prevented by the ex_appointments_doctor_overlap
+exclusion constraint, not by this engine. Cached availability may lag other
+workers by up to AVAILABILITY_CACHE_TTL_SECONDS.
+
+Python 3.5+ compatible
+"""
+
+import logging
+import time as _time
+from datetime import date, time, timedelta
+from typing import Optional, List, Dict, Tuple, Iterable
+
+from sqlalchemy import select, and_, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.appointments import Appointment, AppointmentSlot, AppointmentStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+# Statuses that occupy a doctor's time
+ACTIVE_APPOINTMENT_STATUSES = [
+    AppointmentStatus.SCHEDULED,
+    AppointmentStatus.CONFIRMED,
+    AppointmentStatus.CHECKED_IN,
+]
+
+# Name of the exclusion constraint on appointments
+DOCTOR_OVERLAP_CONSTRAINT = "ex_appointments_doctor_overlap"
+
+MINUTES_PER_DAY = 24 * 60
+
+# Default working hours and slot length when no slots are configured
+DEFAULT_DAY_START = time(hour=8)
+DEFAULT_DAY_END = time(hour=17)
+DEFAULT_SLOT_MINUTES = 30
+
+AVAILABILITY_CACHE_TTL_SECONDS = 30
+
+# Session.info key collecting (department_id, date) pairs to invalidate
+PENDING_INVALIDATION_KEY = "slot_availability_invalidate"
+
+
+def minute_of_day(value: time) -> int:
+    """Minutes since midnight of a time value"""
+    return value.hour * 60 + value.minute
+
+
+def time_of_minute(minute: int) -> time:
+    """Time value of a minute of the day"""
+    minute = min(max(minute, 0), MINUTES_PER_DAY - 1)
+    return time(hour=minute // 60, minute=minute % 60)
+
+
+def interval_mask(start_minute: int, end_minute: int) -> int:
+    """Bit mask covering minutes [start_minute, end_minute) of a day"""
+    start_minute = max(start_minute, 0)
+    end_minute = min(end_minute, MINUTES_PER_DAY)
+    if end_minute <= start_minute:
+        return 0
+    return ((1 << (end_minute - start_minute)) - 1) << start_minute
+
+
+class DayBitmap(object):
+    """Busy minutes of one doctor (or a whole department) on one day"""
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    def add(self, start_minute: int, end_minute: int):
+        """Mark minutes [start_minute, end_minute) as busy"""
+        self.bits |= interval_mask(start_minute, end_minute)
+
+    def is_free(self, start_minute: int, end_minute: int) -> bool:
+        """Whether no minute of [start_minute, end_minute) is busy"""
+        return not (self.bits & interval_mask(start_minute, end_minute))
+
+
+def default_slots() -> List[Tuple[int, int]]:
+    """Default slots as (start_minute, end_minute) pairs"""
+    start = minute_of_day(DEFAULT_DAY_START)
+    end = minute_of_day(DEFAULT_DAY_END)
+    return [
+        (minute, minute + DEFAULT_SLOT_MINUTES)
+        for minute in range(start, end, DEFAULT_SLOT_MINUTES)
+    ]
+
+
+class DayIndex(object):
+    """Busy bitmaps and configured slots of one department on one day
+
+    Args:
+        busy: Busy bitmap per doctor ID (None for appointments without doctor)
+        slots: Configured (start_minute, end_minute) slots per doctor ID
+            (None for department-level slots)
+    """
+
+    def __init__(
+        self,
+        busy: Optional[Dict[Optional[int], DayBitmap]] = None,
+        slots: Optional[Dict[Optional[int], List[Tuple[int, int]]]] = None,
+    ):
+        self.busy = busy or {}
+        self.slots = slots or {}
+        self._department_busy = None  # type: Optional[DayBitmap]
+
+    def doctor_ids(self) -> List[int]:
+        """Doctors with configured slots or appointments on this day"""
+        ids = set(self.busy) | set(self.slots)
+        ids.discard(None)
+        return sorted(ids)
+
+    def busy_for(self, doctor_id: Optional[int]) -> DayBitmap:
+        """Busy bitmap of a doctor, or of the whole department for None"""
+        if doctor_id:
+            return self.busy.get(doctor_id) or DayBitmap()
+
+        if self._department_busy is None:
+            bits = 0
+            for bitmap in self.busy.values():
+                bits |= bitmap.bits
+            self._department_busy = DayBitmap(bits)
+        return self._department_busy
+
+    def free_slots(self, doctor_id: Optional[int]) -> List[Dict[str, any]]:
+        """Free slots of a doctor (or department-level slots for None)
+
+        Args:
+            doctor_id: Doctor ID or None
+
+        Returns:
+            List of free slots in the booking API format
+        """
+        busy = self.busy_for(doctor_id)
+        candidates = self.slots.get(doctor_id) or default_slots()
+
+        return [
+            {
+                "start_time": time_of_minute(start).strftime("%H:%M"),
+                "end_time": time_of_minute(end % MINUTES_PER_DAY).strftime("%H:%M"),
+                "available": True,
+            }
+            for start, end in candidates
+            if busy.is_free(start, end)
+        ]
+
+
+class AvailabilityCache(object):
+    """In-process cache of DayIndex per (department, day)"""
+
+    def __init__(self, ttl_seconds: float = AVAILABILITY_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # type: Dict[Tuple[int, date], Tuple[float, DayIndex]]
+
+    def get(self, department_id: int, day: date) -> Optional[DayIndex]:
+        """Cached index of a department day, or None if missing or expired"""
+        entry = self._entries.get((department_id, day))
+        if entry is None:
+            return None
+        if entry[0] < _time.monotonic():
+            self._entries.pop((department_id, day), None)
+            return None
+        return entry[1]
+
+    def set(self, department_id: int, day: date, index: DayIndex):
+        """Cache the index of a department day"""
+        now = _time.monotonic()
+        if len(self._entries) > 10000:
+            self._entries = dict(
+                (key, entry) for key, entry in self._entries.items() if entry[0] >= now
+            )
+        self._entries[(department_id, day)] = (now + self.ttl_seconds, index)
+
+    def invalidate(self, department_id: int, day: date):
+        """Drop the cached index of a department day"""
+        self._entries.pop((department_id, day), None)
+
+    def invalidate_after_commit(self, db: AsyncSession, department_id: int, days: Iterable[date]):
+        """Invalidate department days now and again once the session commits
+
+        The second invalidation drops indexes rebuilt from pre-commit data
+        by concurrent requests in the meantime.
+
+        Args:
+            db: Session the appointment change is made in
+            department_id: Department ID
+            days: Affected appointment dates
+        """
+        pending = db.info.setdefault(PENDING_INVALIDATION_KEY, set())
+        if not pending:
+            event.listen(db.sync_session, "after_commit", self._on_commit, once=True)
+
+        for day in days:
+            if day is None:
+                continue
+            self.invalidate(department_id, day)
+            pending.add((department_id, day))
+
+    def _on_commit(self, session):
+        """after_commit hook: drop the changed department days"""
+        for department_id, day in session.info.pop(PENDING_INVALIDATION_KEY, set()):
+            self.invalidate(department_id, day)
+
+
+# Process-wide availability cache
+availability_cache = AvailabilityCache()
+
+
+class SlotAvailabilityEngine(object):
+    """Computes free appointment slots from bitmaps built once per day"""
+
+    def __init__(self, db: AsyncSession, cache: Optional[AvailabilityCache] = None):
+        self.db = db
+        self.cache = cache or availability_cache
+
+    async def get_free_slots(
+        self,
+        department_id: int,
+        doctor_id: Optional[int],
+        appointment_date: date,
+    ) -> List[Dict[str, any]]:
+        """Free slots of a doctor (or department) on one day
+
+        Args:
+            department_id: Department ID
+            doctor_id: Doctor ID (None for department-level slots)
+            appointment_date: Appointment date
+
+        Returns:
+            List of free time slots
+        """
+        indexes = await self._load_days(department_id, appointment_date, 1)
+        return indexes[appointment_date].free_slots(doctor_id)
+
+    async def get_availability(
+        self,
+        department_id: int,
+        doctor_id: Optional[int],
+        start_date: date,
+        days: int = 14,
+    ) -> Dict[date, List[Dict[str, any]]]:
+        """Free slots of a doctor (or department) for a date range
+
+        Args:
+            department_id: Department ID
+            doctor_id: Doctor ID (None for department-level slots)
+            start_date: First date
+            days: Number of days
+
+        Returns:
+            Free slots per date
+        """
+        indexes = await self._load_days(department_id, start_date, days)
+        return dict((day, index.free_slots(doctor_id)) for day, index in indexes.items())
+
+    async def get_department_availability(
+        self,
+        department_id: int,
+        start_date: date,
+        days: int = 14,
+    ) -> Dict[Optional[int], Dict[date, List[Dict[str, any]]]]:
+        """Free slots of every doctor of a department for a date range
+
+        Args:
+            department_id: Department ID
+            start_date: First date
+            days: Number of days
+
+        Returns:
+            Free slots per doctor ID, then per date; key None holds the
+            department-level slots
+        """
+        indexes = await self._load_days(department_id, start_date, days)
+
+        doctor_ids = set()
+        for index in indexes.values():
+            doctor_ids.update(index.doctor_ids())
+
+        availability = {}
+        for doctor_id in [None] + sorted(doctor_ids):
+            availability[doctor_id] = dict(
+                (day, index.free_slots(doctor_id)) for day, index in indexes.items()
+            )
+        return availability
+
+    async def is_available(
+        self,
+        department_id: int,
+        doctor_id: Optional[int],
+        appointment_date: date,
+        appointment_time: time,
+        duration_minutes: int,
+        exclude_appointment_id: Optional[int] = None,
+    ) -> bool:
+        """Check a requested time against current appointments (uncached)
+
+        Args:
+            department_id: Department ID
+            doctor_id: Doctor ID (None checks the whole department)
+            appointment_date: Appointment date
+            appointment_time: Appointment time
+            duration_minutes: Duration in minutes
+            exclude_appointment_id: Appointment ID to ignore (rescheduling)
+
+        Returns:
+            True if no active appointment overlaps
+        """
+        start = minute_of_day(appointment_time)
+        end = start + duration_minutes
+
+        filters = [
+            Appointment.department_id == department_id,
+            Appointment.appointment_date == appointment_date,
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+        ]
+        if end < MINUTES_PER_DAY:
+            # Only appointments starting before the requested end can overlap
+            filters.append(Appointment.appointment_time < time_of_minute(end))
+        if doctor_id:
+            filters.append(Appointment.doctor_id == doctor_id)
+        if exclude_appointment_id:
+            filters.append(Appointment.id != exclude_appointment_id)
+
+        query = select(
+            Appointment.appointment_time,
+            Appointment.duration_minutes,
+        ).where(and_(*filters))
+
+        result = await self.db.execute(query)
+        busy = DayBitmap()
+        for row in result:
+            busy.add(*self._appointment_minutes(row))
+        return busy.is_free(start, end)
+
+    async def _load_days(
+        self,
+        department_id: int,
+        start_date: date,
+        days: int,
+    ) -> Dict[date, DayIndex]:
+        """Get DayIndex per date, loading uncached dates with one query each"""
+        dates = [start_date + timedelta(days=offset) for offset in range(days)]
+
+        indexes = {}
+        missing = []
+        for day in dates:
+            index = self.cache.get(department_id, day)
+            if index is None:
+                missing.append(day)
+            else:
+                indexes[day] = index
+
+        if missing:
+            loaded = await self._build_days(department_id, missing[0], missing[-1])
+            for day in missing:
+                index = loaded.get(day) or DayIndex()
+                self.cache.set(department_id, day, index)
+                indexes[day] = index
+
+        return indexes
+
+    async def _build_days(
+        self,
+        department_id: int,
+        first_date: date,
+        last_date: date,
+    ) -> Dict[date, DayIndex]:
+        """Build DayIndex for every date in [first_date, last_date]"""
+        indexes = {}
+
+        def index_for(day):
+            index = indexes.get(day)
+            if index is None:
+                index = indexes[day] = DayIndex()
+            return index
+
+        appointments = await self.db.execute(
+            select(
+                Appointment.doctor_id,
+                Appointment.appointment_date,
+                Appointment.appointment_time,
+                Appointment.duration_minutes,
+            ).where(
+                and_(
+                    Appointment.department_id == department_id,
+                    Appointment.appointment_date >= first_date,
+                    Appointment.appointment_date <= last_date,
+                    Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+                )
+            )
+        )
+        for row in appointments:
+            busy = index_for(row.appointment_date).busy
+            bitmap = busy.get(row.doctor_id)
+            if bitmap is None:
+                bitmap = busy[row.doctor_id] = DayBitmap()
+            bitmap.add(*self._appointment_minutes(row))
+
+        slots = await self.db.execute(
+            select(
+                AppointmentSlot.doctor_id,
+                AppointmentSlot.date,
+                AppointmentSlot.start_time,
+                AppointmentSlot.end_time,
+            ).where(
+                and_(
+                    AppointmentSlot.department_id == department_id,
+                    AppointmentSlot.date >= first_date,
+                    AppointmentSlot.date <= last_date,
+                    AppointmentSlot.is_available == True,
+                    AppointmentSlot.is_blocked == False,
+                )
+            ).order_by(AppointmentSlot.date, AppointmentSlot.start_time)
+        )
+        for row in slots:
+            configured = index_for(row.date).slots.setdefault(row.doctor_id, [])
+            configured.append((minute_of_day(row.start_time), minute_of_day(row.end_time)))
+
+        return indexes
+
+    @staticmethod
+    def _appointment_minutes(row) -> Tuple[int, int]:
+        """(start_minute, end_minute) of an appointment row
+
+        Uses duration_minutes, like ex_appointments_doctor_overlap, so the
+        engine and the constraint agree on what overlaps.
+        """
+        start = minute_of_day(row.appointment_time)
+        return start, start + (row.duration_minutes or DEFAULT_SLOT_MINUTES)
+
+
+def get_slot_availability_engine(db: AsyncSession) -> SlotAvailabilityEngine:
+    """Get slot availability engine"""
+    return SlotAvailabilityEngine(db)
@@ -0,0 +1,398 @@
+"""System Metrics Sampler for STORY-005: System Monitoring
+
+This module samples host metrics in the background instead of on request:
+- Each sample is read in a worker thread with non-blocking psutil calls;
+  cpu_percent(interval=None) measures the CPU since the previous sample
+- The last MONITORING_BUFFER_SAMPLES values of every metric are kept in a
+  fixed-size ring buffer, which serves the monitoring endpoints
+- Every sample updates the Prometheus gauges of app.core.metrics
+- Only 1 minute and 1 hour rollups (average, min, max) are written to
+  system_metrics, as multi-row INSERTs every MONITORING_FLUSH_INTERVAL_SECONDS
+
+Rollup rows get a metric_id derived from host, interval, metric and bucket,
+so API workers sampling the same host write each rollup only once.
+
+Python 3.5+ compatible
+"""
+
+import asyncio
+import collections
+import hashlib
+import logging
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Tuple, Iterable
+
+import psutil
+
+from app.core.config import settings
+from app.core.metrics import (
+    disk_usage_bytes,
+    memory_usage_bytes,
+    system_cpu_usage_percent,
+    system_metric_rollups_total,
+    system_network_bytes,
+    system_process_count,
+)
+from app.models.system_monitoring import SystemMetric, MetricType, MetricUnit
+
+
+logger = logging.getLogger(__name__)
+
+
+# Sampled metrics: unit and tags of each
+SYSTEM_METRICS = collections.OrderedDict([
+    ("cpu.usage", (MetricUnit.PERCENT, {"type": "cpu"})),
+    ("memory.usage", (MetricUnit.PERCENT, {"type": "memory"})),
+    ("memory.available", (MetricUnit.BYTES, {"type": "memory"})),
+    ("disk.usage", (MetricUnit.PERCENT, {"type": "disk", "path": "/"})),
+    ("disk.free", (MetricUnit.BYTES, {"type": "disk", "path": "/"})),
+    ("network.bytes_sent", (MetricUnit.BYTES, {"type": "network"})),
+    ("network.bytes_recv", (MetricUnit.BYTES, {"type": "network"})),
+    ("system.process_count", (MetricUnit.COUNT, {"type": "system"})),
+])
+
+# Rollup intervals persisted to system_metrics
+ROLLUP_INTERVALS = ("minute", "hour")
+
+# Rows per INSERT, and closed rollups kept while the database is unreachable
+ROLLUP_BATCH_SIZE = 500
+MAX_PENDING_ROLLUPS = 10000
+
+
+def naive_utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """A timestamp as naive UTC, the form samples and rollups are stored in"""
+    if timestamp is None or timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def bucket_start(timestamp: datetime, interval: str) -> datetime:
+    """Start of the rollup bucket a timestamp falls in"""
+    if interval == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+class MetricRingBuffer(object):
+    """Fixed-size buffer of the latest (timestamp, value) samples of a metric"""
+
+    def __init__(self, size: int):
+        self._samples = collections.deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def append(self, timestamp: datetime, value: float):
+        self._samples.append((timestamp, value))
+
+    @property
+    def oldest(self) -> Optional[datetime]:
+        return self._samples[0][0] if self._samples else None
+
+    def latest(self) -> Optional[Tuple[datetime, float]]:
+        return self._samples[-1] if self._samples else None
+
+    def window(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> List[Tuple[datetime, float]]:
+        """Samples in a time range, oldest first"""
+        return [
+            (timestamp, value) for timestamp, value in self._samples
+            if (start_time is None or timestamp >= start_time)
+            and (end_time is None or timestamp <= end_time)
+        ]
+
+
+class MetricRollup(object):
+    """Average, min and max of a metric over one bucket"""
+
+    __slots__ = ("start", "samples", "total", "minimum", "maximum")
+
+    def __init__(self, start: Optional[datetime] = None):
+        self.start = start
+        self.samples = 0
+        self.total = 0.0
+        self.minimum = None  # type: Optional[float]
+        self.maximum = None  # type: Optional[float]
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.total / self.samples if self.samples else None
+
+    def add(self, value: float, samples: int = 1, minimum: float = None, maximum: float = None):
+        """Add a sample, or an average over several samples with their min and max"""
+        self.samples += samples
+        self.total += value * samples
+        minimum = value if minimum is None else minimum
+        maximum = value if maximum is None else maximum
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def merge(self, other: "MetricRollup"):
+        if other.samples:
+            self.add(other.average, other.samples, other.minimum, other.maximum)
+
+    @classmethod
+    def from_metric(cls, metric: SystemMetric) -> "MetricRollup":
+        """Rollup of a persisted row; rows without rollup tags count as one sample"""
+        tags = metric.tags or {}
+        rollup = cls(metric.timestamp)
+        rollup.add(
+            metric.metric_value,
+            samples=int(tags.get("samples", 1)),
+            minimum=float(tags["min"]) if "min" in tags else None,
+            maximum=float(tags["max"]) if "max" in tags else None,
+        )
+        return rollup
+
+
+class SystemMetricsSampler(object):
+    """Background sampler of host metrics with in-memory history
+
+    Usage:
+        system_metrics_sampler.start()        # in the application lifespan
+        system_metrics_sampler.metrics(...)   # from request handling
+        await system_metrics_sampler.stop()   # on shutdown, flushes rollups
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.MONITORING_SAMPLE_INTERVAL_SECONDS,
+        buffer_size: int = settings.MONITORING_BUFFER_SAMPLES,
+        flush_interval: float = settings.MONITORING_FLUSH_INTERVAL_SECONDS,
+        hostname: Optional[str] = None,
+    ):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.hostname = hostname or socket.gethostname()
+        self.buffers = dict((name, MetricRingBuffer(buffer_size)) for name in SYSTEM_METRICS)
+        self._open_rollups = {}  # type: Dict[Tuple[str, str], MetricRollup]
+        self._pending = []  # type: List[Dict]
+        self._task = None  # type: Optional[asyncio.Task]
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the sampling loop"""
+        if self.running:
+            return
+        # The first non-blocking reading only sets the CPU baseline
+        psutil.cpu_percent(interval=None)
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info("System metrics sampler started ({}s interval)".format(self.interval))
+
+    async def stop(self):
+        """Stop the sampling loop and write the closed rollups"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def sample(self) -> Dict[str, float]:
+        """Read and record one sample without blocking the event loop"""
+        values = await asyncio.get_event_loop().run_in_executor(None, self._read)
+        self.record(datetime.utcnow(), values)
+        return values
+
+    def record(self, timestamp: datetime, values: Dict[str, float]):
+        """Add a sample to the ring buffers and rollups
+
+        Args:
+            timestamp: When the sample was read (naive UTC)
+            values: Value per metric name
+        """
+        for name, value in values.items():
+            self.buffers[name].append(timestamp, value)
+
+            for interval in ROLLUP_INTERVALS:
+                start = bucket_start(timestamp, interval)
+                rollup = self._open_rollups.get((interval, name))
+                if rollup is not None and rollup.start != start:
+                    self._pending.append(self._rollup_row(name, interval, rollup))
+                    rollup = None
+                if rollup is None:
+                    rollup = self._open_rollups[(interval, name)] = MetricRollup(start)
+                rollup.add(value)
+
+        if len(self._pending) > MAX_PENDING_ROLLUPS:
+            dropped = len(self._pending) - MAX_PENDING_ROLLUPS
+            del self._pending[:dropped]
+            system_metric_rollups_total.labels(status="dropped").inc(dropped)
+
+    async def flush(self) -> int:
+        """Write closed rollups to system_metrics in batches
+
+        Returns:
+            Number of rollup rows written
+        """
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from app.db.session import get_db_context
+
+        rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+
+        try:
+            async with get_db_context() as db:
+                for i in range(0, len(rows), ROLLUP_BATCH_SIZE):
+                    await db.execute(
+                        pg_insert(SystemMetric.__table__)
+                        .values(rows[i:i + ROLLUP_BATCH_SIZE])
+                        .on_conflict_do_nothing(index_elements=["metric_id"])
+                    )
+        except Exception as e:
+            logger.error("Failed to write {} system metric rollups: {}".format(len(rows), e))
+            system_metric_rollups_total.labels(status="failed").inc(len(rows))
+            self._pending = (rows + self._pending)[-MAX_PENDING_ROLLUPS:]
+            return 0
+
+        system_metric_rollups_total.labels(status="written").inc(len(rows))
+        return len(rows)
+
+    def covers(self, start_time: Optional[datetime], end_time: Optional[datetime] = None) -> bool:
+        """Whether the ring buffers hold every sample of a time range"""
+        oldest = self.buffers["cpu.usage"].oldest
+        if oldest is None or (end_time is not None and end_time < oldest):
+            return False
+        return start_time is None or start_time >= oldest
+
+    def metrics(
+        self,
+        metric_name: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> List[SystemMetric]:
+        """Buffered samples as unsaved SystemMetric instances, newest first"""
+        if metric_name is not None and metric_name not in self.buffers:
+            return []
+        names = [metric_name] if metric_name else list(SYSTEM_METRICS)
+
+        samples = []
+        for name in names:
+            for timestamp, value in self.buffers[name].window(start_time, end_time):
+                samples.append((timestamp, name, value))
+        samples.sort(key=lambda sample: sample[0], reverse=True)
+
+        return [
+            self._metric(name, timestamp, value)
+            for timestamp, name, value in samples[:limit]
+        ]
+
+    async def current_metrics(self) -> List[SystemMetric]:
+        """Latest sample of every metric; samples now when nothing is buffered"""
+        if self.buffers["cpu.usage"].latest() is None:
+            await self.sample()
+
+        metrics = []
+        for name, buffer in self.buffers.items():
+            latest = buffer.latest()
+            if latest is not None:
+                metrics.append(self._metric(name, latest[0], latest[1]))
+        return metrics
+
+    def open_rollup(self, interval: str, metric_name: str) -> Optional[MetricRollup]:
+        """Rollup of the current, not yet persisted bucket"""
+        return self._open_rollups.get((interval, metric_name))
+
+    def _read(self) -> Dict[str, float]:
+        """Read host metrics and export them to Prometheus (worker thread)"""
+        cpu_percent = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage("/")
+        net_io = psutil.net_io_counters()
+        process_count = len(psutil.pids())
+
+        system_cpu_usage_percent.set(cpu_percent)
+        memory_usage_bytes.labels(type="total").set(memory.total)
+        memory_usage_bytes.labels(type="used").set(memory.used)
+        memory_usage_bytes.labels(type="free").set(memory.free)
+        disk_usage_bytes.labels(mount_point="/", type="total").set(disk.total)
+        disk_usage_bytes.labels(mount_point="/", type="used").set(disk.used)
+        disk_usage_bytes.labels(mount_point="/", type="free").set(disk.free)
+        system_network_bytes.labels(direction="sent").set(net_io.bytes_sent)
+        system_network_bytes.labels(direction="recv").set(net_io.bytes_recv)
+        system_process_count.set(process_count)
+
+        return {
+            "cpu.usage": cpu_percent,
+            "memory.usage": memory.percent,
+            "memory.available": memory.available,
+            "disk.usage": disk.percent,
+            "disk.free": disk.free,
+            "network.bytes_sent": net_io.bytes_sent,
+            "network.bytes_recv": net_io.bytes_recv,
+            "system.process_count": process_count,
+        }
+
+    def _tags(self, metric_name: str) -> Dict[str, str]:
+        tags = dict(SYSTEM_METRICS[metric_name][1])
+        tags["host"] = self.hostname
+        return tags
+
+    def _metric(self, metric_name: str, timestamp: datetime, value: float) -> SystemMetric:
+        return SystemMetric(
+            metric_type=MetricType.SYSTEM,
+            metric_name=metric_name,
+            metric_value=value,
+            metric_unit=SYSTEM_METRICS[metric_name][0],
+            tags=self._tags(metric_name),
+            timestamp=timestamp,
+            interval="second",
+            source=self.hostname,
+        )
+
+    def _rollup_row(self, metric_name: str, interval: str, rollup: MetricRollup) -> Dict:
+        key = "{}|{}|{}|{}".format(self.hostname, interval, metric_name, rollup.start.isoformat())
+        tags = self._tags(metric_name)
+        tags.update({
+            "min": str(rollup.minimum),
+            "max": str(rollup.maximum),
+            "samples": str(rollup.samples),
+        })
+        return {
+            "metric_id": "sys_rollup_{}".format(hashlib.sha1(key.encode()).hexdigest()[:32]),
+            "metric_type": MetricType.SYSTEM,
+            "metric_name": metric_name,
+            "metric_unit": SYSTEM_METRICS[metric_name][0],
+            "metric_value": rollup.average,
+            "tags": tags,
+            "timestamp": rollup.start,
+            "interval": interval,
+            "source": self.hostname,
+        }
+
+    async def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.error("Error sampling system metrics: {}".format(e))
+
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval
+                await self.flush()
+
+
+def summarize_rollups(rollups: Iterable[MetricRollup]) -> MetricRollup:
+    """Combine rollups into one, weighting averages by their sample counts"""
+    summary = MetricRollup()
+    for rollup in rollups:
+        summary.merge(rollup)
+    return summary
+
+
+# Process-wide sampler, started from the application lifespan
+system_metrics_sampler = SystemMetricsSampler()
@@ -21,9 +21,11 @@ from sqlalchemy import select, func, and_, desc
 from app.models.system_monitoring import (
     SystemMetric, DatabaseMetric, ApplicationMetric,
     HealthCheckResult, MonitoringThreshold,
-    MetricType, MetricUnit,
 )
 from app.models.system_alerts import SystemAlert, AlertSeverity, AlertStatus
+from app.services.system_metrics_sampler import (
+    MetricRollup, bucket_start, naive_utc, summarize_rollups, system_metrics_sampler,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -37,91 +39,15 @@ class MetricsCollectionService(object):
         self.hostname = socket.gethostname()
 
     async def collect_system_metrics(self) -> List[SystemMetric]:
-        """Collect current system metrics
+        """Get the current system metrics from the background sampler
+
+        Samples are kept in memory by the sampler, which persists only
+        1 minute and 1 hour rollups, so nothing is written here.
 
         Returns:
-            List of SystemMetric instances
+            List of unsaved SystemMetric instances
         """
-        import uuid
-        timestamp = datetime.utcnow()
-        metrics = []
-
-        # CPU metrics
-        cpu_percent = psutil.cpu_percent(interval=1)
-        metrics.append(self._create_metric(
-            metric_name="cpu.usage",
-            metric_value=cpu_percent,
-            metric_unit=MetricUnit.PERCENT,
-            tags={"type": "cpu", "host": self.hostname},
-            timestamp=timestamp,
-        ))
-
-        # Memory metrics
-        memory = psutil.virtual_memory()
-        metrics.append(self._create_metric(
-            metric_name="memory.usage",
-            metric_value=memory.percent,
-            metric_unit=MetricUnit.PERCENT,
-            tags={"type": "memory", "host": self.hostname},
-            timestamp=timestamp,
-        ))
-        metrics.append(self._create_metric(
-            metric_name="memory.available",
-            metric_value=memory.available,
-            metric_unit=MetricUnit.BYTES,
-            tags={"type": "memory", "host": self.hostname},
-            timestamp=timestamp,
-        ))
-
-        # Disk metrics
-        disk = psutil.disk_usage("/")
-        metrics.append(self._create_metric(
-            metric_name="disk.usage",
-            metric_value=disk.percent,
-            metric_unit=MetricUnit.PERCENT,
-            tags={"type": "disk", "host": self.hostname, "path": "/"},
-            timestamp=timestamp,
-        ))
-        metrics.append(self._create_metric(
-            metric_name="disk.free",
-            metric_value=disk.free,
-            metric_unit=MetricUnit.BYTES,
-            tags={"type": "disk", "host": self.hostname, "path": "/"},
-            timestamp=timestamp,
-        ))
-
-        # Network metrics
-        net_io = psutil.net_io_counters()
-        metrics.append(self._create_metric(
-            metric_name="network.bytes_sent",
-            metric_value=net_io.bytes_sent,
-            metric_unit=MetricUnit.BYTES,
-            tags={"type": "network", "host": self.hostname},
-            timestamp=timestamp,
-        ))
-        metrics.append(self._create_metric(
-            metric_name="network.bytes_recv",
-            metric_value=net_io.bytes_recv,
-            metric_unit=MetricUnit.BYTES,
-            tags={"type": "network", "host": self.hostname},
-            timestamp=timestamp,
-        ))
-
-        # Process count
-        process_count = len(psutil.pids())
-        metrics.append(self._create_metric(
-            metric_name="system.process_count",
-            metric_value=process_count,
-            metric_unit=MetricUnit.COUNT,
-            tags={"type": "system", "host": self.hostname},
-            timestamp=timestamp,
-        ))
-
-        # Save to database
-        for metric in metrics:
-            self.db.add(metric)
-
-        await self.db.flush()
+        metrics = await system_metrics_sampler.current_metrics()
 
         logger.info("Collected {} system metrics".format(len(metrics)))
         return metrics
@@ -184,40 +110,6 @@ class MetricsCollectionService(object):
         logger.info("Collected database metrics: {} connections".format(total_connections))
         return metric
 
-    def _create_metric(
-        self,
-        metric_name: str,
-        metric_value: float,
-        metric_unit: str = None,
-        tags: Dict[str, str] = None,
-        timestamp: datetime = None,
-    ) -> SystemMetric:
-        """Create a system metric instance
-
-        Args:
-            metric_name: Metric name
-            metric_value: Metric value
-            metric_unit: Unit of measurement
-            tags: Tags for filtering
-            timestamp: When metric was recorded
-
-        Returns:
-            SystemMetric instance
-        """
-        import uuid
-
-        return SystemMetric(
-            metric_id="sys_metric_{}".format(uuid.uuid4().hex[:12]),
-            metric_type=MetricType.SYSTEM,
-            metric_name=metric_name,
-            metric_value=metric_value,
-            metric_unit=metric_unit,
-            tags=tags or {},
-            timestamp=timestamp or datetime.utcnow(),
-            interval="minute",
-            source=self.hostname,
-        )
-
 
 class HealthCheckService(object):
     """Service for executing health checks"""
@@ -627,21 +519,32 @@ class MonitoringQueryService(object):
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
         limit: int = 100,
+        interval: str = "minute",
     ) -> List[SystemMetric]:
         """Query system metrics
 
+        Ranges the sampler still holds in memory are answered from its ring
+        buffers; older ranges from the persisted rollups of one interval.
+
         Args:
             metric_name: Filter by metric name
             start_time: Start of time range
             end_time: End of time range
             limit: Maximum records to return
+            interval: Rollup interval of persisted metrics (minute, hour)
 
         Returns:
             List of SystemMetric instances
         """
+        start_time = naive_utc(start_time)
+        end_time = naive_utc(end_time)
+
+        if system_metrics_sampler.covers(start_time, end_time):
+            return system_metrics_sampler.metrics(metric_name, start_time, end_time, limit)
+
         query = select(SystemMetric)
 
-        conditions = []
+        conditions = [SystemMetric.interval == interval]
         if metric_name:
             conditions.append(SystemMetric.metric_name == metric_name)
         if start_time:
@@ -649,14 +552,50 @@ class MonitoringQueryService(object):
         if end_time:
             conditions.append(SystemMetric.timestamp <= end_time)
 
-        if conditions:
-            query = query.where(and_(*conditions))
-
+        query = query.where(and_(*conditions))
         query = query.order_by(desc(SystemMetric.timestamp)).limit(limit)
 
         result = await self.db.execute(query)
         return result.scalars().all()
 
+    async def get_metrics_summary(self, hours: int = 24) -> Dict[str, Any]:
+        """Summarize CPU, memory and disk usage over recent hours
+
+        Combines the persisted hourly rollups with the sampler's current hour.
+
+        Args:
+            hours: Hours of history to summarize
+
+        Returns:
+            Dict with avg, max and min per resource
+        """
+        start_time = bucket_start(datetime.utcnow() - timedelta(hours=hours), "hour")
+
+        summary = {"period_hours": hours}
+        for key, metric_name in (("cpu", "cpu.usage"), ("memory", "memory.usage"), ("disk", "disk.usage")):
+            query = select(SystemMetric).where(
+                and_(
+                    SystemMetric.metric_name == metric_name,
+                    SystemMetric.interval == "hour",
+                    SystemMetric.timestamp >= start_time,
+                )
+            )
+            result = await self.db.execute(query)
+            rollups = [MetricRollup.from_metric(m) for m in result.scalars().all()]
+
+            current = system_metrics_sampler.open_rollup("hour", metric_name)
+            if current is not None and all(r.start != current.start for r in rollups):
+                rollups.append(current)
+
+            combined = summarize_rollups(rollups)
+            summary[key] = {
+                "avg": round(combined.average or 0, 2),
+                "max": round(combined.maximum or 0, 2),
+                "min": round(combined.minimum or 0, 2),
+            }
+
+        return summary
+
     async def get_health_status(self) -> Dict[str, Any]:
         """Get current system health status
 
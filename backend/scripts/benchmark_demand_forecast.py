@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Demand forecast benchmark.
+
+Times the per-drug forecasting loop against the vectorized bulk forecast
+(single chunk and process pool) on synthetic consumption data for a range
+of formulary sizes, so the runtime per item count can be tracked between
+releases. Only the forecast compute is measured, not the database query.
+
+Usage: python scripts/benchmark_demand_forecast.py [--sizes 100,1000,6000]
+       [--days 365] [--horizon 30] [--workers N] [--scalar-limit 1000]
+       [--output benchmarks.csv]
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from app.services.demand_forecasting import (
+    DemandForecastingService,
+    forecast_matrix,
+    run_forecast_matrix,
+)
+
+
+def synthetic_consumption(n_drugs: int, n_days: int, seed: int = 42) -> np.ndarray:
+    """Build a consumption matrix mixing stable, trending and erratic drugs"""
+    rng = np.random.default_rng(seed)
+    base = rng.choice([1.0, 5.0, 20.0, 100.0], size=(n_drugs, 1))
+    trend = rng.choice([0.0, 0.01, 0.05], size=(n_drugs, 1)) * base
+    noise = rng.choice([0.1, 0.4, 1.2], size=(n_drugs, 1)) * base
+    days = np.arange(n_days)
+    matrix = base + trend * days / 30 + rng.normal(size=(n_drugs, n_days)) * noise
+    matrix[rng.random((n_drugs, n_days)) < 0.1] = 0
+    return np.floor(np.maximum(matrix, 0))
+
+
+async def time_scalar(matrix, end_date, horizon):
+    """Forecast drug by drug with the per-drug algorithm classes"""
+    service = DemandForecastingService(None)
+    n_days = matrix.shape[1]
+    dates = [end_date - timedelta(days=n_days - 1 - i) for i in range(n_days)]
+
+    start = time.perf_counter()
+    for row in matrix.tolist():
+        historical_data = list(zip(dates, row))
+        algorithm = await service.analyze_demand_pattern(historical_data)
+        service.ALGORITHMS[algorithm].forecast(historical_data, horizon)
+    return time.perf_counter() - start
+
+
+def time_vectorized(matrix, end_date, horizon):
+    """Forecast every drug in one vectorized call"""
+    start = time.perf_counter()
+    forecast_matrix(list(range(len(matrix))), matrix, end_date, horizon)
+    return time.perf_counter() - start
+
+
+async def time_pool(matrix, end_date, horizon, workers):
+    """Forecast every drug the way batch_forecast does"""
+    start = time.perf_counter()
+    await run_forecast_matrix(list(range(len(matrix))), matrix, end_date, horizon, max_workers=workers)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark demand forecasting by item count")
+    parser.add_argument("--sizes", default="100,500,1000,3000,6000", help="Comma-separated item counts")
+    parser.add_argument("--days", type=int, default=365, help="Days of history")
+    parser.add_argument("--horizon", type=int, default=30, help="Forecast horizon in days")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size")
+    parser.add_argument("--scalar-limit", type=int, default=1000,
+                        help="Largest item count to run the per-drug loop for")
+    parser.add_argument("--output", default=None, help="CSV file to append results to")
+    args = parser.parse_args()
+
+    end_date = date.today()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    fields = ["date", "items", "days", "horizon", "scalar_s", "vectorized_s", "pool_s", "speedup"]
+    rows = []
+
+    print("{:>8} {:>12} {:>14} {:>10} {:>9}".format("items", "scalar (s)", "vectorized (s)", "pool (s)", "speedup"))
+    for size in sizes:
+        matrix = synthetic_consumption(size, args.days + 1)
+
+        scalar = None
+        if size <= args.scalar_limit:
+            scalar = await time_scalar(matrix, end_date, args.horizon)
+        vectorized = time_vectorized(matrix, end_date, args.horizon)
+        pool = await time_pool(matrix, end_date, args.horizon, args.workers)
+        speedup = scalar / pool if scalar else None
+
+        rows.append({
+            "date": end_date.isoformat(),
+            "items": size,
+            "days": args.days,
+            "horizon": args.horizon,
+            "scalar_s": round(scalar, 4) if scalar else "",
+            "vectorized_s": round(vectorized, 4),
+            "pool_s": round(pool, 4),
+            "speedup": round(speedup, 1) if speedup else "",
+        })
+        print("{:>8} {:>12} {:>14.3f} {:>10.3f} {:>9}".format(
+            size,
+            "{:.3f}".format(scalar) if scalar else "-",
+            vectorized,
+            pool,
+            "{:.1f}x".format(speedup) if speedup else "-",
+        ))
+
+    if args.output:
+        write_header = not os.path.exists(args.output)
+        with open(args.output, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+        print("\nResults appended to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+FEFO allocation concurrency benchmark.
+
+Creates a throwaway drug with several batches, then runs many dispensers
+in parallel, each on its own session, requesting stock through
+dispense_stock until the drug runs out. Afterwards it checks that nothing
+was oversold: no batch went negative, the dispensed total never exceeds
+the stock received, and the maintained balance matches the batch sum.
+
+Needs a migrated database (DATABASE_URL); the test data is removed at
+the end unless --keep is given.
+
+Usage: python scripts/benchmark_fefo_allocation.py [--dispensers 50]
+       [--batches 8] [--batch-quantity 100] [--request 3] [--keep]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import select, delete, func
+
+from app.models import encounter, hospital, patient, prescription  # noqa: F401  (relationship targets)
+from app.crud.inventory import InsufficientStockError, apply_stock_delta, dispense_stock
+from app.db.session import AsyncSessionLocal
+from app.models.inventory import (
+    Drug, DrugBatch, DrugStockBalance, StockTransaction, StockTransactionItem,
+)
+
+
+REFERENCE_TYPE = "fefo_benchmark"
+
+
+async def create_stock(batches: int, batch_quantity: int) -> int:
+    """Create the benchmark drug and its batches; returns the drug ID"""
+    async with AsyncSessionLocal() as session:
+        drug = Drug(
+            generic_name="FEFO benchmark",
+            drug_code="BENCH-{}".format(uuid.uuid4().hex[:12]),
+            dosage_form="tablet",
+        )
+        session.add(drug)
+        await session.flush()
+
+        for i in range(batches):
+            session.add(DrugBatch(
+                drug_id=drug.id,
+                batch_number="BENCH-{:03d}".format(i),
+                expiry_date=date.today() + timedelta(days=30 + i * 15),
+                quantity=batch_quantity,
+                initial_quantity=batch_quantity,
+                bin_location="BENCH-{}".format(i % 2),
+                received_date=date.today(),
+            ))
+            await apply_stock_delta(session, drug.id, "BENCH-{}".format(i % 2), batch_quantity)
+
+        await session.commit()
+        return drug.id
+
+
+async def dispenser(drug_id: int, quantity: int, latencies: list) -> int:
+    """Dispense until the drug is out of stock; returns the quantity dispensed"""
+    dispensed = 0
+    while True:
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            try:
+                await dispense_stock(session, {drug_id: quantity}, reference_type=REFERENCE_TYPE)
+                await session.commit()
+            except InsufficientStockError:
+                await session.rollback()
+                return dispensed
+        latencies.append(time.perf_counter() - start)
+        dispensed += quantity
+
+
+async def verify(drug_id: int, received: int, dispensed: int) -> list:
+    """Check the final stock state; returns a list of problems"""
+    problems = []
+    async with AsyncSessionLocal() as session:
+        batch_sum = await session.scalar(
+            select(func.coalesce(func.sum(DrugBatch.quantity), 0)).where(DrugBatch.drug_id == drug_id)
+        )
+        negative = await session.scalar(
+            select(func.count(DrugBatch.id)).where(DrugBatch.drug_id == drug_id, DrugBatch.quantity < 0)
+        )
+        on_hand = await session.scalar(select(Drug.stock_on_hand).where(Drug.id == drug_id))
+        location_sum = await session.scalar(
+            select(func.coalesce(func.sum(DrugStockBalance.on_hand), 0)).where(DrugStockBalance.drug_id == drug_id)
+        )
+
+    if dispensed > received:
+        problems.append("oversold: dispensed {} of {} received".format(dispensed, received))
+    if negative:
+        problems.append("{} batch(es) below zero".format(negative))
+    if batch_sum != received - dispensed:
+        problems.append("batch sum {} != {} received - {} dispensed".format(batch_sum, received, dispensed))
+    if on_hand != batch_sum or location_sum != batch_sum:
+        problems.append("balances {} / {} != batch sum {}".format(on_hand, location_sum, batch_sum))
+    return problems
+
+
+async def cleanup(drug_id: int):
+    """Remove the benchmark drug, batches, balances and transactions"""
+    async with AsyncSessionLocal() as session:
+        transaction_ids = select(StockTransactionItem.transaction_id).where(StockTransactionItem.drug_id == drug_id)
+        await session.execute(delete(StockTransaction).where(StockTransaction.id.in_(transaction_ids)))
+        await session.execute(delete(DrugStockBalance).where(DrugStockBalance.drug_id == drug_id))
+        await session.execute(delete(DrugBatch).where(DrugBatch.drug_id == drug_id))
+        await session.execute(delete(Drug).where(Drug.id == drug_id))
+        await session.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent FEFO dispensing")
+    parser.add_argument("--dispensers", type=int, default=50, help="Parallel dispensers")
+    parser.add_argument("--batches", type=int, default=8, help="Batches of the benchmark drug")
+    parser.add_argument("--batch-quantity", type=int, default=100, help="Units per batch")
+    parser.add_argument("--request", type=int, default=3, help="Units per dispense")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark data")
+    args = parser.parse_args()
+
+    received = args.batches * args.batch_quantity
+    drug_id = await create_stock(args.batches, args.batch_quantity)
+
+    try:
+        latencies = []
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            dispenser(drug_id, args.request, latencies) for _ in range(args.dispensers)
+        ])
+        elapsed = time.perf_counter() - start
+        dispensed = sum(results)
+
+        print("dispensers:      {}".format(args.dispensers))
+        print("received:        {}".format(received))
+        print("dispensed:       {} in {} requests".format(dispensed, len(latencies)))
+        print("elapsed:         {:.2f} s ({:.0f} dispenses/s)".format(elapsed, len(latencies) / elapsed if elapsed else 0))
+        if latencies:
+            ordered = sorted(latencies)
+            print("latency p50/p95: {:.1f} / {:.1f} ms".format(
+                statistics.median(ordered) * 1000,
+                ordered[int(len(ordered) * 0.95) - 1] * 1000,
+            ))
+
+        problems = await verify(drug_id, received, dispensed)
+        for problem in problems:
+            print("FAIL: {}".format(problem))
+        if not problems:
+            print("OK: no oversell, balances match the batches")
+        return 1 if problems else 0
+    finally:
+        if not args.keep:
+            await cleanup(drug_id)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
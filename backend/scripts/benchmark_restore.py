@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Database restore benchmark.
+
+Creates a scratch source database on the local Postgres server, fills it
+with patient-sized tables, backs it up with the streaming backup engine
+and restores it into a scratch target database once per pg_restore job
+count. Prints the restore time and throughput of each run and the time a
+200 GB database would take at that rate, against the 30 minute restore
+objective.
+
+Needs pg_dump/pg_restore on PATH and a role allowed to create databases
+(DATABASE_URL). The scratch databases are dropped at the end unless
+--keep is given.
+
+Usage: python scripts/benchmark_restore.py [--tables 8] [--rows 500000]
+       [--jobs 1,4,8] [--keep]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.services.backup_engine import RestoreProgress, StreamingBackupEngine
+
+
+SOURCE_DATABASE = "simrs_restore_bench_src"
+TARGET_DATABASE = "simrs_restore_bench_dst"
+OBJECTIVE_SECONDS = 30 * 60
+PROJECTED_BYTES = 200 * 1024 ** 3
+
+
+def database_url(name: str) -> str:
+    return make_url(settings.DATABASE_URL).set(database=name).render_as_string(hide_password=False)
+
+
+async def recreate_databases(names, drop_only: bool = False):
+    engine = create_async_engine(settings.DATABASE_URL, isolation_level="AUTOCOMMIT")
+    try:
+        async with engine.connect() as conn:
+            for name in names:
+                await conn.execute(text('DROP DATABASE IF EXISTS "{}"'.format(name)))
+                if not drop_only:
+                    await conn.execute(text('CREATE DATABASE "{}"'.format(name)))
+    finally:
+        await engine.dispose()
+
+
+async def seed_source(tables: int, rows: int) -> int:
+    engine = create_async_engine(database_url(SOURCE_DATABASE))
+    try:
+        async with engine.begin() as conn:
+            for i in range(tables):
+                await conn.execute(text("""
+                    CREATE TABLE bench_{i} (
+                        id BIGSERIAL PRIMARY KEY,
+                        patient_id INTEGER NOT NULL,
+                        note TEXT NOT NULL,
+                        created_at TIMESTAMPTZ NOT NULL
+                    )
+                """.format(i=i)))
+                await conn.execute(text("""
+                    INSERT INTO bench_{i} (patient_id, note, created_at)
+                    SELECT g % 50000, md5(g::text) || repeat(' catatan klinis', 8),
+                           NOW() - (g || ' minutes')::interval
+                    FROM generate_series(1, :rows) AS g
+                """.format(i=i)), {"rows": rows})
+                await conn.execute(text(
+                    "CREATE INDEX ix_bench_{i}_patient ON bench_{i} (patient_id)".format(i=i)
+                ))
+            size = await conn.execute(text("SELECT pg_database_size(current_database())"))
+            return size.scalar()
+    finally:
+        await engine.dispose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel database restore")
+    parser.add_argument("--tables", type=int, default=8, help="Tables in the source database")
+    parser.add_argument("--rows", type=int, default=500000, help="Rows per table")
+    parser.add_argument("--jobs", default="1,4,8", help="Comma-separated pg_restore job counts")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch databases")
+    args = parser.parse_args()
+    job_counts = [int(jobs) for jobs in args.jobs.split(",")]
+
+    await recreate_databases([SOURCE_DATABASE])
+    try:
+        started = time.perf_counter()
+        database_bytes = await seed_source(args.tables, args.rows)
+        print("source database: {:.1f} MB in {} tables (seeded in {:.1f} s)".format(
+            database_bytes / 1024 ** 2, args.tables, time.perf_counter() - started
+        ))
+
+        with tempfile.TemporaryDirectory(prefix="simrs_restore_bench_") as workdir:
+            engine = StreamingBackupEngine(
+                minio_client=object(), bucket="bench", bytes_per_second=0,
+                staging_dir=workdir, database_url=database_url(SOURCE_DATABASE),
+            )
+            started = time.perf_counter()
+            backup = await engine.backup_database("restore bench", "local", workdir)
+            print("backup:          {:.1f} MB archive in {:.1f} s".format(
+                backup["size_bytes"] / 1024 ** 2, time.perf_counter() - started
+            ))
+
+            print("")
+            print("{:>5} {:>10} {:>10} {:>16}".format("jobs", "restore s", "MB/s", "200 GB projected"))
+            for jobs in job_counts:
+                await recreate_databases([TARGET_DATABASE])
+                engine = StreamingBackupEngine(
+                    minio_client=object(), bucket="bench", bytes_per_second=0,
+                    staging_dir=workdir, restore_jobs=jobs, database_url=database_url(TARGET_DATABASE),
+                )
+                progress = RestoreProgress()
+                started = time.perf_counter()
+                result = await engine.restore_database(backup["backup_path"], backup["checksum"], progress)
+                elapsed = time.perf_counter() - started
+
+                rate = database_bytes / elapsed
+                projected = PROJECTED_BYTES / rate
+                print("{:>5} {:>10.1f} {:>10.1f} {:>13.0f} min{}".format(
+                    jobs, elapsed, rate / 1024 ** 2, projected / 60,
+                    "" if projected <= OBJECTIVE_SECONDS else "  (over objective)",
+                ))
+                if result["tables_restored"] != args.tables:
+                    print("FAIL: {} of {} tables restored".format(result["tables_restored"], args.tables))
+                    return 1
+    finally:
+        if not args.keep:
+            await recreate_databases([SOURCE_DATABASE, TARGET_DATABASE], drop_only=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
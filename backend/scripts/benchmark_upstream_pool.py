@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Upstream connection pool benchmark.
+
+Starts a local mock upstream that answers like a BPJS eligibility check
+and charges a fixed delay for every new connection (standing in for the
+TCP + TLS handshake to BPJS), then sends the same requests twice:
+
+- fresh:  a new httpx.AsyncClient per request, as the per-request BPJS
+          and SATUSEHAT clients used to do
+- shared: the shared "bpjs_vclaim" client from the HTTP client registry
+
+and prints latency and how many connections each mode opened.
+
+Usage: python scripts/benchmark_upstream_pool.py [--requests 200]
+       [--concurrency 10] [--handshake-ms 40] [--response-ms 5]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx
+
+from app.core.http_clients import HTTPClientRegistry, UPSTREAM_POOLS
+
+
+RESPONSE_BODY = json.dumps({
+    "metaData": {"code": "200", "message": "OK"},
+    "response": {"peserta": {"noKartu": "0001234567890", "statusPeserta": {"kode": "0"}}},
+}).encode()
+
+
+class MockUpstream:
+    """HTTP/1.1 keep-alive server with a per-connection handshake delay"""
+
+    def __init__(self, handshake_delay: float, response_delay: float):
+        self.handshake_delay = handshake_delay
+        self.response_delay = response_delay
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return "http://127.0.0.1:{}/Peserta/nokartu/0001234567890".format(port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.handshake_delay)
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                await asyncio.sleep(self.response_delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(RESPONSE_BODY)).encode() + b"\r\n\r\n"
+                    + RESPONSE_BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run_mode(name: str, url: str, requests: int, concurrency: int, get_client):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            async with get_client() as client:
+                response = await client.get(url)
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "mode": name,
+        "elapsed": elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+class _Borrowed:
+    """Async context manager lending a shared client without closing it"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def __aenter__(self):
+        return self.client
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--handshake-ms", type=float, default=40.0)
+    parser.add_argument("--response-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    upstream = MockUpstream(args.handshake_ms / 1000, args.response_ms / 1000)
+    url = await upstream.start()
+    results = []
+
+    try:
+        results.append(await run_mode(
+            "fresh", url, args.requests, args.concurrency,
+            lambda: httpx.AsyncClient(timeout=30.0),
+        ))
+        fresh_connections = upstream.connections
+
+        registry = HTTPClientRegistry(pools={"bpjs_vclaim": UPSTREAM_POOLS["bpjs_vclaim"]})
+        registry.start()
+        shared, _ = registry.acquire("bpjs_vclaim")
+        try:
+            results.append(await run_mode(
+                "shared", url, args.requests, args.concurrency,
+                lambda: _Borrowed(shared),
+            ))
+        finally:
+            await registry.stop()
+        shared_connections = upstream.connections - fresh_connections
+    finally:
+        await upstream.stop()
+
+    print("{} requests, concurrency {}, {}ms handshake, {}ms response".format(
+        args.requests, args.concurrency, args.handshake_ms, args.response_ms
+    ))
+    print("{:<8} {:>10} {:>10} {:>10} {:>12}".format("mode", "total s", "mean ms", "p95 ms", "connections"))
+    for result, connections in zip(results, (fresh_connections, shared_connections)):
+        print("{:<8} {:>10.2f} {:>10.1f} {:>10.1f} {:>12}".format(
+            result["mode"], result["elapsed"], result["mean_ms"], result["p95_ms"], connections
+        ))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
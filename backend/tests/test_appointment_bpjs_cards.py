@@ -0,0 +1,55 @@
+"""
+Tests for the appointment query behind the BPJS eligibility prewarm
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.crud.appointments import get_appointment_bpjs_cards
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Records the statements a query runs, compiled for PostgreSQL"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, statement):
+        compiled = statement.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={"literal_binds": True},
+        )
+        self.statements.append(str(compiled))
+        return FakeResult(self.rows)
+
+
+@pytest.mark.asyncio
+async def test_bpjs_cards_of_booked_patients():
+    db = FakeSession([
+        SimpleNamespace(id=1, bpjs_card_number="0001111111111"),
+        SimpleNamespace(id=2, bpjs_card_number="0002222222222"),
+    ])
+
+    cards = await get_appointment_bpjs_cards(db, date(2026, 3, 2))
+
+    sql = db.statements[0]
+    assert cards == [(1, "0001111111111"), (2, "0002222222222")]
+    assert sql.startswith("SELECT DISTINCT patients.id, patients.bpjs_card_number")
+    assert "JOIN appointments ON appointments.patient_id = patients.id" in sql
+    assert "appointments.appointment_date = '2026-03-02'" in sql
+    assert "appointments.status IN ('SCHEDULED', 'CONFIRMED')" in sql
+    assert "patients.is_active IS true" in sql
+    assert "patients.bpjs_card_number IS NOT NULL" in sql
+    assert sql.endswith("ORDER BY patients.id")
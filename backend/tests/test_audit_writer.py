@@ -0,0 +1,120 @@
+"""
+Unit tests for the buffered audit log writer
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.audit_writer import AuditLogWriter
+
+
+def _take_journal(writer):
+    rows = []
+    for path, journal in writer._claim_journals():
+        rows.extend(writer._read_journal(journal))
+        journal.close()
+    return rows
+
+
+def _entry(**overrides):
+    entry = {
+        "action": "READ",
+        "resource_type": "Patient",
+        "resource_id": "42",
+        "request_path": "/api/v1/patients/42",
+        "request_method": "GET",
+        "success": True,
+        "status_code": 200,
+        "request_body": None,
+    }
+    entry.update(overrides)
+    return entry
+
+
+class TestAuditRowConversion:
+    """Test buffered entry to row conversion"""
+
+    def test_status_code_moves_to_additional_data(self):
+        row = AuditLogWriter._to_row(_entry(status_code=404))
+
+        assert "status_code" not in row
+        assert "request_body" not in row
+        assert row["additional_data"] == {"status_code": 404}
+
+
+class TestAuditJournal:
+    """Test spilling to and replaying from the journal"""
+
+    def test_journal_round_trip(self, tmp_path):
+        journal_path = str(tmp_path / "audit" / "journal.jsonl")
+        writer = AuditLogWriter(journal_path=journal_path)
+        timestamp = datetime(2026, 1, 16, 8, 30, tzinfo=timezone.utc)
+
+        writer._append_journal([
+            AuditLogWriter._to_row(_entry(timestamp=timestamp)),
+            AuditLogWriter._to_row(_entry(resource_id="43", timestamp=timestamp)),
+        ])
+        rows = _take_journal(writer)
+
+        assert [row["resource_id"] for row in rows] == ["42", "43"]
+        assert rows[0]["timestamp"] == timestamp
+
+    @pytest.mark.asyncio
+    async def test_replay_file_survives_failed_insert(self, tmp_path, monkeypatch):
+        journal_path = str(tmp_path / "journal.jsonl")
+        writer = AuditLogWriter(journal_path=journal_path)
+        writer._append_journal([AuditLogWriter._to_row(_entry())])
+
+        # The process dies while the rows are being inserted
+        class Crash(BaseException):
+            pass
+
+        async def crash(rows, status):
+            raise Crash()
+
+        monkeypatch.setattr(writer, "_insert_rows", crash)
+        with pytest.raises(Crash):
+            await writer._replay_journal()
+        monkeypatch.undo()
+
+        # The next start picks the leftover replay file up
+        inserted = []
+
+        async def insert(rows):
+            inserted.extend(rows)
+
+        monkeypatch.setattr(writer, "_execute_insert", insert)
+        await writer._replay_journal()
+
+        assert [row["resource_id"] for row in inserted] == ["42"]
+        assert list(tmp_path.glob("journal.jsonl.replay-*")) == []
+
+    def test_claimed_replay_file_is_not_shared(self, tmp_path):
+        journal_path = str(tmp_path / "journal.jsonl")
+        worker_a = AuditLogWriter(journal_path=journal_path)
+        worker_b = AuditLogWriter(journal_path=journal_path)
+        worker_a._append_journal([AuditLogWriter._to_row(_entry())])
+
+        claimed = worker_a._claim_journals()
+        try:
+            assert len(claimed) == 1
+            assert worker_b._claim_journals() == []
+        finally:
+            for _, journal in claimed:
+                journal.close()
+
+    @pytest.mark.asyncio
+    async def test_enqueue_before_start_spills(self, tmp_path):
+        journal = tmp_path / "journal.jsonl"
+        writer = AuditLogWriter(journal_path=str(journal))
+
+        writer.enqueue(_entry())
+        for _ in range(100):
+            if journal.exists():
+                break
+            await asyncio.sleep(0.01)
+
+        rows = _take_journal(writer)
+        assert len(rows) == 1
+        assert rows[0]["timestamp"] is not None
@@ -0,0 +1,301 @@
+"""
+Unit tests for the streaming backup engine
+"""
+import gzip
+import hashlib
+import io
+import os
+import tarfile
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.backup_engine import (
+    MANIFEST_MEMBER,
+    PG_RESTORE_TABLE_PATTERN,
+    ArchiveWriter,
+    BackupIntegrityError,
+    BandwidthLimiter,
+    ChunkPipe,
+    RestoreProgress,
+    StreamingBackupEngine,
+    plan_incremental,
+)
+
+
+def test_archive_writer_compresses_and_hashes_in_one_pass():
+    sink = io.BytesIO()
+    writer = ArchiveWriter(sink, compress_level=6)
+    for _ in range(100):
+        writer.write(b"rekam medis " * 1000)
+    writer.close()
+
+    assert gzip.decompress(sink.getvalue()) == b"rekam medis " * 100000
+    assert writer.hexdigest() == hashlib.sha256(sink.getvalue()).hexdigest()
+    assert writer.bytes_out == len(sink.getvalue()) < writer.bytes_in
+
+
+def test_bandwidth_limiter_caps_throughput():
+    limiter = BandwidthLimiter(10000)
+    started = time.monotonic()
+    limiter.consume(10000)  # burst allowance
+    limiter.consume(2000)
+
+    assert time.monotonic() - started >= 0.15
+
+
+def test_chunk_pipe_hands_off_between_threads():
+    pipe = ChunkPipe(max_chunks=2)
+
+    def produce():
+        for i in range(50):
+            pipe.write(bytes([i]) * 100)
+        pipe.close_writer()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    data = b""
+    while True:
+        part = pipe.read(777)
+        if not part:
+            break
+        data += part
+    producer.join()
+
+    assert data == b"".join(bytes([i]) * 100 for i in range(50))
+
+
+def test_chunk_pipe_passes_writer_errors_to_reader():
+    pipe = ChunkPipe()
+    pipe.write(b"partial")
+    pipe.close_writer(RuntimeError("pg_dump failed"))
+
+    with pytest.raises(RuntimeError):
+        pipe.read(1024)
+
+
+def test_plan_incremental_hashes_only_touched_files():
+    previous = {
+        "a.txt": {"size": 1, "mtime_ns": 1, "sha256": "aa"},
+        "b.txt": {"size": 1, "mtime_ns": 1, "sha256": "bb"},
+        "c.txt": {"size": 1, "mtime_ns": 1, "sha256": "cc"},
+        "gone.txt": {"size": 1, "mtime_ns": 1, "sha256": "dd"},
+    }
+    current = {
+        "a.txt": {"size": 1, "mtime_ns": 1},
+        "b.txt": {"size": 1, "mtime_ns": 2},   # touched, same content
+        "c.txt": {"size": 2, "mtime_ns": 2},   # rewritten
+        "new.txt": {"size": 1, "mtime_ns": 2},
+    }
+    hashed = []
+
+    def hash_file(path):
+        hashed.append(path)
+        return "bb"
+
+    changed, carried, deleted = plan_incremental(current, previous, hash_file)
+
+    assert changed == ["c.txt", "new.txt"]
+    assert sorted(carried) == ["a.txt", "b.txt"]
+    assert carried["b.txt"]["mtime_ns"] == 2
+    assert deleted == ["gone.txt"]
+    assert hashed == ["b.txt"]
+
+
+class FakeMinio:
+    """Reads put_object streams in parts, like the SDK does"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, name, data, length, content_type=None, part_size=0):
+        parts = []
+        while True:
+            part = data.read(part_size or length)
+            if not part:
+                break
+            parts.append(part)
+        self.objects[(bucket, name)] = b"".join(parts)
+
+    def stat_object(self, bucket, name):
+        if (bucket, name) not in self.objects:
+            raise NoSuchKey()
+        return SimpleNamespace(size=len(self.objects[(bucket, name)]))
+
+    def get_object(self, bucket, name, length=0):
+        if (bucket, name) not in self.objects:
+            raise NoSuchKey()
+        data = self.objects[(bucket, name)]
+        return FakeResponse(data[:length] if length else data)
+
+    def remove_object(self, bucket, name):
+        self.objects.pop((bucket, name), None)
+
+
+class NoSuchKey(Exception):
+    code = "NoSuchKey"
+
+
+class FakeResponse(io.BytesIO):
+    def release_conn(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_file_backup_streams_to_minio(tmp_path):
+    source = tmp_path / "uploads"
+    source.mkdir()
+    (source / "scan.pdf").write_bytes(os.urandom(3 * 1024 * 1024))
+    minio = FakeMinio()
+    engine = StreamingBackupEngine(minio_client=minio, bucket="simrs", part_size=1024 * 1024)
+
+    result = await engine.backup_files(str(source), "backup_s3", "minio", "backups/files")
+
+    archive = minio.objects[("simrs", "backups/files/" + result["backup_path"].rsplit("/", 1)[1])]
+    assert result["backup_path"].startswith("minio://simrs/backups/files/uploads_")
+    assert hashlib.sha256(archive).hexdigest() == result["checksum"]
+    assert len(archive) == result["size_bytes"]
+    assert ("simrs", "backups/files/" + result["backup_path"].rsplit("/", 1)[1] + ".manifest.json") in minio.objects
+
+
+@pytest.mark.asyncio
+async def test_stat_and_delete_minio_backup_with_its_manifest(tmp_path):
+    source = tmp_path / "uploads"
+    source.mkdir()
+    (source / "scan.pdf").write_bytes(b"%PDF" * 1000)
+    minio = FakeMinio()
+    engine = StreamingBackupEngine(minio_client=minio, bucket="simrs")
+    result = await engine.backup_files(str(source), "backup_s3", "minio", "backups/files")
+    path = result["backup_path"]
+
+    assert await engine.stat(path) == result["size_bytes"]
+    assert await engine.read_head(path, 2) == b"\x1f\x8b"
+
+    await engine.delete(path)
+
+    assert minio.objects == {}
+    assert await engine.stat(path) is None
+    assert await engine.read_head(path, 2) is None
+    assert await engine.load_manifest(path) is None
+
+
+@pytest.mark.asyncio
+async def test_incremental_file_backup_archives_only_changes(tmp_path):
+    source = tmp_path / "uploads"
+    source.mkdir()
+    (source / "scan.pdf").write_bytes(b"%PDF" * 1000)
+    (source / "lab.txt").write_text("hb 13.2")
+    storage = str(tmp_path / "backups")
+    engine = StreamingBackupEngine(minio_client=object(), bucket="simrs")
+
+    full = await engine.backup_files(str(source), "backup_full", "local", storage)
+    manifest = await engine.load_manifest(full["backup_path"])
+
+    (source / "lab.txt").write_text("hb 12.8 g/dL")
+    os.utime(source / "scan.pdf")  # touched only
+    incremental = await engine.backup_files(str(source), "backup_incr", "local", storage, base_manifest=manifest)
+
+    with tarfile.open(incremental["backup_path"], "r:gz") as tar:
+        names = tar.getnames()
+    with open(incremental["backup_path"], "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest() == incremental["checksum"]
+
+    assert full["files_count"] == 2
+    assert incremental["files_count"] == 1
+    assert sorted(names) == [MANIFEST_MEMBER, os.path.join("uploads", "lab.txt")]
+    files = (await engine.load_manifest(incremental["backup_path"]))["files"]
+    assert files[os.path.join("uploads", "scan.pdf")]["backup_id"] == "backup_full"
+    assert files[os.path.join("uploads", "lab.txt")]["backup_id"] == "backup_incr"
+
+
+async def _full_and_incremental(tmp_path, engine):
+    source = tmp_path / "uploads"
+    source.mkdir()
+    (source / "scan.pdf").write_bytes(b"%PDF" * 1000)
+    (source / "old.txt").write_text("removed later")
+    storage = str(tmp_path / "backups")
+
+    full = await engine.backup_files(str(source), "backup_full", "local", storage)
+
+    (source / "old.txt").unlink()
+    (source / "sub").mkdir()
+    (source / "sub" / "new.txt").write_text("hasil lab")
+    manifest = await engine.load_manifest(full["backup_path"])
+    incremental = await engine.backup_files(str(source), "backup_incr", "local", storage, base_manifest=manifest)
+    return full, incremental
+
+
+@pytest.mark.asyncio
+async def test_restore_files_combines_incremental_chain(tmp_path):
+    engine = StreamingBackupEngine(minio_client=object(), bucket="simrs")
+    full, incremental = await _full_and_incremental(tmp_path, engine)
+    target = tmp_path / "restored"
+    progress = RestoreProgress()
+
+    result = await engine.restore_files(
+        [
+            ("backup_incr", incremental["backup_path"], incremental["checksum"]),
+            ("backup_full", full["backup_path"], full["checksum"]),
+        ],
+        str(target),
+        await engine.load_manifest(incremental["backup_path"]),
+        progress,
+    )
+
+    assert result["files_restored"] == 2
+    assert (target / "uploads" / "scan.pdf").read_bytes() == b"%PDF" * 1000
+    assert (target / "uploads" / "sub" / "new.txt").read_text() == "hasil lab"
+    assert not (target / "uploads" / "old.txt").exists()
+    assert progress.percent() == 100.0
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".restore_")]
+
+
+@pytest.mark.asyncio
+async def test_restores_are_not_held_to_the_backup_cap(tmp_path):
+    engine = StreamingBackupEngine(minio_client=object(), bucket="simrs")
+    full, incremental = await _full_and_incremental(tmp_path, engine)
+
+    class BackupCapExhausted(BandwidthLimiter):
+        def consume(self, nbytes):
+            raise AssertionError("restore read against the backup cap")
+
+    engine.limiter = BackupCapExhausted(1)
+    await engine.restore_files(
+        [("backup_full", full["backup_path"], full["checksum"])], str(tmp_path / "restored")
+    )
+    result = await engine.verify_archive(incremental["backup_path"], incremental["checksum"])
+
+    assert result["checksum_verified"]
+    assert engine.restore_limiter.rate == 0
+
+
+@pytest.mark.asyncio
+async def test_restore_rejects_corrupted_archive(tmp_path):
+    engine = StreamingBackupEngine(minio_client=object(), bucket="simrs")
+    source = tmp_path / "uploads"
+    source.mkdir()
+    (source / "scan.pdf").write_bytes(b"%PDF" * 1000)
+    backup = await engine.backup_files(str(source), "backup_full", "local", str(tmp_path / "backups"))
+    target = tmp_path / "restored"
+
+    with pytest.raises(BackupIntegrityError):
+        await engine.restore_files([("backup_full", backup["backup_path"], "0" * 64)], str(target))
+    assert not target.exists()
+
+    result = await engine.verify_archive(backup["backup_path"], backup["checksum"])
+    assert result["files_count"] == 1
+
+
+def test_pg_restore_progress_lines():
+    serial = PG_RESTORE_TABLE_PATTERN.search('pg_restore: processing data for table "public.patients"')
+    parallel = PG_RESTORE_TABLE_PATTERN.search("pg_restore: finished item 3412 TABLE DATA public encounters")
+
+    assert serial.group(1) == "public.patients"
+    assert (parallel.group(2), parallel.group(3)) == ("public", "encounters")
+
+    progress = RestoreProgress(extract_share=0.3)
+    progress.bytes_total = progress.bytes_read = 100
+    progress.tables_total, progress.tables_restored = 10, 5
+    assert progress.percent() == 65.0
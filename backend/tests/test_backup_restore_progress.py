@@ -0,0 +1,46 @@
+"""
+Unit tests for restore progress reporting
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.services import backup as backup_service
+from app.services.backup import BackupRestorationService
+from app.services.backup_engine import RestoreProgress
+
+
+class CallerSession:
+    """The restore's own session, which the reporter must not touch"""
+
+    async def commit(self):
+        raise AssertionError("progress committed on the caller's session")
+
+
+@pytest.mark.asyncio
+async def test_progress_writes_finish_before_the_restore_returns(monkeypatch):
+    monkeypatch.setattr(backup_service, "RESTORE_PROGRESS_INTERVAL_SECONDS", 0.01)
+    service = BackupRestorationService(CallerSession())
+    writes = []
+    writing = []
+
+    async def record_progress(restore_job_id, progress):
+        writing.append(True)
+        await asyncio.sleep(0.03)  # a slow commit
+        writes.append((restore_job_id, progress.percent()))
+        writing.pop()
+
+    monkeypatch.setattr(service, "_record_progress", record_progress)
+
+    async def restore():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    restore_job = SimpleNamespace(id=3, restore_id="restore_x")
+    result = await service._with_progress(restore_job, RestoreProgress(), restore())
+
+    assert result == "done"
+    assert writes and all(job_id == 3 for job_id, _ in writes)
+    assert not writing
@@ -0,0 +1,68 @@
+"""
+Unit tests for backup retention cleanup
+"""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.services import backup as backup_service
+from app.services.backup import BackupRetentionService
+from app.services.backup_engine import MANIFEST_SUFFIX, StreamingBackupEngine
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+class FakeSession:
+    """Answers the expired-backups query, then the retained-backups query"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    async def execute(self, statement):
+        return FakeResult(self.results.pop(0))
+
+
+@pytest.mark.asyncio
+async def test_cleanup_keeps_bases_of_retained_backups(tmp_path, monkeypatch):
+    engine = StreamingBackupEngine(minio_client=object(), bucket="simrs")
+    monkeypatch.setattr(backup_service, "create_backup_engine", lambda: engine)
+    storage = str(tmp_path / "backups")
+    source = tmp_path / "uploads"
+    source.mkdir()
+    (source / "scan.pdf").write_bytes(b"%PDF" * 1000)
+
+    stale = await engine.backup_files(str(source), "backup_stale", "local", storage)
+    base = await engine.backup_files(str(source), "backup_base", "local", storage)
+    (source / "lab.txt").write_text("hb 13.2")
+    incremental = await engine.backup_files(
+        str(source), "backup_incr", "local", storage,
+        base_manifest=await engine.load_manifest(base["backup_path"]),
+    )
+
+    db = FakeSession(
+        [
+            SimpleNamespace(job_id="backup_stale", backup_path=stale["backup_path"]),
+            SimpleNamespace(job_id="backup_base", backup_path=base["backup_path"]),
+            SimpleNamespace(job_id="backup_gone", backup_path=os.path.join(storage, "missing.tar.gz")),
+        ],
+        [SimpleNamespace(job_id="backup_incr", backup_path=incremental["backup_path"])],
+    )
+
+    result = await BackupRetentionService(db).cleanup_old_backups(dry_run=False)
+
+    assert result["backups_to_delete"] == 2
+    assert result["backups_deleted"] == 2
+    assert result["backups_kept_as_base"] == 1
+    assert result["total_size_bytes"] == stale["size_bytes"]
+    assert not os.path.exists(stale["backup_path"])
+    assert not os.path.exists(stale["backup_path"] + MANIFEST_SUFFIX)
+    assert os.path.exists(base["backup_path"])
+    assert os.path.exists(base["backup_path"] + MANIFEST_SUFFIX)
@@ -0,0 +1,120 @@
+"""
+Unit tests for the two-tier BPJS eligibility cache
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.bpjs_cache import BPJSCacheManager, LocalTTLCache, jittered_ttl
+from app.services.bpjs_vclaim import BPJSVClaimError
+
+
+class FakeRedis:
+    """The few Redis commands the cache manager uses"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.values.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+        self.ttls[key] = ttl
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+CARD = "0001234567890"
+
+
+def _manager(redis=None):
+    return BPJSCacheManager(redis, local_cache=LocalTTLCache(max_entries=100))
+
+
+class TestLocalTTLCache:
+    """Test the in-process tier"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalTTLCache(max_entries=2)
+        cache.set("a", {"v": 1}, 60)
+        cache.set("b", {"v": 2}, 60)
+        cache.get("a")
+        cache.set("c", {"v": 3}, 60)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"v": 1}
+
+    def test_entries_expire(self):
+        cache = LocalTTLCache()
+        cache.set("a", {"v": 1}, 0)
+
+        assert cache.get("a") is None
+
+
+class TestBPJSCacheManager:
+    """Test tiers, negative caching and single-flight lookups"""
+
+    @pytest.mark.asyncio
+    async def test_l2_hit_fills_l1(self):
+        redis = FakeRedis()
+        redis.values["bpjs:eligibility:{}".format(CARD)] = json.dumps({"is_eligible": True})
+        manager = _manager(redis)
+
+        assert (await manager.get_cached_eligibility(CARD))["is_eligible"]
+        assert (await manager.get_cached_eligibility(CARD))["is_eligible"]
+        assert redis.gets == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_fetch(self):
+        manager = _manager(FakeRedis())
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"is_eligible": True}
+
+        results = await asyncio.gather(*[manager.get_or_fetch_eligibility(CARD, fetch) for _ in range(20)])
+
+        assert len(calls) == 1
+        assert all(data["is_eligible"] for data, _ in results)
+        assert (await manager.get_or_fetch_eligibility(CARD, fetch))[1] is True
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_cached_negatively(self):
+        redis = FakeRedis()
+        manager = _manager(redis)
+
+        async def fetch():
+            raise BPJSVClaimError("Peserta tidak ditemukan", code="201")
+
+        with pytest.raises(BPJSVClaimError):
+            await manager.get_or_fetch_eligibility(CARD, fetch)
+
+        data, is_cached = await manager.get_or_fetch_eligibility(CARD, fetch)
+        assert is_cached
+        assert data["negative"] and not data["is_eligible"]
+        assert redis.ttls["bpjs:eligibility:{}".format(CARD)] <= 3600 * 1.1
+
+    @pytest.mark.asyncio
+    async def test_outage_is_not_cached(self):
+        manager = _manager(FakeRedis())
+
+        async def fetch():
+            raise BPJSVClaimError("Request to BPJS API timed out", code="TIMEOUT")
+
+        for _ in range(2):
+            with pytest.raises(BPJSVClaimError):
+                await manager.get_or_fetch_eligibility(CARD, fetch)
+
+    def test_ttl_jitter_bounds(self):
+        ttls = set(jittered_ttl(86400) for _ in range(50))
+
+        assert len(ttls) > 1
+        assert all(86400 * 0.9 <= ttl <= 86400 * 1.1 for ttl in ttls)
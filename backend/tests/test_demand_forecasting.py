@@ -0,0 +1,83 @@
+"""
+Unit tests for the vectorized batch demand forecast
+"""
+import asyncio
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.demand_forecasting import (
+    DemandForecastingService,
+    forecast_matrix,
+)
+
+
+END_DATE = date(2026, 1, 31)
+
+
+def synthetic_series(n_drugs, n_days, seed=7):
+    """Stable, trending and erratic daily series with zero days"""
+    rng = random.Random(seed)
+    series = []
+    for _ in range(n_drugs):
+        base = rng.choice([0, 2, 10, 50])
+        trend = rng.choice([0, 0.05, 0.3])
+        noise = rng.choice([0.05, 0.4, 1.5])
+        series.append([
+            max(0, int(base + trend * i + rng.gauss(0, noise * base + 0.1)))
+            if rng.random() > 0.1 else 0
+            for i in range(n_days)
+        ])
+    return series
+
+
+def scalar_forecast(series, horizon, algorithm=None):
+    """Forecast one series with the per-drug algorithm classes"""
+    n_days = len(series)
+    historical_data = [
+        (END_DATE - timedelta(days=n_days - 1 - i), q) for i, q in enumerate(series)
+    ]
+    service = DemandForecastingService(None)
+    if algorithm is None:
+        algorithm = asyncio.run(service.analyze_demand_pattern(historical_data))
+    return service.ALGORITHMS[algorithm].forecast(historical_data, horizon)
+
+
+class TestForecastMatrix:
+    """Test the vectorized algorithms against the per-drug classes"""
+
+    @pytest.mark.parametrize("n_days", [366, 20])
+    def test_matches_per_drug_forecast(self, n_days):
+        series = synthetic_series(30, n_days)
+        results = forecast_matrix(list(range(30)), np.array(series), END_DATE, 14)
+
+        for drug_id, (row, result) in enumerate(zip(series, results)):
+            expected = scalar_forecast(row, 14)
+            assert result["drug_id"] == drug_id
+            for key in ("algorithm", "parameters", "mape", "forecast"):
+                assert result[key] == expected[key]
+            for got, want in zip(result["confidence_intervals"], expected["confidence_intervals"]):
+                assert got == pytest.approx(want)
+
+    @pytest.mark.parametrize("algorithm", [
+        "simple_moving_average", "exponential_smoothing", "linear_regression",
+    ])
+    def test_forced_algorithm(self, algorithm):
+        series = synthetic_series(5, 90, seed=3)
+        results = forecast_matrix([1, 2, 3, 4, 5], np.array(series), END_DATE, 7, algorithm=algorithm)
+
+        for row, result in zip(series, results):
+            expected = scalar_forecast(row, 7, algorithm)
+            assert result["algorithm"] == algorithm
+            assert result["forecast"] == expected["forecast"]
+            assert result["mape"] == expected["mape"]
+
+    def test_forecast_dates_follow_history(self):
+        results = forecast_matrix([9], np.zeros((1, 60)), END_DATE, 3)
+
+        assert [f["date"] for f in results[0]["forecast"]] == [
+            "2026-02-01", "2026-02-02", "2026-02-03",
+        ]
+        assert results[0]["mape"] is None
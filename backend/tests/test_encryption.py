@@ -9,7 +9,9 @@ This test suite verifies:
 import json
 import os
 import sys
+import base64
 import pytest
+from cryptography.fernet import Fernet
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -19,8 +21,11 @@ from app.core.encryption import (
     encrypt_field,
     decrypt_field,
     is_encrypted,
+    encrypt_many,
+    decrypt_many,
     EncryptionError
 )
+from app.core import encryption
 
 
 class TestEncryption:
@@ -174,5 +179,59 @@ class TestEncryption:
             encrypt_field("test data")
 
 
+class TestKeyRing:
+    """Test suite for the cached key ring and bulk APIs."""
+
+    @pytest.fixture
+    def key(self, monkeypatch):
+        """Configure a fresh encryption key."""
+        key = generate_key()
+        monkeypatch.setattr(encryption.settings, "AUDIT_LOG_ENCRYPTION_KEY", key)
+        return key
+
+    def test_key_ring_is_cached(self, key):
+        """Test that the key ring is built once per key."""
+        assert encryption._get_fernet() is encryption._get_fernet()
+
+    def test_compact_format(self, key):
+        """Test that values are stored as bare Fernet tokens."""
+        ciphertext = encrypt_field("Test data")
+
+        assert ciphertext.startswith(encryption.FERNET_TOKEN_PREFIX)
+        assert is_encrypted(ciphertext) is True
+
+    def test_reads_legacy_format(self, key):
+        """Test that double-base64 values written earlier still decrypt."""
+        token = Fernet(key.encode()).encrypt(b"legacy row")
+        legacy = base64.urlsafe_b64encode(token).decode()
+
+        assert is_encrypted(legacy) is True
+        assert decrypt_field(legacy) == "legacy row"
+
+    def test_rotated_key(self, key, monkeypatch):
+        """Test that values encrypted with a retired key still decrypt."""
+        old_ciphertext = encrypt_field("before rotation")
+        new_key = generate_key()
+        monkeypatch.setattr(
+            encryption.settings, "AUDIT_LOG_ENCRYPTION_KEY", f"{new_key},{key}"
+        )
+
+        assert decrypt_field(old_ciphertext) == "before rotation"
+        assert Fernet(new_key.encode()).decrypt(
+            encrypt_field("after rotation").encode()
+        ) == b"after rotation"
+
+    @pytest.mark.parametrize("max_workers", [1, 4])
+    def test_bulk_round_trip(self, key, max_workers):
+        """Test bulk encryption and decryption preserve order and None."""
+        values = [f"value {i}" for i in range(encryption.BULK_PARALLEL_THRESHOLD + 5)]
+        values[3] = None
+
+        ciphertexts = encrypt_many(values, max_workers=max_workers)
+
+        assert ciphertexts[3] is None
+        assert decrypt_many(ciphertexts, max_workers=max_workers) == values
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
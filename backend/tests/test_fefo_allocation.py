@@ -0,0 +1,173 @@
+"""
+Unit tests for the FEFO dispensing split
+"""
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.crud import inventory
+from app.crud.inventory import InsufficientStockError, allocate_fefo, dispense_stock
+
+
+def batch(batch_id, drug_id, quantity, expiry_date):
+    return SimpleNamespace(id=batch_id, drug_id=drug_id, quantity=quantity, expiry_date=expiry_date)
+
+
+BATCHES = [
+    batch(1, 10, 5, date(2026, 4, 1)),
+    batch(2, 10, 0, date(2026, 5, 1)),
+    batch(3, 10, 20, date(2026, 6, 1)),
+    batch(4, 11, 8, date(2026, 4, 15)),
+]
+
+
+def test_request_is_split_across_batches_in_order():
+    allocations, shortages = allocate_fefo(BATCHES, {10: 12})
+
+    assert [(b.id, quantity) for b, quantity in allocations] == [(1, 5), (3, 7)]
+    assert shortages == {}
+
+
+def test_all_drugs_are_allocated_together():
+    allocations, shortages = allocate_fefo(BATCHES, {10: 3, 11: 8})
+
+    assert [(b.id, quantity) for b, quantity in allocations] == [(1, 3), (4, 8)]
+    assert shortages == {}
+
+
+def test_shortage_is_reported_per_drug():
+    allocations, shortages = allocate_fefo(BATCHES, {10: 30, 11: 2, 12: 4})
+
+    assert sum(quantity for b, quantity in allocations if b.drug_id == 10) == 25
+    assert shortages == {10: 5, 12: 4}
+    assert "short 5" in str(InsufficientStockError(shortages))
+
+
+class RowLocks:
+    """FOR UPDATE [SKIP LOCKED] over in-memory batches, one owner per row"""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.owners = {}
+        self.released = asyncio.Condition()
+
+    async def lock(self, session, drug_ids, skip_locked):
+        locked = []
+        candidates = sorted(
+            (b for b in self.batches if b.drug_id in drug_ids),
+            key=lambda b: (b.drug_id, b.expiry_date, b.id),
+        )
+        for batch in candidates:
+            if batch.quantity <= 0:
+                continue
+            if self.owners.get(batch.id, session) is not session:
+                if skip_locked:
+                    continue
+                async with self.released:
+                    await self.released.wait_for(lambda: batch.id not in self.owners)
+            if batch.quantity <= 0:
+                continue  # Rows are re-checked after the wait, as in PostgreSQL
+            self.owners[batch.id] = session
+            session.held.append(batch.id)
+            locked.append(batch)
+            await asyncio.sleep(0)  # Let the other dispenser run between rows
+        return locked
+
+    async def release(self, batch_ids):
+        async with self.released:
+            for batch_id in batch_ids:
+                self.owners.pop(batch_id, None)
+            self.released.notify_all()
+
+
+class FakeSavepoint:
+    def __init__(self, session):
+        self.session = session
+        self.mark = len(session.held)
+
+    async def rollback(self):
+        released = self.session.held[self.mark:]
+        del self.session.held[self.mark:]
+        await self.session.locks.release(released)
+
+    async def commit(self):
+        pass
+
+
+class FakeDispenserSession:
+    """One dispenser's transaction against the shared row locks"""
+
+    def __init__(self, locks):
+        self.locks = locks
+        self.held = []
+        self.added = []
+
+    async def begin_nested(self):
+        return FakeSavepoint(self)
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        await self.locks.release(self.held)
+        self.held = []
+
+
+@pytest.fixture
+def row_locks(monkeypatch):
+    batches = [
+        SimpleNamespace(id=1, drug_id=10, quantity=5, expiry_date=date(2026, 4, 1),
+                        bin_location="A-1", unit_cost=None, updated_at=None),
+        SimpleNamespace(id=2, drug_id=11, quantity=5, expiry_date=date(2026, 4, 1),
+                        bin_location="A-2", unit_cost=None, updated_at=None),
+    ]
+    locks = RowLocks(batches)
+
+    async def lock_fefo_batches(db, drug_ids, skip_locked):
+        return await locks.lock(db, drug_ids, skip_locked)
+
+    async def transaction_number():
+        return "TRX-TEST"
+
+    async def apply_stock_delta(db, drug_id, location, delta):
+        return 0
+
+    monkeypatch.setattr(inventory, "_lock_fefo_batches", lock_fefo_batches)
+    monkeypatch.setattr(inventory, "generate_transaction_number", transaction_number)
+    monkeypatch.setattr(inventory, "apply_stock_delta", apply_stock_delta)
+    return locks
+
+
+@pytest.mark.asyncio
+async def test_overlapping_dispenses_do_not_deadlock(row_locks):
+    async def dispense(requested):
+        db = FakeDispenserSession(row_locks)
+        transaction = await dispense_stock(db, requested)
+        await db.commit()
+        return transaction
+
+    # Each skip-locked pass gets one of the two batches and comes up short
+    first, second = await asyncio.wait_for(
+        asyncio.gather(dispense({10: 3, 11: 3}), dispense({10: 2, 11: 2})),
+        timeout=2,
+    )
+
+    assert first is not None and second is not None
+    assert [b.quantity for b in row_locks.batches] == [0, 0]
+    assert row_locks.owners == {}
+
+
+@pytest.mark.asyncio
+async def test_nothing_dispensed_creates_no_transaction(row_locks):
+    for batch in row_locks.batches:
+        batch.quantity = 0
+    db = FakeDispenserSession(row_locks)
+
+    assert await dispense_stock(db, {10: 1}, allow_partial=True) is None
+    assert db.added == []
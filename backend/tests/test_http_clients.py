@@ -0,0 +1,101 @@
+"""
+Unit tests for the shared upstream HTTP client registry
+"""
+import asyncio
+
+import pytest
+
+from app.core.http_clients import HTTPClientRegistry, UpstreamPool
+from app.core.metrics import upstream_http_requests_total
+
+
+class _Upstream:
+    """Minimal keep-alive HTTP server counting connections"""
+
+    def __init__(self):
+        self.connections = 0
+        self.release = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return "http://127.0.0.1:{}/".format(self.server.sockets[0].getsockname()[1])
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                if self.release is not None:
+                    await self.release.wait()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+def _reused(upstream):
+    return upstream_http_requests_total.labels(upstream=upstream, connection="reused")._value.get()
+
+
+class TestHTTPClientRegistry:
+    """Test lending, connection reuse and draining"""
+
+    def test_private_client_before_start(self):
+        registry = HTTPClientRegistry(pools={"test_private": UpstreamPool(2, 1)})
+
+        client, owned = registry.acquire("test_private")
+
+        assert owned is True
+        asyncio.run(client.aclose())
+
+    @pytest.mark.asyncio
+    async def test_shared_client_reuses_connection(self):
+        upstream = _Upstream()
+        url = await upstream.start()
+        registry = HTTPClientRegistry(pools={"test_shared": UpstreamPool(2, 1)})
+        registry.start()
+        reused_before = _reused("test_shared")
+
+        try:
+            for _ in range(5):
+                client, owned = registry.acquire("test_shared")
+                assert owned is False
+                response = await client.get(url)
+                assert response.text == "ok"
+        finally:
+            await registry.stop()
+            await upstream.stop()
+
+        assert upstream.connections == 1
+        assert _reused("test_shared") - reused_before == 4
+
+    @pytest.mark.asyncio
+    async def test_stop_waits_for_in_flight_requests(self):
+        upstream = _Upstream()
+        upstream.release = asyncio.Event()
+        url = await upstream.start()
+        registry = HTTPClientRegistry(pools={"test_drain": UpstreamPool(2, 1)}, drain_timeout=5)
+        registry.start()
+        client, _ = registry.acquire("test_drain")
+
+        request = asyncio.ensure_future(client.get(url))
+        await asyncio.sleep(0.05)
+        assert registry.in_flight() == 1
+
+        stopping = asyncio.ensure_future(registry.stop())
+        await asyncio.sleep(0.05)
+        assert not stopping.done()
+
+        upstream.release.set()
+        response = await request
+        await stopping
+        await upstream.stop()
+
+        assert response.text == "ok"
+        assert registry.started is False
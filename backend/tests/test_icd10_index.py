@@ -0,0 +1,86 @@
+"""
+Unit tests for the in-memory ICD-10 search index
+"""
+from app.services.icd10_index import ICD10Entry, ICD10SearchIndex, normalize_code
+
+
+def entry(entry_id, code, indonesian, english=None, chapter="I", usage_count=0, is_common=False, severity=None):
+    return ICD10Entry(
+        id=entry_id,
+        code=code,
+        code_full=code,
+        chapter=chapter,
+        block=code[:3],
+        description_indonesian=indonesian,
+        description_english=english,
+        severity=severity,
+        usage_count=usage_count,
+        is_common=is_common,
+    )
+
+
+def build_index():
+    return ICD10SearchIndex([
+        entry(1, "A09", "Diare dan gastroenteritis", "Diarrhoea and gastroenteritis", usage_count=5),
+        entry(2, "A09.0", "Gastroenteritis infeksi lainnya", "Other gastroenteritis of infectious origin"),
+        entry(3, "A01.0", "Demam tifoid", "Typhoid fever", is_common=True),
+        entry(4, "J18.9", "Pneumonia, tidak spesifik", "Pneumonia, unspecified", chapter="X", severity="severe"),
+        entry(5, "R50.9", "Demam, tidak spesifik", "Fever, unspecified", chapter="XVIII", usage_count=20),
+    ])
+
+
+class TestICD10SearchIndex:
+    """Test code and description lookup"""
+
+    def test_normalize_code(self):
+        assert normalize_code(" a09.0 ") == "A090"
+
+    def test_code_prefix(self):
+        results, total = build_index().search("A09")
+
+        assert [r.code for r in results] == ["A09", "A09.0"]
+        assert total == 2
+
+    def test_code_with_decimal(self):
+        results, _ = build_index().search("a09.")
+        assert {r.code for r in results} == {"A09", "A09.0"}
+
+    def test_word_prefix_ranked(self):
+        results, total = build_index().search("dem")
+
+        # Common first, then by usage count
+        assert [r.id for r in results] == [3, 5]
+        assert total == 2
+
+    def test_infix_match(self):
+        results, _ = build_index().search("enteritis")
+        assert {r.id for r in results} == {1, 2}
+
+    def test_all_words_must_match(self):
+        results, _ = build_index().search("demam tifoid")
+        assert [r.id for r in results] == [3]
+
+    def test_english_description(self):
+        results, _ = build_index().search("fever")
+        assert {r.id for r in results} == {3, 5}
+
+    def test_filters(self):
+        index = build_index()
+
+        assert index.search("dem", chapter_filter="XVIII")[1] == 1
+        assert index.search("pneu", severity_filter="severe")[1] == 1
+        assert index.search("dem", common_only=True)[0][0].id == 3
+
+    def test_limit_keeps_total(self):
+        results, total = build_index().search("a0", limit=1)
+
+        assert len(results) == 1
+        assert total == 3
+
+    def test_rerank_after_usage(self):
+        index = build_index()
+        index.entries[2].usage_count = 50
+        index.rerank()
+
+        results, _ = index.search("gastro")
+        assert [r.id for r in results] == [2, 1]
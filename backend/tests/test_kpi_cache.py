@@ -0,0 +1,94 @@
+"""
+Unit tests for the single-flight KPI result cache
+"""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.kpi_cache import KPIResultCache, kpi_cache_key
+
+
+def _counting(value, delay=0.01):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value
+
+    return compute, calls
+
+
+class TestKPICacheKey:
+    """Test KPI cache keys"""
+
+    def test_key_changes_when_kpi_is_edited(self):
+        start = datetime(2026, 1, 16)
+        end = datetime(2026, 1, 16, 23, 59, 59)
+        kpi = SimpleNamespace(id=7, updated_at=datetime(2026, 1, 1))
+        edited = SimpleNamespace(id=7, updated_at=datetime(2026, 1, 2))
+
+        assert kpi_cache_key(kpi, start, end) != kpi_cache_key(edited, start, end)
+        assert kpi_cache_key(kpi, start, end) == kpi_cache_key(kpi, start, end)
+
+
+class TestKPIResultCache:
+    """Test caching and single-flight computation"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_compute_once(self):
+        cache = KPIResultCache()
+        compute, calls = _counting(42.0)
+
+        values = await asyncio.gather(*[
+            cache.get_or_compute("kpi", 60, compute) for _ in range(50)
+        ])
+
+        assert values == [42.0] * 50
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_value_is_reused_until_min_remaining(self):
+        cache = KPIResultCache()
+        compute, calls = _counting(1.0, delay=0)
+
+        await cache.get_or_compute("kpi", 60, compute)
+        await cache.get_or_compute("kpi", 60, compute)
+        assert len(calls) == 1
+
+        await cache.get_or_compute("kpi", 60, compute, min_remaining=120)
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_none_is_not_cached(self):
+        cache = KPIResultCache()
+        compute, calls = _counting(None, delay=0)
+
+        await cache.get_or_compute("kpi", 60, compute)
+        await cache.get_or_compute("kpi", 60, compute)
+
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_waiters_share_the_error(self):
+        cache = KPIResultCache()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("query failed")
+
+        results = await asyncio.gather(*[
+            cache.get_or_compute("kpi", 60, failing) for _ in range(3)
+        ], return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert "kpi" not in cache._inflight
+
+    def test_active_dashboards_expire(self):
+        cache = KPIResultCache()
+        cache.mark_active("ops")
+
+        assert cache.active_dashboards(window=60) == ["ops"]
+        assert cache.active_dashboards(window=-1) == []
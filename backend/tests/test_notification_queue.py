@@ -0,0 +1,73 @@
+"""
+Unit tests for notification queue delivery outcomes
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from app.models.notifications import NotificationStatus
+from app.services.notification_channels import ChannelStatus, create_delivery_result
+from app.services.notification_queue import NotificationQueueProcessor, delivery_outcome
+
+
+Row = namedtuple("Row", [
+    "status", "sent_at", "delivered_at", "message_id", "failed_reason",
+    "retry_count", "max_retries", "scheduled_at",
+])
+
+NOW = datetime(2026, 1, 16, 8, 0, 0)
+
+
+def pending(retry_count=0, max_retries=3):
+    return Row("pending", None, None, None, None, retry_count, max_retries, None)
+
+
+class TestDeliveryOutcome:
+    """Test status updates computed from delivery results"""
+
+    def test_sent(self):
+        result = create_delivery_result(True, ChannelStatus.SENT, message_id="m-1")
+        values, retry = delivery_outcome(pending(), result, NotificationQueueProcessor.RETRY_DELAYS, NOW)
+
+        assert values["status"] == NotificationStatus.SENT
+        assert values["sent_at"] == NOW
+        assert values["message_id"] == "m-1"
+        assert values["delivered_at"] is None
+        assert retry is None
+
+    def test_delivered(self):
+        result = create_delivery_result(True, ChannelStatus.DELIVERED)
+        values, _ = delivery_outcome(pending(), result, NotificationQueueProcessor.RETRY_DELAYS, NOW)
+
+        assert values["status"] == NotificationStatus.DELIVERED
+        assert values["delivered_at"] == NOW
+
+    def test_failure_is_retried(self):
+        result = create_delivery_result(False, ChannelStatus.FAILED, error_message="timeout")
+        values, retry = delivery_outcome(pending(retry_count=1), result, NotificationQueueProcessor.RETRY_DELAYS, NOW)
+
+        assert values["status"] == NotificationStatus.PENDING
+        assert values["retry_count"] == 2
+        assert retry == 300
+        assert values["scheduled_at"] == NOW + timedelta(seconds=300)
+        assert values["failed_reason"] == "timeout"
+
+    def test_last_failure_is_final(self):
+        result = create_delivery_result(False, ChannelStatus.FAILED, error_message="bounced")
+        values, retry = delivery_outcome(pending(retry_count=2), result, NotificationQueueProcessor.RETRY_DELAYS, NOW)
+
+        assert values["status"] == NotificationStatus.FAILED
+        assert values["retry_count"] == 3
+        assert retry is None
+
+    def test_every_update_has_the_same_columns(self):
+        """Bulk UPDATE needs one parameter set shape for all rows"""
+        sent, _ = delivery_outcome(
+            pending(), create_delivery_result(True, ChannelStatus.SENT),
+            NotificationQueueProcessor.RETRY_DELAYS, NOW
+        )
+        failed, _ = delivery_outcome(
+            pending(), create_delivery_result(False, ChannelStatus.FAILED),
+            NotificationQueueProcessor.RETRY_DELAYS, NOW
+        )
+
+        assert set(sent) == set(failed)
@@ -0,0 +1,102 @@
+"""
+Unit tests for patient deduplication blocking keys and scoring
+"""
+from datetime import date
+
+from app.services.patient_deduplication import (
+    normalize_name,
+    indonesian_phonetic_key,
+    normalize_phone_suffix,
+    dob_bucket,
+    build_blocking_keys,
+    jaro_winkler,
+    jaro_winkler_many,
+    _score_blocks,
+)
+
+
+class TestPhoneticKeys:
+    """Test Indonesian phonetic name keys"""
+
+    def test_old_spelling_variants_share_key(self):
+        """Test that old and modern spellings produce the same key"""
+        pairs = [
+            ("soekarno", "sukarno"),
+            ("djoko", "joko"),
+            ("achmad", "ahmad"),
+            ("sjarifuddin", "syarifudin"),
+            ("njoman", "nyoman"),
+        ]
+        for old, modern in pairs:
+            assert indonesian_phonetic_key(old) == indonesian_phonetic_key(modern)
+
+    def test_different_names_differ(self):
+        """Test that unrelated names produce different keys"""
+        assert indonesian_phonetic_key("budi") != indonesian_phonetic_key("sari")
+
+    def test_empty_token(self):
+        """Test empty input"""
+        assert indonesian_phonetic_key("") == ""
+
+    def test_normalize_name_strips_titles_and_muhammad(self):
+        """Test honorific removal and Muhammad variants"""
+        assert normalize_name("Tn. Moch. Hatta") == "muhammad hatta"
+        assert normalize_name("Ny. Siti Aminah, S.E.") == "siti aminah"
+
+
+class TestBlockingKeys:
+    """Test phone and date-of-birth blocking keys"""
+
+    def test_phone_suffix_ignores_country_code(self):
+        """Test +62 and 0 prefixes normalize to the same suffix"""
+        assert normalize_phone_suffix("+62 812-3456-7890") == normalize_phone_suffix("0812 3456 7890")
+
+    def test_phone_suffix_too_short(self):
+        """Test short numbers are not used for blocking"""
+        assert normalize_phone_suffix("12345") is None
+        assert normalize_phone_suffix(None) is None
+
+    def test_dob_bucket(self):
+        """Test year-month bucketing"""
+        assert dob_bucket(date(1980, 7, 15)) == 198007
+        assert dob_bucket(None) is None
+
+    def test_build_blocking_keys(self):
+        """Test complete key set"""
+        keys = build_blocking_keys("Budi Santoso", "081234567890", date(1980, 7, 15))
+
+        assert keys["normalized_name"] == "budi santoso"
+        assert keys["phonetic_first"] == indonesian_phonetic_key("budi")
+        assert keys["phonetic_last"] == indonesian_phonetic_key("santoso")
+        assert keys["phone_suffix"] == "34567890"
+        assert keys["dob_bucket"] == 198007
+
+
+class TestJaroWinkler:
+    """Test Jaro-Winkler similarity"""
+
+    def test_reference_values(self):
+        """Test against published reference values"""
+        assert round(jaro_winkler("martha", "marhta"), 3) == 0.961
+        assert round(jaro_winkler("dwayne", "duane"), 2) == 0.84
+
+    def test_identical_and_empty(self):
+        """Test boundary cases"""
+        assert jaro_winkler("budi", "budi") == 1.0
+        assert jaro_winkler("", "budi") == 0.0
+
+    def test_many_preserves_order(self):
+        """Test batch scoring returns one score per candidate in order"""
+        scores = jaro_winkler_many("budi santoso", ["budi santoso", "agus salim"])
+
+        assert scores[0] == 1.0
+        assert scores[1] < 0.7
+
+    def test_score_blocks(self):
+        """Test pair scoring within a block"""
+        block = [(1, "budi santoso", 198007), (2, "budi santosa", 198007), (3, "agus salim", 198007)]
+        pairs = _score_blocks([block], 0.9, "dob_first")
+
+        assert len(pairs) == 1
+        assert pairs[0][:2] == (1, 2)
+        assert pairs[0][3] == "dob_first"
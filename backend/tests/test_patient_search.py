@@ -0,0 +1,105 @@
+"""
+Unit tests for patient search modes and keyset cursors
+"""
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.crud.patient import (
+    decode_patient_cursor,
+    encode_patient_cursor,
+    search_patients,
+)
+
+
+class FakeResult:
+    def __init__(self, value=None):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: [])
+
+
+class FakeConnection:
+    dialect = postgresql.dialect()
+
+    def __init__(self, session):
+        self.session = session
+
+    async def exec_driver_sql(self, sql):
+        self.session.driver_sql.append(sql)
+        return FakeResult(json.dumps([{"Plan": {"Plan Rows": 4321}}]))
+
+
+class FakeSession:
+    """Records the statements a search runs, compiled for PostgreSQL"""
+
+    def __init__(self, count=7):
+        self.count = count
+        self.statements = []
+        self.driver_sql = []
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return FakeResult(self.count)
+
+    async def connection(self):
+        return FakeConnection(self)
+
+
+def test_cursor_round_trip():
+    patient = SimpleNamespace(created_at=datetime(2026, 1, 5, 9, 30, 15, 123456), id=42)
+
+    cursor = encode_patient_cursor(patient)
+
+    assert decode_patient_cursor(cursor) == (patient.created_at, 42)
+    with pytest.raises(ValueError):
+        decode_patient_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_cursor_mode_uses_keyset_instead_of_offset():
+    db = FakeSession()
+    cursor = encode_patient_cursor(SimpleNamespace(created_at=datetime(2026, 1, 5), id=42))
+
+    patients, total = await search_patients(db, "budi", skip=200, cursor=cursor)
+
+    page_sql = db.statements[-1]
+    assert (patients, total) == ([], 7)
+    assert "(patients.created_at, patients.id) < (" in page_sql
+    assert "OFFSET" not in page_sql
+    assert "ORDER BY patients.created_at DESC, patients.id DESC" in page_sql
+
+
+@pytest.mark.asyncio
+async def test_ranked_mode_orders_by_relevance():
+    db = FakeSession()
+
+    await search_patients(db, "budi", ranked=True)
+
+    page_sql = db.statements[-1]
+    assert "patients.full_name %% " in page_sql
+    assert "ORDER BY CASE" in page_sql
+    assert "similarity(patients.full_name" in page_sql
+
+    with pytest.raises(ValueError):
+        await search_patients(db, "budi", ranked=True, cursor="anything")
+
+
+@pytest.mark.asyncio
+async def test_estimate_mode_skips_the_count_query():
+    db = FakeSession()
+
+    _, total = await search_patients(db, "budi", estimate_total=True)
+
+    assert total == 4321
+    assert db.driver_sql[0].startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert len(db.statements) == 1
+    assert "count(" not in db.statements[0]
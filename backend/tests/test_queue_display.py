@@ -0,0 +1,72 @@
+"""
+Unit tests for queue display snapshots
+"""
+import asyncio
+
+import pytest
+
+from app.schemas.queue import QueueDepartment
+from app.services import queue_display
+from app.services.queue_display import QueueDisplayStore, display_key, snapshot_etag
+
+
+class RecordingDisplayStore(QueueDisplayStore):
+    """Store with the database build and Redis write replaced"""
+
+    def __init__(self):
+        super(RecordingDisplayStore, self).__init__()
+        self.builds = 0
+
+    async def _build(self, db, department, poli_id):
+        self.builds += 1
+        await asyncio.sleep(0.01)
+        snapshot = {"department": department.value, "build": self.builds}
+        snapshot["etag"] = snapshot_etag(snapshot)
+        return snapshot
+
+    async def _write(self, key, snapshot, publish):
+        self._local[key] = snapshot
+
+
+class DummyContext(object):
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class TestSnapshotEtag:
+    """Test snapshot keys and ETags"""
+
+    def test_display_key(self):
+        assert display_key(QueueDepartment.POLI, 3) == "poli:3"
+        assert display_key(QueueDepartment.FARMASI) == "farmasi:all"
+
+    def test_etag_ignores_timestamp(self):
+        first = {"waiting": [{"ticket_number": "A-001"}], "timestamp": "08:00"}
+        second = {"waiting": [{"ticket_number": "A-001"}], "timestamp": "08:01"}
+        changed = {"waiting": [{"ticket_number": "A-002"}], "timestamp": "08:01"}
+
+        assert snapshot_etag(first) == snapshot_etag(second)
+        assert snapshot_etag(first) != snapshot_etag(changed)
+
+
+class TestDisplayRefresh:
+    """Test coalescing of display rebuilds"""
+
+    @pytest.mark.asyncio
+    async def test_changes_during_rebuild_coalesce(self, monkeypatch):
+        monkeypatch.setattr(queue_display, "get_db_context", DummyContext)
+        store = RecordingDisplayStore()
+
+        for _ in range(10):
+            store.schedule_refresh(QueueDepartment.POLI, 3)
+            await asyncio.sleep(0)
+
+        while store._refreshing:
+            await asyncio.sleep(0.01)
+
+        # One rebuild for the first change, one more for all later ones
+        assert store.builds == 2
+        assert store._local["poli:3"]["build"] == 2
@@ -0,0 +1,172 @@
+"""
+Unit tests for the API rate limiter and its middleware
+"""
+import asyncio
+import hashlib
+
+import pytest
+
+from app.core.rate_limit import RateLimiter, RateLimitRule
+from app.middleware.rate_limit import RateLimitMiddleware, rule_identity
+
+
+class FakeBucketRedis:
+    """Runs the token bucket script's logic in Python, with a frozen clock"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.calls = 0
+        self.fail = False
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls += 1
+            if self.fail:
+                raise ConnectionError("redis down")
+            capacity, rate, wanted = int(args[0]), float(args[1]), int(args[2])
+            tokens = self.buckets.get(keys[0], capacity)
+            granted = min(wanted, int(tokens))
+            tokens -= granted
+            self.buckets[keys[0]] = tokens
+            retry_after = 0 if granted else int((1 - tokens) / rate) + 1
+            return [granted, int(tokens), retry_after, int((capacity - tokens) / rate) + 1]
+        return run
+
+
+@pytest.mark.asyncio
+async def test_leases_amortize_redis_calls():
+    redis = FakeBucketRedis()
+    limiter = RateLimiter(redis)
+    rule = RateLimitRule("search", 1200, 60)
+
+    decisions = [await limiter.check(rule, "ip:10.0.0.1") for _ in range(200)]
+
+    assert all(decision.allowed for decision in decisions)
+    assert redis.calls < 20
+    taken = 1200 - redis.buckets["rate_limit:bucket:search:ip:10.0.0.1"]
+    assert 200 <= taken <= 200 + rule.max_batch
+
+
+@pytest.mark.asyncio
+async def test_strict_limit_is_exact_and_blocks_locally():
+    redis = FakeBucketRedis()
+    limiter = RateLimiter(redis)
+    rule = RateLimitRule("login", 5, 60, by="ip")
+
+    decisions = [await limiter.check(rule, "ip:10.0.0.2") for _ in range(8)]
+
+    assert [d.allowed for d in decisions] == [True] * 5 + [False] * 3
+    assert decisions[5].retry_after > 0
+    assert redis.calls == 6  # one token per call, then answered locally while blocked
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checks_share_one_refill():
+    redis = FakeBucketRedis()
+    limiter = RateLimiter(redis)
+    rule = RateLimitRule("bpjs", 120, 60)
+
+    decisions = await asyncio.gather(*[limiter.check(rule, "user:7") for _ in range(6)])
+
+    assert all(d.allowed for d in decisions)
+    assert redis.calls <= 4
+
+
+@pytest.mark.asyncio
+async def test_fails_open_when_redis_is_down():
+    redis = FakeBucketRedis()
+    redis.fail = True
+    limiter = RateLimiter(redis)
+    rule = RateLimitRule("default", 10, 60)
+
+    assert (await limiter.check(rule, "ip:10.0.0.3")).allowed
+    assert (await limiter.check(rule, "ip:10.0.0.3")).allowed
+    assert redis.calls == 1
+
+
+def _scope(path, method="GET", headers=None, client=("10.0.0.9", 1234)):
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": client,
+    }
+
+
+async def _call(middleware, scope):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    return messages[0]["status"], dict((k.decode(), v.decode()) for k, v in messages[0]["headers"])
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+@pytest.mark.asyncio
+async def test_middleware_answers_429_with_headers():
+    middleware = RateLimitMiddleware(
+        _ok_app,
+        limiter=RateLimiter(FakeBucketRedis()),
+        rules=[RateLimitRule("search", 2, 60, path=r"^/api/v1/patients")],
+        api_key_hashes=[_digest("kiosk-3"), _digest("kiosk-4")],
+    )
+    scope = _scope("/api/v1/patients/", headers={"X-API-Key": "kiosk-3"})
+
+    status, headers = await _call(middleware, scope)
+    assert status == 200
+    assert headers["ratelimit-limit"] == "2"
+    assert headers["ratelimit-remaining"] == "1"
+
+    await _call(middleware, scope)
+    status, headers = await _call(middleware, scope)
+    assert status == 429
+    assert int(headers["retry-after"]) >= 1
+
+    status, _ = await _call(middleware, _scope("/api/v1/patients/", headers={"X-API-Key": "kiosk-4"}))
+    assert status == 200
+    status, headers = await _call(middleware, _scope("/health"))
+    assert status == 200 and "ratelimit-limit" not in headers
+
+
+def _digest(api_key):
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def test_identity_prefers_issued_api_key_and_hides_it():
+    rule = RateLimitRule("default", 10, 60)
+    issued = frozenset([_digest("secret-key")])
+    identity = rule_identity(rule, _scope("/api/v1/x", headers={"X-API-Key": "secret-key"}), api_key_hashes=issued)
+
+    assert identity.startswith("key:") and "secret-key" not in identity
+    assert rule_identity(rule, _scope("/api/v1/x")) == "ip:10.0.0.9"
+
+
+def test_unknown_api_keys_share_the_client_bucket():
+    rule = RateLimitRule("default", 10, 60)
+    issued = frozenset([_digest("secret-key")])
+
+    for api_key in ("made-up-1", "made-up-2"):
+        scope = _scope("/api/v1/x", headers={"X-API-Key": api_key})
+        assert rule_identity(rule, scope, api_key_hashes=issued) == "ip:10.0.0.9"
+        assert rule_identity(rule, scope) == "ip:10.0.0.9"
+
+
+def test_forwarded_client_ip_comes_from_the_proxy():
+    rule = RateLimitRule("default", 10, 60)
+    # The client sent "X-Forwarded-For: 1.2.3.4"; nginx appended the real peer
+    forwarded = _scope("/api/v1/x", headers={"X-Forwarded-For": "1.2.3.4, 203.0.113.5"})
+    real_ip = _scope("/api/v1/x", headers={"X-Forwarded-For": "1.2.3.4, 203.0.113.5", "X-Real-IP": "203.0.113.7"})
+
+    assert rule_identity(rule, forwarded) == "ip:10.0.0.9"
+    assert rule_identity(rule, forwarded, trust_forwarded_for=True) == "ip:203.0.113.5"
+    assert rule_identity(rule, real_ip, trust_forwarded_for=True) == "ip:203.0.113.7"
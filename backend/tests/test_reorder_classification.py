@@ -0,0 +1,62 @@
+"""
+Unit tests for the vectorized reorder point and ABC calculations
+"""
+import math
+
+import numpy as np
+
+from app.services.reorder_point_optimization import (
+    DEFAULT_UNIT_COST,
+    ORDERING_COST,
+    HOLDING_COST_RATE,
+    abc_classify,
+    reorder_parameters,
+)
+
+
+def test_reorder_parameters_match_the_per_drug_formulas():
+    series = [[3, 0, 5, 2, 8, 4], [10, 10, 10, 10, 10, 10]]
+    lead_times = [7, 14]
+    unit_costs = [2000.0, 500.0]
+
+    params = reorder_parameters(series, lead_times, unit_costs, 1.645)
+
+    for i, quantities in enumerate(series):
+        adu = sum(quantities) / len(quantities)
+        std_dev = (sum((q - adu) ** 2 for q in quantities) / len(quantities)) ** 0.5
+        safety_stock = 1.645 * std_dev * lead_times[i] ** 0.5
+        eoq = ((2 * adu * 365 * ORDERING_COST) / (unit_costs[i] * HOLDING_COST_RATE)) ** 0.5
+
+        assert math.isclose(params['safety_stock'][i], safety_stock)
+        assert math.isclose(params['reorder_point'][i], adu * lead_times[i] + safety_stock)
+        assert math.isclose(params['eoq'][i], eoq)
+
+
+def test_free_drugs_get_a_finite_eoq():
+    series = [[4, 4, 4], [4, 4, 4], [4, 4, 4]]
+
+    params = reorder_parameters(series, [7, 7, 7], [0.0, -10.0, DEFAULT_UNIT_COST], 1.645)
+
+    assert np.all(np.isfinite(params['eoq']))
+    assert params['eoq'][0] == params['eoq'][1] == params['eoq'][2]
+    assert params['annual_value'][0] == 0
+
+
+def test_abc_ranks_by_cumulative_value():
+    classes, cumulative = abc_classify([50, 700, 0, 100, 150])
+
+    assert list(classes) == ['C', 'A', 'C', 'B', 'A']
+    assert math.isclose(cumulative[1], 0.7)
+    assert math.isclose(cumulative[0], 1.0)
+
+
+def test_single_dominant_drug_is_class_a():
+    classes, _ = abc_classify([990, 5, 5])
+
+    assert list(classes) == ['A', 'C', 'C']
+
+
+def test_no_consumption_is_class_c():
+    classes, _ = abc_classify(np.zeros(3))
+
+    assert list(classes) == ['C', 'C', 'C']
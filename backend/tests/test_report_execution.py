@@ -0,0 +1,179 @@
+"""
+Unit tests for report query parameterization, cache keys and file writers
+"""
+import csv
+import json
+import os
+import time
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from app.services.report_execution import (
+    DEFAULT_REPORT_CACHE_TTL_SECONDS,
+    ReportFileWriter,
+    build_report_statement,
+    open_report_writer,
+    parameterize_query,
+    remove_expired_report_outputs,
+    report_output_path,
+    report_cache_key,
+    report_cache_ttl,
+    report_parameter_types,
+    tabulate,
+)
+
+
+def test_parameterize_query_replaces_placeholders_with_binds():
+    sql, names = parameterize_query(
+        "SELECT * FROM invoices WHERE invoice_date >= {start} AND invoice_date <= {end} "
+        "AND payer_type = {payer} AND invoice_date <> {start}"
+    )
+
+    assert sql == (
+        "SELECT * FROM invoices WHERE invoice_date >= (:start) AND invoice_date <= (:end) "
+        "AND payer_type = (:payer) AND invoice_date <> (:start)"
+    )
+    assert names == ["start", "end", "payer"]
+
+
+def test_build_report_statement_binds_values_instead_of_inlining():
+    statement, values = build_report_statement(
+        "SELECT * FROM patients WHERE name = {name} AND birth_date > {born}",
+        {"name": "O'Brien; DROP TABLE patients", "born": "1990-01-31"},
+        {"born": "date"},
+    )
+
+    assert "O'Brien" not in str(statement)
+    assert values == {"name": "O'Brien; DROP TABLE patients", "born": date(1990, 1, 31)}
+
+
+def _asyncpg_sql(statement, values):
+    compiled = statement.compile(dialect=asyncpg_dialect())
+    return compiled.string, compiled.construct_params(values)
+
+
+def test_undeclared_parameters_are_typed_by_the_server():
+    statement, values = build_report_statement(
+        "SELECT * FROM encounters WHERE visit_date >= {d}::date AND visit_date < {until} "
+        "AND patient_name = {name} AND department_id = {dept}",
+        {"d": "2026-01-01", "until": "2026-02-01", "name": "O'Brien", "dept": 4},
+    )
+
+    sql, params = _asyncpg_sql(statement, values)
+    rendered = statement.compile(dialect=asyncpg_dialect(), compile_kwargs={"render_postcompile": True}).string
+
+    # Rendered as literals at execution time, never sent as str binds
+    assert "$" not in sql
+    assert params == values
+    assert "visit_date >= ('2026-01-01')::date" in rendered
+    assert "visit_date < ('2026-02-01')" in rendered
+    assert "patient_name = ('O''Brien')" in rendered
+    assert "department_id = (4)" in rendered
+
+
+def test_declared_parameters_stay_bound_through_casts():
+    statement, values = build_report_statement(
+        "SELECT * FROM encounters WHERE visit_date >= {d}::date", {"d": "2026-01-01"}, {"d": "date"}
+    )
+
+    sql, params = _asyncpg_sql(statement, values)
+
+    assert sql == "SELECT * FROM encounters WHERE visit_date >= ($1::DATE)::date"
+    assert params == {"d": date(2026, 1, 1)}
+
+
+def test_build_report_statement_binds_missing_parameters_as_null():
+    _, values = build_report_statement("SELECT {a}, {b}", {"a": 1})
+    assert values == {"a": 1, "b": None}
+
+
+def test_build_report_statement_rejects_unknown_types():
+    with pytest.raises(ValueError):
+        build_report_statement("SELECT {a}", {"a": 1}, {"a": "money"})
+
+
+def test_report_parameter_types_accepts_both_declaration_forms():
+    report = SimpleNamespace(config={"parameters": {"start": "date", "limit": {"type": "int"}}})
+    assert report_parameter_types(report) == {"start": "date", "limit": "int"}
+
+
+def test_report_cache_key_ignores_parameter_order():
+    first = report_cache_key(7, {"a": 1, "b": "x"}, "json")
+    second = report_cache_key(7, {"b": "x", "a": 1}, "json")
+
+    assert first == second
+    assert first != report_cache_key(7, {"a": 2, "b": "x"}, "json")
+    assert first != report_cache_key(7, {"a": 1, "b": "x"}, "csv")
+
+
+def test_report_cache_ttl():
+    assert report_cache_ttl(SimpleNamespace(config=None)) == DEFAULT_REPORT_CACHE_TTL_SECONDS
+    assert report_cache_ttl(SimpleNamespace(config={"cache_ttl_seconds": 0})) == 0
+    assert report_cache_ttl(SimpleNamespace(config={"cache_ttl_seconds": 3600})) == 3600
+
+
+def test_tabulate_lists_and_dicts():
+    assert tabulate([{"a": 1}, {"a": 2, "b": 3}]) == (["a", "b"], [[1, None], [2, 3]])
+    assert tabulate({"total": 5}) == (["key", "value"], [["total", 5]])
+
+
+def test_csv_writer_writes_batches(tmp_path):
+    path = str(tmp_path / "out" / "report.csv")
+    writer = open_report_writer("csv", path)
+    writer.write_header(["id", "amount"])
+    writer.write_rows([(1, Decimal("10.50")), (2, Decimal("3.00"))])
+    writer.write_rows([(3, None)])
+    writer.close()
+
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["id", "amount"], ["1", "10.50"], ["2", "3.00"], ["3", ""]]
+    assert writer.row_count == 3
+
+
+def test_json_writer_writes_an_array_of_objects(tmp_path):
+    path = str(tmp_path / "report.json")
+    writer = open_report_writer("json", path)
+    writer.write_header(["day", "amount"])
+    writer.write_rows([(date(2025, 1, 1), Decimal("1.5"))])
+    writer.write_rows([(date(2025, 1, 2), Decimal("2"))])
+    writer.close()
+
+    with open(path) as f:
+        assert json.load(f) == [
+            {"day": "2025-01-01", "amount": 1.5},
+            {"day": "2025-01-02", "amount": 2.0},
+        ]
+
+
+def test_unsupported_output_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_report_writer("pdf", str(tmp_path / "report.pdf"))
+
+
+def test_report_writers_must_implement_rows_and_close(tmp_path):
+    class Incomplete(ReportFileWriter):
+        def write_rows(self, rows):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete(str(tmp_path / "report.csv"))
+
+
+def test_expired_report_outputs_are_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.REPORT_OUTPUT_DIR", str(tmp_path))
+    old, recent = report_output_path(1, "csv"), report_output_path(2, "csv")
+    other = str(tmp_path / "notes.txt")
+    for path in (old, recent, other):
+        with open(path, "w") as f:
+            f.write("x")
+    now = time.time()
+    os.utime(old, (now - 8 * 86400, now - 8 * 86400))
+    os.utime(other, (now - 8 * 86400, now - 8 * 86400))
+
+    assert remove_expired_report_outputs(7, now=now) == [old]
+    assert os.path.exists(recent) and os.path.exists(other)
@@ -0,0 +1,32 @@
+"""
+Unit tests for report fact day batching and invoice aging buckets
+"""
+from datetime import date, timedelta
+
+from app.crud.billing import aging_bucket
+from app.services.report_facts import day_batches
+
+
+def test_day_batches_sorts_deduplicates_and_splits():
+    start = date(2025, 1, 1)
+    days = [start + timedelta(days=offset) for offset in range(70)]
+
+    batches = day_batches(list(reversed(days)) + days[:5] + [None], batch_size=31)
+
+    assert [len(batch) for batch in batches] == [31, 31, 8]
+    assert [day for batch in batches for day in batch] == days
+
+
+def test_day_batches_empty():
+    assert day_batches([]) == []
+
+
+def test_aging_bucket_boundaries():
+    assert aging_bucket(0) == '0_30'
+    assert aging_bucket(30) == '0_30'
+    assert aging_bucket(31) == '31_60'
+    assert aging_bucket(60) == '31_60'
+    assert aging_bucket(61) == '61_90'
+    assert aging_bucket(90) == '61_90'
+    assert aging_bucket(91) == '91_plus'
+    assert aging_bucket(400) == '91_plus'
@@ -0,0 +1,106 @@
+"""
+Unit tests for the SATUSEHAT bulk sync bundle building and pacing
+"""
+import asyncio
+import time
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.satusehat_bulk_sync import RequestPacer, build_encounter_bundle, bundle_resource_ids
+
+
+def _encounter(satusehat_encounter_id=None):
+    return SimpleNamespace(
+        id=7,
+        satusehat_encounter_id=satusehat_encounter_id,
+        encounter_type="outpatient",
+        encounter_date=date(2025, 1, 16),
+        start_time=datetime(2025, 1, 16, 8, 0),
+        end_time=datetime(2025, 1, 16, 9, 0),
+        status="finished",
+        department="Poli Umum",
+        chief_complaint="Demam",
+        is_urgent=False,
+        bpjs_sep_number=None,
+    )
+
+
+def _diagnosis(diagnosis_id, satusehat_condition_id=None):
+    return SimpleNamespace(
+        id=diagnosis_id,
+        satusehat_condition_id=satusehat_condition_id,
+        icd_10_code="A01.0",
+        diagnosis_name="Typhoid fever",
+        diagnosis_type="primary",
+        is_chronic=False,
+        notes=None,
+        created_at=datetime(2025, 1, 16, 8, 30),
+    )
+
+
+PATIENT = SimpleNamespace(id=3, satusehat_patient_id="P100", full_name="Budi Santoso")
+
+
+class TestBuildEncounterBundle:
+    """Test the encounter transaction Bundle"""
+
+    def test_new_resources_reference_the_encounter_urn(self):
+        bundle = build_encounter_bundle(_encounter(), PATIENT, None, [_diagnosis(1), _diagnosis(2)])
+
+        assert bundle["type"] == "transaction"
+        encounter_entry, *conditions = bundle["entry"]
+        assert encounter_entry["request"] == {"method": "POST", "url": "Encounter"}
+        assert encounter_entry["fullUrl"].startswith("urn:uuid:")
+        assert len(conditions) == 2
+        for entry in conditions:
+            assert entry["request"]["method"] == "POST"
+            assert entry["resource"]["encounter"]["reference"] == encounter_entry["fullUrl"]
+
+    def test_synced_resources_are_updated_in_place(self):
+        bundle = build_encounter_bundle(_encounter("E200"), PATIENT, None, [_diagnosis(1, "C300")])
+
+        encounter_entry, condition_entry = bundle["entry"]
+        assert encounter_entry["request"] == {"method": "PUT", "url": "Encounter/E200"}
+        assert condition_entry["request"] == {"method": "PUT", "url": "Condition/C300"}
+        assert condition_entry["resource"]["encounter"]["reference"] == "Encounter/E200"
+
+
+class TestBundleResourceIds:
+    """Test reading IDs from a transaction response"""
+
+    def test_reads_ids_in_entry_order(self):
+        response = {"entry": [
+            {"response": {"resourceID": "E1", "status": "201 Created"}},
+            {"response": {"location": "Condition/C2/_history/1", "status": "201 Created"}},
+            {"response": {"status": "200 OK"}, "resource": {"id": "C3"}},
+            {"response": {"status": "400 Bad Request"}},
+        ]}
+
+        assert bundle_resource_ids(response) == ["E1", "C2", "C3", None]
+
+    def test_empty_response(self):
+        assert bundle_resource_ids({}) == []
+
+
+class TestRequestPacer:
+    """Test request pacing"""
+
+    @pytest.mark.asyncio
+    async def test_spaces_request_starts(self):
+        pacer = RequestPacer(50)
+        started = time.monotonic()
+
+        await asyncio.gather(*[pacer.wait() for _ in range(6)])
+
+        assert time.monotonic() - started >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_unlimited_rate_does_not_wait(self):
+        pacer = RequestPacer(0)
+        started = time.monotonic()
+
+        await asyncio.gather(*[pacer.wait() for _ in range(100)])
+
+        assert time.monotonic() - started < 0.05
@@ -0,0 +1,120 @@
+"""
+Unit tests for the shared SATUSEHAT token cache
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services import satusehat_token
+from app.services.satusehat_token import CachedToken, SATUSEHATTokenManager, token_cache_key
+
+
+class FakeRedis:
+    """The few Redis commands the token manager uses"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    async def eval(self, script, numkeys, key, owner):
+        if self.values.get(key) == owner:
+            del self.values[key]
+
+
+class BrokenRedis:
+    async def get(self, key):
+        raise ConnectionError("redis down")
+
+    set = delete = eval = get
+
+
+def _fetcher(expires_in=3600):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "token-{}".format(len(calls)), expires_in
+
+    return fetch, calls
+
+
+KEY = token_cache_key("client", "https://auth.example")
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(satusehat_token, "get_redis_client", lambda: fake)
+    return fake
+
+
+class TestSATUSEHATTokenManager:
+    """Test token sharing and single-flight refresh"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_refresh(self, redis):
+        manager = SATUSEHATTokenManager()
+        fetch, calls = _fetcher()
+
+        tokens = await asyncio.gather(*[manager.get_token(KEY, fetch) for _ in range(50)])
+
+        assert len(calls) == 1
+        assert set(t.access_token for t in tokens) == {"token-1"}
+        assert "{}:lock".format(KEY) not in redis.values
+
+    @pytest.mark.asyncio
+    async def test_other_workers_read_the_shared_token(self, redis):
+        fetch, calls = _fetcher()
+        await SATUSEHATTokenManager().get_token(KEY, fetch)
+
+        token = await SATUSEHATTokenManager().get_token(KEY, fetch)
+
+        assert token.access_token == "token-1"
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_refreshes_before_expiry(self, redis):
+        manager = SATUSEHATTokenManager(refresh_margin=300)
+        fetch, calls = _fetcher()
+        manager._tokens[KEY] = CachedToken("old", time.time() + 60)
+
+        token = await manager.get_token(KEY, fetch)
+
+        assert token.access_token == "token-1"
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_drops_matching_token(self, redis):
+        manager = SATUSEHATTokenManager()
+        fetch, calls = _fetcher()
+        await manager.get_token(KEY, fetch)
+
+        await manager.invalidate(KEY, "token-1")
+        token = await manager.get_token(KEY, fetch)
+
+        assert token.access_token == "token-2"
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_works_without_redis(self, monkeypatch):
+        monkeypatch.setattr(satusehat_token, "get_redis_client", lambda: BrokenRedis())
+        manager = SATUSEHATTokenManager()
+        fetch, calls = _fetcher()
+
+        tokens = await asyncio.gather(*[manager.get_token(KEY, fetch) for _ in range(10)])
+
+        assert len(calls) == 1
+        assert all(t.access_token == "token-1" for t in tokens)
@@ -0,0 +1,99 @@
+"""
+Unit tests for the slot availability engine
+"""
+from datetime import date, time
+from types import SimpleNamespace
+
+from app.services.slot_availability import (
+    AvailabilityCache,
+    DayBitmap,
+    DayIndex,
+    SlotAvailabilityEngine,
+    default_slots,
+    minute_of_day,
+)
+
+
+def _busy(*ranges):
+    bitmap = DayBitmap()
+    for start, end in ranges:
+        bitmap.add(minute_of_day(start), minute_of_day(end))
+    return bitmap
+
+
+class TestDayBitmap:
+    """Test busy-minute bitmaps"""
+
+    def test_overlap(self):
+        bitmap = _busy((time(9, 0), time(9, 30)))
+
+        assert not bitmap.is_free(minute_of_day(time(9, 15)), minute_of_day(time(9, 45)))
+        assert not bitmap.is_free(minute_of_day(time(8, 45)), minute_of_day(time(9, 1)))
+
+    def test_adjacent_ranges_are_free(self):
+        bitmap = _busy((time(9, 0), time(9, 30)))
+
+        assert bitmap.is_free(minute_of_day(time(9, 30)), minute_of_day(time(10, 0)))
+        assert bitmap.is_free(minute_of_day(time(8, 30)), minute_of_day(time(9, 0)))
+
+
+def test_appointment_length_follows_the_overlap_constraint():
+    # The exclusion constraint is built from duration_minutes, not end_time
+    row = SimpleNamespace(appointment_time=time(9, 0), duration_minutes=45)
+
+    assert SlotAvailabilityEngine._appointment_minutes(row) == (9 * 60, 9 * 60 + 45)
+
+
+class TestDayIndex:
+    """Test free slot calculation"""
+
+    def test_default_slots_minus_appointments(self):
+        index = DayIndex(busy={7: _busy((time(8, 0), time(8, 30)), (time(10, 15), time(10, 45)))})
+
+        free = [slot["start_time"] for slot in index.free_slots(7)]
+
+        assert len(default_slots()) == 18
+        assert "08:00" not in free
+        assert "10:00" not in free and "10:30" not in free
+        assert len(free) == 15
+
+    def test_department_level_combines_doctors(self):
+        index = DayIndex(busy={
+            7: _busy((time(8, 0), time(8, 30))),
+            9: _busy((time(8, 30), time(9, 0))),
+        })
+
+        free = [slot["start_time"] for slot in index.free_slots(None)]
+
+        assert free[0] == "09:00"
+        assert index.doctor_ids() == [7, 9]
+        # Another doctor's appointments do not block this doctor
+        assert index.free_slots(9)[0]["start_time"] == "08:00"
+
+    def test_configured_slots(self):
+        index = DayIndex(
+            busy={7: _busy((time(13, 0), time(13, 20)))},
+            slots={7: [(13 * 60, 13 * 60 + 20), (13 * 60 + 20, 13 * 60 + 40)]},
+        )
+
+        assert index.free_slots(7) == [
+            {"start_time": "13:20", "end_time": "13:40", "available": True},
+        ]
+
+
+class TestAvailabilityCache:
+    """Test cache expiry and invalidation"""
+
+    def test_invalidate(self):
+        cache = AvailabilityCache(ttl_seconds=60)
+        cache.set(1, date(2026, 1, 5), DayIndex())
+
+        assert cache.get(1, date(2026, 1, 5)) is not None
+        cache.invalidate(1, date(2026, 1, 5))
+        assert cache.get(1, date(2026, 1, 5)) is None
+
+    def test_expiry(self):
+        cache = AvailabilityCache(ttl_seconds=-1)
+        cache.set(1, date(2026, 1, 5), DayIndex())
+
+        assert cache.get(1, date(2026, 1, 5)) is None
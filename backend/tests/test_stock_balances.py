@@ -0,0 +1,167 @@
+"""
+Unit tests for the stock balance rules
+"""
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.crud.inventory import (
+    apply_stock_delta,
+    batch_counts_toward_stock,
+    get_current_stock,
+    get_stock_balances,
+    reconcile_stock_balances,
+)
+from app.models.inventory import DrugStockBalance
+
+
+TODAY = date(2026, 3, 1)
+
+
+def batch(expiry_date, is_quarantined=False):
+    return SimpleNamespace(quantity=10, expiry_date=expiry_date, is_quarantined=is_quarantined)
+
+
+def test_batch_counts_until_its_expiry_date():
+    assert batch_counts_toward_stock(batch(date(2026, 3, 2)), TODAY)
+    assert batch_counts_toward_stock(batch(TODAY), TODAY)
+    assert not batch_counts_toward_stock(batch(date(2026, 2, 28)), TODAY)
+
+
+def test_quarantined_batch_never_counts():
+    assert not batch_counts_toward_stock(batch(date(2027, 1, 1), is_quarantined=True), TODAY)
+
+
+class FakeResult:
+    def __init__(self, rows=None, scalar=None):
+        self.rows = rows or []
+        self.value = scalar
+
+    def scalar(self):
+        return self.value
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Records statements compiled for PostgreSQL and answers with queued results"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+        self.committed = False
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement.compile(dialect=postgresql.dialect())), params))
+        return self.results.pop(0) if self.results else FakeResult()
+
+    async def commit(self):
+        self.committed = True
+
+
+@pytest.mark.asyncio
+async def test_apply_delta_updates_total_and_upserts_location():
+    db = FakeSession(FakeResult(scalar=70))
+
+    stock = await apply_stock_delta(db, drug_id=5, location=None, delta=-30)
+
+    assert stock == 70
+    (total_sql, _), (balance_sql, _) = db.statements
+    assert total_sql.startswith("UPDATE drugs SET stock_on_hand=(drugs.stock_on_hand + ")
+    assert "RETURNING drugs.stock_on_hand" in total_sql
+    assert "ON CONFLICT (drug_id, location) DO UPDATE SET on_hand = " \
+           "(drug_stock_balances.on_hand + excluded.on_hand)" in balance_sql
+
+
+@pytest.mark.asyncio
+async def test_apply_zero_delta_leaves_location_balances_alone():
+    db = FakeSession(FakeResult(scalar=40))
+
+    assert await apply_stock_delta(db, drug_id=5, location="A-1", delta=0) == 40
+    assert len(db.statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_applies_differences_as_deltas():
+    db = FakeSession(
+        FakeResult([SimpleNamespace(id=5, delta=-3)]),
+        FakeResult(),
+        FakeResult([
+            SimpleNamespace(drug_id=5, location="", delta=-3),
+            SimpleNamespace(drug_id=5, location="B-2", delta=12),
+        ]),
+    )
+
+    corrected = await reconcile_stock_balances(db, [5])
+
+    assert corrected == {'drugs_corrected': 1, 'locations_corrected': 2}
+    assert db.committed
+    drug_sql, update_sql, location_sql, _ = [sql for sql, _ in db.statements]
+    assert "drug_batches.is_quarantined = false" in drug_sql
+    assert "drug_batches.expiry_date >= " in drug_sql
+    assert update_sql.startswith("UPDATE drugs SET stock_on_hand=(drugs.stock_on_hand + ")
+    assert "FULL OUTER JOIN" in location_sql
+    assert [(p["location"], p["on_hand"]) for p in db.statements[-1][1]] == [("", -3), ("B-2", 12)]
+
+
+@pytest.mark.asyncio
+async def test_reconcile_of_no_drugs_runs_no_queries():
+    db = FakeSession()
+
+    assert await reconcile_stock_balances(db, []) == {'drugs_corrected': 0, 'locations_corrected': 0}
+    assert db.statements == []
+
+
+@pytest_asyncio.fixture
+async def stock_db():
+    """SQLite with just the stock columns (drugs has PostgreSQL-only types)"""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE drugs (id INTEGER PRIMARY KEY, stock_on_hand INTEGER NOT NULL)"))
+        await conn.execute(text(
+            "CREATE TABLE drug_batches (id INTEGER PRIMARY KEY, drug_id INTEGER, quantity INTEGER, "
+            "expiry_date DATE, is_quarantined BOOLEAN, bin_location VARCHAR(50))"
+        ))
+        await conn.run_sync(DrugStockBalance.__table__.create)
+        await conn.execute(text("INSERT INTO drugs VALUES (5, 100)"))
+
+    async with async_sessionmaker(engine, class_=AsyncSession)() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_deltas_add_up_per_drug_and_location(stock_db):
+    assert await apply_stock_delta(stock_db, drug_id=5, location="A-1", delta=-30) == 70
+    assert await apply_stock_delta(stock_db, drug_id=5, location="A-1", delta=12) == 82
+    assert await apply_stock_delta(stock_db, drug_id=5, location=None, delta=5) == 87
+
+    assert await get_current_stock(stock_db, 5) == 87
+    assert await get_stock_balances(stock_db, 5) == {"": 5, "A-1": -18}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_brings_balances_to_the_usable_batch_sums(stock_db):
+    await apply_stock_delta(stock_db, drug_id=5, location="C-3", delta=9)
+    await stock_db.execute(text(
+        "INSERT INTO drug_batches VALUES "
+        "(1, 5, 40, '2099-01-01', 0, 'A-1'), "
+        "(2, 5, 7, '2099-01-01', 0, NULL), "
+        "(3, 5, 99, '2000-01-01', 0, 'A-1'), "  # expired
+        "(4, 5, 50, '2099-01-01', 1, 'B-2')"  # quarantined
+    ))
+
+    corrected = await reconcile_stock_balances(stock_db, [5])
+
+    assert corrected == {'drugs_corrected': 1, 'locations_corrected': 3}
+    assert await get_current_stock(stock_db, 5) == 47
+    assert await get_stock_balances(stock_db, 5) == {"": 7, "A-1": 40}
+    assert await reconcile_stock_balances(stock_db, [5]) == {'drugs_corrected': 0, 'locations_corrected': 0}
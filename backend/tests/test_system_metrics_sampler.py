@@ -0,0 +1,128 @@
+"""
+Unit tests for the background system metrics sampler
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app.main  # noqa: F401 - registers every model with the ORM
+from app.services import system_monitoring
+from app.services.system_monitoring import MonitoringQueryService
+from app.services.system_metrics_sampler import (
+    MetricRingBuffer,
+    MetricRollup,
+    SYSTEM_METRICS,
+    SystemMetricsSampler,
+    summarize_rollups,
+)
+
+
+def _values(cpu):
+    values = dict((name, 1.0) for name in SYSTEM_METRICS)
+    values["cpu.usage"] = cpu
+    return values
+
+
+def test_ring_buffer_keeps_latest_samples():
+    buffer = MetricRingBuffer(3)
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    for i in range(5):
+        buffer.append(start + timedelta(seconds=i), float(i))
+
+    assert len(buffer) == 3
+    assert buffer.oldest == start + timedelta(seconds=2)
+    assert buffer.latest() == (start + timedelta(seconds=4), 4.0)
+    assert [v for _, v in buffer.window(start_time=start + timedelta(seconds=3))] == [3.0, 4.0]
+
+
+def test_closed_minutes_become_rollup_rows():
+    sampler = SystemMetricsSampler(buffer_size=100, hostname="simrs-app-1")
+    start = datetime(2026, 1, 1, 8, 59, 0)
+    for i, cpu in enumerate([10.0, 30.0, 20.0, 90.0]):
+        sampler.record(start + timedelta(seconds=20 * i), _values(cpu))
+
+    # 08:59:00-08:59:40 closed the 08:59 minute and hour at 09:00:00
+    rows = dict(((r["interval"], r["metric_name"]), r) for r in sampler._pending)
+    minute = rows[("minute", "cpu.usage")]
+    assert minute["metric_value"] == 20.0
+    assert minute["tags"]["min"] == "10.0" and minute["tags"]["max"] == "30.0"
+    assert minute["tags"]["samples"] == "3"
+    assert minute["timestamp"] == start
+    assert ("hour", "cpu.usage") in rows
+    assert sampler.open_rollup("minute", "cpu.usage").average == 90.0
+
+    # Another worker on the same host produces the same row IDs
+    other = SystemMetricsSampler(buffer_size=100, hostname="simrs-app-1")
+    for i, cpu in enumerate([10.0, 30.0, 20.0, 90.0]):
+        other.record(start + timedelta(seconds=20 * i), _values(cpu))
+    assert sorted(r["metric_id"] for r in other._pending) == sorted(r["metric_id"] for r in sampler._pending)
+
+
+def test_buffer_covers_only_its_own_window():
+    sampler = SystemMetricsSampler(buffer_size=10, hostname="simrs-app-1")
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    for i in range(15):
+        sampler.record(start + timedelta(seconds=5 * i), _values(float(i)))
+
+    assert sampler.covers(start + timedelta(seconds=30))
+    assert not sampler.covers(start)
+
+    assert not sampler.covers(None, end_time=start + timedelta(seconds=10))
+    assert [v for _, v in sampler.buffers["cpu.usage"].window()][-3:] == [12.0, 13.0, 14.0]
+    assert sampler.metrics("unknown.metric") == []
+
+
+def test_summary_weights_rollups_by_samples():
+    first = MetricRollup()
+    first.add(10.0, samples=3, minimum=5.0, maximum=20.0)
+    second = MetricRollup()
+    second.add(50.0)
+
+    summary = summarize_rollups([first, second, MetricRollup()])
+
+    assert summary.samples == 4
+    assert summary.average == 20.0
+    assert (summary.minimum, summary.maximum) == (5.0, 50.0)
+
+
+class FakeSession:
+    """Records the statements a query runs, compiled for PostgreSQL"""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        compiled = statement.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={"literal_binds": True},
+        )
+        self.statements.append(str(compiled))
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: []))
+
+
+@pytest.mark.asyncio
+async def test_query_accepts_aware_times_and_filters_rollups_by_interval(monkeypatch):
+    sampler = SystemMetricsSampler(buffer_size=10, hostname="simrs-app-1")
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    for i in range(15):
+        sampler.record(start + timedelta(seconds=5 * i), _values(float(i)))
+    monkeypatch.setattr(system_monitoring, "system_metrics_sampler", sampler)
+    db = FakeSession()
+    service = MonitoringQueryService(db)
+
+    # 15:01 in Jakarta is 08:01 UTC, still in the ring buffers
+    jakarta = timezone(timedelta(hours=7))
+    metrics = await service.get_system_metrics(
+        "cpu.usage", start_time=datetime(2026, 1, 1, 15, 1, 0, tzinfo=jakarta),
+    )
+    assert [m.metric_value for m in metrics] == [14.0, 13.0, 12.0]
+    assert db.statements == []
+
+    await service.get_system_metrics(
+        start_time=datetime(2026, 1, 1, 7, 0, 0, tzinfo=timezone.utc), interval="hour",
+    )
+    sql = db.statements[0]
+    assert "system_metrics.interval = 'hour'" in sql
+    assert "system_metrics.timestamp >= '2026-01-01 07:00:00'" in sql
@@ -0,0 +1,152 @@
+"""
+Unit tests for the BPJS upstream resilience layer
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.upstream_resilience import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    UpstreamGuard,
+    UpstreamUnavailableError,
+    endpoint_key,
+    is_transient_code,
+)
+
+
+def _response(status_code=200):
+    return httpx.Response(status_code, json={"metaData": {"code": "200"}})
+
+
+def test_endpoint_key_hides_identifiers():
+    assert endpoint_key("Peserta/nokartu/0001234567890/tglSEP/2025-01-16") == "Peserta/nokartu/*/tglSEP/*"
+    assert endpoint_key("/SEP/0301R0011225V000001") == "SEP/*"
+
+
+def test_transient_codes():
+    assert is_transient_code("UNAVAILABLE")
+    assert is_transient_code("503")
+    assert is_transient_code("429")
+    assert not is_transient_code("201")
+    assert not is_transient_code(None)
+
+
+class TestCircuitBreaker:
+    """Test opening, probing and closing"""
+
+    def test_opens_on_failure_rate_then_probes(self):
+        breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window=10, open_seconds=0)
+        for success in (True, False, False, True):
+            assert breaker.allow() is False
+            breaker.record(success)
+
+        assert breaker.state == "open"
+        assert breaker.allow() is True   # open_seconds elapsed: one probe
+        assert breaker.allow() is None   # no second probe while it runs
+
+        breaker.record(True, probe=True)
+        assert breaker.state == "closed"
+
+    def test_failed_probe_reopens_for_longer(self):
+        breaker = CircuitBreaker(failure_rate=0.5, min_calls=1, open_seconds=0.01, max_open_seconds=60)
+        breaker.record(False)
+        time.sleep(0.02)
+
+        assert breaker.allow() is True
+        breaker.record(False, probe=True)
+
+        assert breaker.state == "open"
+        assert breaker.retry_after() > 0.01
+
+
+class TestAdaptiveLimiter:
+    """Test shedding and AIMD"""
+
+    @pytest.mark.asyncio
+    async def test_sheds_beyond_queue(self):
+        limiter = AdaptiveLimiter(max_limit=1, min_limit=1, max_queue=1, queue_timeout=0.05)
+        assert await limiter.acquire()
+
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not await limiter.acquire()   # queue full
+
+        limiter.release()
+        assert await waiting
+        assert limiter.in_use == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout(self):
+        limiter = AdaptiveLimiter(max_limit=1, min_limit=1, max_queue=5, queue_timeout=0.01)
+        await limiter.acquire()
+
+        assert not await limiter.acquire()
+        assert limiter.queued == 0
+
+    def test_decreases_on_overload_and_recovers(self):
+        limiter = AdaptiveLimiter(max_limit=10, min_limit=2)
+        limiter.on_overload()
+        assert limiter.limit == 7.0
+
+        for _ in range(100):
+            limiter.on_success()
+        assert limiter.limit == 10.0
+
+
+class TestUpstreamGuard:
+    """Test guarded calls"""
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast(self):
+        guard = UpstreamGuard("test_open", max_concurrency=4, hedge=False)
+        calls = []
+
+        async def failing(timeout):
+            calls.append(timeout)
+            raise httpx.ConnectError("refused")
+
+        for _ in range(10):
+            with pytest.raises(httpx.ConnectError):
+                await guard.call("Peserta/nik/1", failing)
+
+        with pytest.raises(UpstreamUnavailableError) as excinfo:
+            await guard.call("Peserta/nik/2", failing)
+
+        assert excinfo.value.reason == "circuit_open"
+        assert len(calls) == 10
+        assert guard.limiter.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_server_errors_count_as_failures(self):
+        guard = UpstreamGuard("test_5xx", max_concurrency=4, hedge=False)
+
+        async def unavailable(timeout):
+            return _response(503)
+
+        for _ in range(10):
+            assert (await guard.call("SEP/create", unavailable)).status_code == 503
+
+        assert guard.breaker("SEP/create").state == "open"
+
+    @pytest.mark.asyncio
+    async def test_slow_request_is_hedged(self):
+        guard = UpstreamGuard("test_hedge", max_concurrency=4)
+        estimator = guard.latency("Peserta/nik/*")
+        for _ in range(5):
+            estimator.observe(0.01)
+        attempts = []
+
+        async def send(timeout):
+            attempts.append(timeout)
+            if len(attempts) == 1:
+                await asyncio.sleep(5)
+            return _response()
+
+        response = await asyncio.wait_for(guard.call("Peserta/nik/1", send, hedge=True), 2)
+
+        assert response.status_code == 200
+        assert len(attempts) == 2
+        assert guard.limiter.in_use == 0